@@ -0,0 +1,58 @@
+"""add bank account daily balances
+
+Revision ID: a3c5e7f9b1d4
+Revises: f2b4d6e8a0c3
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "a3c5e7f9b1d4"
+down_revision: Union[str, None] = "f2b4d6e8a0c3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "bank_account_daily_balances",
+        sa.Column("bank_account_id", sa.Integer(), nullable=False),
+        sa.Column("dia", sa.Date(), nullable=False),
+        sa.Column("ingresos", sa.Float(), server_default="0", nullable=False),
+        sa.Column("egresos", sa.Float(), server_default="0", nullable=False),
+        sa.Column("movimientos", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("saldo_cierre", sa.Float(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(
+            ["bank_account_id"], ["bank_accounts.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("bank_account_id", "dia"),
+    )
+
+    # Libro inicial desde los movimientos vigentes
+    op.execute("""
+        INSERT INTO bank_account_daily_balances
+            (bank_account_id, dia, ingresos, egresos, movimientos, saldo_cierre)
+        SELECT bank_account_id, dia, ingresos, egresos, movimientos,
+               SUM(ingresos - egresos) OVER (
+                   PARTITION BY bank_account_id ORDER BY dia
+               )
+        FROM (
+            SELECT bank_account_id,
+                   date(fecha) AS dia,
+                   COALESCE(SUM(CASE WHEN tipo = 'ingreso' THEN monto ELSE 0 END), 0)
+                       AS ingresos,
+                   COALESCE(SUM(CASE WHEN tipo = 'egreso' THEN monto ELSE 0 END), 0)
+                       AS egresos,
+                   COUNT(*) AS movimientos
+            FROM bank_movements
+            WHERE record_status != 'E'
+            GROUP BY bank_account_id, date(fecha)
+        ) AS totales
+        """)
+
+
+def downgrade() -> None:
+    op.drop_table("bank_account_daily_balances")
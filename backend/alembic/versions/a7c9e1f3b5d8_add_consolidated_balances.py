@@ -0,0 +1,67 @@
+"""add consolidated balances
+
+Revision ID: a7c9e1f3b5d8
+Revises: f6b8d0e2a4c7
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "a7c9e1f3b5d8"
+down_revision: Union[str, None] = "f6b8d0e2a4c7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# tipo -> (tabla de facturas, columna del dueño)
+FUENTES = {
+    "clientes": ("receivable_invoices", "client_id"),
+    "proveedores": ("payable_invoices", "supplier_id"),
+}
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_receivable_invoices_client_id",
+        "receivable_invoices",
+        ["client_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_payable_invoices_supplier_id",
+        "payable_invoices",
+        ["supplier_id"],
+        unique=False,
+    )
+
+    op.create_table(
+        "consolidated_balances",
+        sa.Column("tipo", sa.String(length=20), nullable=False),
+        sa.Column("entidad_id", sa.Integer(), nullable=False),
+        sa.Column("deuda_total", sa.Float(), server_default="0", nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("tipo", "entidad_id"),
+    )
+
+    # Saldo inicial desde las facturas vigentes
+    for tipo, (tabla, columna) in FUENTES.items():
+        op.execute(f"""
+            INSERT INTO consolidated_balances (tipo, entidad_id, deuda_total)
+            SELECT '{tipo}', {columna}, COALESCE(SUM(saldo_pendiente), 0)
+            FROM {tabla}
+            WHERE {columna} IS NOT NULL AND record_status != 'E'
+            GROUP BY {columna}
+            """)
+
+
+def downgrade() -> None:
+    op.drop_table("consolidated_balances")
+    op.drop_index("ix_payable_invoices_supplier_id", table_name="payable_invoices")
+    op.drop_index("ix_receivable_invoices_client_id", table_name="receivable_invoices")
@@ -0,0 +1,32 @@
+"""add pdf_status to receivable invoice payments
+
+Revision ID: b5d7f9a1c3e6
+Revises: a3c5e7f9b1d4
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "b5d7f9a1c3e6"
+down_revision: Union[str, None] = "a3c5e7f9b1d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "receivable_invoice_payments",
+        sa.Column("pdf_status", sa.String(length=20), nullable=True),
+    )
+    # Los complementos ya timbrados tienen su PDF generado en línea
+    op.execute(
+        "UPDATE receivable_invoice_payments SET pdf_status = 'GENERADO' "
+        "WHERE length(complemento_uuid) = 36"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("receivable_invoice_payments", "pdf_status")
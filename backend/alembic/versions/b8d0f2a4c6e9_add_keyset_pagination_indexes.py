@@ -0,0 +1,37 @@
+"""add keyset pagination indexes
+
+Revision ID: b8d0f2a4c6e9
+Revises: a7c9e1f3b5d8
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "b8d0f2a4c6e9"
+down_revision: Union[str, None] = "a7c9e1f3b5d8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_payable_invoices_fecha_vencimiento_id",
+        "payable_invoices",
+        ["fecha_vencimiento", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_audit_logs_created_at_id",
+        "audit_logs",
+        ["created_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_audit_logs_created_at_id", table_name="audit_logs")
+    op.drop_index(
+        "ix_payable_invoices_fecha_vencimiento_id", table_name="payable_invoices"
+    )
@@ -0,0 +1,85 @@
+"""add folio sequences
+
+Revision ID: c3e5a7f9b2d4
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "c3e5a7f9b2d4"
+down_revision: Union[str, None] = "a1b2c3d4e5f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "folio_sequences",
+        sa.Column("serie", sa.String(length=10), nullable=False),
+        sa.Column("ultimo_folio", sa.Integer(), server_default="0", nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("serie"),
+    )
+    op.create_table(
+        "folio_reservations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("serie", sa.String(length=10), nullable=False),
+        sa.Column("folio", sa.Integer(), nullable=False),
+        sa.Column("origen", sa.String(length=120), nullable=True),
+        sa.Column(
+            "status", sa.String(length=20), server_default="RESERVADO", nullable=False
+        ),
+        sa.Column("motivo", sa.Text(), nullable=True),
+        sa.Column(
+            "reserved_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("resolved_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("serie", "folio", name="uq_folio_reservations_serie_folio"),
+    )
+    op.create_index("ix_folio_reservations_id", "folio_reservations", ["id"])
+
+    # Continuar la numeración actual: folio_actual_{serie} de system_configs
+    op.execute("""
+        INSERT INTO folio_sequences (serie, ultimo_folio)
+        SELECT substring(key FROM 14), CAST(value AS INTEGER)
+        FROM system_configs
+        WHERE key LIKE 'folio\\_actual\\_%' AND value ~ '^[0-9]+$'
+        ON CONFLICT (serie) DO NOTHING
+        """)
+    # Complementos de pago: el mayor COM-n existente (base histórica 2559)
+    op.execute("""
+        INSERT INTO folio_sequences (serie, ultimo_folio)
+        SELECT 'COM', GREATEST(
+            2559,
+            COALESCE(MAX(CAST(substring(folio_complemento FROM 5) AS INTEGER)), 0)
+        )
+        FROM receivable_invoice_payments
+        WHERE folio_complemento ~ '^COM-[0-9]+$'
+        ON CONFLICT (serie) DO NOTHING
+        """)
+
+
+def downgrade() -> None:
+    # Regresar el último folio a system_configs para no reiniciar la numeración
+    op.execute("""
+        UPDATE system_configs sc
+        SET value = CAST(fs.ultimo_folio AS TEXT)
+        FROM folio_sequences fs
+        WHERE sc.key = 'folio_actual_' || fs.serie
+        """)
+    op.drop_index("ix_folio_reservations_id", table_name="folio_reservations")
+    op.drop_table("folio_reservations")
+    op.drop_table("folio_sequences")
@@ -0,0 +1,84 @@
+"""add opening balance movements
+
+Revision ID: c7e9b1d3f5a8
+Revises: b5d7f9a1c3e6
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "c7e9b1d3f5a8"
+down_revision: Union[str, None] = "b5d7f9a1c3e6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_LIBRO = """
+    INSERT INTO bank_account_daily_balances
+        (bank_account_id, dia, ingresos, egresos, movimientos, saldo_cierre)
+    SELECT bank_account_id, dia, ingresos, egresos, movimientos,
+           SUM(ingresos - egresos) OVER (
+               PARTITION BY bank_account_id ORDER BY dia
+           )
+    FROM (
+        SELECT bank_account_id,
+               date(fecha) AS dia,
+               COALESCE(SUM(CASE WHEN tipo = 'ingreso' THEN monto ELSE 0 END), 0)
+                   AS ingresos,
+               COALESCE(SUM(CASE WHEN tipo = 'egreso' THEN monto ELSE 0 END), 0)
+                   AS egresos,
+               COUNT(*) AS movimientos
+        FROM bank_movements
+        WHERE record_status != 'E'
+        GROUP BY bank_account_id, date(fecha)
+    ) AS totales
+"""
+
+
+def upgrade() -> None:
+    # Lo que el saldo de cada cuenta no explica con sus movimientos es su saldo
+    # inicial (o ajustes manuales previos): entra como el primer movimiento
+    op.execute("""
+        INSERT INTO bank_movements
+            (bank_account_id, tipo, monto, fecha, concepto, origen_modulo,
+             conciliado, fecha_conciliacion, record_status, created_at)
+        SELECT a.id,
+               CASE WHEN a.diferencia > 0 THEN 'ingreso' ELSE 'egreso' END,
+               ABS(a.diferencia),
+               a.fecha,
+               'Saldo inicial',
+               'AJUSTE_SALDO',
+               true,
+               CURRENT_DATE,
+               'A',
+               now()
+        FROM (
+            SELECT c.id,
+                   ROUND((COALESCE(c.saldo, 0) - COALESCE(SUM(
+                       CASE WHEN m.tipo = 'ingreso' THEN m.monto
+                            WHEN m.tipo = 'egreso' THEN -m.monto
+                            ELSE 0 END
+                   ), 0))::numeric, 2) AS diferencia,
+                   LEAST(c.created_at, MIN(m.fecha)) AS fecha
+            FROM bank_accounts c
+            LEFT JOIN bank_movements m
+                ON m.bank_account_id = c.id AND m.record_status != 'E'
+            WHERE c.record_status != 'E'
+            GROUP BY c.id
+        ) AS a
+        WHERE a.diferencia != 0
+        """)
+    op.execute("DELETE FROM bank_account_daily_balances")
+    op.execute(_LIBRO)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DELETE FROM bank_movements
+        WHERE origen_modulo = 'AJUSTE_SALDO'
+          AND concepto = 'Saldo inicial'
+          AND created_by_id IS NULL
+        """)
+    op.execute("DELETE FROM bank_account_daily_balances")
+    op.execute(_LIBRO)
@@ -0,0 +1,23 @@
+"""add trip_legs trip_id index
+
+Revision ID: c9e1a3b5d7f0
+Revises: b8d0f2a4c6e9
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "c9e1a3b5d7f0"
+down_revision: Union[str, None] = "b8d0f2a4c6e9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_trip_legs_trip_id", "trip_legs", ["trip_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_trip_legs_trip_id", table_name="trip_legs")
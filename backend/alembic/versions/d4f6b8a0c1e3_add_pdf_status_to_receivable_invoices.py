@@ -0,0 +1,32 @@
+"""add pdf_status to receivable invoices
+
+Revision ID: d4f6b8a0c1e3
+Revises: c3e5a7f9b2d4
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "d4f6b8a0c1e3"
+down_revision: Union[str, None] = "c3e5a7f9b2d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "receivable_invoices",
+        sa.Column("pdf_status", sa.String(length=20), nullable=True),
+    )
+    # Las facturas ya timbradas tienen su PDF generado en línea
+    op.execute(
+        "UPDATE receivable_invoices SET pdf_status = 'GENERADO' "
+        "WHERE uuid IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("receivable_invoices", "pdf_status")
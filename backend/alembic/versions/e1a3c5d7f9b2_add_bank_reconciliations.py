@@ -0,0 +1,85 @@
+"""add bank reconciliations
+
+Revision ID: e1a3c5d7f9b2
+Revises: d0f2b4c6e8a1
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "e1a3c5d7f9b2"
+down_revision: Union[str, None] = "d0f2b4c6e8a1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_bank_movements_cuenta_fecha_id",
+        "bank_movements",
+        ["bank_account_id", "fecha", "id"],
+        unique=False,
+    )
+
+    op.create_table(
+        "bank_reconciliations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("bank_movement_id", sa.Integer(), nullable=False),
+        sa.Column("tipo_documento", sa.String(length=20), nullable=False),
+        sa.Column("documento_id", sa.Integer(), nullable=False),
+        sa.Column("monto", sa.Float(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=True),
+        sa.Column(
+            "record_status",
+            postgresql.ENUM("A", "I", "E", name="recordstatus", create_type=False),
+            server_default="A",
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("created_by_id", sa.Integer(), nullable=True),
+        sa.Column("updated_by_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["bank_movement_id"], ["bank_movements.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["created_by_id"], ["users.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["updated_by_id"], ["users.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_bank_reconciliations_id", "bank_reconciliations", ["id"])
+    op.create_index(
+        "ix_bank_reconciliations_bank_movement_id",
+        "bank_reconciliations",
+        ["bank_movement_id"],
+    )
+    op.create_index(
+        "ix_bank_reconciliations_documento",
+        "bank_reconciliations",
+        ["tipo_documento", "documento_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_bank_reconciliations_documento", table_name="bank_reconciliations"
+    )
+    op.drop_index(
+        "ix_bank_reconciliations_bank_movement_id", table_name="bank_reconciliations"
+    )
+    op.drop_index("ix_bank_reconciliations_id", table_name="bank_reconciliations")
+    op.drop_table("bank_reconciliations")
+    op.drop_index("ix_bank_movements_cuenta_fecha_id", table_name="bank_movements")
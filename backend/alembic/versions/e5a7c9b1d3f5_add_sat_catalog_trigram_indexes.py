@@ -0,0 +1,87 @@
+"""add sat catalog trigram indexes
+
+Revision ID: e5a7c9b1d3f5
+Revises: d4f6b8a0c1e3
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "e5a7c9b1d3f5"
+down_revision: Union[str, None] = "d4f6b8a0c1e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columnas que filtra la búsqueda `ilike '%x%'` de los catálogos grandes
+CATALOGOS = {
+    "sat_products": ("clave", "descripcion"),
+    "sat_location_codes": (
+        "codigo_postal",
+        "estado_clave",
+        "municipio_clave",
+        "localidad_clave",
+    ),
+    "sat_neighborhoods": ("clave", "nombre"),
+    "sat_municipalities": ("clave", "descripcion"),
+    "sat_localities": ("clave", "descripcion"),
+    "sat_hazardous_materials": ("clave", "descripcion"),
+    "sat_stations": ("descripcion",),
+    "sat_unit_weights": ("clave", "nombre", "descripcion"),
+}
+
+
+def _nombre_trgm(tabla: str, columna: str) -> str:
+    return f"ix_{tabla}_{columna}_trgm"
+
+
+def _nombre_lower(tabla: str, columna: str) -> str:
+    return f"ix_{tabla}_{columna}_lower"
+
+
+def _habilitar_pg_trgm(bind) -> bool:
+    disponible = bind.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).scalar()
+    if not disponible:
+        return False
+    try:
+        # Savepoint: sin permisos para CREATE EXTENSION la migración sigue
+        with bind.begin_nested():
+            bind.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except sa.exc.DBAPIError:
+        return False
+    return True
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if _habilitar_pg_trgm(bind):
+        for tabla, columnas in CATALOGOS.items():
+            for columna in columnas:
+                op.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_nombre_trgm(tabla, columna)} "
+                    f"ON {tabla} USING gin ({columna} gin_trgm_ops)"
+                )
+        return
+
+    # Sin pg_trgm: índices sobre lower() para coincidencias exactas y por
+    # prefijo; la búsqueda por subcadena sigue recorriendo la tabla (o la
+    # resuelve el índice en memoria de la API).
+    for tabla, columnas in CATALOGOS.items():
+        for columna in columnas:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS {_nombre_lower(tabla, columna)} "
+                f"ON {tabla} (lower({columna}) text_pattern_ops)"
+            )
+
+
+def downgrade() -> None:
+    # La extensión se deja instalada: otros objetos pueden depender de ella
+    for tabla, columnas in CATALOGOS.items():
+        for columna in columnas:
+            op.execute(f"DROP INDEX IF EXISTS {_nombre_trgm(tabla, columna)}")
+            op.execute(f"DROP INDEX IF EXISTS {_nombre_lower(tabla, columna)}")
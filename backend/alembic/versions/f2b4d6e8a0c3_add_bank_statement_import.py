@@ -0,0 +1,43 @@
+"""add bank statement import
+
+Revision ID: f2b4d6e8a0c3
+Revises: e1a3c5d7f9b2
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "f2b4d6e8a0c3"
+down_revision: Union[str, None] = "e1a3c5d7f9b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "bank_accounts",
+        sa.Column(
+            "layout_estado_cuenta",
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=True,
+        ),
+    )
+    op.add_column(
+        "bank_movements", sa.Column("huella", sa.String(length=40), nullable=True)
+    )
+    op.create_index(
+        "ux_bank_movements_cuenta_huella",
+        "bank_movements",
+        ["bank_account_id", "huella"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_bank_movements_cuenta_huella", table_name="bank_movements")
+    op.drop_column("bank_movements", "huella")
+    op.drop_column("bank_accounts", "layout_estado_cuenta")
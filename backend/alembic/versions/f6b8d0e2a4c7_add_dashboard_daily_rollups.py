@@ -0,0 +1,81 @@
+"""add dashboard daily rollups
+
+Revision ID: f6b8d0e2a4c7
+Revises: e5a7c9b1d3f5
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "f6b8d0e2a4c7"
+down_revision: Union[str, None] = "e5a7c9b1d3f5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columnas de fecha que recorre el recálculo de un día (rango por día)
+INDICES_FECHA = {
+    "ix_trips_start_date": ("trips", "start_date"),
+    "ix_trip_timeline_events_time": ("trip_timeline_events", "time"),
+    "ix_work_orders_fecha_cierre": ("work_orders", "fecha_cierre"),
+    "ix_fuel_logs_fecha_hora": ("fuel_logs", "fecha_hora"),
+}
+
+_CONTADORES = (
+    "trips",
+    "on_time",
+    "late",
+    "tramos_ruta",
+    "full_count",
+    "sencillo_count",
+    "incidents",
+    "fuel_tickets",
+    "ordenes_cerradas",
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "dashboard_daily_rollups",
+        sa.Column("dia", sa.Date(), nullable=False),
+        sa.Column("dimension", sa.String(length=20), nullable=False),
+        sa.Column("dimension_id", sa.Integer(), nullable=False),
+        *[
+            sa.Column(nombre, sa.Integer(), server_default="0", nullable=False)
+            for nombre in _CONTADORES
+        ],
+        sa.Column("revenue", sa.Float(), server_default="0", nullable=False),
+        sa.Column("odometro_min", sa.Integer(), nullable=True),
+        sa.Column("odometro_max", sa.Integer(), nullable=True),
+        sa.Column("litros", sa.Float(), server_default="0", nullable=False),
+        sa.Column("gasto_taller", sa.Float(), server_default="0", nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("dia", "dimension", "dimension_id"),
+    )
+    op.create_index(
+        "ix_dashboard_daily_rollups_dimension_dia",
+        "dashboard_daily_rollups",
+        ["dimension", "dia"],
+        unique=False,
+    )
+
+    for nombre, (tabla, columna) in INDICES_FECHA.items():
+        op.create_index(nombre, tabla, [columna], unique=False)
+
+
+def downgrade() -> None:
+    for nombre, (tabla, _columna) in INDICES_FECHA.items():
+        op.drop_index(nombre, table_name=tabla)
+
+    op.drop_index(
+        "ix_dashboard_daily_rollups_dimension_dia",
+        table_name="dashboard_daily_rollups",
+    )
+    op.drop_table("dashboard_daily_rollups")
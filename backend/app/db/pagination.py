@@ -0,0 +1,164 @@
+"""
+Paginación por cursor (keyset) para los listados grandes.
+
+En lugar de OFFSET, cada página pide las filas que van después de la última
+entregada según el orden del listado: `WHERE (col1, id) < (:v1, :v2)`. El
+costo no crece con la profundidad de la página y las altas o bajas no
+desplazan ni duplican registros entre páginas.
+
+El cursor es opaco para el cliente (base64 de los valores del orden de la
+última fila) y viaja en el header `X-Next-Cursor`; sin header no hay más
+páginas. Los endpoints conservan `skip` / `limit` cuando no se manda cursor.
+Los listados que responden en streaming usan `paginar_keyset_en_lotes`.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+HEADER_SIGUIENTE = "X-Next-Cursor"
+
+
+def _a_texto(valor) -> str:
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _desde_texto(columna, texto: str):
+    tipo = columna.type.python_type
+    if tipo is datetime:
+        return datetime.fromisoformat(texto)
+    if tipo is date:
+        return date.fromisoformat(texto)
+    return tipo(texto)
+
+
+def codificar_cursor(valores) -> str:
+    crudo = json.dumps([_a_texto(v) for v in valores], separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, columnas) -> tuple:
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        textos = json.loads(crudo)
+        if not isinstance(textos, list) or len(textos) != len(columnas):
+            raise ValueError(cursor)
+        return tuple(_desde_texto(c, t) for c, t in zip(columnas, textos))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido.")
+
+
+def _validar_pagina(limit: int, skip: int) -> None:
+    # limit + 1 con limit <= 0 devolvería filas y un cursor sin última fila
+    if limit < 1 or skip < 0:
+        raise HTTPException(
+            status_code=400, detail="limit debe ser mayor a 0 y skip no negativo."
+        )
+
+
+def _ordenar(query, orden, despues_de, descendente: bool):
+    """Ordena `query` por `orden` y, si hay llave, deja solo lo que va después."""
+    if despues_de is not None:
+        llave = tuple_(*orden)
+        query = query.filter(
+            llave < tuple_(*despues_de) if descendente else llave > tuple_(*despues_de)
+        )
+    return query.order_by(*[c.desc() if descendente else c.asc() for c in orden])
+
+
+def paginar_keyset(
+    query,
+    orden,
+    cursor: str | None = None,
+    limit: int = 100,
+    descendente: bool = False,
+    skip: int = 0,
+):
+    """
+    Aplica orden y cursor (o `skip`, modo anterior) a `query` y devuelve
+    (filas, siguiente_cursor). El cursor también sale en modo offset, así
+    que un cliente puede empezar sin cursor y seguir el header.
+
+    `orden` son columnas no nulas en la misma dirección; la última debe ser
+    única (normalmente el id) para que el orden sea total.
+    """
+    _validar_pagina(limit, skip)
+    valores = decodificar_cursor(cursor, orden) if cursor else None
+    query = _ordenar(query, orden, valores, descendente)
+    if skip and not cursor:
+        query = query.offset(skip)
+
+    filas = query.limit(limit + 1).all()
+    if len(filas) <= limit:
+        return filas, None
+
+    filas = filas[:limit]
+    return filas, codificar_cursor([getattr(filas[-1], c.key) for c in orden])
+
+
+def paginar_keyset_en_lotes(
+    query,
+    orden,
+    cursor: str | None = None,
+    limit: int = 100,
+    descendente: bool = False,
+    skip: int = 0,
+    lote: int = 500,
+):
+    """
+    Variante de `paginar_keyset` para respuestas en streaming: devuelve
+    (iterador de filas, siguiente_cursor) sin tener la página en memoria.
+
+    El siguiente cursor hace falta antes del cuerpo (va en el header), así
+    que primero se leen solo las llaves de orden de las filas `limit` y
+    `limit + 1`. Después las filas se leen en lotes de `lote` por keyset,
+    hasta esa llave: un alta concurrente alarga la página en lugar de
+    quedar entre dos páginas.
+    """
+    _validar_pagina(limit, skip)
+    valores = decodificar_cursor(cursor, orden) if cursor else None
+    inicio = 0 if cursor else skip
+
+    llaves = (
+        _ordenar(
+            query.enable_eagerloads(False).with_entities(*orden),
+            orden,
+            valores,
+            descendente,
+        )
+        .offset(inicio + limit - 1)
+        .limit(2)
+        .all()
+    )
+    siguiente = None
+    if len(llaves) == 2:
+        siguiente = codificar_cursor(llaves[0])
+        llave = tuple_(*orden)
+        query = query.filter(
+            llave >= tuple_(*llaves[0]) if descendente else llave <= tuple_(*llaves[0])
+        )
+
+    def filas():
+        despues_de, offset = valores, inicio
+        while True:
+            consulta = _ordenar(query, orden, despues_de, descendente)
+            if offset:
+                consulta = consulta.offset(offset)
+            bloque = consulta.limit(lote).all()
+            yield from bloque
+            if len(bloque) < lote:
+                return
+            despues_de = tuple(getattr(bloque[-1], c.key) for c in orden)
+            offset = 0
+
+    return filas(), siguiente
+
+
+def publicar_cursor(response: Response, siguiente: str | None) -> None:
+    if siguiente:
+        response.headers[HEADER_SIGUIENTE] = siguiente
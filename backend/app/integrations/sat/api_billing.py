@@ -1,7 +1,7 @@
 import os
 import shutil
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
 from pydantic import BaseModel
 from typing import List, Optional
 
@@ -21,8 +21,21 @@ from app.integrations.sat.payment_service import (
 )  # <-- ¡ESTA ES LA NUEVA!
 
 # IMPORTAMOS AMBOS MOTORES
+from app.integrations.sat.batch_stamping import (
+    enviar_job_timbrado,
+    obtener_job_timbrado,
+)
 from app.integrations.sat.billing_service import BillingService
 from app.integrations.sat.carta_porte_service import CartaPorteService
+from app.integrations.sat.csd_signer import invalidate_csd_signers
+from app.integrations.sat.fiscal_config import invalidar_fiscal_config
+from app.integrations.sat.folio_service import anular_folio, auditar_huecos
+from app.integrations.sat.pdf_rebuild import (
+    iniciar_reconstruccion_pdfs,
+    obtener_progreso_reconstruccion,
+)
+from app.integrations.sat.pdf_render_queue import PDF_STATUS_PENDIENTE
+from app.integrations.sat.retry_queue import metricas_cola_retry
 from app.models import models
 from app.modules.auth.router import get_current_active_user
 from app.core.security import verify_password
@@ -392,35 +405,7 @@ def stamp_real_trip(trip_id: int, db: Session = Depends(get_db)):
 
     service = BillingService(db)  # CORRECTO: Servicio Financiero
 
-    from app.models.models import ReceivableInvoice
-
-    factura_vieja = (
-        db.query(ReceivableInvoice)
-        .filter(
-            ReceivableInvoice.viaje_id == trip_id, ReceivableInvoice.is_nominal == True
-        )
-        .first()
-    )
-
-    uuid_relacionado = factura_vieja.uuid if factura_vieja else None
-
-    #   NUEVO: Extractor Inteligente de Folio para Reciclaje
-    folio_a_reciclar = None
-    if factura_vieja and factura_vieja.folio_interno:
-        try:
-            # Convierte "CP-13" a 13 entero
-            folio_a_reciclar = int(factura_vieja.folio_interno.split("-")[1])
-        except Exception as e:
-            logger.warning(
-                f"No se pudo extraer folio numérico de {factura_vieja.folio_interno}: {e}"
-            )
-
-    invoice_data = ReceivableInvoiceCreate(
-        viaje_id=trip_id,
-        is_nominal=False,
-        uuid_relacionado=uuid_relacionado,
-        folio_forzado=folio_a_reciclar,  # <-- Inyectamos el folio rescatado
-    )
+    invoice_data, factura_vieja = service.payload_factura_real(trip_id)
 
     try:
         factura_final = service.generar_factura_final_relacionada(invoice_data)
@@ -516,6 +501,39 @@ def generar_factura_final(
         raise HTTPException(status_code=400, detail=custom_error)
 
 
+# ==============================================================
+# TIMBRADO MASIVO (CIERRE DE MES): JOB + CONSULTA DE PROGRESO
+# ==============================================================
+class BatchStampPayload(BaseModel):
+    trip_ids: List[int]
+
+
+@router.post("/stamp/batch", response_model=dict, status_code=202)
+def enviar_timbrado_masivo(
+    payload: BatchStampPayload,
+    current_user: models.User = Depends(RequirePermission("sat:stamp_cfdi")),
+):
+    """
+    Encola la factura real de N viajes. Los folios se asignan en el orden
+    recibido; el sellado y las llamadas al PAC corren en paralelo y los PDFs
+    se generan en segundo plano. Consultar el avance con GET /stamp/batch/{job_id}.
+    """
+    job = enviar_job_timbrado(payload.trip_ids)
+    return {
+        "status": "accepted",
+        "message": f"Lote de {job['total']} viajes encolado para timbrado.",
+        "data": job,
+    }
+
+
+@router.get("/stamp/batch/{job_id}", response_model=dict)
+def consultar_timbrado_masivo(
+    job_id: str,
+    current_user: models.User = Depends(RequirePermission("sat:stamp_cfdi")),
+):
+    return {"status": "success", "data": obtener_job_timbrado(job_id)}
+
+
 @router.get("/invoice/{uuid}/pdf", response_class=FileResponse)
 def download_invoice_pdf(uuid: str, db: Session = Depends(get_db)):
     import re
@@ -538,6 +556,24 @@ def download_invoice_pdf(uuid: str, db: Session = Depends(get_db)):
         pdf_path = pdf_path_upper
     elif pdf_path_lower.exists():
         pdf_path = pdf_path_lower
+    elif (
+        db.query(models.ReceivableInvoice.pdf_status)
+        .filter(models.ReceivableInvoice.uuid == clean_uuid)
+        .scalar()
+        == PDF_STATUS_PENDIENTE
+        or db.query(models.ReceivableInvoicePayment.id)
+        .filter(
+            models.ReceivableInvoicePayment.complemento_uuid == clean_uuid,
+            models.ReceivableInvoicePayment.pdf_status == PDF_STATUS_PENDIENTE,
+        )
+        .first()
+        is not None
+    ):
+        # Timbrada (factura o complemento), pero el PDF sigue en la cola de render
+        raise HTTPException(
+            status_code=202,
+            detail="El PDF se está generando, intenta de nuevo en unos segundos.",
+        )
     else:
         raise HTTPException(
             status_code=404,
@@ -647,6 +683,7 @@ def update_sat_params(data: dict, db: Session = Depends(get_db)):
                 )
             )
     db.commit()
+    invalidar_fiscal_config(data.keys())
     return {"status": "success"}
 
 
@@ -696,6 +733,9 @@ def upload_csd_files(
             )
 
     db.commit()
+    # La llave descifrada en caché pertenece al CSD anterior
+    invalidate_csd_signers(environment)
+    invalidar_fiscal_config(configs.keys())
     return {
         "status": "success",
         "message": f"Certificados de {environment} actualizados",
@@ -852,12 +892,50 @@ def get_sat_retry_queue(
     ]
 
 
+@router.get("/retry-queue/metrics", summary="Métricas de la cola de reintentos SAT")
+def get_sat_retry_queue_metrics(db: Session = Depends(get_db)):
+    return metricas_cola_retry(db)
+
+
 @router.post("/retry-queue/process", summary="Procesar cola de reintentos SAT")
 def process_sat_retry_queue(limit: int = 10, db: Session = Depends(get_db)):
     service = BillingService(db)
     return service.procesar_sat_retry_queue(limit=limit)
 
 
+# ==============================================================
+# AUDITORÍA DE FOLIOS (HUECOS EN LA NUMERACIÓN)
+# ==============================================================
+class AnularFolioPayload(BaseModel):
+    motivo: str
+
+
+@router.get("/folios/{serie}/auditoria", summary="Folios reservados sin comprobante")
+def auditar_folios(
+    serie: str, desde: Optional[int] = None, db: Session = Depends(get_db)
+):
+    return auditar_huecos(db, serie.upper(), desde=desde)
+
+
+@router.post("/folios/{serie}/{folio}/anular", summary="Justificar hueco de folio")
+def anular_folio_reservado(
+    serie: str,
+    folio: int,
+    payload: AnularFolioPayload,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    reserva = anular_folio(db, serie.upper(), folio, payload.motivo)
+    return {
+        "status": "success",
+        "data": {
+            "serie": reserva.serie,
+            "folio": reserva.folio,
+            "status": reserva.status,
+        },
+    }
+
+
 # ==============================================================
 # NUEVO: ENDPOINT PARA CANCELACIÓN MASIVA (1 o N FACTURAS)
 # ==============================================================
@@ -993,11 +1071,37 @@ def reconstruir_pdf_factura(invoice_id: int, db: Session = Depends(get_db)):
         )
 
 
-@router.get("/rebuild-all-pdfs")
-def rebuild_all_pdfs(db: Session = Depends(get_db)):
-    try:
-        service = BillingService(db)
-        resultado = service.regenerar_todos_los_pdfs()
-        return resultado
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+class RebuildPdfsPayload(BaseModel):
+    fecha_desde: Optional[date] = None
+    fecha_hasta: Optional[date] = None
+    serie: Optional[str] = None
+    client_id: Optional[int] = None
+    reanudar: bool = False
+
+
+@router.post("/rebuild-all-pdfs", status_code=202)
+def rebuild_all_pdfs(
+    payload: RebuildPdfsPayload,
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Reconstruye PDFs en segundo plano por bloques, con checkpoint por id.
+    Con `reanudar` continúa la última reconstrucción interrumpida.
+    """
+    return {
+        "status": "success",
+        "data": iniciar_reconstruccion_pdfs(
+            fecha_desde=payload.fecha_desde,
+            fecha_hasta=payload.fecha_hasta,
+            serie=payload.serie,
+            client_id=payload.client_id,
+            reanudar=payload.reanudar,
+        ),
+    }
+
+
+@router.get("/rebuild-all-pdfs/status")
+def rebuild_all_pdfs_status(
+    current_user: models.User = Depends(get_current_active_user),
+):
+    return {"status": "success", "data": obtener_progreso_reconstruccion()}
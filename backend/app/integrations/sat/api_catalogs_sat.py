@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import or_
@@ -6,6 +6,13 @@ from typing import List, Type, Any, Optional
 from pydantic import BaseModel
 
 from app.db.database import get_db
+from app.integrations.sat.catalog_index import (
+    actualizar_en_indice,
+    buscar_catalogo,
+    obtener_indice,
+    quitar_de_indice,
+)
+from app.integrations.sat.catalog_search import decodificar_cursor
 from app.models import models
 
 router = APIRouter()
@@ -171,11 +178,28 @@ def create_crud_endpoints(
     # 🚀 FIX APLICADO: Paginación Segura y Búsqueda Inteligente para evitar colapso de RAM
     @router.get(f"{path}", response_model=List[schema_response], tags=[tag])
     def get_all(
+        response: Response,
         skip: int = Query(0, ge=0),
         limit: int = Query(500, ge=1, le=100000),  # <-- Bajamos de 50000 a 500
         search: Optional[str] = "",
+        ranking: bool = False,
+        cursor: Optional[str] = None,
         db: Session = Depends(get_db),
     ):
+        # Modo relevancia: mejores coincidencias primero, página siguiente en X-Next-Cursor
+        if ranking or cursor:
+            filas, siguiente = buscar_catalogo(
+                db, model, search, limit=limit, cursor=decodificar_cursor(cursor)
+            )
+            if siguiente:
+                response.headers["X-Next-Cursor"] = siguiente
+            return filas
+
+        # Catálogo en memoria (catalog_index); la consulta queda como respaldo
+        indice = obtener_indice(db, model)
+        if indice is not None:
+            return indice.buscar(search, skip=skip, limit=limit)
+
         query = db.query(model).filter(model.activo == True)
 
         if search:
@@ -215,12 +239,14 @@ def create_crud_endpoints(
                     setattr(existente, key, value)
                 db.commit()
                 db.refresh(existente)
+                actualizar_en_indice(model, existente)
                 return existente
 
         nuevo_item = model(**payload.model_dump())
         db.add(nuevo_item)
         db.commit()
         db.refresh(nuevo_item)
+        actualizar_en_indice(model, nuevo_item)
         return nuevo_item
 
     @router.put(f"{path}/{{item_id}}", response_model=schema_response, tags=[tag])
@@ -238,6 +264,7 @@ def create_crud_endpoints(
         try:
             db.commit()
             db.refresh(item)
+            actualizar_en_indice(model, item)
             return item
         except IntegrityError:
             db.rollback()
@@ -256,6 +283,7 @@ def create_crud_endpoints(
 
         item.activo = False
         db.commit()
+        actualizar_en_indice(model, item)
         return None
 
 
@@ -380,7 +408,30 @@ create_crud_endpoints(
     response_model=List[SatPostalCodeResponse],
     tags=["SAT - Ubicaciones"],
 )
-def get_location_codes(search: str = "", db: Session = Depends(get_db)):
+def get_location_codes(
+    response: Response,
+    search: str = "",
+    limit: int = Query(500, ge=1, le=500),
+    ranking: bool = False,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    if ranking or cursor:
+        filas, siguiente = buscar_catalogo(
+            db,
+            models.SatLocationCode,
+            search,
+            limit=limit,
+            cursor=decodificar_cursor(cursor),
+        )
+        if siguiente:
+            response.headers["X-Next-Cursor"] = siguiente
+        return filas
+
+    indice = obtener_indice(db, models.SatLocationCode)
+    if indice is not None:
+        return indice.buscar(search, limit=limit)
+
     query = db.query(models.SatLocationCode)
 
     if search:
@@ -393,7 +444,7 @@ def get_location_codes(search: str = "", db: Session = Depends(get_db)):
             )
         )
 
-    return query.order_by(models.SatLocationCode.codigo_postal.asc()).limit(500).all()
+    return query.order_by(models.SatLocationCode.codigo_postal.asc()).limit(limit).all()
 
 
 @router.post(
@@ -414,6 +465,7 @@ def create_location_code(payload: SatPostalCodeCreate, db: Session = Depends(get
     db.add(nuevo_item)
     db.commit()
     db.refresh(nuevo_item)
+    actualizar_en_indice(models.SatLocationCode, nuevo_item)
     return nuevo_item
 
 
@@ -439,6 +491,7 @@ def update_location_code(
     try:
         db.commit()
         db.refresh(item)
+        actualizar_en_indice(models.SatLocationCode, item)
         return item
     except IntegrityError:
         db.rollback()
@@ -461,4 +514,5 @@ def delete_location_code(item_id: int, db: Session = Depends(get_db)):
 
     db.delete(item)
     db.commit()
+    quitar_de_indice(models.SatLocationCode, item_id)
     return None
@@ -0,0 +1,444 @@
+"""
+Timbrado masivo de facturas reales (cierre de mes).
+
+Un job recibe N viajes y los procesa en fases:
+
+1. Preparación serial, en el orden recibido: viajes precargados en bloque
+   (`build_context`), payload, folio (secuencia de `folio_service`) y
+   factura en PROCESANDO. Así los folios quedan en el mismo orden en que se
+   enviaron los viajes.
+2. Sellado (cadena original + firma CSD) en un pool de procesos.
+3. Llamadas al PAC con concurrencia acotada (pool de clientes zeep).
+4. Registro serial en orden de folio: TIMBRADA, o PENDIENTE_TIMBRADO +
+   `register_sat_retry` si el PAC hizo timeout (misma semántica que el
+   timbrado individual), o ERROR_SAT.
+5. PDFs fuera del hilo de timbrado, en la cola de render (`pdf_render_queue`).
+
+Al terminar el timbrado el job queda en GENERANDO_PDFS mientras la cola de
+render tenga PDFs suyos pendientes (`pdfs_pendientes`); con el último pasa a
+COMPLETADO o COMPLETADO_CON_ERRORES (errores de timbrado o de PDF).
+
+Los jobs viven en memoria del proceso (igual que el escudo anti doble clic)
+y se consultan por id para ver el progreso. Limitación: solo sirve con un
+proceso de API. Con varios workers de uvicorn/gunicorn la consulta puede
+caer en otro proceso y responder 404, y tras un reinicio se pierden los jobs
+(las facturas sí quedan en BD con su estatus).
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import uuid as uuid_lib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from fastapi import HTTPException
+from zeep.plugins import HistoryPlugin
+
+from app.db.database import SessionLocal
+from app.integrations.sat.billing_service import BillingService
+from app.integrations.sat.carta_porte_service import CartaPorteService
+from app.integrations.sat.csd_signer import sellar_cfdi
+
+logger = logging.getLogger("billing.audit")
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+BATCH_SEAL_WORKERS = max(1, _int_env("SAT_BATCH_SEAL_WORKERS", os.cpu_count() or 2))
+BATCH_PAC_CONCURRENCY = max(1, _int_env("SAT_BATCH_PAC_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = max(1, _int_env("SAT_BATCH_MAX_ITEMS", 500))
+BATCH_JOBS_RETENTION = max(1, _int_env("SAT_BATCH_JOBS_RETENTION", 50))
+
+ESTADOS_ACTIVOS = {"EN_COLA", "PROCESANDO"}
+# Timbrado terminado, PDFs aún en la cola de render
+ESTADO_GENERANDO_PDFS = "GENERANDO_PDFS"
+
+_jobs: dict[str, dict] = {}
+_jobs_lock = threading.Lock()
+
+# Un solo job a la vez: los folios de jobs distintos no se intercalan
+_job_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sat-batch")
+_seal_executor = None
+_seal_lock = threading.Lock()
+
+
+def _get_seal_executor() -> ProcessPoolExecutor:
+    global _seal_executor
+    with _seal_lock:
+        if _seal_executor is None:
+            # spawn: los procesos hijos no heredan conexiones ni hilos del API
+            _seal_executor = ProcessPoolExecutor(
+                max_workers=BATCH_SEAL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _seal_executor
+
+
+def _reset_seal_executor():
+    global _seal_executor
+    with _seal_lock:
+        if _seal_executor is not None:
+            _seal_executor.shutdown(wait=False, cancel_futures=True)
+        _seal_executor = None
+
+
+# ==========================================================================
+# REGISTRO DE JOBS
+# ==========================================================================
+
+
+def _snapshot(job: dict) -> dict:
+    with _jobs_lock:
+        return {
+            **{k: v for k, v in job.items() if k != "items"},
+            "items": [dict(item) for item in job["items"]],
+        }
+
+
+def _actualizar(job: dict, item: dict | None = None, **campos):
+    with _jobs_lock:
+        if item is not None:
+            item.update(campos)
+        else:
+            job.update(campos)
+
+
+def _contar(job: dict, contador: str):
+    with _jobs_lock:
+        job[contador] += 1
+
+
+def _purgar_jobs_viejos():
+    terminados = sorted(
+        (
+            j
+            for j in _jobs.values()
+            if j["status"] not in ESTADOS_ACTIVOS
+            and j["status"] != ESTADO_GENERANDO_PDFS
+        ),
+        key=lambda j: j["created_at"],
+    )
+    for job in terminados[: max(0, len(_jobs) - BATCH_JOBS_RETENTION)]:
+        del _jobs[job["id"]]
+
+
+def enviar_job_timbrado(trip_ids: list[int]) -> dict:
+    """Encola un job de timbrado masivo y devuelve su estado inicial."""
+    trip_ids = list(dict.fromkeys(trip_ids))
+    if not trip_ids:
+        raise HTTPException(status_code=400, detail="No se enviaron viajes a timbrar.")
+    if len(trip_ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {BATCH_MAX_ITEMS} viajes por lote (se enviaron {len(trip_ids)}).",
+        )
+
+    with _jobs_lock:
+        en_proceso = {
+            item["viaje_id"]
+            for job in _jobs.values()
+            if job["status"] in ESTADOS_ACTIVOS
+            for item in job["items"]
+        }
+        duplicados = sorted(set(trip_ids) & en_proceso)
+        if duplicados:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Los viajes {duplicados} ya están en un lote de timbrado activo.",
+            )
+
+        job = {
+            "id": uuid_lib.uuid4().hex,
+            "status": "EN_COLA",
+            "created_at": datetime.utcnow().isoformat(),
+            "started_at": None,
+            "timbrado_finished_at": None,
+            "finished_at": None,
+            "total": len(trip_ids),
+            "procesados": 0,
+            "timbrados": 0,
+            "pendientes": 0,
+            "errores": 0,
+            "pdfs_generados": 0,
+            "pdfs_con_error": 0,
+            "pdfs_pendientes": 0,
+            "items": [
+                {
+                    "viaje_id": trip_id,
+                    "factura_id": None,
+                    "folio_interno": None,
+                    "status": "EN_COLA",
+                    "uuid": None,
+                    "pdf_status": None,
+                    "detalle": None,
+                }
+                for trip_id in trip_ids
+            ],
+        }
+        _jobs[job["id"]] = job
+        _purgar_jobs_viejos()
+
+    _job_runner.submit(_ejecutar_job, job)
+    logger.info(f"📦 Lote de timbrado {job['id']} encolado con {len(trip_ids)} viajes")
+    return _snapshot(job)
+
+
+def obtener_job_timbrado(job_id: str) -> dict:
+    job = _jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Lote de timbrado no encontrado.")
+    return _snapshot(job)
+
+
+# ==========================================================================
+# EJECUCIÓN
+# ==========================================================================
+
+
+def _detalle_error(e: Exception) -> str:
+    return str(e.detail) if isinstance(e, HTTPException) else str(e)
+
+
+def _finalizar_item(job: dict, item: dict, status: str, detalle: str | None = None):
+    if detalle is None:
+        _actualizar(job, item, status=status)
+    else:
+        _actualizar(job, item, status=status, detalle=detalle)
+    contador = {
+        "TIMBRADA": "timbrados",
+        "PENDIENTE_TIMBRADO": "pendientes",
+    }.get(status, "errores")
+    _contar(job, contador)
+    _contar(job, "procesados")
+
+
+def _ejecutar_job(job: dict):
+    _actualizar(job, status="PROCESANDO", started_at=datetime.utcnow().isoformat())
+    # Sin expirar en commit: los viajes precargados sobreviven a los commits
+    # por factura y no se vuelven a leer uno por uno
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        service = BillingService(db)
+        service.precargar_viajes(item["viaje_id"] for item in job["items"])
+        preparados = _fase_preparacion(job, service)
+        _fase_sellado(job, service, preparados)
+        _fase_pac_y_registro(job, service, preparados)
+    except Exception as e:
+        logger.exception(f"💥 Lote de timbrado {job['id']} abortado: {e}")
+        for item in job["items"]:
+            if item["status"] not in {"TIMBRADA", "PENDIENTE_TIMBRADO", "ERROR_SAT"}:
+                _finalizar_item(job, item, "ERROR_SAT", f"Lote abortado: {e}")
+    finally:
+        db.close()
+        with _jobs_lock:
+            job["timbrado_finished_at"] = datetime.utcnow().isoformat()
+            job["status"] = ESTADO_GENERANDO_PDFS
+            _cerrar_si_pdfs_listos(job)
+        logger.info(
+            f"📦 Lote {job['id']} timbrado: {job['timbrados']} timbrados, "
+            f"{job['pendientes']} pendientes, {job['errores']} errores, "
+            f"{job['pdfs_pendientes']} PDFs en cola"
+        )
+
+
+def _cerrar_si_pdfs_listos(job: dict):
+    """Cierra el job cuando ya no hay PDFs suyos en la cola. Requiere `_jobs_lock`."""
+    if job["status"] != ESTADO_GENERANDO_PDFS or job["pdfs_pendientes"] > 0:
+        return
+    con_errores = job["errores"] or job["pdfs_con_error"]
+    job["status"] = "COMPLETADO_CON_ERRORES" if con_errores else "COMPLETADO"
+    job["finished_at"] = datetime.utcnow().isoformat()
+
+
+def _fase_preparacion(job: dict, service: BillingService) -> list[dict]:
+    """Folio + factura PROCESANDO + XML con certificado, uno por uno y en orden."""
+    preparados = []
+    for item in job["items"]:
+        _actualizar(job, item, status="PREPARANDO")
+        try:
+            invoice_data, nominal = service.payload_factura_real(item["viaje_id"])
+            factura, viaje, data, relacion_uuid = service._preparar_factura_final(
+                invoice_data
+            )
+        except Exception as e:
+            service.db.rollback()
+            _finalizar_item(job, item, "ERROR_SAT", _detalle_error(e))
+            continue
+
+        _actualizar(
+            job,
+            item,
+            status="SELLANDO",
+            factura_id=factura.id,
+            folio_interno=factura.folio_interno,
+        )
+        prep = {
+            "item": item,
+            "factura": factura,
+            "viaje": viaje,
+            "data": data,
+            "relacion_uuid": relacion_uuid,
+            "nominal_id": nominal.id if nominal and nominal.uuid else None,
+        }
+        try:
+            prep["xml_con_cert"] = service._armar_xml_con_certificado(
+                data, relacion_uuid
+            )
+        except Exception as e:
+            _registrar_error(job, service, prep, e)
+            continue
+        preparados.append(prep)
+    return preparados
+
+
+def _sellar_local(service: BillingService, xml_bytes: bytes):
+    return service._generar_sello_xslt(xml_bytes)
+
+
+def _fase_sellado(job: dict, service: BillingService, preparados: list[dict]):
+    args = (str(service.path_key), service.key_password, service.env)
+    try:
+        executor = _get_seal_executor()
+        futures = [
+            executor.submit(sellar_cfdi, p["xml_con_cert"].encode("utf-8"), *args)
+            for p in preparados
+        ]
+    except Exception as e:
+        logger.warning(f"⚠️ Pool de sellado no disponible, se sella en línea: {e}")
+        futures = None
+
+    for i, prep in enumerate(preparados):
+        try:
+            if futures is not None:
+                try:
+                    sello_b64, _ = futures[i].result()
+                except BrokenProcessPool:
+                    _reset_seal_executor()
+                    futures = None
+            if futures is None:
+                sello_b64, _ = _sellar_local(
+                    service, prep["xml_con_cert"].encode("utf-8")
+                )
+            prep["xml_sellado"] = service._aplicar_sello(
+                prep["xml_con_cert"], sello_b64
+            )
+            _actualizar(job, prep["item"], status="ENVIANDO_PAC")
+        except Exception as e:
+            prep["error"] = e
+
+
+def _fase_pac_y_registro(job: dict, service: BillingService, preparados: list[dict]):
+    carta_porte_service = None
+    with ThreadPoolExecutor(
+        max_workers=BATCH_PAC_CONCURRENCY, thread_name_prefix="sat-batch-pac"
+    ) as pac_executor:
+        futures = {
+            id(prep): pac_executor.submit(
+                service._timbrar_en_pac, prep["xml_sellado"], HistoryPlugin()
+            )
+            for prep in preparados
+            if "error" not in prep
+        }
+
+        # El registro en BD se hace en orden de folio aunque el PAC responda desordenado
+        for prep in preparados:
+            if "error" in prep:
+                _registrar_error(job, service, prep, prep["error"])
+                continue
+            try:
+                res_sat = futures[id(prep)].result()
+                resultado_pac = service._registrar_cfdi_timbrado(
+                    prep["data"], res_sat, generar_pdf=False
+                )
+                factura = service._aplicar_timbre_factura_final(
+                    prep["factura"], prep["viaje"], resultado_pac
+                )
+            except Exception as e:
+                _registrar_error(job, service, prep, e)
+                continue
+
+            _actualizar(
+                job,
+                prep["item"],
+                uuid=factura.uuid,
+                folio_interno=factura.folio_interno,
+                pdf_status="PENDIENTE",
+            )
+            if prep["nominal_id"]:
+                if carta_porte_service is None:
+                    carta_porte_service = CartaPorteService(service.db)
+                _cancelar_nominal(job, carta_porte_service, prep, factura.uuid)
+            _finalizar_item(job, prep["item"], "TIMBRADA")
+            _generar_pdf(job, service, prep, factura.uuid, resultado_pac.cfdi_bytes)
+
+
+def _registrar_error(job: dict, service: BillingService, prep: dict, e: Exception):
+    """Misma semántica que el timbrado individual (timeout → cola de reintentos)."""
+    try:
+        service._manejar_error_factura_final(
+            prep["factura"], e, prep["data"], prep["relacion_uuid"]
+        )
+    except HTTPException as resultado:
+        status = "PENDIENTE_TIMBRADO" if resultado.status_code == 202 else "ERROR_SAT"
+        _finalizar_item(job, prep["item"], status, _detalle_error(e))
+    except Exception as fallo:
+        service.db.rollback()
+        _finalizar_item(job, prep["item"], "ERROR_SAT", str(fallo))
+
+
+def _cancelar_nominal(
+    job: dict, carta_porte_service: CartaPorteService, prep: dict, uuid_sustituto: str
+):
+    try:
+        carta_porte_service.cancelar_factura_nominal(
+            invoice_id=prep["nominal_id"], motivo="01", uuid_sustituto=uuid_sustituto
+        )
+    except Exception as e:
+        carta_porte_service.db.rollback()
+        logger.warning(
+            f"No se pudo cancelar la Carta Porte nominal {prep['nominal_id']}: {e}"
+        )
+        _actualizar(job, prep["item"], detalle=f"Nominal sin cancelar: {e}")
+
+
+def _generar_pdf(job, service, prep, uuid_timbrado, cfdi_bytes):
+    """Encola el PDF (la factura ya está en commit) y sigue con el siguiente."""
+
+    def _pdf_terminado(pdf_status: str, contador: str, detalle: str | None = None):
+        with _jobs_lock:
+            prep["item"]["pdf_status"] = pdf_status
+            if detalle is not None:
+                prep["item"]["detalle"] = detalle
+            job[contador] += 1
+            job["pdfs_pendientes"] -= 1
+            _cerrar_si_pdfs_listos(job)
+
+    def _error_pdf(e):
+        logger.error(f"Error generando PDF {uuid_timbrado}: {e}")
+        _pdf_terminado("ERROR", "pdfs_con_error", str(e))
+
+    def _al_terminar(future):
+        try:
+            future.result()
+        except Exception as e:
+            _error_pdf(e)
+            return
+        _pdf_terminado("GENERADO", "pdfs_generados")
+
+    _contar(job, "pdfs_pendientes")
+    try:
+        future = service._generar_pdf_desde_cfdi(
+            prep["data"], uuid_timbrado, cfdi_bytes, diferir=False
+        )
+    except Exception as e:
+        _error_pdf(e)
+        return
+    future.add_done_callback(_al_terminar)
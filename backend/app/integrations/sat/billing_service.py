@@ -16,22 +16,36 @@ from zeep.plugins import HistoryPlugin
 from lxml import etree
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.responses import FileResponse
-from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 
 from cryptography import x509
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.serialization import load_der_private_key
 from cryptography.hazmat.backends import default_backend
 
 import qrcode
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML
-from app.integrations.sat.retry_queue import register_sat_retry
-from app.integrations.sat.soap_client import create_pac_client, is_pac_timeout_error
+from app.integrations.sat.retry_queue import (
+    calcular_backoff,
+    reclamar_items_retry,
+    register_sat_retry,
+)
+from app.integrations.sat.build_context import (
+    ViajeBuildContext,
+    buscar_producto_sat,
+    buscar_ubicacion_sat,
+    cargar_viaje,
+    construir_contexto,
+    precargar_viajes,
+)
+from app.integrations.sat.csd_signer import get_csd_signer
+from app.integrations.sat.fiscal_config import get_fiscal_config
+from app.integrations.sat.folio_service import siguiente_folio
+from app.integrations.sat.pdf_render_queue import encolar_pdf
+from app.integrations.sat.xslt_registry import (
+    CADENA_ORIGINAL_CFDI_40,
+    generar_cadena_original,
+)
+from app.integrations.sat.soap_client import is_pac_timeout_error, pac_client
 
 try:
     from num2words import num2words
@@ -45,15 +59,7 @@ except ImportError as e:
 from app.db.database import get_db
 from app.modules.logistics.schemas import ReceivableInvoiceCreate
 from app.models.models import (
-    Trip,
-    TripLeg,
     ReceivableInvoice,
-    Client as ClientModel,
-    Unit,
-    Operator,
-    SystemConfig,
-    SatLocationCode,
-    SatProduct,
     SatRetryQueue,
     ReceivableInvoicePayment,
     ReceivableInvoiceDocumentHistory,
@@ -86,7 +92,6 @@ logging.config.dictConfig(
 )
 logger = logging.getLogger("billing.audit")
 
-DEFAULT_LEYENDA = "Condiciones de prestación de servicios que ampara la CARTA DE PORTE O COMPROBANTE PARA EL TRANSPORTE DE MERCANCÍAS. PRIMERA.- Para los efectos del presente contrato..."
 
 # =========================================================
 #  MAPEO INTELIGENTE DE ESTADOS SAT (INEGI -> 3 LETRAS)
@@ -234,6 +239,7 @@ class BillingService:
             self.pac_pass = os.getenv("PAC_PASS_PROD", "TU_PASS_PROD")
 
         self.history = HistoryPlugin()
+        self._viajes_precargados = {}
         self.base_path = Path(
             os.getenv("APP_BASE_PATH", Path(__file__).resolve().parents[2])
         )
@@ -248,106 +254,31 @@ class BillingService:
         self.cert_dir.mkdir(parents=True, exist_ok=True)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
 
-        cert_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_cert_path{self.suffix}")
-            .first()
-        )
-        key_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_key_path{self.suffix}")
-            .first()
-        )
-        pass_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_key_password{self.suffix}")
-            .first()
-        )
+        # Configuración fiscal en caché (ver fiscal_config): sin consultas por instancia
+        fiscal = get_fiscal_config(self.db, self.env)
+        self.fiscal_config_version = fiscal.version
 
         self.path_cer = (
-            Path(cert_conf.value)
-            if cert_conf and cert_conf.value
+            Path(fiscal.cert_path)
+            if fiscal.cert_path
             else (self.cert_dir / "default.cer")
         )
         self.path_key = (
-            Path(key_conf.value)
-            if key_conf and key_conf.value
+            Path(fiscal.key_path)
+            if fiscal.key_path
             else (self.cert_dir / "default.key")
         )
-        self.key_password = pass_conf.value if pass_conf else "12345678a"
+        self.key_password = fiscal.key_password
+        self.leyenda_legal_db = fiscal.leyenda_legal
 
-        rfc_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_rfc{self.suffix}")
-            .first()
-        )
-        leyenda_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_leyenda_legal{self.suffix}")
-            .first()
-        )
-        raw_leyenda = (
-            leyenda_conf.value
-            if leyenda_conf and leyenda_conf.value
-            else DEFAULT_LEYENDA
-        )
+        self.emisor_rfc = fiscal.emisor_rfc
+        self.emisor_nombre = fiscal.emisor_nombre
+        self.emisor_regimen = fiscal.emisor_regimen
+        self.emisor_cp = fiscal.emisor_cp
 
-        if 'Comentario="' in raw_leyenda:
-            texto = raw_leyenda.split('Comentario="', 1)[1]
-        elif "Comentario='" in raw_leyenda:
-            texto = raw_leyenda.split("Comentario='", 1)[1]
-        else:
-            texto = raw_leyenda
-
-        texto = re.sub(r'["\']?\s*></.*?>(.*)$', "", texto, flags=re.IGNORECASE)
-        texto = re.sub(r'["\']?\s*/?>\s*$', "", texto)
-        self.leyenda_legal_db = texto.strip()
-
-        nombre_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_nombre{self.suffix}")
-            .first()
-        )
-        regimen_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_regimen_fiscal{self.suffix}")
-            .first()
-        )
-        cp_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_cp{self.suffix}")
-            .first()
-        )
-
-        self.emisor_rfc = (
-            rfc_conf.value if rfc_conf and rfc_conf.value else "EKU9003173C9"
-        )
-        raw_emisor = (
-            nombre_conf.value if nombre_conf and nombre_conf.value else "RAPIDOS 3T"
-        )
-        raw_emisor = (
-            raw_emisor.upper()
-            .replace(" S.A. DE C.V.", "")
-            .replace(" SA DE CV", "")
-            .strip()
-        )
-
-        self.emisor_nombre = (
-            "RAPIDOS 3T" if self.emisor_rfc == "EKU9003173C9" else raw_emisor
-        )
-        self.emisor_regimen = (
-            regimen_conf.value if regimen_conf and regimen_conf.value else "624"
-        )
-        self.emisor_cp = str(cp_conf.value).strip() if cp_conf and cp_conf.value else ""
-
-        loc_emisor = (
-            self.db.query(SatLocationCode)
-            .filter(SatLocationCode.codigo_postal == self.emisor_cp)
-            .first()
-        )
-        if loc_emisor:
-            self.emisor_estado = normalizar_estado_sat(loc_emisor.estado_clave)
-            self.emisor_municipio = str(loc_emisor.municipio_clave).zfill(3)
+        if fiscal.emisor_estado_clave is not None:
+            self.emisor_estado = normalizar_estado_sat(fiscal.emisor_estado_clave)
+            self.emisor_municipio = fiscal.emisor_municipio
         else:
             raise HTTPException(
                 status_code=400,
@@ -355,65 +286,24 @@ class BillingService:
             )
 
     def _generar_sello_xslt(self, xml_bytes: bytes) -> tuple[str, str]:
-        xslt_path = (
-            Path(__file__).parent
-            / "cadenas_sat_originales_base"
-            / "cadenaoriginal_4_0.xslt.xml"
-        )
+        xslt_path = CADENA_ORIGINAL_CFDI_40
         if not xslt_path.exists():
             raise HTTPException(
                 status_code=500, detail=f"XSLT no encontrado en {xslt_path}"
             )
         try:
-            parser = etree.XMLParser(
-                load_dtd=False, no_network=True, resolve_entities=False
-            )
-            xslt_doc = etree.parse(str(xslt_path), parser=parser)
-            transform = etree.XSLT(xslt_doc)
-            xml_doc = etree.fromstring(xml_bytes, parser=parser)
-            cadena_original_tree = transform(xml_doc)
-            cadena_original = (
-                str(cadena_original_tree)
-                .replace('<?xml version="1.0" encoding="UTF-8"?>', "")
-                .replace("\n", "")
-                .strip()
-            )
-
-            with open(self.path_key, "rb") as f:
-                private_key = load_der_private_key(
-                    f.read(), password=self.key_password.encode()
-                )
+            cadena_original = generar_cadena_original(xml_bytes)
 
-            signature = private_key.sign(
-                cadena_original.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256()
-            )
-            sello_b64 = base64.b64encode(signature).decode("utf-8")
+            signer = get_csd_signer(self.path_key, self.key_password, self.env)
+            sello_b64 = signer.sign(cadena_original)
             return sello_b64, cadena_original
         except Exception as e:
             logger.error(f"Fallo en motor criptográfico blindado: {e}")
             raise HTTPException(status_code=500, detail=f"Error en Sello SAT: {str(e)}")
 
     def _get_y_avanzar_folio(self, serie: str) -> int:
-        from app.models.models import SystemConfig
-
-        config_key = f"folio_actual_{serie}"
-        secuencia = (
-            self.db.query(SystemConfig)
-            .filter(SystemConfig.key == config_key)
-            .with_for_update(of=SystemConfig)
-            .first()
-        )
-
-        if not secuencia:
-            nuevo_folio = 1
-            secuencia = SystemConfig(
-                key=config_key, value=str(nuevo_folio), grupo="folios", tipo="integer"
-            )
-            self.db.add(secuencia)
-        else:
-            nuevo_folio = int(secuencia.value) + 1
-            secuencia.value = str(nuevo_folio)
-        return nuevo_folio
+        # Reserva en transacción propia: no retiene candados durante el PAC
+        return siguiente_folio(serie, origen=self.__class__.__name__)
 
     def _guardar_xml_disco(self, xml_bytes: bytes, uuid: str):
         with open(self.storage_dir / f"{uuid}.xml", "wb") as f:
@@ -458,9 +348,6 @@ class BillingService:
 
     def regenerar_pdf_factura(self, invoice_id: int):
         from app.models.models import ReceivableInvoice
-        import qrcode
-        from io import BytesIO
-        from lxml import etree
 
         factura = (
             self.db.query(ReceivableInvoice)
@@ -470,6 +357,19 @@ class BillingService:
         if not factura or not factura.uuid:
             raise ValueError("Factura no encontrada o no tiene UUID timbrado.")
 
+        # El render corre en el pool; aquí esperamos el resultado
+        self.encolar_regeneracion_pdf(factura).result()
+
+        return {
+            "status": "success",
+            "message": f"PDF reconstruido exitosamente para {factura.folio_interno}",
+        }
+
+    def encolar_regeneracion_pdf(self, factura):
+        """
+        Reconstruye el contexto del PDF desde el XML en disco y lo envía al
+        pool de render. Devuelve el Future del render (ver `pdf_render_queue`).
+        """
         # 1. Verificar que exista el XML físico
         xml_path = self.storage_dir / f"{factura.uuid}.xml"
         if not xml_path.exists():
@@ -598,7 +498,7 @@ class BillingService:
         qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
 
         # 6. Crear PDF
-        self._generar_pdf_con_diseno(
+        return self._generar_pdf_con_diseno(
             d,
             factura.uuid,
             buffer.getvalue(),
@@ -607,73 +507,27 @@ class BillingService:
             c_sat,
             cadena_original_tfd,
             importe_letra,
+            diferir=False,
         )
 
-        return {
-            "status": "success",
-            "message": f"PDF reconstruido exitosamente para {factura.folio_interno}",
-        }
+    def precargar_viajes(self, viaje_ids):
+        """Precarga viajes y catálogos de un lote (ver build_context)."""
+        self._viajes_precargados.update(precargar_viajes(self.db, viaje_ids))
 
-    def regenerar_todos_los_pdfs(self):
-        from app.models.models import ReceivableInvoice
-
-        facturas = (
-            self.db.query(ReceivableInvoice)
-            .filter(ReceivableInvoice.uuid.isnot(None))
-            .all()
+    def _obtener_contexto_viaje(
+        self, viaje_id: int, buscar_tramo_carretera: bool = False
+    ) -> ViajeBuildContext:
+        viaje = self._viajes_precargados.get(viaje_id) or cargar_viaje(
+            self.db, viaje_id
         )
-        exitos = 0
-        errores = []
-        for fac in facturas:
-            try:
-                self.regenerar_pdf_factura(fac.id)
-                exitos += 1
-            except Exception as e:
-                errores.append(f"{fac.folio_interno}: {str(e)}")
-        return {"status": "success", "reconstruidos": exitos, "errores": errores}
+        return construir_contexto(viaje, buscar_tramo_carretera)
 
     def _obtener_datos_completos(
         self, viaje_id: int, buscar_tramo_carretera: bool = False
     ):
-        viaje = self.db.query(Trip).filter(Trip.id == viaje_id).first()
-        if not viaje:
-            raise HTTPException(status_code=404, detail="Viaje no encontrado.")
-
-        cliente = (
-            self.db.query(ClientModel).filter(ClientModel.id == viaje.client_id).first()
-        )
-        if not viaje.legs:
-            raise HTTPException(
-                status_code=400, detail="El viaje no tiene tramos (TripLeg)."
-            )
-
-        tramo_seleccionado = viaje.legs[0]
-        if buscar_tramo_carretera and len(viaje.legs) > 1:
-            tramo_ruta = next(
-                (leg for leg in viaje.legs if "ruta" in str(leg.leg_type).lower()), None
-            )
-            tramo_seleccionado = tramo_ruta if tramo_ruta else viaje.legs[-1]
-
-        unidad = (
-            self.db.query(Unit).filter(Unit.id == tramo_seleccionado.unit_id).first()
-        )
-        operador = (
-            self.db.query(Operator)
-            .filter(Operator.id == tramo_seleccionado.operator_id)
-            .first()
-        )
-        r1 = (
-            self.db.query(Unit).filter(Unit.id == viaje.remolque_1_id).first()
-            if viaje.remolque_1_id
-            else None
-        )
-        r2 = (
-            self.db.query(Unit).filter(Unit.id == viaje.remolque_2_id).first()
-            if viaje.remolque_2_id
-            else None
-        )
-
-        return viaje, cliente, unidad, operador, r1, r2
+        return self._obtener_contexto_viaje(
+            viaje_id, buscar_tramo_carretera
+        ).como_tupla()
 
     def _build_dict_from_models(
         self,
@@ -717,11 +571,7 @@ class BillingService:
                 else ""
             )
 
-        loc_destino = (
-            self.db.query(SatLocationCode)
-            .filter(SatLocationCode.codigo_postal == cp_destino_fisico)
-            .first()
-        )
+        loc_destino = buscar_ubicacion_sat(self.db, cp_destino_fisico)
         if loc_destino:
             estado_dest = normalizar_estado_sat(loc_destino.estado_clave)
             municipio_dest = str(loc_destino.municipio_clave).zfill(3)
@@ -734,11 +584,7 @@ class BillingService:
         clave_mercancia_final = (
             getattr(viaje, "sat_clave_producto", "01010101") or "01010101"
         )
-        producto_sat = (
-            self.db.query(SatProduct)
-            .filter(SatProduct.clave == clave_mercancia_final)
-            .first()
-        )
+        producto_sat = buscar_producto_sat(self.db, clave_mercancia_final)
         catalogo_peligroso = (
             str(producto_sat.es_material_peligroso).strip() if producto_sat else "0,1"
         )
@@ -1055,6 +901,26 @@ class BillingService:
     def _importar_comprobante_ws(self, data, relacion_uuid=None):
         logger.info("Generando XML Carta Porte y enviando al PAC...")
 
+        xml_con_cert = self._armar_xml_con_certificado(data, relacion_uuid)
+        sello_b64, cadena_original = self._generar_sello_xslt(
+            xml_con_cert.encode("utf-8")
+        )
+        xml_sellado = self._aplicar_sello(xml_con_cert, sello_b64)
+
+        try:
+            res_sat = self._timbrar_en_pac(xml_sellado)
+            return self._registrar_cfdi_timbrado(data, res_sat)
+        except Exception as e:
+            logger.error(f"Error en comunicación con PAC: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"Error al timbrar Carta Porte: {str(e)}"
+            )
+
+    # =========================================================================
+    # FASES DEL TIMBRADO (reutilizadas por el timbrado masivo)
+    # =========================================================================
+
+    def _armar_xml_con_certificado(self, data: dict, relacion_uuid=None) -> str:
         # =================================================================
         # 🛡️ FIX DEFINITIVO SAT [CFDI40149] - SINCRONIZACIÓN DE CP GENÉRICO
         # =================================================================
@@ -1078,131 +944,136 @@ class BillingService:
             no_certificado = "".join([sn_hex[i] for i in range(1, len(sn_hex), 2)])
             data["cert_emisor"] = no_certificado
 
-        xml_con_cert = xml_base.replace(
+        return xml_base.replace(
             "<cfdi:Comprobante",
             f'<cfdi:Comprobante NoCertificado="{no_certificado}" Certificado="{cert_b64}"',
         )
-        sello_b64, cadena_original = self._generar_sello_xslt(
-            xml_con_cert.encode("utf-8")
-        )
-        xml_sellado = xml_con_cert.replace(
+
+    @staticmethod
+    def _aplicar_sello(xml_con_cert: str, sello_b64: str) -> str:
+        return xml_con_cert.replace(
             "<cfdi:Comprobante", f'<cfdi:Comprobante Sello="{sello_b64}"'
         )
 
-        try:
-            client_zeep = create_pac_client(self.wsdl_timbrado, self.history)
+    def _timbrar_en_pac(self, xml_sellado: str, history=None):
+        """Envía el XML sellado al PAC y devuelve el resultado SAT del primer comprobante."""
+        history = history if history is not None else self.history
 
-            # --- INICIO DE LOGS AÑADIDOS ---
-            logger.debug("======================================================")
-            logger.debug("⬆️ [SAT/PAC] ENVIANDO PETICIÓN TIMBRADO CARTA PORTE ⬆️")
-            logger.debug(f"XML Sellado (Payload): \n{xml_sellado}")
-            logger.debug("======================================================")
+        # --- INICIO DE LOGS AÑADIDOS ---
+        logger.debug("======================================================")
+        logger.debug("⬆️ [SAT/PAC] ENVIANDO PETICIÓN TIMBRADO CARTA PORTE ⬆️")
+        logger.debug(f"XML Sellado (Payload): \n{xml_sellado}")
+        logger.debug("======================================================")
 
+        with pac_client(self.wsdl_timbrado, history) as client_zeep:
             result = client_zeep.service.timbrar(
                 self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
             )
 
-            logger.debug("======================================================")
-            logger.debug("⬇️ [SAT/PAC] RESPUESTA RECIBIDA CARTA PORTE ⬇️")
-            logger.debug(
-                f"Status General PAC: {getattr(result, 'status', 'N/A')} | Mensaje: {getattr(result, 'mensaje', 'N/A')}"
-            )
+        logger.debug("======================================================")
+        logger.debug("⬇️ [SAT/PAC] RESPUESTA RECIBIDA CARTA PORTE ⬇️")
+        logger.debug(
+            f"Status General PAC: {getattr(result, 'status', 'N/A')} | Mensaje: {getattr(result, 'mensaje', 'N/A')}"
+        )
 
-            if self.history.last_received:
-                raw_response = etree.tostring(
-                    self.history.last_received["envelope"], pretty_print=True
-                ).decode()
-                logger.debug(f"SOAP Response RAW: \n{raw_response}")
-            logger.debug("======================================================")
-            # --- FIN DE LOGS AÑADIDOS ---
+        if history.last_received:
+            raw_response = etree.tostring(
+                history.last_received["envelope"], pretty_print=True
+            ).decode()
+            logger.debug(f"SOAP Response RAW: \n{raw_response}")
+        logger.debug("======================================================")
+        # --- FIN DE LOGS AÑADIDOS ---
 
-            if int(getattr(result, "status", 0)) != 200:
-                raise HTTPException(
-                    status_code=400, detail=f"Error PAC: {result.mensaje}"
-                )
-            res_sat = result.resultados[0]
-            if int(getattr(res_sat, "status", 0)) != 200:
-                raise HTTPException(
-                    status_code=400, detail=f"Error SAT: {res_sat.mensaje}"
-                )
+        if int(getattr(result, "status", 0)) != 200:
+            raise HTTPException(status_code=400, detail=f"Error PAC: {result.mensaje}")
+        res_sat = result.resultados[0]
+        if int(getattr(res_sat, "status", 0)) != 200:
+            raise HTTPException(status_code=400, detail=f"Error SAT: {res_sat.mensaje}")
+        return res_sat
 
-            uuid_timbrado = res_sat.uuid
-            logger.info(f"¡FACTURA TIMBRADA! UUID: {uuid_timbrado}")
-            raw_cfdi = res_sat.cfdiTimbrado
-            cfdi_bytes = (
-                raw_cfdi.encode("utf-8") if isinstance(raw_cfdi, str) else raw_cfdi
-            )
+    def _registrar_cfdi_timbrado(self, data: dict, res_sat, generar_pdf: bool = True):
+        """
+        Guarda el CFDI timbrado en disco y (opcionalmente) genera su PDF.
+        Devuelve el PACResult con uuid, serie y folio reales.
+        """
+        uuid_timbrado = res_sat.uuid
+        logger.info(f"¡FACTURA TIMBRADA! UUID: {uuid_timbrado}")
+        raw_cfdi = res_sat.cfdiTimbrado
+        cfdi_bytes = raw_cfdi.encode("utf-8") if isinstance(raw_cfdi, str) else raw_cfdi
 
-            self._guardar_xml_disco(cfdi_bytes, uuid_timbrado)
+        self._guardar_xml_disco(cfdi_bytes, uuid_timbrado)
 
+        if generar_pdf:
             try:
-                root = etree.fromstring(cfdi_bytes)
-                ns = {
-                    "cfdi": "http://www.sat.gob.mx/cfd/4",
-                    "tfd": "http://www.sat.gob.mx/TimbreFiscalDigital",
-                }
-                tfd_node = root.xpath("//tfd:TimbreFiscalDigital", namespaces=ns)[0]
-                s_sat = tfd_node.get("SelloSAT", "0000")
-                c_sat = tfd_node.get("NoCertificadoSAT", "0000")
-                s_emi = root.xpath("//cfdi:Comprobante/@Sello", namespaces=ns)[0]
-                fecha_timbrado_sat = tfd_node.get("FechaTimbrado")
-                data["fecha_sat_con_hora"] = fecha_timbrado_sat
-                cadena_original_tfd = f"||{tfd_node.get('Version', '1.1')}|{uuid_timbrado}|{tfd_node.get('FechaTimbrado')}|{tfd_node.get('RfcProvCertif')}|{tfd_node.get('SelloCFD')}|{c_sat}||"
-
-                total_float = _clean_float(data.get("total", 0))
-                if HAS_NUM2WORDS:
-                    entero = int(total_float)
-                    decimales = int(round((total_float - entero) * 100))
-                    texto = num2words(entero, lang="es").upper()
-                    if texto == "UNO":
-                        texto = "UN"
-                    importe_letra = f"({texto} PESO{'S' if entero != 1 else ''} {decimales:02d}/100 MXN)"
-                else:
-                    importe_letra = f"({total_float:,.2f} MXN)"
-
-                qr_string = f"https://verificacfdi.facturaelectronica.sat.gob.mx/default.aspx?id={uuid_timbrado}&re={self.emisor_rfc}&rr={data.get('rfc_cliente', '')}&tt={total_float:.2f}&fe={s_emi[-8:]}"
-                qr = qrcode.QRCode(version=1, box_size=10, border=2)
-                qr.add_data(qr_string)
-                qr.make(fit=True)
-                buffer = BytesIO()
-                qr.make_image(fill_color="black", back_color="white").save(
-                    buffer, format="PNG"
-                )
-
-                self._generar_pdf_con_diseno(
-                    data,
-                    uuid_timbrado,
-                    buffer.getvalue(),
-                    s_sat,
-                    s_emi,
-                    c_sat,
-                    cadena_original_tfd,
-                    importe_letra,
-                )
+                self._generar_pdf_desde_cfdi(data, uuid_timbrado, cfdi_bytes)
             except Exception as e:
                 logger.error(f"Error generando PDF: {e}")
 
-            class PACResult:
-                pass
+        class PACResult:
+            pass
 
-            ret = PACResult()
-            ret.uuid = uuid_timbrado
+        ret = PACResult()
+        ret.uuid = uuid_timbrado
+        ret.cfdi_bytes = cfdi_bytes
 
-            try:
-                root_xml = etree.fromstring(cfdi_bytes)
-                ret.serie = root_xml.get("Serie")
-                ret.folio = root_xml.get("Folio")
-            except Exception:
-                ret.serie = None
-                ret.folio = None
+        try:
+            root_xml = etree.fromstring(cfdi_bytes)
+            ret.serie = root_xml.get("Serie")
+            ret.folio = root_xml.get("Folio")
+        except Exception:
+            ret.serie = None
+            ret.folio = None
 
-            return ret
+        return ret
 
-        except Exception as e:
-            logger.error(f"Error en comunicación con PAC: {e}")
-            raise HTTPException(
-                status_code=500, detail=f"Error al timbrar Carta Porte: {str(e)}"
+    def _generar_pdf_desde_cfdi(
+        self, data: dict, uuid_timbrado: str, cfdi_bytes, diferir: bool = True
+    ):
+        """Arma QR, importe con letra y cadena del TFD y genera el PDF del CFDI."""
+        root = etree.fromstring(cfdi_bytes)
+        ns = {
+            "cfdi": "http://www.sat.gob.mx/cfd/4",
+            "tfd": "http://www.sat.gob.mx/TimbreFiscalDigital",
+        }
+        tfd_node = root.xpath("//tfd:TimbreFiscalDigital", namespaces=ns)[0]
+        s_sat = tfd_node.get("SelloSAT", "0000")
+        c_sat = tfd_node.get("NoCertificadoSAT", "0000")
+        s_emi = root.xpath("//cfdi:Comprobante/@Sello", namespaces=ns)[0]
+        fecha_timbrado_sat = tfd_node.get("FechaTimbrado")
+        data["fecha_sat_con_hora"] = fecha_timbrado_sat
+        cadena_original_tfd = f"||{tfd_node.get('Version', '1.1')}|{uuid_timbrado}|{tfd_node.get('FechaTimbrado')}|{tfd_node.get('RfcProvCertif')}|{tfd_node.get('SelloCFD')}|{c_sat}||"
+
+        total_float = _clean_float(data.get("total", 0))
+        if HAS_NUM2WORDS:
+            entero = int(total_float)
+            decimales = int(round((total_float - entero) * 100))
+            texto = num2words(entero, lang="es").upper()
+            if texto == "UNO":
+                texto = "UN"
+            importe_letra = (
+                f"({texto} PESO{'S' if entero != 1 else ''} {decimales:02d}/100 MXN)"
             )
+        else:
+            importe_letra = f"({total_float:,.2f} MXN)"
+
+        qr_string = f"https://verificacfdi.facturaelectronica.sat.gob.mx/default.aspx?id={uuid_timbrado}&re={self.emisor_rfc}&rr={data.get('rfc_cliente', '')}&tt={total_float:.2f}&fe={s_emi[-8:]}"
+        qr = qrcode.QRCode(version=1, box_size=10, border=2)
+        qr.add_data(qr_string)
+        qr.make(fit=True)
+        buffer = BytesIO()
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+
+        return self._generar_pdf_con_diseno(
+            data,
+            uuid_timbrado,
+            buffer.getvalue(),
+            s_sat,
+            s_emi,
+            c_sat,
+            cadena_original_tfd,
+            importe_letra,
+            diferir=diferir,
+        )
 
     def _generar_pdf_con_diseno(
         self,
@@ -1214,7 +1085,13 @@ class BillingService:
         c_sat,
         cadena_original,
         importe_letra,
+        diferir: bool = True,
     ):
+        """
+        Arma el contexto de la plantilla y encola el PDF (`pdf_render_queue`).
+        Con `diferir` el render sale al hacer commit de la sesión; sin él se
+        envía de inmediato y se devuelve el Future.
+        """
         import re
 
         dir_cliente = d.get("direccion_cliente", "")
@@ -1232,12 +1109,6 @@ class BillingService:
                     f"{str(dir_cliente).rstrip(', ')}, C.P. {cp_cliente}"
                 )
 
-        logo_path = self.templates_dir / "assets" / "logo-black.png"
-        logo_src = (
-            f"data:image/png;base64,{base64.b64encode(open(logo_path, 'rb').read()).decode('utf-8')}"
-            if logo_path.exists()
-            else ""
-        )
         qr_src = f"data:image/png;base64,{base64.b64encode(qr_bytes).decode('utf-8')}"
 
         def chunk_b64(text, length=105):
@@ -1322,7 +1193,6 @@ class BillingService:
                 "folio_interno", f"{d.get('serie', 'F')}-{d.get('folio', '')}"
             ),
             "fecha_emision": fecha_limpia,
-            "logo_src": logo_src,
             "qr_src": qr_src,
             "metodo_pago": d.get("metodo_pago", "PPD"),
             "type_comprobante": "I (Ingreso)",
@@ -1352,11 +1222,14 @@ class BillingService:
             "pedimento": d.get("pedimento", ""),
         }
 
-        env = Environment(loader=FileSystemLoader(str(self.templates_dir)))
-        html_out = env.get_template("carta_porte.html").render(context)
-        pdf_path = self.storage_dir / f"{uuid}.pdf"
-        HTML(string=html_out, base_url=self.templates_dir.as_uri()).write_pdf(
-            str(pdf_path)
+        # El logo lo agrega el proceso de render (precargado una sola vez)
+        return encolar_pdf(
+            uuid,
+            "carta_porte.html",
+            context,
+            self.templates_dir,
+            self.storage_dir / f"{uuid}.pdf",
+            db=self.db if diferir else None,
         )
 
     def generar_carta_porte_nominal(
@@ -1882,17 +1755,16 @@ class BillingService:
         )
 
         try:
-            client_zeep = create_pac_client(self.wsdl_timbrado, self.history)
-
             # --- INICIO DE LOGS AÑADIDOS ---
             logger.debug("======================================================")
             logger.debug("⬆️ [SAT/PAC] ENVIANDO PETICIÓN TIMBRADO FACTURA LIBRE ⬆️")
             logger.debug(f"XML Sellado (Payload): \n{xml_sellado}")
             logger.debug("======================================================")
 
-            result = client_zeep.service.timbrar(
-                self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
-            )
+            with pac_client(self.wsdl_timbrado, self.history) as client_zeep:
+                result = client_zeep.service.timbrar(
+                    self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
+                )
 
             logger.debug("======================================================")
             logger.debug("⬇️ [SAT/PAC] RESPUESTA RECIBIDA FACTURA LIBRE ⬇️")
@@ -2149,6 +2021,23 @@ class BillingService:
     def generar_factura_final_relacionada(
         self, invoice_data: ReceivableInvoiceCreate
     ) -> ReceivableInvoice:
+        factura, viaje, data, uuid_relacionado_real = self._preparar_factura_final(
+            invoice_data
+        )
+
+        try:
+            resultado_pac = self._importar_comprobante_ws(
+                data, relacion_uuid=uuid_relacionado_real
+            )
+            return self._aplicar_timbre_factura_final(factura, viaje, resultado_pac)
+        except Exception as e:
+            self._manejar_error_factura_final(factura, e, data, uuid_relacionado_real)
+
+    def _preparar_factura_final(self, invoice_data: ReceivableInvoiceCreate):
+        """
+        Fase transaccional previa al PAC: arma el payload, asigna folio y deja la
+        factura en PROCESANDO (commit corto para liberar el candado del folio).
+        """
         from app.modules.logistics.schemas import SatCfdiPayload
 
         viaje, cliente, unidad, operador, r1, r2 = self._obtener_datos_completos(
@@ -2262,44 +2151,83 @@ class BillingService:
 
         self.db.commit()
         self.db.refresh(factura)
+        return factura, viaje, data, uuid_relacionado_real
 
-        try:
-            resultado_pac = self._importar_comprobante_ws(
-                data, relacion_uuid=uuid_relacionado_real
-            )
-            uuid_generado = getattr(resultado_pac, "uuid", None)
+    def _aplicar_timbre_factura_final(
+        self, factura: ReceivableInvoice, viaje, resultado_pac
+    ) -> ReceivableInvoice:
+        uuid_generado = getattr(resultado_pac, "uuid", None)
 
-            serie_real = getattr(resultado_pac, "serie", None)
-            folio_real = getattr(resultado_pac, "folio", None)
-            if serie_real and folio_real:
-                factura.folio_interno = f"{serie_real}-{folio_real}"
+        serie_real = getattr(resultado_pac, "serie", None)
+        folio_real = getattr(resultado_pac, "folio", None)
+        if serie_real and folio_real:
+            factura.folio_interno = f"{serie_real}-{folio_real}"
 
-            factura.uuid = uuid_generado
-            factura.status_sat = "TIMBRADA"
-            if uuid_generado:
-                factura.pdf_url = f"/api/sat/invoice/{uuid_generado}/pdf"
-                factura.xml_url = f"/api/sat/invoice/{uuid_generado}/xml"
-                viaje.uuid_fiscal = uuid_generado
-                viaje.estatus = "facturado"
+        factura.uuid = uuid_generado
+        factura.status_sat = "TIMBRADA"
+        if uuid_generado:
+            factura.pdf_url = f"/api/sat/invoice/{uuid_generado}/pdf"
+            factura.xml_url = f"/api/sat/invoice/{uuid_generado}/xml"
+            viaje.uuid_fiscal = uuid_generado
+            viaje.estatus = "facturado"
 
-            self.db.commit()
-            self.db.refresh(factura)
-            return factura
-        except Exception as e:
-            if is_pac_timeout_error(e):
-                self._marcar_timbrado_pendiente(factura, e, data, uuid_relacionado_real)
-                raise HTTPException(
-                    status_code=202,
-                    detail=(
-                        "El PAC tardó en responder. La factura quedó en PENDIENTE_TIMBRADO "
-                        "para conciliación/reintento; no se marcó como error definitivo."
-                    ),
-                )
-            factura.status_sat = "ERROR_SAT"
-            self.db.commit()
+        self.db.commit()
+        self.db.refresh(factura)
+        return factura
+
+    def _manejar_error_factura_final(
+        self, factura: ReceivableInvoice, e: Exception, data: dict, relacion_uuid
+    ):
+        """Timeout → PENDIENTE_TIMBRADO + cola de reintentos; otro error → ERROR_SAT."""
+        if is_pac_timeout_error(e):
+            self._marcar_timbrado_pendiente(factura, e, data, relacion_uuid)
             raise HTTPException(
-                status_code=500, detail=f"Error timbrando factura final en BD: {str(e)}"
+                status_code=202,
+                detail=(
+                    "El PAC tardó en responder. La factura quedó en PENDIENTE_TIMBRADO "
+                    "para conciliación/reintento; no se marcó como error definitivo."
+                ),
             )
+        factura.status_sat = "ERROR_SAT"
+        self.db.commit()
+        raise HTTPException(
+            status_code=500, detail=f"Error timbrando factura final en BD: {str(e)}"
+        )
+
+    def payload_factura_real(self, trip_id: int):
+        """
+        Arma el ReceivableInvoiceCreate de la factura real de un viaje, reciclando
+        el folio de su Carta Porte nominal previa. Devuelve (payload, nominal).
+        """
+        factura_vieja = (
+            self.db.query(ReceivableInvoice)
+            .filter(
+                ReceivableInvoice.viaje_id == trip_id,
+                ReceivableInvoice.is_nominal == True,
+            )
+            .first()
+        )
+
+        uuid_relacionado = factura_vieja.uuid if factura_vieja else None
+
+        #   NUEVO: Extractor Inteligente de Folio para Reciclaje
+        folio_a_reciclar = None
+        if factura_vieja and factura_vieja.folio_interno:
+            try:
+                # Convierte "CP-13" a 13 entero
+                folio_a_reciclar = int(factura_vieja.folio_interno.split("-")[1])
+            except Exception as e:
+                logger.warning(
+                    f"No se pudo extraer folio numérico de {factura_vieja.folio_interno}: {e}"
+                )
+
+        invoice_data = ReceivableInvoiceCreate(
+            viaje_id=trip_id,
+            is_nominal=False,
+            uuid_relacionado=uuid_relacionado,
+            folio_forzado=folio_a_reciclar,  # <-- Inyectamos el folio rescatado
+        )
+        return invoice_data, factura_vieja
 
     def cancelar_factura_sat(
         self, invoice_id: int, motivo: str = "02", uuid_sustituto: str = None
@@ -2376,8 +2304,6 @@ class BillingService:
         )
 
         try:
-            client_zeep = create_pac_client(self.wsdl_timbrado, self.history)
-
             with open(self.path_cer, "rb") as f_cer:
                 cer_bytes = f_cer.read()
             with open(self.path_key, "rb") as f_key:
@@ -2389,14 +2315,15 @@ class BillingService:
             )
             uuids_array = [uuid_formateado_sat]
 
-            resultado = client_zeep.service.cancelar(
-                usuario=self.pac_user,
-                password=self.pac_pass,
-                uuids=uuids_array,
-                derCertCSD=cer_bytes,
-                derKeyCSD=key_bytes,
-                contrasenaCSD=self.key_password,
-            )
+            with pac_client(self.wsdl_timbrado, self.history) as client_zeep:
+                resultado = client_zeep.service.cancelar(
+                    usuario=self.pac_user,
+                    password=self.pac_pass,
+                    uuids=uuids_array,
+                    derCertCSD=cer_bytes,
+                    derKeyCSD=key_bytes,
+                    contrasenaCSD=self.key_password,
+                )
 
             if int(getattr(resultado, "status", 0)) not in [200, 201, 202]:
                 raise Exception(f"Rechazo del PAC: {resultado.mensaje}")
@@ -2575,169 +2502,142 @@ class BillingService:
         }
 
     def procesar_sat_retry_queue(self, limit: int = 10):
-        now = datetime.utcnow()
-        pendientes = (
-            self.db.query(SatRetryQueue)
-            .filter(
-                SatRetryQueue.status == "PENDIENTE",
-                SatRetryQueue.attempts < SatRetryQueue.max_attempts,
-                or_(
-                    SatRetryQueue.next_attempt_at.is_(None),
-                    SatRetryQueue.next_attempt_at <= now,
-                ),
-            )
-            .order_by(SatRetryQueue.next_attempt_at.asc().nullsfirst())
-            .limit(limit)
-            .all()
-        )
-
-        resultados = []
-        for item in pendientes:
-            item.status = "REINTENTANDO"
-            item.locked_at = now
-            item.last_attempt_at = now
-            self.db.commit()
+        """
+        Procesa un lote de la cola de reintentos. Los items se reclaman con
+        FOR UPDATE SKIP LOCKED, así que es seguro correrlo junto al worker
+        (`sat_retry_worker.py`) u otra instancia del API.
+        """
+        ids = reclamar_items_retry(self.db, limit=limit)
+        resultados = [self.procesar_item_retry(item_id) for item_id in ids]
+        return {"procesadas": len(ids), "resultados": resultados}
 
-            factura = (
-                self.db.query(ReceivableInvoice)
-                .filter(ReceivableInvoice.id == item.invoice_id)
-                .first()
-            )
+    def procesar_item_retry(self, item_id: int) -> dict:
+        """Ejecuta un item ya reclamado (status REINTENTANDO) de la cola."""
+        item = self.db.query(SatRetryQueue).filter(SatRetryQueue.id == item_id).first()
+        if not item:
+            return {"id": item_id, "status": "NO_ENCONTRADO"}
 
-            if not factura:
-                item.status = "ERROR"
-                item.last_error = "Factura ya no existe."
-                item.resolved_at = datetime.utcnow()
-                self.db.commit()
-                resultados.append({"id": item.id, "status": item.status})
-                continue
+        factura = (
+            self.db.query(ReceivableInvoice)
+            .filter(ReceivableInvoice.id == item.invoice_id)
+            .first()
+        )
 
-            try:
-                if item.document_type == "rep":
-                    from app.integrations.sat.payment_service import (
-                        PaymentComplementService,
-                    )
+        if not factura:
+            item.status = "ERROR"
+            item.last_error = "Factura ya no existe."
+            item.resolved_at = datetime.utcnow()
+            self.db.commit()
+            return {"id": item.id, "status": item.status}
 
-                    payload = item.request_payload or {}
-                    payment_id = item.payment_id or payload.get("payment_id")
-                    if not payment_id:
-                        raise ValueError("No hay payment_id para reintentar REP.")
-
-                    payment_service = PaymentComplementService(self.db)
-                    if item.operation_type == "timbrado_pago":
-                        item.status = "CONCILIACION_REQUERIDA"
-                        item.locked_at = None
-                        item.next_attempt_at = None
-                        item.last_error = (
-                            "Timeout previo de timbrado REP. No se reintenta automaticamente "
-                            "porque el PAC pudo haber generado el complemento; primero debe conciliarse."
-                        )
-                        self.db.commit()
-                        resultados.append(
-                            {
-                                "id": item.id,
-                                "invoice_id": item.invoice_id,
-                                "payment_id": item.payment_id,
-                                "document_type": item.document_type,
-                                "operation_type": item.operation_type,
-                                "status": item.status,
-                                "message": "Requiere conciliacion antes de reintentar timbrado.",
-                            }
-                        )
-                        continue
-                    elif item.operation_type == "cancelacion_pago":
-                        payment_service.cancelar_pago_sat(
-                            payment_id=payment_id,
-                            motivo=payload.get("motivo") or "02",
-                            uuid_sustituto=payload.get("uuid_sustituto"),
-                        )
-                    else:
-                        raise ValueError(
-                            f"Tipo de operación REP no soportado: {item.operation_type}"
-                        )
+        try:
+            if item.document_type == "rep":
+                from app.integrations.sat.payment_service import (
+                    PaymentComplementService,
+                )
 
-                elif item.operation_type == "cancelacion":
-                    payload = item.request_payload or {}
-                    self.cancelar_factura_sat(
-                        invoice_id=factura.id,
-                        motivo=payload.get("motivo")
-                        or factura.motivo_cancelacion
-                        or "02",
-                        uuid_sustituto=payload.get("uuid_sustituto"),
-                    )
-                    self.db.refresh(factura)
+                payload = item.request_payload or {}
+                payment_id = item.payment_id or payload.get("payment_id")
+                if not payment_id:
+                    raise ValueError("No hay payment_id para reintentar REP.")
 
-                elif item.operation_type == "timbrado":
+                payment_service = PaymentComplementService(self.db)
+                if item.operation_type == "timbrado_pago":
                     item.status = "CONCILIACION_REQUERIDA"
                     item.locked_at = None
                     item.next_attempt_at = None
                     item.last_error = (
-                        "Timeout previo de timbrado CFDI. No se reintenta automaticamente "
-                        "porque el PAC pudo haber generado el timbre; primero debe conciliarse."
-                    )
-                    factura.detalle_sat = (
-                        "Timbrado pendiente por timeout. Requiere conciliación con PAC/SAT "
-                        "antes de reintentar para evitar duplicidad."
+                        "Timeout previo de timbrado REP. No se reintenta automaticamente "
+                        "porque el PAC pudo haber generado el complemento; primero debe conciliarse."
                     )
                     self.db.commit()
-                    resultados.append(
-                        {
-                            "id": item.id,
-                            "invoice_id": item.invoice_id,
-                            "payment_id": item.payment_id,
-                            "document_type": item.document_type,
-                            "operation_type": item.operation_type,
-                            "status": item.status,
-                            "message": "Requiere conciliacion antes de reintentar timbrado.",
-                        }
-                    )
-                    continue
-
-                else:
-                    raise ValueError(
-                        f"Tipo de operación no soportado: {item.operation_type}"
-                    )
-
-                item.status = "RESUELTO"
-                item.resolved_at = datetime.utcnow()
-                item.locked_at = None
-                item.last_error = None
-                self.db.commit()
-                resultados.append(
-                    {
+                    return {
                         "id": item.id,
                         "invoice_id": item.invoice_id,
                         "payment_id": item.payment_id,
                         "document_type": item.document_type,
                         "operation_type": item.operation_type,
                         "status": item.status,
+                        "message": "Requiere conciliacion antes de reintentar timbrado.",
                     }
-                )
+                elif item.operation_type == "cancelacion_pago":
+                    payment_service.cancelar_pago_sat(
+                        payment_id=payment_id,
+                        motivo=payload.get("motivo") or "02",
+                        uuid_sustituto=payload.get("uuid_sustituto"),
+                    )
+                else:
+                    raise ValueError(
+                        f"Tipo de operación REP no soportado: {item.operation_type}"
+                    )
 
-            except Exception as e:
-                item.status = (
-                    "PENDIENTE" if item.attempts < item.max_attempts else "ERROR"
+            elif item.operation_type == "cancelacion":
+                payload = item.request_payload or {}
+                self.cancelar_factura_sat(
+                    invoice_id=factura.id,
+                    motivo=payload.get("motivo") or factura.motivo_cancelacion or "02",
+                    uuid_sustituto=payload.get("uuid_sustituto"),
                 )
-                item.attempts = (item.attempts or 0) + 1
+                self.db.refresh(factura)
+
+            elif item.operation_type == "timbrado":
+                item.status = "CONCILIACION_REQUERIDA"
                 item.locked_at = None
-                item.last_error = str(e)[:4000]
-                item.next_attempt_at = datetime.utcnow() + timedelta(
-                    minutes=min(60, 5 * max(item.attempts, 1))
+                item.next_attempt_at = None
+                item.last_error = (
+                    "Timeout previo de timbrado CFDI. No se reintenta automaticamente "
+                    "porque el PAC pudo haber generado el timbre; primero debe conciliarse."
+                )
+                factura.detalle_sat = (
+                    "Timbrado pendiente por timeout. Requiere conciliación con PAC/SAT "
+                    "antes de reintentar para evitar duplicidad."
                 )
                 self.db.commit()
-                resultados.append(
-                    {
-                        "id": item.id,
-                        "invoice_id": item.invoice_id,
-                        "payment_id": item.payment_id,
-                        "document_type": item.document_type,
-                        "operation_type": item.operation_type,
-                        "status": item.status,
-                        "error": item.last_error,
-                    }
+                return {
+                    "id": item.id,
+                    "invoice_id": item.invoice_id,
+                    "payment_id": item.payment_id,
+                    "document_type": item.document_type,
+                    "operation_type": item.operation_type,
+                    "status": item.status,
+                    "message": "Requiere conciliacion antes de reintentar timbrado.",
+                }
+
+            else:
+                raise ValueError(
+                    f"Tipo de operación no soportado: {item.operation_type}"
                 )
 
-        return {"procesadas": len(pendientes), "resultados": resultados}
+            item.status = "RESUELTO"
+            item.resolved_at = datetime.utcnow()
+            item.locked_at = None
+            item.last_error = None
+            self.db.commit()
+            return {
+                "id": item.id,
+                "invoice_id": item.invoice_id,
+                "payment_id": item.payment_id,
+                "document_type": item.document_type,
+                "operation_type": item.operation_type,
+                "status": item.status,
+            }
+
+        except Exception as e:
+            item.attempts = (item.attempts or 0) + 1
+            item.status = "PENDIENTE" if item.attempts < item.max_attempts else "ERROR"
+            item.locked_at = None
+            item.last_error = str(e)[:4000]
+            item.next_attempt_at = datetime.utcnow() + calcular_backoff(item.attempts)
+            self.db.commit()
+            return {
+                "id": item.id,
+                "invoice_id": item.invoice_id,
+                "payment_id": item.payment_id,
+                "document_type": item.document_type,
+                "operation_type": item.operation_type,
+                "status": item.status,
+                "error": item.last_error,
+            }
 
     def resolver_timbrado_conciliado(
         self,
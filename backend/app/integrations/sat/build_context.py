@@ -0,0 +1,153 @@
+"""
+Armado de los datos de un viaje para Carta Porte / factura real.
+
+Antes cada comprobante hacía una consulta por relación (viaje, cliente,
+unidad del tramo, operador, remolques) más el CP destino en
+`sat_location_codes` y la clave en `sat_products`. Aquí:
+
+- `cargar_viaje` trae el viaje con todas sus relaciones en una sola ida
+  (joins + selectin de tramos).
+- `precargar_viajes` hace lo mismo para muchos viajes con una consulta por
+  tipo de relación (timbrado masivo).
+- CP y productos SAT se leen del índice en memoria de `catalog_index`
+  (`buscar_ubicacion_sat`, `buscar_producto_sat`).
+"""
+
+from dataclasses import dataclass
+from typing import Iterable
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from app.integrations.sat.catalog_index import buscar_por_llave
+from app.models.models import (
+    Client,
+    Operator,
+    SatLocationCode,
+    SatProduct,
+    Trip,
+    TripLeg,
+    Unit,
+)
+
+
+@dataclass
+class ViajeBuildContext:
+    viaje: Trip
+    cliente: Client | None
+    tramo: TripLeg
+    unidad: Unit | None
+    operador: Operator | None
+    r1: Unit | None
+    r2: Unit | None
+
+    def como_tupla(self):
+        """Orden que esperan `_obtener_datos_completos` y `_build_dict_from_models`."""
+        return self.viaje, self.cliente, self.unidad, self.operador, self.r1, self.r2
+
+
+@dataclass(frozen=True)
+class UbicacionSat:
+    codigo_postal: str
+    estado_clave: str
+    municipio_clave: str | None
+
+
+@dataclass(frozen=True)
+class ProductoSat:
+    clave: str
+    descripcion: str
+    es_material_peligroso: str | None
+
+
+def buscar_ubicacion_sat(db: Session, codigo_postal: str) -> UbicacionSat | None:
+    codigo_postal = str(codigo_postal or "").strip()
+    fila = buscar_por_llave(db, SatLocationCode, codigo_postal)
+    if fila is None:
+        return None
+    return UbicacionSat(
+        fila["codigo_postal"], fila["estado_clave"], fila["municipio_clave"]
+    )
+
+
+def buscar_producto_sat(db: Session, clave: str) -> ProductoSat | None:
+    fila = buscar_por_llave(db, SatProduct, clave)
+    if fila is None:
+        return None
+    return ProductoSat(
+        fila["clave"], fila["descripcion"], fila["es_material_peligroso"]
+    )
+
+
+# ==========================================================================
+# VIAJES
+# ==========================================================================
+
+
+def _opciones_viaje(en_bloque: bool):
+    # Un viaje: joins para las relaciones a uno. Muchos: una consulta por
+    # relación (selectin) para no multiplicar filas.
+    carga = selectinload if en_bloque else joinedload
+    return (
+        carga(Trip.client),
+        carga(Trip.sub_client),
+        carga(Trip.tariff),
+        carga(Trip.remolque_1),
+        carga(Trip.remolque_2),
+        selectinload(Trip.legs).selectinload(TripLeg.unit),
+        selectinload(Trip.legs).selectinload(TripLeg.operator),
+    )
+
+
+def cargar_viaje(db: Session, viaje_id: int) -> Trip:
+    viaje = (
+        db.query(Trip)
+        .options(*_opciones_viaje(en_bloque=False))
+        .filter(Trip.id == viaje_id)
+        .first()
+    )
+    if not viaje:
+        raise HTTPException(status_code=404, detail="Viaje no encontrado.")
+    return viaje
+
+
+def precargar_viajes(db: Session, viaje_ids: Iterable[int]) -> dict[int, Trip]:
+    """Viajes con sus relaciones para un lote, en pocas consultas."""
+    viaje_ids = list(dict.fromkeys(viaje_ids))
+    if not viaje_ids:
+        return {}
+
+    viajes = (
+        db.query(Trip)
+        .options(*_opciones_viaje(en_bloque=True))
+        .filter(Trip.id.in_(viaje_ids))
+        .all()
+    )
+
+    return {v.id: v for v in viajes}
+
+
+def construir_contexto(
+    viaje: Trip, buscar_tramo_carretera: bool = False
+) -> ViajeBuildContext:
+    if not viaje.legs:
+        raise HTTPException(
+            status_code=400, detail="El viaje no tiene tramos (TripLeg)."
+        )
+
+    tramo = viaje.legs[0]
+    if buscar_tramo_carretera and len(viaje.legs) > 1:
+        tramo_ruta = next(
+            (leg for leg in viaje.legs if "ruta" in str(leg.leg_type).lower()), None
+        )
+        tramo = tramo_ruta if tramo_ruta else viaje.legs[-1]
+
+    return ViajeBuildContext(
+        viaje=viaje,
+        cliente=viaje.client,
+        tramo=tramo,
+        unidad=tramo.unit,
+        operador=tramo.operator,
+        r1=viaje.remolque_1 if viaje.remolque_1_id else None,
+        r2=viaje.remolque_2 if viaje.remolque_2_id else None,
+    )
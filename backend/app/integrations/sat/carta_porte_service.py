@@ -21,16 +21,27 @@ from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 
 from cryptography import x509
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.serialization import load_der_private_key
 from cryptography.hazmat.backends import default_backend
 
 import qrcode
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML
 from app.integrations.sat.retry_queue import register_sat_retry
-from app.integrations.sat.soap_client import create_pac_client, is_pac_timeout_error
+from app.integrations.sat.build_context import (
+    ViajeBuildContext,
+    buscar_producto_sat,
+    buscar_ubicacion_sat,
+    cargar_viaje,
+    construir_contexto,
+    precargar_viajes,
+)
+from app.integrations.sat.csd_signer import get_csd_signer
+from app.integrations.sat.fiscal_config import get_fiscal_config
+from app.integrations.sat.folio_service import siguiente_folio
+from app.integrations.sat.pdf_render_queue import encolar_pdf
+from app.integrations.sat.xslt_registry import (
+    CADENA_ORIGINAL_CFDI_40,
+    generar_cadena_original,
+)
+from app.integrations.sat.soap_client import is_pac_timeout_error, pac_client
 
 try:
     from num2words import num2words
@@ -44,15 +55,7 @@ except ImportError as e:
 from app.db.database import get_db
 from app.modules.logistics.schemas import ReceivableInvoiceCreate, SatCfdiPayload
 from app.models.models import (
-    Trip,
-    TripLeg,
     ReceivableInvoice,
-    Client as ClientModel,
-    Unit,
-    Operator,
-    SystemConfig,
-    SatLocationCode,
-    SatProduct,
     ReceivableInvoicePayment,
     BankAccount,
 )
@@ -78,7 +81,6 @@ logging.config.dictConfig(
 )
 logger = logging.getLogger("billing.audit")
 
-DEFAULT_LEYENDA = "Condiciones de prestación de servicios que ampara la CARTA DE PORTE O COMPROBANTE PARA EL TRANSPORTE DE MERCANCÍAS. PRIMERA.- Para los efectos del presente contrato..."
 
 SAT_ESTADOS_MAP = {
     "01": "AGU",
@@ -218,6 +220,7 @@ class CartaPorteService:
             self.pac_pass = os.getenv("PAC_PASS_PROD", "TU_PASS_PROD")
 
         self.history = HistoryPlugin()
+        self._viajes_precargados = {}
         self.base_path = Path(
             os.getenv("APP_BASE_PATH", Path(__file__).resolve().parents[2])
         )
@@ -232,106 +235,31 @@ class CartaPorteService:
         self.cert_dir.mkdir(parents=True, exist_ok=True)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
 
-        cert_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_cert_path{self.suffix}")
-            .first()
-        )
-        key_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_key_path{self.suffix}")
-            .first()
-        )
-        pass_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_key_password{self.suffix}")
-            .first()
-        )
+        # Configuración fiscal en caché (ver fiscal_config): sin consultas por instancia
+        fiscal = get_fiscal_config(self.db, self.env)
+        self.fiscal_config_version = fiscal.version
 
         self.path_cer = (
-            Path(cert_conf.value)
-            if cert_conf and cert_conf.value
+            Path(fiscal.cert_path)
+            if fiscal.cert_path
             else (self.cert_dir / "default.cer")
         )
         self.path_key = (
-            Path(key_conf.value)
-            if key_conf and key_conf.value
+            Path(fiscal.key_path)
+            if fiscal.key_path
             else (self.cert_dir / "default.key")
         )
-        self.key_password = pass_conf.value if pass_conf else "12345678a"
+        self.key_password = fiscal.key_password
+        self.leyenda_legal_db = fiscal.leyenda_legal
 
-        rfc_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_rfc{self.suffix}")
-            .first()
-        )
-        leyenda_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_leyenda_legal{self.suffix}")
-            .first()
-        )
-        raw_leyenda = (
-            leyenda_conf.value
-            if leyenda_conf and leyenda_conf.value
-            else DEFAULT_LEYENDA
-        )
+        self.emisor_rfc = fiscal.emisor_rfc
+        self.emisor_nombre = fiscal.emisor_nombre
+        self.emisor_regimen = fiscal.emisor_regimen
+        self.emisor_cp = fiscal.emisor_cp
 
-        if 'Comentario="' in raw_leyenda:
-            texto = raw_leyenda.split('Comentario="', 1)[1]
-        elif "Comentario='" in raw_leyenda:
-            texto = raw_leyenda.split("Comentario='", 1)[1]
-        else:
-            texto = raw_leyenda
-
-        texto = re.sub(r'["\']?\s*></.*?>(.*)$', "", texto, flags=re.IGNORECASE)
-        texto = re.sub(r'["\']?\s*/?>\s*$', "", texto)
-        self.leyenda_legal_db = texto.strip()
-
-        nombre_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_nombre{self.suffix}")
-            .first()
-        )
-        regimen_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_regimen_fiscal{self.suffix}")
-            .first()
-        )
-        cp_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_cp{self.suffix}")
-            .first()
-        )
-
-        self.emisor_rfc = (
-            rfc_conf.value if rfc_conf and rfc_conf.value else "EKU9003173C9"
-        )
-        raw_emisor = (
-            nombre_conf.value if nombre_conf and nombre_conf.value else "RAPIDOS 3T"
-        )
-        raw_emisor = (
-            raw_emisor.upper()
-            .replace(" S.A. DE C.V.", "")
-            .replace(" SA DE CV", "")
-            .strip()
-        )
-
-        self.emisor_nombre = (
-            "RAPIDOS 3T" if self.emisor_rfc == "EKU9003173C9" else raw_emisor
-        )
-        self.emisor_regimen = (
-            regimen_conf.value if regimen_conf and regimen_conf.value else "624"
-        )
-        self.emisor_cp = str(cp_conf.value).strip() if cp_conf and cp_conf.value else ""
-
-        loc_emisor = (
-            self.db.query(SatLocationCode)
-            .filter(SatLocationCode.codigo_postal == self.emisor_cp)
-            .first()
-        )
-        if loc_emisor:
-            self.emisor_estado = normalizar_estado_sat(loc_emisor.estado_clave)
-            self.emisor_municipio = str(loc_emisor.municipio_clave).zfill(3)
+        if fiscal.emisor_estado_clave is not None:
+            self.emisor_estado = normalizar_estado_sat(fiscal.emisor_estado_clave)
+            self.emisor_municipio = fiscal.emisor_municipio
         else:
             raise HTTPException(
                 status_code=400,
@@ -339,40 +267,17 @@ class CartaPorteService:
             )
 
     def _generar_sello_xslt(self, xml_bytes: bytes) -> tuple[str, str]:
-        xslt_path = (
-            Path(__file__).parent
-            / "cadenas_sat_originales_base"
-            / "cadenaoriginal_4_0.xslt.xml"
-        )
+        xslt_path = CADENA_ORIGINAL_CFDI_40
         if not xslt_path.exists():
             raise HTTPException(
                 status_code=500, detail=f"XSLT no encontrado en {xslt_path}"
             )
 
         try:
-            parser = etree.XMLParser(
-                load_dtd=False, no_network=True, resolve_entities=False
-            )
-            xslt_doc = etree.parse(str(xslt_path), parser=parser)
-            transform = etree.XSLT(xslt_doc)
-            xml_doc = etree.fromstring(xml_bytes, parser=parser)
-            cadena_original_tree = transform(xml_doc)
-            cadena_original = (
-                str(cadena_original_tree)
-                .replace('<?xml version="1.0" encoding="UTF-8"?>', "")
-                .replace("\n", "")
-                .strip()
-            )
+            cadena_original = generar_cadena_original(xml_bytes)
 
-            with open(self.path_key, "rb") as f:
-                private_key = load_der_private_key(
-                    f.read(), password=self.key_password.encode()
-                )
-
-            signature = private_key.sign(
-                cadena_original.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256()
-            )
-            sello_b64 = base64.b64encode(signature).decode("utf-8")
+            signer = get_csd_signer(self.path_key, self.key_password, self.env)
+            sello_b64 = signer.sign(cadena_original)
             return sello_b64, cadena_original
 
         except Exception as e:
@@ -380,70 +285,27 @@ class CartaPorteService:
             raise HTTPException(status_code=500, detail=f"Error en Sello SAT: {str(e)}")
 
     def _get_y_avanzar_folio(self, serie: str) -> int:
-        from app.models.models import SystemConfig
+        # Reserva en transacción propia: no retiene candados durante el PAC
+        return siguiente_folio(serie, origen=self.__class__.__name__)
 
-        config_key = f"folio_actual_{serie}"
-        secuencia = (
-            self.db.query(SystemConfig)
-            .filter(SystemConfig.key == config_key)
-            .with_for_update(of=SystemConfig)
-            .first()
-        )
+    def precargar_viajes(self, viaje_ids):
+        """Precarga viajes y catálogos de un lote (ver build_context)."""
+        self._viajes_precargados.update(precargar_viajes(self.db, viaje_ids))
 
-        if not secuencia:
-            nuevo_folio = 1
-            secuencia = SystemConfig(
-                key=config_key, value=str(nuevo_folio), grupo="folios", tipo="integer"
-            )
-            self.db.add(secuencia)
-        else:
-            nuevo_folio = int(secuencia.value) + 1
-            secuencia.value = str(nuevo_folio)
-
-        return nuevo_folio
+    def _obtener_contexto_viaje(
+        self, viaje_id: int, buscar_tramo_carretera: bool = False
+    ) -> ViajeBuildContext:
+        viaje = self._viajes_precargados.get(viaje_id) or cargar_viaje(
+            self.db, viaje_id
+        )
+        return construir_contexto(viaje, buscar_tramo_carretera)
 
     def _obtener_datos_completos(
         self, viaje_id: int, buscar_tramo_carretera: bool = False
     ):
-        viaje = self.db.query(Trip).filter(Trip.id == viaje_id).first()
-        if not viaje:
-            raise HTTPException(status_code=404, detail="Viaje no encontrado.")
-
-        cliente = (
-            self.db.query(ClientModel).filter(ClientModel.id == viaje.client_id).first()
-        )
-        if not viaje.legs:
-            raise HTTPException(
-                status_code=400, detail="El viaje no tiene tramos (TripLeg)."
-            )
-
-        tramo_seleccionado = viaje.legs[0]
-        if buscar_tramo_carretera and len(viaje.legs) > 1:
-            tramo_ruta = next(
-                (leg for leg in viaje.legs if "ruta" in str(leg.leg_type).lower()), None
-            )
-            tramo_seleccionado = tramo_ruta if tramo_ruta else viaje.legs[-1]
-
-        unidad = (
-            self.db.query(Unit).filter(Unit.id == tramo_seleccionado.unit_id).first()
-        )
-        operador = (
-            self.db.query(Operator)
-            .filter(Operator.id == tramo_seleccionado.operator_id)
-            .first()
-        )
-        r1 = (
-            self.db.query(Unit).filter(Unit.id == viaje.remolque_1_id).first()
-            if viaje.remolque_1_id
-            else None
-        )
-        r2 = (
-            self.db.query(Unit).filter(Unit.id == viaje.remolque_2_id).first()
-            if viaje.remolque_2_id
-            else None
-        )
-
-        return viaje, cliente, unidad, operador, r1, r2
+        return self._obtener_contexto_viaje(
+            viaje_id, buscar_tramo_carretera
+        ).como_tupla()
 
     def _build_dict_from_models(
         self,
@@ -487,11 +349,7 @@ class CartaPorteService:
                 else ""
             )
 
-        loc_destino = (
-            self.db.query(SatLocationCode)
-            .filter(SatLocationCode.codigo_postal == cp_destino_fisico)
-            .first()
-        )
+        loc_destino = buscar_ubicacion_sat(self.db, cp_destino_fisico)
         if loc_destino:
             estado_dest = normalizar_estado_sat(loc_destino.estado_clave)
             municipio_dest = str(loc_destino.municipio_clave).zfill(3)
@@ -507,11 +365,7 @@ class CartaPorteService:
         clave_mercancia_final = (
             getattr(viaje, "sat_clave_producto", "01010101") or "01010101"
         )
-        producto_sat = (
-            self.db.query(SatProduct)
-            .filter(SatProduct.clave == clave_mercancia_final)
-            .first()
-        )
+        producto_sat = buscar_producto_sat(self.db, clave_mercancia_final)
 
         # BLINDAJE 1: El producto DEBE existir. No asumimos defaults.
         if not producto_sat:
@@ -1001,10 +855,10 @@ class CartaPorteService:
         )
 
         try:
-            client_zeep = create_pac_client(self.wsdl_timbrado, self.history)
-            result = client_zeep.service.timbrar(
-                self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
-            )
+            with pac_client(self.wsdl_timbrado, self.history) as client_zeep:
+                result = client_zeep.service.timbrar(
+                    self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
+                )
 
             if int(getattr(result, "status", 0)) != 200:
                 raise HTTPException(
@@ -1132,12 +986,6 @@ class CartaPorteService:
                     f"{str(dir_cliente).rstrip(', ')}, C.P. {cp_val}"
                 )
 
-        logo_path = self.templates_dir / "assets" / "logo-black.png"
-        logo_src = (
-            f"data:image/png;base64,{base64.b64encode(open(logo_path, 'rb').read()).decode('utf-8')}"
-            if logo_path.exists()
-            else ""
-        )
         qr_src = f"data:image/png;base64,{base64.b64encode(qr_bytes).decode('utf-8')}"
 
         def chunk_b64(text, length=105):
@@ -1195,7 +1043,6 @@ class CartaPorteService:
             "fecha_emision": d.get("fecha_timbrado", d.get("fecha", "")).replace(
                 "T", " "
             ),
-            "logo_src": logo_src,
             "qr_src": qr_src,
             "metodo_pago": d.get("metodo_pago", "PPD"),
             "tipo_comprobante": "I (Ingreso)",
@@ -1222,11 +1069,14 @@ class CartaPorteService:
             "info_material_peligroso": info_material_peligroso,
         }
 
-        env = Environment(loader=FileSystemLoader(str(self.templates_dir)))
-        html_out = env.get_template("carta_porte.html").render(context)
-        pdf_path = self.storage_dir / f"{uuid}.pdf"
-        HTML(string=html_out, base_url=self.templates_dir.as_uri()).write_pdf(
-            str(pdf_path)
+        # El logo lo agrega el proceso de render; sale al hacer commit
+        return encolar_pdf(
+            uuid,
+            "carta_porte.html",
+            context,
+            self.templates_dir,
+            self.storage_dir / f"{uuid}.pdf",
+            db=self.db,
         )
 
     def generar_carta_porte_nominal(
@@ -1695,16 +1545,15 @@ class CartaPorteService:
             sustituto_str = uuid_sustituto if uuid_sustituto else ""
             uuid_formateado_sat = f"{factura.uuid.strip()}|{motivo}|{sustituto_str}"
 
-            client_zeep = create_pac_client(self.wsdl_timbrado, self.history)
-
-            resultado = client_zeep.service.cancelar(
-                usuario=self.pac_user,
-                password=self.pac_pass,
-                uuids=[uuid_formateado_sat],
-                derCertCSD=cer_bytes,
-                derKeyCSD=key_bytes,
-                contrasenaCSD=self.key_password,
-            )
+            with pac_client(self.wsdl_timbrado, self.history) as client_zeep:
+                resultado = client_zeep.service.cancelar(
+                    usuario=self.pac_user,
+                    password=self.pac_pass,
+                    uuids=[uuid_formateado_sat],
+                    derCertCSD=cer_bytes,
+                    derKeyCSD=key_bytes,
+                    contrasenaCSD=self.key_password,
+                )
 
             if int(getattr(resultado, "status", 0)) not in [200, 201, 202]:
                 raise Exception(f"Rechazo del PAC: {resultado.mensaje}")
@@ -0,0 +1,488 @@
+"""
+Índice en memoria de los catálogos SAT.
+
+El autocompletado de la UI y cada Carta Porte consultaban `sat_products`,
+`sat_location_codes` y los demás catálogos con `ilike '%texto%'`, que no
+puede usar índices. Los catálogos casi no cambian, así que cada proceso
+mantiene una copia con un índice de trigramas:
+
+- Búsqueda por subcadena con la misma semántica que `ilike '%x%'` sobre los
+  mismos campos: se toman los ids del trigrama menos frecuente de la
+  búsqueda y solo esos candidatos se verifican. Búsquedas de 1-2 letras
+  recorren el catálogo en orden y se detienen al llenar la página.
+- Búsqueda exacta por llave (CP, clave de producto) para los servicios.
+- Se carga al arrancar la API; los endpoints de alta, edición y baja
+  actualizan la fila en el índice después del commit.
+- Como en `fiscal_config`, esos cambios solo llegan al proceso que los
+  atendió; `SAT_CATALOG_INDEX_TTL_SECONDS` limita cuánto tardan los demás en
+  recargar (en segundo plano, sirviendo la copia anterior mientras tanto).
+
+Con `SAT_CATALOG_INDEX_ENABLED=0` todo vuelve a consultar la BD.
+"""
+
+import bisect
+import heapq
+import logging
+import os
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.integrations.sat.catalog_search import (
+    buscar_rankeado_sql,
+    codificar_cursor,
+    nivel_coincidencia,
+)
+from app.models import models
+
+logger = logging.getLogger("billing.audit")
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+SAT_CATALOG_INDEX_ENABLED = os.getenv("SAT_CATALOG_INDEX_ENABLED", "1").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+SAT_CATALOG_INDEX_TTL_SECONDS = _float_env("SAT_CATALOG_INDEX_TTL_SECONDS", 900.0)
+
+# Separa campos en el texto indexado: ninguna búsqueda cruza de un campo a otro
+_SEPARADOR = "\x1f"
+
+_recargas = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sat-catalogos")
+
+
+def _trigramas(texto: str) -> set[str]:
+    return {texto[i : i + 3] for i in range(len(texto) - 2)}
+
+
+def _compactar(valor):
+    # Claves de estado, municipio, etc. se repiten miles de veces
+    if isinstance(valor, str) and len(valor) <= 12:
+        return sys.intern(valor)
+    return valor
+
+
+class _Estado:
+    """Filas y estructuras de búsqueda de un catálogo; se reemplaza al recargar."""
+
+    def __init__(self):
+        self.filas: dict[int, tuple] = {}
+        self.textos: dict[int, str] = {}
+        self.postings: dict[str, array] = {}
+        self.por_llave: dict[str, list[int]] = {}
+        # (valor de orden, id) ordenado: orden de salida de los listados
+        self.orden: list[tuple] = []
+
+
+class CatalogIndex:
+    def __init__(
+        self,
+        model,
+        campos: tuple[str, ...],
+        llave: str | None = None,
+        orden: str = "id",
+    ):
+        self.model = model
+        self.campos = campos
+        self.llave = llave
+        self.campo_orden = orden
+        self.columnas = tuple(attr.key for attr in model.__mapper__.column_attrs)
+        self._pos = {columna: i for i, columna in enumerate(self.columnas)}
+        self.tiene_activo = "activo" in self._pos
+
+        self._estado = _Estado()
+        self._lock = threading.RLock()
+        self._carga_lock = threading.Lock()
+        self.cargado_en: float | None = None
+        self._recargando = False
+        self._pendientes: list[tuple] = []
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+
+    def _texto(self, fila: tuple) -> str:
+        return _SEPARADOR.join(
+            str(fila[self._pos[campo]]).lower()
+            for campo in self.campos
+            if fila[self._pos[campo]] is not None
+        )
+
+    def _clave_orden(self, fila: tuple) -> tuple:
+        item_id = fila[self._pos["id"]]
+        if self.campo_orden == "id":
+            return (item_id,)
+        return (fila[self._pos[self.campo_orden]] or "", item_id)
+
+    def _agregar(self, estado: _Estado, fila: tuple, masivo: bool = False):
+        item_id = fila[self._pos["id"]]
+        texto = self._texto(fila)
+        estado.filas[item_id] = fila
+        estado.textos[item_id] = texto
+
+        for trigrama in _trigramas(texto):
+            ids = estado.postings.get(trigrama)
+            if ids is None:
+                estado.postings[trigrama] = array("q", (item_id,))
+            elif ids[-1] < item_id:
+                ids.append(item_id)
+            else:
+                bisect.insort(ids, item_id)
+
+        if self.llave:
+            valor = fila[self._pos[self.llave]]
+            if valor is not None:
+                bisect.insort(estado.por_llave.setdefault(str(valor), []), item_id)
+
+        if masivo:
+            # Carga completa: se ordena una sola vez al final
+            estado.orden.append(self._clave_orden(fila))
+        else:
+            bisect.insort(estado.orden, self._clave_orden(fila))
+
+    def _quitar(self, estado: _Estado, item_id: int):
+        fila = estado.filas.pop(item_id, None)
+        if fila is None:
+            return
+        texto = estado.textos.pop(item_id)
+
+        for trigrama in _trigramas(texto):
+            ids = estado.postings.get(trigrama)
+            if ids is None:
+                continue
+            i = bisect.bisect_left(ids, item_id)
+            if i < len(ids) and ids[i] == item_id:
+                del ids[i]
+            if not ids:
+                del estado.postings[trigrama]
+
+        if self.llave:
+            valor = fila[self._pos[self.llave]]
+            ids = estado.por_llave.get(str(valor)) if valor is not None else None
+            if ids and item_id in ids:
+                ids.remove(item_id)
+                if not ids:
+                    del estado.por_llave[str(valor)]
+
+        clave = self._clave_orden(fila)
+        i = bisect.bisect_left(estado.orden, clave)
+        if i < len(estado.orden) and estado.orden[i] == clave:
+            del estado.orden[i]
+
+    def _aplicar(self, estado: _Estado, cambio: tuple):
+        item_id, fila = cambio
+        self._quitar(estado, item_id)
+        if fila is not None:
+            self._agregar(estado, fila)
+
+    def _registrar_cambio(self, item_id: int, fila: tuple | None):
+        with self._lock:
+            if self._recargando:
+                # La carga en curso pudo leer la fila antes del commit
+                self._pendientes.append((item_id, fila))
+            if self.cargado_en is not None:
+                self._aplicar(self._estado, (item_id, fila))
+
+    def cargar(self, db: Session, solo_si_vacio: bool = False):
+        """Lee el catálogo completo y reemplaza el estado de una sola vez."""
+        with self._carga_lock:
+            if solo_si_vacio and self.cargado_en is not None:
+                # Otro hilo (p. ej. la precarga del arranque) terminó primero
+                return
+            inicio = time.perf_counter()
+            with self._lock:
+                self._recargando = True
+                self._pendientes = []
+
+            try:
+                estado = _Estado()
+                columnas = [getattr(self.model, c) for c in self.columnas]
+                filas = (
+                    db.query(*columnas)
+                    .order_by(self.model.id)
+                    .execution_options(yield_per=5000)
+                )
+                for fila in filas:
+                    self._agregar(
+                        estado, tuple(_compactar(v) for v in fila), masivo=True
+                    )
+                estado.orden.sort()
+
+                with self._lock:
+                    for cambio in self._pendientes:
+                        self._aplicar(estado, cambio)
+                    self._estado = estado
+                    self.cargado_en = time.monotonic()
+            finally:
+                with self._lock:
+                    self._recargando = False
+                    self._pendientes = []
+
+            logger.info(
+                f"📚 Catálogo {self.model.__tablename__} indexado: "
+                f"{len(estado.filas)} filas en {time.perf_counter() - inicio:.2f}s"
+            )
+
+    def actualizar(self, item):
+        """Refleja en el índice una fila recién guardada (alta, edición o baja lógica)."""
+        fila = tuple(_compactar(getattr(item, c)) for c in self.columnas)
+        self._registrar_cambio(fila[self._pos["id"]], fila)
+
+    def quitar(self, item_id: int):
+        self._registrar_cambio(item_id, None)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _como_dict(self, fila: tuple) -> dict:
+        return dict(zip(self.columnas, fila))
+
+    def _visible(self, fila: tuple, solo_activos: bool) -> bool:
+        return not solo_activos or bool(fila[self._pos["activo"]])
+
+    def _candidatos(self, estado: _Estado, texto_busqueda: str):
+        """Ids a verificar: la lista del trigrama menos frecuente de la búsqueda."""
+        if len(texto_busqueda) < 3:
+            return estado.filas.keys()
+        listas = [estado.postings.get(t) for t in _trigramas(texto_busqueda)]
+        if any(ids is None for ids in listas):
+            return ()
+        return min(listas, key=len)
+
+    def buscar(
+        self,
+        search: str = "",
+        skip: int = 0,
+        limit: int = 500,
+        solo_activos: bool = True,
+    ) -> list[dict]:
+        """Filas cuyo texto contiene `search` (sin distinguir mayúsculas)."""
+        solo_activos = solo_activos and self.tiene_activo
+        fin = skip + limit
+        texto_busqueda = (search or "").lower()
+
+        with self._lock:
+            estado = self._estado
+            resultado = []
+
+            if len(texto_busqueda) < 3:
+                # Sin trigramas: recorrido en orden con corte al llenar la página
+                for clave in estado.orden:
+                    item_id = clave[-1]
+                    fila = estado.filas[item_id]
+                    if not self._visible(fila, solo_activos):
+                        continue
+                    if texto_busqueda and texto_busqueda not in estado.textos[item_id]:
+                        continue
+                    resultado.append(fila)
+                    if len(resultado) >= fin:
+                        break
+                return [self._como_dict(f) for f in resultado[skip:fin]]
+
+            for item_id in self._candidatos(estado, texto_busqueda):
+                fila = estado.filas[item_id]
+                if not self._visible(fila, solo_activos):
+                    continue
+                if texto_busqueda not in estado.textos[item_id]:
+                    continue
+                resultado.append(fila)
+                if self.campo_orden == "id" and len(resultado) >= fin:
+                    break
+
+            if self.campo_orden != "id":
+                resultado.sort(key=self._clave_orden)
+            return [self._como_dict(f) for f in resultado[skip:fin]]
+
+    def buscar_rankeado(
+        self,
+        search: str = "",
+        limit: int = 50,
+        cursor: tuple[int, int] | None = None,
+        solo_activos: bool = True,
+    ) -> list[tuple[int, dict]]:
+        """Pares (nivel, fila) por relevancia después de `cursor` (ver catalog_search)."""
+        solo_activos = solo_activos and self.tiene_activo
+        texto_busqueda = (search or "").lower()
+
+        with self._lock:
+            estado = self._estado
+            coincidencias = []
+            for item_id in self._candidatos(estado, texto_busqueda):
+                fila = estado.filas[item_id]
+                texto = estado.textos[item_id]
+                if not self._visible(fila, solo_activos) or texto_busqueda not in texto:
+                    continue
+                clave = (
+                    nivel_coincidencia(texto.split(_SEPARADOR), texto_busqueda),
+                    item_id,
+                )
+                if cursor is None or clave > cursor:
+                    coincidencias.append((clave, fila))
+
+        pagina = heapq.nsmallest(limit, coincidencias, key=lambda c: c[0])
+        return [(clave[0], self._como_dict(fila)) for clave, fila in pagina]
+
+    def por_llave(self, valor) -> dict | None:
+        """Primera fila (menor id) con ese valor de llave, como `.first()`."""
+        with self._lock:
+            ids = self._estado.por_llave.get(str(valor))
+            return self._como_dict(self._estado.filas[ids[0]]) if ids else None
+
+
+# ==========================================================================
+# REGISTRO DE CATÁLOGOS
+# ==========================================================================
+
+
+def _campos_default(model) -> tuple[str, ...]:
+    # Los mismos campos que filtraba el `get_all` genérico
+    return tuple(c for c in ("clave", "descripcion", "nombre") if hasattr(model, c))
+
+
+_indices: dict = {
+    models.SatLocationCode: CatalogIndex(
+        models.SatLocationCode,
+        campos=("codigo_postal", "estado_clave", "municipio_clave", "localidad_clave"),
+        llave="codigo_postal",
+        orden="codigo_postal",
+    ),
+    models.SatProduct: CatalogIndex(
+        models.SatProduct, _campos_default(models.SatProduct), llave="clave"
+    ),
+}
+for _model in (
+    models.SatServiceType,
+    models.SatCargoType,
+    models.SatTrailerSubtype,
+    models.SatTruckConfig,
+    models.SatMunicipality,
+    models.SatLocality,
+    models.SatNeighborhood,
+    models.SatPermitType,
+    models.SatPackagingType,
+    models.SatHazardousMaterial,
+    models.SatStation,
+    models.SatUnitWeight,
+):
+    _indices[_model] = CatalogIndex(_model, _campos_default(_model))
+
+
+def _recargar(indice: CatalogIndex, solo_si_vacio: bool = False):
+    db = SessionLocal()
+    try:
+        indice.cargar(db, solo_si_vacio=solo_si_vacio)
+    except Exception as e:
+        logger.error(f"No se pudo indexar {indice.model.__tablename__}: {e}")
+    finally:
+        db.close()
+
+
+def obtener_indice(db: Session, model) -> CatalogIndex | None:
+    """
+    Índice del catálogo, cargándolo con `db` la primera vez. None si el
+    índice está deshabilitado o el modelo no es un catálogo registrado.
+    """
+    if not SAT_CATALOG_INDEX_ENABLED:
+        return None
+    indice = _indices.get(model)
+    if indice is None:
+        return None
+
+    if indice.cargado_en is None:
+        indice.cargar(db, solo_si_vacio=True)
+    elif (
+        time.monotonic() - indice.cargado_en > SAT_CATALOG_INDEX_TTL_SECONDS
+        and not indice._recargando
+        and not indice._carga_lock.locked()
+    ):
+        # Se marca ahora para no encolar una recarga por cada petición
+        indice.cargado_en = time.monotonic()
+        _recargas.submit(_recargar, indice)
+    return indice
+
+
+def actualizar_en_indice(model, item):
+    indice = _indices.get(model)
+    if indice is not None:
+        indice.actualizar(item)
+
+
+def quitar_de_indice(model, item_id: int):
+    indice = _indices.get(model)
+    if indice is not None:
+        indice.quitar(item_id)
+
+
+def buscar_por_llave(db: Session, model, valor) -> dict | None:
+    """Fila por llave exacta (CP, clave de producto); consulta la BD sin índice."""
+    indice = obtener_indice(db, model)
+    if indice is not None:
+        return indice.por_llave(valor)
+
+    llave = _indices[model].llave
+    item = (
+        db.query(model)
+        .filter(getattr(model, llave) == valor)
+        .order_by(model.id)
+        .first()
+    )
+    if item is None:
+        return None
+    return {attr.key: getattr(item, attr.key) for attr in model.__mapper__.column_attrs}
+
+
+def campos_busqueda(model) -> tuple[str, ...]:
+    indice = _indices.get(model)
+    return indice.campos if indice is not None else _campos_default(model)
+
+
+def buscar_catalogo(
+    db: Session,
+    model,
+    search: str = "",
+    limit: int = 50,
+    cursor: tuple[int, int] | None = None,
+    solo_activos: bool = True,
+) -> tuple[list, str | None]:
+    """
+    Búsqueda por relevancia de cualquier catálogo SAT: índice en memoria si
+    está disponible, SQL si no. Devuelve la página y el cursor de la
+    siguiente (None si no hay más).
+    """
+    indice = obtener_indice(db, model)
+    if indice is not None:
+        pares = indice.buscar_rankeado(search, limit + 1, cursor, solo_activos)
+    else:
+        pares = buscar_rankeado_sql(
+            db, model, campos_busqueda(model), search, limit + 1, cursor, solo_activos
+        )
+
+    siguiente = None
+    if len(pares) > limit:
+        pares = pares[:limit]
+        nivel, ultimo = pares[-1]
+        ultimo_id = ultimo["id"] if isinstance(ultimo, dict) else ultimo.id
+        siguiente = codificar_cursor(nivel, ultimo_id)
+    return [fila for _, fila in pares], siguiente
+
+
+def precargar_indices():
+    """Encola la carga de todos los catálogos (arranque de la API)."""
+    if not SAT_CATALOG_INDEX_ENABLED:
+        return
+    for indice in _indices.values():
+        if indice.cargado_en is None:
+            _recargas.submit(_recargar, indice, True)
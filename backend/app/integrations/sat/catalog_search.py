@@ -0,0 +1,114 @@
+"""
+Búsqueda por relevancia en catálogos SAT con paginación por cursor.
+
+Un solo criterio de relevancia para el índice en memoria (`catalog_index`)
+y para la consulta SQL de respaldo, así ambos caminos devuelven lo mismo:
+
+    0  algún campo es exactamente el texto buscado
+    1  algún campo empieza con el texto
+    2  alguna palabra de un campo empieza con el texto
+    3  el texto aparece en medio de un campo
+
+Dentro de cada nivel se ordena por id. El cursor es el par (nivel, id) del
+último registro entregado; la siguiente página empieza después de él, sin
+OFFSET. En PostgreSQL el filtro `ilike '%x%'` lo resuelven los índices GIN
+de trigramas (migración e5a7c9b1d3f5) cuando existe `pg_trgm`.
+"""
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, literal, or_, tuple_
+from sqlalchemy.orm import Session
+
+NIVEL_EXACTO = 0
+NIVEL_PREFIJO = 1
+NIVEL_PALABRA = 2
+NIVEL_CONTIENE = 3
+
+
+def codificar_cursor(nivel: int, item_id: int) -> str:
+    return f"{nivel}:{item_id}"
+
+
+def decodificar_cursor(cursor: str | None) -> tuple[int, int] | None:
+    if not cursor:
+        return None
+    try:
+        nivel, item_id = cursor.split(":", 1)
+        return int(nivel), int(item_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de búsqueda inválido.")
+
+
+def nivel_coincidencia(valores: list[str], busqueda: str) -> int:
+    """Nivel de una fila; `valores` y `busqueda` ya en minúsculas."""
+    if not busqueda:
+        return NIVEL_EXACTO
+    nivel = NIVEL_CONTIENE
+    for valor in valores:
+        if valor == busqueda:
+            return NIVEL_EXACTO
+        if valor.startswith(busqueda):
+            nivel = min(nivel, NIVEL_PREFIJO)
+        elif " " + busqueda in valor:
+            nivel = min(nivel, NIVEL_PALABRA)
+    return nivel
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def buscar_rankeado_sql(
+    db: Session,
+    model,
+    campos: tuple[str, ...],
+    busqueda: str,
+    limit: int,
+    cursor: tuple[int, int] | None = None,
+    solo_activos: bool = True,
+) -> list[tuple[int, object]]:
+    """Pares (nivel, registro) en orden de relevancia, después de `cursor`."""
+    busqueda = (busqueda or "").lower()
+    patron = _escapar_like(busqueda)
+    columnas = [func.lower(getattr(model, campo)) for campo in campos]
+
+    if busqueda:
+        nivel = case(
+            (or_(*[c == busqueda for c in columnas]), NIVEL_EXACTO),
+            (
+                or_(*[c.like(f"{patron}%", escape="\\") for c in columnas]),
+                NIVEL_PREFIJO,
+            ),
+            (
+                or_(*[c.like(f"% {patron}%", escape="\\") for c in columnas]),
+                NIVEL_PALABRA,
+            ),
+            else_=NIVEL_CONTIENE,
+        )
+    else:
+        nivel = literal(NIVEL_EXACTO)
+
+    query = db.query(nivel.label("nivel"), model)
+    if solo_activos and hasattr(model, "activo"):
+        query = query.filter(model.activo == True)
+    if busqueda:
+        # Sin lower(): así el planner usa los índices GIN (gin_trgm_ops)
+        query = query.filter(
+            or_(
+                *[
+                    getattr(model, campo).ilike(f"%{patron}%", escape="\\")
+                    for campo in campos
+                ]
+            )
+        )
+    if busqueda:
+        orden = (nivel, model.id)
+        if cursor is not None:
+            query = query.filter(tuple_(nivel, model.id) > tuple_(*cursor))
+    else:
+        # Nivel constante: solo el id ordena (un literal en ORDER BY sería posición)
+        orden = (model.id,)
+        if cursor is not None:
+            query = query.filter(model.id > cursor[1])
+
+    return [(fila.nivel, fila[1]) for fila in query.order_by(*orden).limit(limit)]
@@ -0,0 +1,95 @@
+"""
+Caché de firmantes CSD a nivel proceso.
+
+Cargar la llave privada del CSD (`load_der_private_key` con contraseña) es un
+descifrado PBKDF costoso que antes se repetía en cada sello. Aquí se guarda el
+objeto de llave ya descifrado, indexado por (ruta de la llave, mtime del
+archivo, ambiente QA/PROD). Si el archivo cambia en disco la entrada deja de
+coincidir y se recarga; al subir un CSD nuevo (`upload_csd_files`) se invalida
+explícitamente el ambiente afectado.
+"""
+
+import base64
+import threading
+from pathlib import Path
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import load_der_private_key
+
+
+class CsdSigner:
+    """Firma cadenas originales con la llave privada del CSD (PKCS#1 v1.5 + SHA256)."""
+
+    def __init__(self, private_key, key_path: Path, environment: str):
+        self._private_key = private_key
+        self.key_path = key_path
+        self.environment = environment
+
+    def sign(self, cadena: str) -> str:
+        signature = self._private_key.sign(
+            cadena.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256()
+        )
+        return base64.b64encode(signature).decode("utf-8")
+
+
+_lock = threading.Lock()
+_signers: dict[tuple[str, int, str], CsdSigner] = {}
+
+
+def get_csd_signer(key_path, password: str, environment: str) -> CsdSigner:
+    """
+    Devuelve el firmante cacheado para la llave indicada, descifrándola solo
+    la primera vez (o cuando el archivo cambia).
+    """
+    key_path = Path(key_path)
+    environment = (environment or "PROD").upper()
+    cache_key = (str(key_path.resolve()), key_path.stat().st_mtime_ns, environment)
+
+    signer = _signers.get(cache_key)
+    if signer:
+        return signer
+
+    with _lock:
+        signer = _signers.get(cache_key)
+        if signer:
+            return signer
+
+        with open(key_path, "rb") as f:
+            private_key = load_der_private_key(
+                f.read(), password=(password or "").encode()
+            )
+
+        # Una sola versión viva por ruta/ambiente: descartamos mtimes anteriores
+        for stale in [
+            k for k in _signers if k[0] == cache_key[0] and k[2] == environment
+        ]:
+            del _signers[stale]
+
+        signer = CsdSigner(private_key, key_path, environment)
+        _signers[cache_key] = signer
+        return signer
+
+
+def invalidate_csd_signers(environment: str | None = None):
+    """Descarta los firmantes de un ambiente (o todos si no se indica)."""
+    with _lock:
+        if environment is None:
+            _signers.clear()
+            return
+        environment = environment.upper()
+        for k in [k for k in _signers if k[2] == environment]:
+            del _signers[k]
+
+
+def sellar_cfdi(xml_bytes: bytes, key_path, password: str, environment: str):
+    """
+    Cadena original + sello de un comprobante. Función de módulo (picklable)
+    para ejecutarse en el pool de procesos del timbrado masivo; cada proceso
+    conserva su propio transform XSLT y firmante en caché.
+    """
+    from app.integrations.sat.xslt_registry import generar_cadena_original
+
+    cadena_original = generar_cadena_original(xml_bytes)
+    sello_b64 = get_csd_signer(key_path, password, environment).sign(cadena_original)
+    return sello_b64, cadena_original
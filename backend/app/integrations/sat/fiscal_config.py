@@ -0,0 +1,194 @@
+"""
+Snapshot inmutable de la configuración fiscal del emisor.
+
+Los servicios SAT (facturación, Carta Porte, pagos) se instancian por
+petición y antes leían en cada constructor una docena de filas de
+SystemConfig más el CP del emisor en `sat_location_codes`. Aquí se cargan
+una sola vez por ambiente (QA/PROD) en un `FiscalConfig` congelado:
+
+- Cada snapshot lleva un número de versión. `invalidar_fiscal_config`
+  incrementa la versión cuando cambia una llave fiscal (update_sat_params,
+  system-config, CSD) y el siguiente servicio recarga.
+- La invalidación solo llega al proceso que atendió el cambio; con varios
+  workers, `SAT_FISCAL_CONFIG_TTL_SECONDS` limita cuánto puede vivir un
+  snapshot viejo en los demás.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy.orm import Session
+
+from app.models.models import SatLocationCode, SystemConfig
+
+logger = logging.getLogger("billing.audit")
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+SAT_FISCAL_CONFIG_TTL_SECONDS = _float_env("SAT_FISCAL_CONFIG_TTL_SECONDS", 300.0)
+
+DEFAULT_LEYENDA = "Condiciones de prestación de servicios que ampara la CARTA DE PORTE O COMPROBANTE PARA EL TRANSPORTE DE MERCANCÍAS. PRIMERA.- Para los efectos del presente contrato..."
+
+# Llaves (sin sufijo _qa) que forman parte del snapshot
+FISCAL_CONFIG_KEYS = (
+    "sat_cert_path",
+    "sat_key_path",
+    "sat_key_password",
+    "empresa_rfc",
+    "empresa_nombre",
+    "empresa_regimen_fiscal",
+    "empresa_cp",
+    "sat_leyenda_legal",
+)
+
+
+@dataclass(frozen=True)
+class FiscalConfig:
+    version: int
+    environment: str
+    cargado_en: float
+
+    cert_path: str | None
+    key_path: str | None
+    key_password: str | None
+    emisor_rfc: str
+    emisor_nombre: str
+    emisor_regimen: str
+    emisor_cp: str
+    leyenda_legal: str
+    # Clave de estado sin normalizar y municipio; None si el CP no existe
+    emisor_estado_clave: str | None
+    emisor_municipio: str | None
+
+
+_lock = threading.Lock()
+_version = 1
+_snapshots: dict[str, FiscalConfig] = {}
+
+
+def _limpiar_leyenda(raw_leyenda: str) -> str:
+    """Extrae el texto de la leyenda aunque se haya guardado como nodo XML."""
+    if 'Comentario="' in raw_leyenda:
+        texto = raw_leyenda.split('Comentario="', 1)[1]
+    elif "Comentario='" in raw_leyenda:
+        texto = raw_leyenda.split("Comentario='", 1)[1]
+    else:
+        texto = raw_leyenda
+
+    texto = re.sub(r'["\']?\s*></.*?>(.*)$', "", texto, flags=re.IGNORECASE)
+    texto = re.sub(r'["\']?\s*/?>\s*$', "", texto)
+    return texto.strip()
+
+
+def _cargar(db: Session, environment: str, version: int) -> FiscalConfig:
+    suffix = "_qa" if environment == "QA" else ""
+    filas = (
+        db.query(SystemConfig.key, SystemConfig.value)
+        .filter(SystemConfig.key.in_([f"{k}{suffix}" for k in FISCAL_CONFIG_KEYS]))
+        .all()
+    )
+    valores = {
+        key[: len(key) - len(suffix)] if suffix else key: value for key, value in filas
+    }
+
+    def valor(key: str, default=None):
+        return valores.get(key) or default
+
+    emisor_rfc = valor("empresa_rfc", "EKU9003173C9")
+    raw_emisor = (
+        valor("empresa_nombre", "RAPIDOS 3T")
+        .upper()
+        .replace(" S.A. DE C.V.", "")
+        .replace(" SA DE CV", "")
+        .strip()
+    )
+    emisor_cp = str(valor("empresa_cp", "")).strip()
+
+    loc_emisor = (
+        db.query(SatLocationCode.estado_clave, SatLocationCode.municipio_clave)
+        .filter(SatLocationCode.codigo_postal == emisor_cp)
+        .first()
+        if emisor_cp
+        else None
+    )
+
+    return FiscalConfig(
+        version=version,
+        environment=environment,
+        cargado_en=time.monotonic(),
+        cert_path=valor("sat_cert_path"),
+        key_path=valor("sat_key_path"),
+        # Sin fila se usa la contraseña de pruebas; con fila vacía se respeta
+        key_password=(
+            valores.get("sat_key_password")
+            if "sat_key_password" in valores
+            else "12345678a"
+        ),
+        emisor_rfc=emisor_rfc,
+        emisor_nombre="RAPIDOS 3T" if emisor_rfc == "EKU9003173C9" else raw_emisor,
+        emisor_regimen=valor("empresa_regimen_fiscal", "624"),
+        emisor_cp=emisor_cp,
+        leyenda_legal=_limpiar_leyenda(valor("sat_leyenda_legal", DEFAULT_LEYENDA)),
+        emisor_estado_clave=loc_emisor.estado_clave if loc_emisor else None,
+        emisor_municipio=(
+            str(loc_emisor.municipio_clave).zfill(3) if loc_emisor else None
+        ),
+    )
+
+
+def get_fiscal_config(db: Session, environment: str) -> FiscalConfig:
+    """Snapshot vigente del ambiente; solo consulta la BD si cambió la versión."""
+    environment = (environment or "PROD").upper()
+
+    snapshot = _snapshots.get(environment)
+    if (
+        snapshot is not None
+        and snapshot.version == _version
+        and time.monotonic() - snapshot.cargado_en < SAT_FISCAL_CONFIG_TTL_SECONDS
+    ):
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshots.get(environment)
+        if (
+            snapshot is not None
+            and snapshot.version == _version
+            and time.monotonic() - snapshot.cargado_en < SAT_FISCAL_CONFIG_TTL_SECONDS
+        ):
+            return snapshot
+
+        snapshot = _cargar(db, environment, _version)
+        _snapshots[environment] = snapshot
+        logger.info(
+            f"🧾 Configuración fiscal {environment} cargada (versión {snapshot.version})"
+        )
+        return snapshot
+
+
+def es_llave_fiscal(key: str) -> bool:
+    base = key[:-3] if key.endswith("_qa") else key
+    return base in FISCAL_CONFIG_KEYS
+
+
+def invalidar_fiscal_config(keys=None):
+    """
+    Incrementa la versión si alguna de las llaves es fiscal (o siempre, si no
+    se indican llaves). Los snapshots existentes siguen siendo válidos para
+    quien ya los tiene; los nuevos servicios cargan la versión siguiente.
+    """
+    global _version
+    if keys is not None and not any(es_llave_fiscal(k) for k in keys):
+        return
+    with _lock:
+        _version += 1
+        _snapshots.clear()
@@ -0,0 +1,223 @@
+"""
+Secuencias de folios por serie (tabla `folio_sequences`).
+
+Antes el folio salía de `SELECT ... FOR UPDATE` sobre `system_configs`
+(`folio_actual_{serie}`) dentro de la transacción del timbrado, por lo que el
+candado se mantenía durante toda la llamada al PAC y todos los timbres de una
+serie se serializaban. Aquí la reserva se hace en su propia transacción corta
+(UPDATE ... RETURNING + commit) y cada folio entregado queda registrado en
+`folio_reservations` para poder auditar huecos (folios reservados que nunca
+llegaron a un comprobante).
+
+Opcionalmente cada proceso puede reservar bloques (`FOLIO_BLOCK_SIZE` > 1) y
+repartirlos localmente; eso reduce aún más los viajes a la BD a cambio de que
+la numeración entre procesos deje de ser estrictamente cronológica.
+"""
+
+import logging
+import os
+import re
+import socket
+import threading
+from collections import deque
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.models import (
+    FolioReservation,
+    FolioSequence,
+    ReceivableInvoice,
+    ReceivableInvoicePayment,
+    SystemConfig,
+)
+
+logger = logging.getLogger("billing.audit")
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+FOLIO_BLOCK_SIZE = max(1, _int_env("FOLIO_BLOCK_SIZE", 1))
+
+# Serie de complementos de pago y su folio base histórico
+SERIE_COMPLEMENTO_PAGO = "COM"
+FOLIO_BASE_COMPLEMENTO_PAGO = 2559
+
+_ORIGEN_PROCESO = f"{socket.gethostname()}:{os.getpid()}"
+
+_bloques: dict[str, deque] = {}
+_bloques_lock = threading.Lock()
+
+
+def _folio_inicial(db: Session, serie: str) -> int:
+    """Último folio usado antes de existir la secuencia (migración en caliente)."""
+    config = (
+        db.query(SystemConfig)
+        .filter(SystemConfig.key == f"folio_actual_{serie}")
+        .first()
+    )
+    if config and str(config.value or "").strip().isdigit():
+        return int(config.value)
+
+    if serie == SERIE_COMPLEMENTO_PAGO:
+        ultimo = FOLIO_BASE_COMPLEMENTO_PAGO
+        folios = db.query(ReceivableInvoicePayment.folio_complemento).filter(
+            ReceivableInvoicePayment.folio_complemento.like(f"{serie}-%")
+        )
+        for (folio,) in folios:
+            match = re.fullmatch(rf"{serie}-(\d+)", folio or "")
+            if match:
+                ultimo = max(ultimo, int(match.group(1)))
+        return ultimo
+
+    return 0
+
+
+def _asegurar_secuencia(db: Session, serie: str):
+    existe = db.query(FolioSequence.serie).filter(FolioSequence.serie == serie).first()
+    if existe:
+        return
+    db.execute(
+        pg_insert(FolioSequence)
+        .values(serie=serie, ultimo_folio=_folio_inicial(db, serie))
+        .on_conflict_do_nothing(index_elements=["serie"])
+    )
+
+
+def reservar_folios(serie: str, cantidad: int = 1, origen: str | None = None):
+    """
+    Reserva `cantidad` folios consecutivos de la serie en una transacción
+    propia y corta. Devuelve la lista de folios reservados.
+    """
+    origen = f"{origen or 'desconocido'}@{_ORIGEN_PROCESO}"
+    db = SessionLocal()
+    try:
+        _asegurar_secuencia(db, serie)
+        ultimo = db.execute(
+            FolioSequence.__table__.update()
+            .where(FolioSequence.serie == serie)
+            .values(
+                ultimo_folio=FolioSequence.ultimo_folio + cantidad,
+                updated_at=func.now(),
+            )
+            .returning(FolioSequence.ultimo_folio)
+        ).scalar_one()
+
+        folios = list(range(ultimo - cantidad + 1, ultimo + 1))
+        db.execute(
+            pg_insert(FolioReservation)
+            .values([{"serie": serie, "folio": f, "origen": origen} for f in folios])
+            .on_conflict_do_nothing(constraint="uq_folio_reservations_serie_folio")
+        )
+        db.commit()
+        return folios
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def siguiente_folio(serie: str, origen: str | None = None) -> int:
+    """
+    Entrega el siguiente folio de la serie. Con FOLIO_BLOCK_SIZE > 1 toma del
+    bloque reservado por este proceso y solo va a la BD cuando se agota.
+    """
+    if FOLIO_BLOCK_SIZE == 1:
+        return reservar_folios(serie, 1, origen)[0]
+
+    with _bloques_lock:
+        bloque = _bloques.setdefault(serie, deque())
+        if not bloque:
+            bloque.extend(reservar_folios(serie, FOLIO_BLOCK_SIZE, origen))
+        return bloque.popleft()
+
+
+# ==========================================================================
+# AUDITORÍA DE HUECOS
+# ==========================================================================
+
+
+def _folios_con_documento(db: Session, serie: str, desde: int, hasta: int) -> set:
+    prefijo = f"{serie}-"
+    if serie == SERIE_COMPLEMENTO_PAGO:
+        columna = ReceivableInvoicePayment.folio_complemento
+    else:
+        columna = ReceivableInvoice.folio_interno
+
+    usados = set()
+    for (folio_txt,) in (
+        db.query(columna).filter(columna.like(f"{prefijo}%")).distinct()
+    ):
+        numero = str(folio_txt or "")[len(prefijo) :]
+        if numero.isdigit() and desde <= int(numero) <= hasta:
+            usados.add(int(numero))
+    return usados
+
+
+def auditar_huecos(db: Session, serie: str, desde: int | None = None) -> dict:
+    """
+    Folios reservados de la serie que no aparecen en ningún comprobante
+    (facturas por `folio_interno`, complementos por `folio_complemento`).
+    """
+    secuencia = db.query(FolioSequence).filter(FolioSequence.serie == serie).first()
+    if not secuencia:
+        return {"serie": serie, "ultimo_folio": None, "huecos": []}
+
+    reservas = db.query(FolioReservation).filter(FolioReservation.serie == serie)
+    if desde is not None:
+        reservas = reservas.filter(FolioReservation.folio >= desde)
+    reservas = reservas.order_by(FolioReservation.folio).all()
+    if not reservas:
+        return {"serie": serie, "ultimo_folio": secuencia.ultimo_folio, "huecos": []}
+
+    usados = _folios_con_documento(db, serie, reservas[0].folio, reservas[-1].folio)
+    huecos = [
+        {
+            "folio": r.folio,
+            "folio_interno": f"{serie}-{r.folio}",
+            "status": r.status,
+            "origen": r.origen,
+            "motivo": r.motivo,
+            "reserved_at": r.reserved_at,
+        }
+        for r in reservas
+        if r.folio not in usados
+    ]
+    return {
+        "serie": serie,
+        "ultimo_folio": secuencia.ultimo_folio,
+        "reservados": len(reservas),
+        "sin_documento": len(huecos),
+        "sin_justificar": sum(1 for h in huecos if h["status"] == "RESERVADO"),
+        "huecos": huecos,
+    }
+
+
+def anular_folio(db: Session, serie: str, folio: int, motivo: str) -> FolioReservation:
+    """Marca un folio reservado y no usado como ANULADO con su justificación."""
+    reserva = (
+        db.query(FolioReservation)
+        .filter(FolioReservation.serie == serie, FolioReservation.folio == folio)
+        .first()
+    )
+    if not reserva:
+        raise HTTPException(
+            status_code=404,
+            detail=f"El folio {serie}-{folio} no tiene reserva registrada.",
+        )
+    reserva.status = "ANULADO"
+    reserva.motivo = motivo
+    reserva.resolved_at = datetime.utcnow()
+    db.commit()
+    logger.info(f"Folio {serie}-{folio} anulado: {motivo}")
+    return reserva
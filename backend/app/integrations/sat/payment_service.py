@@ -16,15 +16,21 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
 from cryptography import x509
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.serialization import load_der_private_key
 from cryptography.hazmat.backends import default_backend
 
 import qrcode
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML
-from app.integrations.sat.soap_client import create_pac_client
+from app.integrations.sat.csd_signer import get_csd_signer
+from app.integrations.sat.fiscal_config import get_fiscal_config
+from app.integrations.sat.folio_service import (
+    SERIE_COMPLEMENTO_PAGO,
+    siguiente_folio,
+)
+from app.integrations.sat.pdf_render_queue import PDF_STATUS_PENDIENTE, encolar_pdf
+from app.integrations.sat.xslt_registry import (
+    CADENA_ORIGINAL_CFDI_40,
+    generar_cadena_original,
+)
+from app.integrations.sat.soap_client import pac_client
 
 try:
     from num2words import num2words
@@ -37,8 +43,6 @@ except ImportError:
 from app.models.models import (
     ReceivableInvoice,
     Client as ClientModel,
-    SystemConfig,
-    SatLocationCode,
     ReceivableInvoicePayment,
     BankAccount,
     BankMovement,
@@ -113,108 +117,39 @@ class PaymentComplementService:
             os.getenv("TEMPLATES_DIR", self.base_path / "templates")
         )
 
-        cert_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_cert_path{self.suffix}")
-            .first()
-        )
-        key_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_key_path{self.suffix}")
-            .first()
-        )
-        pass_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"sat_key_password{self.suffix}")
-            .first()
-        )
+        # Configuración fiscal en caché (ver fiscal_config): sin consultas por instancia
+        fiscal = get_fiscal_config(self.db, self.env)
+        self.fiscal_config_version = fiscal.version
 
         self.path_cer = (
-            Path(cert_conf.value)
-            if cert_conf and cert_conf.value
+            Path(fiscal.cert_path)
+            if fiscal.cert_path
             else (self.cert_dir / "default.cer")
         )
         self.path_key = (
-            Path(key_conf.value)
-            if key_conf and key_conf.value
+            Path(fiscal.key_path)
+            if fiscal.key_path
             else (self.cert_dir / "default.key")
         )
-        self.key_password = pass_conf.value if pass_conf else "12345678a"
+        self.key_password = fiscal.key_password
 
-        rfc_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_rfc{self.suffix}")
-            .first()
-        )
-        nombre_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_nombre{self.suffix}")
-            .first()
-        )
-        regimen_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_regimen_fiscal{self.suffix}")
-            .first()
-        )
-        cp_conf = (
-            self.db.query(SystemConfig)
-            .filter_by(key=f"empresa_cp{self.suffix}")
-            .first()
-        )
-
-        self.emisor_rfc = (
-            rfc_conf.value if rfc_conf and rfc_conf.value else "EKU9003173C9"
-        )
-        raw_emisor = (
-            nombre_conf.value if nombre_conf and nombre_conf.value else "RAPIDOS 3T"
-        )
-        self.emisor_nombre = (
-            "RAPIDOS 3T"
-            if self.emisor_rfc == "EKU9003173C9"
-            else raw_emisor.upper()
-            .replace(" S.A. DE C.V.", "")
-            .replace(" SA DE CV", "")
-            .strip()
-        )
-        self.emisor_regimen = (
-            regimen_conf.value if regimen_conf and regimen_conf.value else "624"
-        )
-        self.emisor_cp = cp_conf.value if cp_conf and cp_conf.value else "91808"
+        self.emisor_rfc = fiscal.emisor_rfc
+        self.emisor_nombre = fiscal.emisor_nombre
+        self.emisor_regimen = fiscal.emisor_regimen
+        self.emisor_cp = fiscal.emisor_cp or "91808"
 
     def _generar_sello_xslt(self, xml_bytes: bytes) -> tuple[str, str]:
-        xslt_path = (
-            Path(__file__).parent
-            / "cadenas_sat_originales_base"
-            / "cadenaoriginal_4_0.xslt.xml"
-        )
+        xslt_path = CADENA_ORIGINAL_CFDI_40
         if not xslt_path.exists():
             raise HTTPException(
                 status_code=500, detail=f"XSLT no encontrado en {xslt_path}"
             )
 
         try:
-            parser = etree.XMLParser(
-                load_dtd=False, no_network=True, resolve_entities=False
-            )
-            xslt_doc = etree.parse(str(xslt_path), parser=parser)
-            transform = etree.XSLT(xslt_doc)
-            xml_doc = etree.fromstring(xml_bytes, parser=parser)
-            cadena_original = (
-                str(transform(xml_doc))
-                .replace('<?xml version="1.0" encoding="UTF-8"?>', "")
-                .replace("\n", "")
-                .strip()
-            )
-
-            with open(self.path_key, "rb") as f:
-                private_key = load_der_private_key(
-                    f.read(), password=self.key_password.encode()
-                )
+            cadena_original = generar_cadena_original(xml_bytes)
 
-            signature = private_key.sign(
-                cadena_original.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256()
-            )
-            sello_b64 = base64.b64encode(signature).decode("utf-8")
+            signer = get_csd_signer(self.path_key, self.key_password, self.env)
+            sello_b64 = signer.sign(cadena_original)
             return sello_b64, cadena_original
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error en Sello SAT: {str(e)}")
@@ -473,28 +408,15 @@ class PaymentComplementService:
         )
 
         # =========================================================================
-        # NUEVA LÓGICA DE FOLIOS PERFECTOS: Buscar el último COM- y sumar 1
+        # FOLIO COM: secuencia dedicada (reserva corta, auditable por huecos)
         # =========================================================================
-        ultimo_pago = (
-            self.db.query(ReceivableInvoicePayment)
-            .filter(ReceivableInvoicePayment.folio_complemento.like("COM-%"))
-            .order_by(ReceivableInvoicePayment.id.desc())
-            .first()
+        # Sin complemento no se consume folio (evita huecos en la serie)
+        folio_corto = (
+            str(siguiente_folio(SERIE_COMPLEMENTO_PAGO, origen=self.__class__.__name__))
+            if generar_complemento
+            else None
         )
 
-        if ultimo_pago and ultimo_pago.folio_complemento:
-            try:
-                # Extraemos el número, ej: "COM-2628" -> "2628" -> 2629
-                ultimo_folio_numero = int(
-                    ultimo_pago.folio_complemento.replace("COM-", "")
-                )
-                folio_corto = str(ultimo_folio_numero + 1)
-            except ValueError:
-                folio_corto = "2560"  # Fallback por si hay basura en la BD
-        else:
-            folio_corto = "2560"  # Número inicial base si la tabla es nueva
-        # =========================================================================
-
         datos_pago = {
             "serie": "COM",
             "folio": folio_corto,
@@ -608,10 +530,10 @@ class PaymentComplementService:
         #  LLAMADA AL PAC AISLADA
         # =========================================================================
         try:
-            client_zeep = create_pac_client(self.wsdl_timbrado, self.history)
-            result = client_zeep.service.timbrar(
-                self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
-            )
+            with pac_client(self.wsdl_timbrado, self.history) as client_zeep:
+                result = client_zeep.service.timbrar(
+                    self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
+                )
 
             if int(getattr(result, "status", 0)) != 200:
                 raise ValueError(f"Error PAC: {result.mensaje}")
@@ -696,6 +618,7 @@ class PaymentComplementService:
                 p.complemento_uuid = str(complemento_uuid)
                 p.folio_complemento = f"COM-{folio_corto}"
                 p.comprobante_url = f"/api/sat/invoice/{complemento_uuid}/pdf"
+                p.pdf_status = PDF_STATUS_PENDIENTE
                 self.db.add(p)
 
                 hist_xml = ReceivablePaymentDocumentHistory(
@@ -877,12 +800,6 @@ class PaymentComplementService:
         importe_letra,
         fecha_certificacion,
     ):
-        logo_path = self.templates_dir / "assets" / "logo-black.png"
-        logo_src = (
-            f"data:image/png;base64,{base64.b64encode(open(logo_path, 'rb').read()).decode('utf-8')}"
-            if logo_path.exists()
-            else ""
-        )
         qr_src = f"data:image/png;base64,{base64.b64encode(qr_bytes).decode('utf-8')}"
 
         def chunk_b64(text, length=105):
@@ -915,7 +832,6 @@ class PaymentComplementService:
             "fecha_certificacion": fecha_cert_limpia,
             "cuenta_beneficiario": cuenta_benef,
             "banco_beneficiario": banco_benef,
-            "logo_src": logo_src,
             "qr_src": qr_src,
             "metodo_pago": "PPD",
             "tipo_comprobante": "P (Pago)",
@@ -952,11 +868,14 @@ class PaymentComplementService:
             ],
         }
 
-        env = Environment(loader=FileSystemLoader(str(self.templates_dir)))
-        html_out = env.get_template("complemento_pago.html").render(context)
-        pdf_path = self.storage_dir / f"{uuid}.pdf"
-        HTML(string=html_out, base_url=self.templates_dir.as_uri()).write_pdf(
-            str(pdf_path)
+        # El logo lo agrega el proceso de render; sale al hacer commit
+        return encolar_pdf(
+            uuid,
+            "complemento_pago.html",
+            context,
+            self.templates_dir,
+            self.storage_dir / f"{uuid}.pdf",
+            db=self.db,
         )
 
     def cancelar_pago_sat(
@@ -991,16 +910,15 @@ class PaymentComplementService:
                 f"{pago.complemento_uuid.strip()}|{motivo}|{sustituto_str}"
             )
 
-            client_zeep = create_pac_client(self.wsdl_timbrado, self.history)
-
-            resultado = client_zeep.service.cancelar(
-                usuario=self.pac_user,
-                password=self.pac_pass,
-                uuids=[uuid_formateado_sat],
-                derCertCSD=cer_bytes,
-                derKeyCSD=key_bytes,
-                contrasenaCSD=self.key_password,
-            )
+            with pac_client(self.wsdl_timbrado, self.history) as client_zeep:
+                resultado = client_zeep.service.cancelar(
+                    usuario=self.pac_user,
+                    password=self.pac_pass,
+                    uuids=[uuid_formateado_sat],
+                    derCertCSD=cer_bytes,
+                    derKeyCSD=key_bytes,
+                    contrasenaCSD=self.key_password,
+                )
 
             if int(getattr(resultado, "status", 0)) not in [200, 201, 202]:
                 raise Exception(
@@ -1267,10 +1185,10 @@ class PaymentComplementService:
         #  LLAMADA AL PAC AISLADA
         # =========================================================================
         try:
-            client_zeep = create_pac_client(self.wsdl_timbrado, self.history)
-            result = client_zeep.service.timbrar(
-                self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
-            )
+            with pac_client(self.wsdl_timbrado, self.history) as client_zeep:
+                result = client_zeep.service.timbrar(
+                    self.pac_user, self.pac_pass, xml_sellado.encode("utf-8"), False
+                )
 
             if int(getattr(result, "status", 0)) != 200:
                 raise ValueError(f"Error PAC: {result.mensaje}")
@@ -0,0 +1,273 @@
+"""
+Reconstrucción masiva de PDFs como job en segundo plano.
+
+- Recorre las facturas timbradas por id ascendente en bloques (keyset, nunca
+  carga todo el historial), con filtros opcionales: rango de fecha de
+  emisión, serie y cliente.
+- Cada bloque se arma en el hilo del job (lee BD y XML) y se renderiza en el
+  pool de procesos de `pdf_render_queue`; se espera el bloque completo antes
+  de avanzar.
+- Al cerrar cada bloque guarda un checkpoint (filtros, último id procesado y
+  contadores) en SystemConfig `pdf_rebuild_checkpoint`. Si el proceso muere,
+  `reanudar=True` continúa desde el último id guardado.
+
+Solo corre una reconstrucción a la vez por proceso.
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid as uuid_lib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from fastapi import HTTPException
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.database import SessionLocal
+from app.integrations.sat.billing_service import BillingService
+from app.models.models import ReceivableInvoice, SystemConfig
+
+logger = logging.getLogger("billing.audit")
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+PDF_REBUILD_CHUNK_SIZE = max(1, _int_env("PDF_REBUILD_CHUNK_SIZE", 50))
+PDF_REBUILD_MAX_ERRORES = 200
+
+CHECKPOINT_KEY = "pdf_rebuild_checkpoint"
+
+_job: dict | None = None
+_job_lock = threading.Lock()
+_inicio_lock = threading.Lock()
+_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-rebuild")
+
+
+# ==========================================================================
+# FILTROS Y CHECKPOINT
+# ==========================================================================
+
+
+def _query_facturas(db, filtros: dict):
+    query = db.query(ReceivableInvoice).filter(ReceivableInvoice.uuid.isnot(None))
+    if filtros.get("fecha_desde"):
+        query = query.filter(
+            ReceivableInvoice.fecha_emision
+            >= date.fromisoformat(filtros["fecha_desde"])
+        )
+    if filtros.get("fecha_hasta"):
+        query = query.filter(
+            ReceivableInvoice.fecha_emision
+            <= date.fromisoformat(filtros["fecha_hasta"])
+        )
+    if filtros.get("serie"):
+        query = query.filter(
+            ReceivableInvoice.folio_interno.like(f"{filtros['serie']}-%")
+        )
+    if filtros.get("client_id"):
+        query = query.filter(ReceivableInvoice.client_id == filtros["client_id"])
+    return query
+
+
+def _leer_checkpoint(db) -> dict | None:
+    valor = (
+        db.query(SystemConfig.value).filter(SystemConfig.key == CHECKPOINT_KEY).scalar()
+    )
+    if not valor:
+        return None
+    try:
+        return json.loads(valor)
+    except ValueError:
+        logger.warning("Checkpoint de reconstrucción de PDFs ilegible; se ignora.")
+        return None
+
+
+def _guardar_checkpoint(db, job: dict):
+    # Core en lugar del ORM: un checkpoint por bloque no debe generar auditoría
+    with _job_lock:
+        valor = json.dumps(job, default=str)
+    stmt = pg_insert(SystemConfig.__table__).values(
+        key=CHECKPOINT_KEY, value=valor, grupo="sat", tipo="json"
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["key"], set_={"value": stmt.excluded.value}
+        )
+    )
+    db.commit()
+
+
+# ==========================================================================
+# JOB
+# ==========================================================================
+
+
+def _actualizar(job: dict, **campos):
+    with _job_lock:
+        job.update(campos)
+        job["actualizado"] = datetime.utcnow().isoformat()
+
+
+def _registrar_error(job: dict, factura, error: Exception):
+    logger.error(f"Error reconstruyendo PDF {factura.folio_interno}: {error}")
+    with _job_lock:
+        job["errores_total"] += 1
+        if len(job["errores"]) < PDF_REBUILD_MAX_ERRORES:
+            job["errores"].append(
+                {"id": factura.id, "folio": factura.folio_interno, "error": str(error)}
+            )
+
+
+def _procesar_bloque(job: dict, service: BillingService, facturas: list):
+    encolados = []
+    for factura in facturas:
+        try:
+            encolados.append((factura, service.encolar_regeneracion_pdf(factura)))
+        except Exception as e:
+            _registrar_error(job, factura, e)
+
+    for factura, futuro in encolados:
+        try:
+            futuro.result()
+            with _job_lock:
+                job["exitos"] += 1
+        except Exception as e:
+            _registrar_error(job, factura, e)
+
+
+def _ejecutar(job: dict):
+    db = SessionLocal()
+    try:
+        service = BillingService(db)
+        while True:
+            facturas = (
+                _query_facturas(db, job["filtros"])
+                .filter(ReceivableInvoice.id > job["ultimo_id"])
+                .order_by(ReceivableInvoice.id)
+                .limit(PDF_REBUILD_CHUNK_SIZE)
+                .all()
+            )
+            if not facturas:
+                break
+
+            _procesar_bloque(job, service, facturas)
+            with _job_lock:
+                job["procesados"] += len(facturas)
+            _actualizar(job, ultimo_id=facturas[-1].id)
+            _guardar_checkpoint(db, job)
+            # Sin identidades acumuladas entre bloques
+            db.expunge_all()
+
+        _actualizar(job, status="COMPLETADO")
+        logger.info(
+            f"📚 Reconstrucción de PDFs {job['id']} terminada: "
+            f"{job['exitos']} ok, {job['errores_total']} con error"
+        )
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"💥 Reconstrucción de PDFs {job['id']} interrumpida: {e}")
+        _actualizar(job, status="ERROR", mensaje=str(e))
+    finally:
+        try:
+            _guardar_checkpoint(db, job)
+        except Exception as e:
+            logger.error(f"No se pudo guardar el checkpoint final: {e}")
+        db.close()
+
+
+def iniciar_reconstruccion_pdfs(
+    fecha_desde: date | None = None,
+    fecha_hasta: date | None = None,
+    serie: str | None = None,
+    client_id: int | None = None,
+    reanudar: bool = False,
+) -> dict:
+    """Arranca (o reanuda desde el checkpoint) la reconstrucción en segundo plano."""
+    global _job
+
+    with _inicio_lock:
+        with _job_lock:
+            if _job is not None and _job["status"] == "EN_PROCESO":
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Ya hay una reconstrucción en curso ({_job['id']}).",
+                )
+
+        db = SessionLocal()
+        try:
+            if reanudar:
+                job = _leer_checkpoint(db)
+                if not job or job.get("status") == "COMPLETADO":
+                    raise HTTPException(
+                        status_code=404,
+                        detail="No hay una reconstrucción interrumpida que reanudar.",
+                    )
+                job.update(
+                    status="EN_PROCESO",
+                    mensaje=None,
+                    reanudaciones=job.get("reanudaciones", 0) + 1,
+                )
+            else:
+                filtros = {
+                    "fecha_desde": fecha_desde.isoformat() if fecha_desde else None,
+                    "fecha_hasta": fecha_hasta.isoformat() if fecha_hasta else None,
+                    "serie": serie.strip().upper() if serie else None,
+                    "client_id": client_id,
+                }
+                job = {
+                    "id": uuid_lib.uuid4().hex,
+                    "status": "EN_PROCESO",
+                    "filtros": filtros,
+                    "total": _query_facturas(db, filtros).count(),
+                    "ultimo_id": 0,
+                    "procesados": 0,
+                    "exitos": 0,
+                    "errores_total": 0,
+                    "errores": [],
+                    "reanudaciones": 0,
+                    "mensaje": None,
+                    "iniciado": datetime.utcnow().isoformat(),
+                }
+            job["actualizado"] = datetime.utcnow().isoformat()
+            _guardar_checkpoint(db, job)
+        finally:
+            db.close()
+
+        with _job_lock:
+            _job = job
+        _runner.submit(_ejecutar, job)
+        logger.info(
+            f"📚 Reconstrucción de PDFs {job['id']} "
+            f"{'reanudada desde id ' + str(job['ultimo_id']) if reanudar else 'iniciada'} "
+            f"({job['total']} facturas)"
+        )
+        return obtener_progreso_reconstruccion()
+
+
+def obtener_progreso_reconstruccion() -> dict:
+    """Progreso del job actual, o del último checkpoint si no corre aquí."""
+    with _job_lock:
+        job = json.loads(json.dumps(_job, default=str)) if _job else None
+
+    if job is None:
+        db = SessionLocal()
+        try:
+            job = _leer_checkpoint(db)
+        finally:
+            db.close()
+        if job is None:
+            return {"status": "SIN_EJECUCIONES"}
+        if job.get("status") == "EN_PROCESO":
+            # El proceso que lo corría ya no existe
+            job["status"] = "INTERRUMPIDO"
+
+    total = job.get("total") or 0
+    job["porcentaje"] = round(job["procesados"] * 100 / total, 1) if total else 100.0
+    return job
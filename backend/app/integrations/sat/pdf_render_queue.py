@@ -0,0 +1,186 @@
+"""
+Cola de renderizado de PDFs de CFDI.
+
+El timbrado ya no espera a WeasyPrint: el servicio arma el contexto de la
+plantilla (QR, importe con letra, sellos) y lo encola aquí. Un pool de
+procesos renderiza el HTML y escribe el PDF; el estado queda en
+`pdf_status` de la factura o del complemento de pago con ese UUID
+(PENDIENTE -> GENERADO | ERROR).
+
+- Cada proceso precarga el entorno Jinja2, las plantillas y el logo en
+  base64 una sola vez (`pdf_render_worker`), en lugar de leerlos en cada
+  factura.
+- Si se encola con la sesión del servicio, el envío espera al commit: el PDF
+  nunca se genera para una factura que no llegó a guardarse y el cambio de
+  estado siempre encuentra la fila. Los envíos pendientes viven en
+  `session.info` y se descartan si la transacción se revierte.
+- El PDF se escribe a un temporal y se renombra, así la descarga nunca
+  sirve un archivo a medias.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.integrations.sat.pdf_render_worker import inicializar_worker, renderizar_pdf
+from app.models.models import ReceivableInvoice, ReceivableInvoicePayment
+
+logger = logging.getLogger("billing.audit")
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+PDF_RENDER_WORKERS = max(1, _int_env("PDF_RENDER_WORKERS", 2))
+
+PDF_STATUS_PENDIENTE = "PENDIENTE"
+PDF_STATUS_GENERADO = "GENERADO"
+PDF_STATUS_ERROR = "ERROR"
+
+# Renders diferidos de la sesión, se envían en el siguiente commit
+_PENDIENTES = "pdf_render_pendientes"
+
+_executor = None
+_executor_lock = threading.Lock()
+# Un solo hilo para escribir estados: PENDIENTE siempre llega antes que el final
+_status_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-status")
+
+
+def _get_executor(templates_dir: str) -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: los procesos hijos no heredan conexiones ni hilos del API
+            _executor = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=inicializar_worker,
+                initargs=(templates_dir,),
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def cerrar_pool_pdf():
+    _reset_executor()
+    _status_executor.shutdown(wait=True)
+
+
+def _actualizar_pdf_status(uuid: str, status: str):
+    db = SessionLocal()
+    try:
+        db.query(ReceivableInvoice).filter(ReceivableInvoice.uuid == uuid).update(
+            {ReceivableInvoice.pdf_status: status}, synchronize_session=False
+        )
+        # Un complemento de pago puede cubrir varios pagos con el mismo UUID
+        db.query(ReceivableInvoicePayment).filter(
+            ReceivableInvoicePayment.complemento_uuid == uuid
+        ).update(
+            {ReceivableInvoicePayment.pdf_status: status}, synchronize_session=False
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"No se pudo actualizar pdf_status de {uuid}: {e}")
+    finally:
+        db.close()
+
+
+def _al_terminar(uuid: str, resultado: Future, future: Future):
+    try:
+        future.result()
+        status = PDF_STATUS_GENERADO
+        logger.info(f"📄 PDF generado: {uuid}")
+    except Exception as e:
+        status = PDF_STATUS_ERROR
+        logger.error(f"❌ Error generando PDF {uuid}: {e}")
+        if isinstance(e, BrokenProcessPool):
+            _reset_executor()
+
+    # El future público se resuelve hasta que el estado quedó guardado
+    def _guardar():
+        _actualizar_pdf_status(uuid, status)
+        if future.exception() is None:
+            resultado.set_result(future.result())
+        else:
+            resultado.set_exception(future.exception())
+
+    _status_executor.submit(_guardar)
+
+
+def _enviar(
+    uuid: str, template_name: str, context: dict, templates_dir: Path, pdf_path: Path
+) -> Future:
+    resultado = Future()
+    _status_executor.submit(_actualizar_pdf_status, uuid, PDF_STATUS_PENDIENTE)
+
+    args = (str(templates_dir), template_name, context, str(pdf_path))
+    try:
+        future = _get_executor(str(templates_dir)).submit(renderizar_pdf, *args)
+    except BrokenProcessPool:
+        _reset_executor()
+        future = _get_executor(str(templates_dir)).submit(renderizar_pdf, *args)
+
+    future.add_done_callback(lambda f: _al_terminar(uuid, resultado, f))
+    return resultado
+
+
+def encolar_pdf(
+    uuid: str,
+    template_name: str,
+    context: dict,
+    templates_dir: Path,
+    pdf_path: Path,
+    db: Session | None = None,
+) -> Future | None:
+    """
+    Encola el render del PDF.
+
+    Con `db` y una transacción abierta, el envío se difiere al siguiente
+    commit de esa sesión y se devuelve None. Sin sesión se envía de
+    inmediato y se devuelve un Future que termina cuando el PDF está escrito
+    y su estado guardado.
+    """
+    if db is not None and db.in_transaction():
+        db.info.setdefault(_PENDIENTES, []).append(
+            (uuid, template_name, context, templates_dir, pdf_path)
+        )
+        return None
+
+    return _enviar(uuid, template_name, context, templates_dir, pdf_path)
+
+
+@event.listens_for(Session, "after_commit")
+def _enviar_pendientes(session):
+    if session.in_nested_transaction():
+        return
+    for args in session.info.pop(_PENDIENTES, []):
+        try:
+            _enviar(*args)
+        except Exception as e:
+            logger.error(f"❌ No se pudo encolar el PDF {args[0]}: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_pendientes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDIENTES, None)
@@ -0,0 +1,65 @@
+"""
+Lado del proceso de render de `pdf_render_queue`.
+
+Se importa dentro de los procesos del pool, por eso no toca la base de datos
+ni los modelos: solo Jinja2, WeasyPrint y los assets de `app/templates`.
+"""
+
+import base64
+import logging
+import os
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader
+from weasyprint import HTML
+
+logger = logging.getLogger("billing.audit")
+
+PLANTILLAS_PRECARGADAS = ("carta_porte.html", "complemento_pago.html")
+
+_worker_templates_dir = None
+_worker_env = None
+_worker_logo_src = ""
+
+
+def inicializar_worker(templates_dir: str):
+    """Precarga plantillas y assets una vez por proceso."""
+    global _worker_templates_dir, _worker_env, _worker_logo_src
+
+    env = Environment(loader=FileSystemLoader(templates_dir), auto_reload=False)
+    for nombre in PLANTILLAS_PRECARGADAS:
+        try:
+            env.get_template(nombre)
+        except Exception as e:
+            logger.warning(f"No se pudo precargar la plantilla {nombre}: {e}")
+
+    logo_path = Path(templates_dir) / "assets" / "logo-black.png"
+    logo_src = ""
+    if logo_path.exists():
+        logo_src = (
+            f"data:image/png;base64,{base64.b64encode(logo_path.read_bytes()).decode()}"
+        )
+
+    _worker_templates_dir = templates_dir
+    _worker_env = env
+    _worker_logo_src = logo_src
+
+
+def renderizar_pdf(
+    templates_dir: str, template_name: str, context: dict, pdf_path: str
+) -> str:
+    """Renderiza la plantilla y escribe el PDF. Corre dentro del pool."""
+    if _worker_env is None or _worker_templates_dir != templates_dir:
+        inicializar_worker(templates_dir)
+
+    context = dict(context)
+    if not context.get("logo_src"):
+        context["logo_src"] = _worker_logo_src
+
+    html_out = _worker_env.get_template(template_name).render(context)
+    tmp_path = f"{pdf_path}.tmp"
+    HTML(string=html_out, base_url=Path(templates_dir).resolve().as_uri()).write_pdf(
+        tmp_path
+    )
+    os.replace(tmp_path, pdf_path)
+    return pdf_path
@@ -1,11 +1,28 @@
-from datetime import datetime, timedelta
+import os
+import random
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 
 from app.models.models import ReceivableInvoice, ReceivableInvoicePayment, SatRetryQueue
 
 
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+# Backoff exponencial: base * 2^(intentos-1), con tope y ±20% de jitter
+SAT_RETRY_BACKOFF_BASE_SECONDS = _int_env("SAT_RETRY_BACKOFF_BASE_SECONDS", 300)
+SAT_RETRY_BACKOFF_MAX_SECONDS = _int_env("SAT_RETRY_BACKOFF_MAX_SECONDS", 6 * 3600)
+# Un item en REINTENTANDO con locked_at más viejo que esto se considera huérfano
+SAT_RETRY_LEASE_SECONDS = _int_env("SAT_RETRY_LEASE_SECONDS", 15 * 60)
+
+
 def register_sat_retry(
     db: Session,
     *,
@@ -141,3 +158,109 @@ def register_sat_payment_retry(
     retry.resolved_at = None
 
     return retry
+
+
+# ==========================================================================
+# RECLAMO CONCURRENTE DE LA COLA (FOR UPDATE SKIP LOCKED)
+# ==========================================================================
+
+
+def calcular_backoff(attempts: int) -> timedelta:
+    segundos = min(
+        SAT_RETRY_BACKOFF_MAX_SECONDS,
+        SAT_RETRY_BACKOFF_BASE_SECONDS * 2 ** max(0, (attempts or 1) - 1),
+    )
+    return timedelta(seconds=segundos * random.uniform(0.8, 1.2))
+
+
+def liberar_reclamos_vencidos(
+    db: Session, lease_seconds: int = SAT_RETRY_LEASE_SECONDS
+) -> int:
+    """
+    Devuelve a PENDIENTE los items que quedaron en REINTENTANDO porque el
+    proceso que los reclamó murió (locked_at más viejo que el lease).
+    """
+    limite = datetime.utcnow() - timedelta(seconds=lease_seconds)
+    liberados = (
+        db.query(SatRetryQueue)
+        .filter(
+            SatRetryQueue.status == "REINTENTANDO",
+            SatRetryQueue.locked_at < limite,
+        )
+        .update(
+            {SatRetryQueue.status: "PENDIENTE", SatRetryQueue.locked_at: None},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return liberados
+
+
+def reclamar_items_retry(db: Session, limit: int = 10) -> list[int]:
+    """
+    Toma hasta `limit` items listos con FOR UPDATE SKIP LOCKED y los marca en
+    REINTENTANDO en una transacción corta. Dos workers nunca reciben el mismo id.
+    """
+    now = datetime.utcnow()
+    items = (
+        db.query(SatRetryQueue)
+        .filter(
+            SatRetryQueue.status == "PENDIENTE",
+            SatRetryQueue.attempts < SatRetryQueue.max_attempts,
+            or_(
+                SatRetryQueue.next_attempt_at.is_(None),
+                SatRetryQueue.next_attempt_at <= now,
+            ),
+        )
+        .order_by(SatRetryQueue.next_attempt_at.asc().nullsfirst(), SatRetryQueue.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True, of=SatRetryQueue)
+        .all()
+    )
+
+    for item in items:
+        item.status = "REINTENTANDO"
+        item.locked_at = now
+        item.last_attempt_at = now
+
+    ids = [item.id for item in items]
+    db.commit()
+    return ids
+
+
+def metricas_cola_retry(db: Session) -> dict:
+    """Profundidad por estatus, items listos y antigüedad del más atrasado."""
+    now = datetime.utcnow()
+    por_estatus = dict(
+        db.query(SatRetryQueue.status, func.count(SatRetryQueue.id))
+        .group_by(SatRetryQueue.status)
+        .all()
+    )
+    listos, mas_antiguo = (
+        db.query(
+            func.count(SatRetryQueue.id),
+            func.min(
+                func.coalesce(SatRetryQueue.next_attempt_at, SatRetryQueue.created_at)
+            ),
+        )
+        .filter(
+            SatRetryQueue.status == "PENDIENTE",
+            SatRetryQueue.attempts < SatRetryQueue.max_attempts,
+            or_(
+                SatRetryQueue.next_attempt_at.is_(None),
+                SatRetryQueue.next_attempt_at <= now,
+            ),
+        )
+        .one()
+    )
+    retraso = None
+    if mas_antiguo is not None:
+        if mas_antiguo.tzinfo is not None:
+            mas_antiguo = mas_antiguo.astimezone(timezone.utc).replace(tzinfo=None)
+        retraso = max(0.0, (now - mas_antiguo).total_seconds())
+
+    return {
+        "por_estatus": por_estatus,
+        "listos": listos,
+        "retraso_max_segundos": retraso,
+    }
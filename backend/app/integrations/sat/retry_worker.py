@@ -0,0 +1,193 @@
+"""
+Worker de larga vida para la cola de reintentos SAT (`sat_retry_queue`).
+
+- Reclama lotes con FOR UPDATE SKIP LOCKED (`reclamar_items_retry`), por lo
+  que varios workers/instancias pueden correr a la vez sin procesar dos veces
+  el mismo item.
+- Procesa cada item en un pool de hilos, cada uno con su propia sesión.
+- Libera reclamos huérfanos (REINTENTANDO con `locked_at` vencido).
+- Los fallos se reprograman con backoff exponencial (`calcular_backoff`).
+- Reporta profundidad de la cola, retraso y latencia de procesamiento.
+
+Se arranca con `python sat_retry_worker.py` (ver opciones con --help).
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.db.database import SessionLocal
+from app.integrations.sat.billing_service import BillingService
+from app.integrations.sat.retry_queue import (
+    SAT_RETRY_LEASE_SECONDS,
+    liberar_reclamos_vencidos,
+    metricas_cola_retry,
+    reclamar_items_retry,
+)
+
+logger = logging.getLogger("billing.audit")
+
+
+class SatRetryWorker:
+    def __init__(
+        self,
+        workers: int = 4,
+        batch_size: int = 20,
+        poll_interval: float = 10.0,
+        lease_seconds: int = SAT_RETRY_LEASE_SECONDS,
+        metrics_interval: float = 60.0,
+    ):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.metrics_interval = metrics_interval
+
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "reclamados": 0,
+            "resueltos": 0,
+            "reprogramados": 0,
+            "conciliacion": 0,
+            "errores": 0,
+            "liberados_por_lease": 0,
+            "segundos_procesando": 0.0,
+        }
+
+    def stop(self):
+        self._stop.set()
+
+    # ------------------------------------------------------------------
+    # Un item
+    # ------------------------------------------------------------------
+
+    def _procesar(self, item_id: int) -> dict:
+        inicio = time.perf_counter()
+        db = SessionLocal()
+        try:
+            resultado = BillingService(db).procesar_item_retry(item_id)
+        except Exception as e:
+            # Falló antes de que el servicio pudiera reprogramar el item; el
+            # lease vencido lo devolverá a PENDIENTE.
+            db.rollback()
+            logger.exception(f"💥 Retry {item_id} falló fuera del servicio: {e}")
+            resultado = {"id": item_id, "status": "FALLO_WORKER", "error": str(e)}
+        finally:
+            db.close()
+
+        contador = {
+            "RESUELTO": "resueltos",
+            "PENDIENTE": "reprogramados",
+            "CONCILIACION_REQUERIDA": "conciliacion",
+        }.get(resultado.get("status"), "errores")
+        with self._stats_lock:
+            self.stats[contador] += 1
+            self.stats["segundos_procesando"] += time.perf_counter() - inicio
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Ciclo
+    # ------------------------------------------------------------------
+
+    def _reclamar(self, limit: int) -> list[int]:
+        db = SessionLocal()
+        try:
+            liberados = liberar_reclamos_vencidos(db, self.lease_seconds)
+            if liberados:
+                logger.warning(f"♻️ {liberados} reintentos con lease vencido liberados")
+            ids = reclamar_items_retry(db, limit=limit)
+        finally:
+            db.close()
+
+        with self._stats_lock:
+            self.stats["liberados_por_lease"] += liberados
+            self.stats["reclamados"] += len(ids)
+        return ids
+
+    def metricas(self) -> dict:
+        db = SessionLocal()
+        try:
+            cola = metricas_cola_retry(db)
+        finally:
+            db.close()
+
+        with self._stats_lock:
+            stats = dict(self.stats)
+        terminados = (
+            stats["resueltos"]
+            + stats["reprogramados"]
+            + stats["conciliacion"]
+            + stats["errores"]
+        )
+        stats["latencia_promedio_segundos"] = (
+            round(stats["segundos_procesando"] / terminados, 3) if terminados else None
+        )
+        return {"cola": cola, "worker": stats}
+
+    def _reportar_metricas(self):
+        try:
+            m = self.metricas()
+        except Exception as e:
+            logger.error(f"No se pudieron calcular métricas de la cola SAT: {e}")
+            return
+        logger.info(
+            "📊 Cola SAT: listos=%s retraso_max=%ss por_estatus=%s | worker=%s",
+            m["cola"]["listos"],
+            m["cola"]["retraso_max_segundos"],
+            m["cola"]["por_estatus"],
+            m["worker"],
+        )
+
+    def run_once(self) -> list[dict]:
+        """Reclama y procesa un solo lote (útil para cron o pruebas)."""
+        ids = self._reclamar(self.batch_size)
+        if not ids:
+            return []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(self._procesar, ids))
+
+    def run_forever(self):
+        logger.info(
+            f"🚀 Worker SAT iniciado: hilos={self.workers} lote={self.batch_size} "
+            f"poll={self.poll_interval}s lease={self.lease_seconds}s"
+        )
+        ultimo_reporte = 0.0
+        en_vuelo = set()
+
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="sat-retry"
+        ) as executor:
+            while not self._stop.is_set():
+                en_vuelo = {f for f in en_vuelo if not f.done()}
+                libres = self.workers - len(en_vuelo)
+
+                ids = []
+                if libres > 0:
+                    try:
+                        ids = self._reclamar(min(libres, self.batch_size))
+                    except Exception as e:
+                        logger.error(f"Error reclamando la cola SAT: {e}")
+
+                for item_id in ids:
+                    en_vuelo.add(executor.submit(self._procesar, item_id))
+
+                if time.monotonic() - ultimo_reporte >= self.metrics_interval:
+                    self._reportar_metricas()
+                    ultimo_reporte = time.monotonic()
+
+                if len(en_vuelo) >= self.workers:
+                    # Pool lleno: esperar a que se libere un hilo
+                    wait(
+                        en_vuelo,
+                        timeout=self.poll_interval,
+                        return_when=FIRST_COMPLETED,
+                    )
+                elif not ids:
+                    # Cola vacía (o sin items listos todavía)
+                    self._stop.wait(self.poll_interval)
+
+            logger.info("🛑 Deteniendo worker SAT; esperando items en curso...")
+
+        self._reportar_metricas()
@@ -1,9 +1,19 @@
+import logging
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
 
 import requests
 import zeep
+from requests.adapters import HTTPAdapter
+from zeep.cache import SqliteCache
 from zeep.transports import Transport
 
+logger = logging.getLogger("billing.audit")
+
 
 def _float_env(name: str, default: float) -> float:
     try:
@@ -12,14 +22,65 @@ def _float_env(name: str, default: float) -> float:
         return default
 
 
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
 PAC_WSDL_TIMEOUT_SECONDS = _float_env("PAC_WSDL_TIMEOUT_SECONDS", 30)
 PAC_OPERATION_TIMEOUT_SECONDS = _float_env("PAC_OPERATION_TIMEOUT_SECONDS", 180)
 
+# Pool de clientes zeep por WSDL (conexiones keep-alive reutilizables)
+PAC_POOL_SIZE = max(1, _int_env("PAC_POOL_SIZE", 4))
+PAC_POOL_ACQUIRE_TIMEOUT_SECONDS = _float_env("PAC_POOL_ACQUIRE_TIMEOUT_SECONDS", 60)
+# Un cliente ocioso más tiempo que esto renueva su sesión HTTP antes de usarse
+PAC_POOL_MAX_IDLE_SECONDS = _float_env("PAC_POOL_MAX_IDLE_SECONDS", 300)
 
-def create_pac_client(wsdl_url: str, history=None) -> zeep.Client:
+# Caché local en disco de WSDL/XSD para no depender del PAC al arrancar
+PAC_WSDL_CACHE_PATH = Path(
+    os.getenv(
+        "PAC_WSDL_CACHE_PATH",
+        Path(__file__).resolve().parents[2] / "storage" / "sat" / "pac_wsdl_cache.db",
+    )
+)
+PAC_WSDL_CACHE_TTL_SECONDS = _int_env("PAC_WSDL_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+
+_wsdl_cache = None
+_wsdl_cache_lock = threading.Lock()
+
+
+def _get_wsdl_cache():
+    global _wsdl_cache
+    if _wsdl_cache is None:
+        with _wsdl_cache_lock:
+            if _wsdl_cache is None:
+                try:
+                    PAC_WSDL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+                    _wsdl_cache = SqliteCache(
+                        path=str(PAC_WSDL_CACHE_PATH),
+                        timeout=PAC_WSDL_CACHE_TTL_SECONDS,
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Caché WSDL en disco no disponible: {e}")
+                    _wsdl_cache = False
+    return _wsdl_cache or None
+
+
+def _build_session() -> requests.Session:
     session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_pac_client(wsdl_url: str, history=None) -> zeep.Client:
+    """Cliente zeep independiente (sin pool). El WSDL se lee del caché en disco."""
     transport = Transport(
-        session=session,
+        session=_build_session(),
+        cache=_get_wsdl_cache(),
         timeout=PAC_WSDL_TIMEOUT_SECONDS,
         operation_timeout=PAC_OPERATION_TIMEOUT_SECONDS,
     )
@@ -27,6 +88,172 @@ def create_pac_client(wsdl_url: str, history=None) -> zeep.Client:
     return zeep.Client(wsdl_url, transport=transport, plugins=plugins)
 
 
+# ==========================================================================
+# POOL DE CLIENTES PAC
+# ==========================================================================
+
+
+class _PooledClient:
+    __slots__ = ("client", "last_used")
+
+    def __init__(self, client: zeep.Client):
+        self.client = client
+        self.last_used = time.monotonic()
+
+
+class PacClientPool:
+    """
+    Pool de clientes zeep para un WSDL. Cada cliente parsea el WSDL una sola
+    vez y conserva su sesión HTTP (keep-alive) entre timbres. Los clientes se
+    crean de forma perezosa hasta `size` y se prestan en exclusiva, así el
+    HistoryPlugin de cada servicio no se mezcla entre peticiones concurrentes.
+
+    Health check: un cliente que falla por error de red/timeout se descarta, y
+    uno que estuvo ocioso más de `max_idle` renueva su sesión HTTP antes de
+    volver a usarse (evita sockets keep-alive cerrados por el PAC).
+    """
+
+    def __init__(
+        self,
+        wsdl_url: str,
+        size: int = PAC_POOL_SIZE,
+        acquire_timeout: float = PAC_POOL_ACQUIRE_TIMEOUT_SECONDS,
+        max_idle: float = PAC_POOL_MAX_IDLE_SECONDS,
+    ):
+        self.wsdl_url = wsdl_url
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.max_idle = max_idle
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.stats = {"created": 0, "reused": 0, "discarded": 0, "refreshed": 0}
+
+    def _new_client(self) -> _PooledClient:
+        client = create_pac_client(self.wsdl_url)
+        self.stats["created"] += 1
+        return _PooledClient(client)
+
+    def _refresh_session(self, pooled: _PooledClient):
+        transport = pooled.client.transport
+        try:
+            transport.session.close()
+        except Exception:
+            pass
+        transport.session = _build_session()
+        self.stats["refreshed"] += 1
+
+    def acquire(self) -> _PooledClient:
+        try:
+            pooled = self._idle.get_nowait()
+        except queue.Empty:
+            pooled = None
+
+        if pooled is None:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return self._new_client()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            try:
+                pooled = self._idle.get(timeout=self.acquire_timeout)
+            except queue.Empty:
+                raise TimeoutError(
+                    f"Pool PAC agotado ({self.size} clientes) para {self.wsdl_url}"
+                )
+
+        if time.monotonic() - pooled.last_used > self.max_idle:
+            self._refresh_session(pooled)
+        self.stats["reused"] += 1
+        return pooled
+
+    def release(self, pooled: _PooledClient, healthy: bool = True):
+        pooled.client.plugins = []
+        if not healthy:
+            self.stats["discarded"] += 1
+            try:
+                pooled.client.transport.session.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+            return
+        pooled.last_used = time.monotonic()
+        self._idle.put(pooled)
+
+    @contextmanager
+    def client(self, history=None):
+        pooled = self.acquire()
+        pooled.client.plugins = [history] if history else []
+        healthy = True
+        try:
+            yield pooled.client
+        except Exception as e:
+            healthy = not _is_transport_error(e)
+            raise
+        finally:
+            self.release(pooled, healthy=healthy)
+
+    def close(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                pooled.client.transport.session.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+
+
+_pools: dict[str, PacClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pac_pool(wsdl_url: str) -> PacClientPool:
+    pool = _pools.get(wsdl_url)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(wsdl_url)
+            if pool is None:
+                pool = _pools[wsdl_url] = PacClientPool(wsdl_url)
+    return pool
+
+
+@contextmanager
+def pac_client(wsdl_url: str, history=None):
+    """
+    Presta un cliente zeep del pool del WSDL indicado con el HistoryPlugin del
+    llamador. Uso: `with pac_client(self.wsdl_timbrado, self.history) as c:`.
+    """
+    with get_pac_pool(wsdl_url).client(history) as client:
+        yield client
+
+
+def close_pac_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def _is_transport_error(exc: Exception) -> bool:
+    current = exc
+    while current:
+        if isinstance(current, requests.exceptions.RequestException):
+            return True
+        current = current.__cause__ or current.__context__
+    return is_pac_timeout_error(exc)
+
+
 def is_pac_timeout_error(exc: Exception) -> bool:
     current = exc
     while current:
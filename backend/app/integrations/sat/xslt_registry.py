@@ -0,0 +1,104 @@
+"""
+Registro compartido de transformaciones XSLT del SAT (cadena original).
+
+Los servicios de timbrado (BillingService, CartaPorteService y
+PaymentComplementService) generaban la cadena original parseando y compilando
+`cadenaoriginal_4_0.xslt.xml` (con sus includes de Carta Porte y Pagos) en cada
+sello. Este módulo parsea la hoja de estilos una sola vez por proceso y la
+re-compila únicamente cuando cambia algún archivo de la carpeta
+(invalidación por mtime).
+
+Los objetos `etree.XSLT` de lxml no deben usarse de forma concurrente desde
+varios hilos, así que el documento parseado se comparte y el transform
+compilado se guarda por hilo (threading.local), manteniendo el costo de
+compilación en una vez por hilo/versión.
+"""
+
+import threading
+from pathlib import Path
+
+from lxml import etree
+
+XSLT_BASE_DIR = Path(__file__).parent / "cadenas_sat_originales_base"
+CADENA_ORIGINAL_CFDI_40 = XSLT_BASE_DIR / "cadenaoriginal_4_0.xslt.xml"
+
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>'
+
+_lock = threading.Lock()
+_documentos: dict[str, tuple[tuple, etree._ElementTree]] = {}
+_local = threading.local()
+
+
+def _secure_parser() -> etree.XMLParser:
+    return etree.XMLParser(load_dtd=False, no_network=True, resolve_entities=False)
+
+
+def _firma_archivos(xslt_path: Path) -> tuple:
+    """
+    Versión de la hoja de estilos: mtimes del XSLT principal y de los archivos
+    hermanos que incluye (utilerias, carta porte, pagos).
+    """
+    archivos = sorted(xslt_path.parent.glob("*.xslt*"))
+    if xslt_path not in archivos:
+        archivos.append(xslt_path)
+    return tuple((p.name, p.stat().st_mtime_ns) for p in archivos)
+
+
+def _documento_xslt(xslt_path: Path) -> tuple[tuple, etree._ElementTree]:
+    key = str(xslt_path)
+    firma = _firma_archivos(xslt_path)
+
+    cached = _documentos.get(key)
+    if cached and cached[0] == firma:
+        return cached
+
+    with _lock:
+        cached = _documentos.get(key)
+        if cached and cached[0] == firma:
+            return cached
+        doc = etree.parse(str(xslt_path), parser=_secure_parser())
+        _documentos[key] = (firma, doc)
+        return firma, doc
+
+
+def get_transform(xslt_path: Path = CADENA_ORIGINAL_CFDI_40) -> etree.XSLT:
+    """
+    Devuelve el transform compilado para `xslt_path`, cacheado por hilo y
+    versión de archivo. Lanza FileNotFoundError si la hoja no existe.
+    """
+    xslt_path = Path(xslt_path)
+    if not xslt_path.exists():
+        raise FileNotFoundError(f"XSLT no encontrado en {xslt_path}")
+
+    firma, doc = _documento_xslt(xslt_path)
+
+    transforms = getattr(_local, "transforms", None)
+    if transforms is None:
+        transforms = _local.transforms = {}
+
+    key = str(xslt_path)
+    cached = transforms.get(key)
+    if cached and cached[0] == firma:
+        return cached[1]
+
+    transform = etree.XSLT(doc)
+    transforms[key] = (firma, transform)
+    return transform
+
+
+def generar_cadena_original(
+    xml_bytes: bytes, xslt_path: Path = CADENA_ORIGINAL_CFDI_40
+) -> str:
+    """Aplica el XSLT del SAT al comprobante y devuelve la cadena original limpia."""
+    transform = get_transform(xslt_path)
+    xml_doc = etree.fromstring(xml_bytes, parser=_secure_parser())
+    return (
+        str(transform(xml_doc)).replace(_XML_DECLARATION, "").replace("\n", "").strip()
+    )
+
+
+def clear_cache():
+    """Descarta todas las hojas parseadas (los transforms por hilo se recompilan solos)."""
+    with _lock:
+        _documentos.clear()
+    _local.transforms = {}
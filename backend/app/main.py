@@ -29,6 +29,7 @@ from app.modules.purchases.router import router as purchases_router
 
 # 2. importacion de Routers de Integraciones Externas
 from app.integrations.sat.router import router as sat_router
+from app.integrations.sat.catalog_index import precargar_indices
 
 app = FastAPI(
     title="TMS Backend Rapidos 3T",
@@ -55,6 +56,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor de la siguiente página en búsquedas paginadas por keyset
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Seguridad y Usuarios (Users ahora es parte de Auth)
@@ -84,6 +87,12 @@ api_router.include_router(purchases_router, prefix="/purchases")
 app.include_router(api_router)
 
 
+@app.on_event("startup")
+def cargar_catalogos_sat():
+    # Índice en memoria de catálogos SAT; se llena en segundo plano
+    precargar_indices()
+
+
 @app.get("/")
 async def root():
     return {"message": "TMS API Rapidos 3T - ASICOM is running ..."}
@@ -28,7 +28,12 @@ from sqlalchemy import (
     UniqueConstraint,
     JSON,
 )
-from sqlalchemy.orm import relationship, declarative_mixin, declared_attr
+from sqlalchemy.orm import (
+    relationship,
+    declarative_mixin,
+    declared_attr,
+    selectinload,
+)
 from sqlalchemy.dialects.postgresql import JSONB, DOUBLE_PRECISION
 
 from app.db.database import Base
@@ -241,13 +246,21 @@ class AuditMixin:
         Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True
     )
 
+    # Perezosos: con "joined" cada consulta de casi cualquier modelo hacía dos
+    # LEFT JOIN a users por entidad. Quien muestre "creado por" los pide con
+    # `opciones_auditoria()`.
     @declared_attr
     def created_by(cls):
-        return relationship("User", foreign_keys=[cls.created_by_id], lazy="joined")
+        return relationship("User", foreign_keys=[cls.created_by_id], lazy="select")
 
     @declared_attr
     def updated_by(cls):
-        return relationship("User", foreign_keys=[cls.updated_by_id], lazy="joined")
+        return relationship("User", foreign_keys=[cls.updated_by_id], lazy="select")
+
+    @classmethod
+    def opciones_auditoria(cls):
+        """Carga creador y editor en una consulta aparte (IN), sin ensanchar el JOIN."""
+        return (selectinload(cls.created_by), selectinload(cls.updated_by))
 
 
 # =========================================================
@@ -696,7 +709,7 @@ class Trip(AuditMixin, Base):
 
     fecha_programada = Column(Date, nullable=True)
     start_date = Column(
-        DateTime(timezone=True), nullable=False, server_default=func.now()
+        DateTime(timezone=True), nullable=False, server_default=func.now(), index=True
     )
     closed_at = Column(DateTime(timezone=True))
     comprobante_entrega_url = Column(String(500), nullable=True)
@@ -737,7 +750,10 @@ class TripLeg(AuditMixin, Base):
 
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(
-        Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False
+        Integer,
+        ForeignKey("trips.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
 
     leg_type = Column(pg_enum(TripLegType, "triplegtype"), nullable=False)
@@ -795,7 +811,7 @@ class TripTimelineEvent(AuditMixin, Base):
         Integer, ForeignKey("trip_legs.id", ondelete="CASCADE"), nullable=False
     )
 
-    time = Column(DateTime(timezone=True), nullable=False)
+    time = Column(DateTime(timezone=True), nullable=False, index=True)
     event = Column(String(500), nullable=False)
     event_type = Column(String(20), default="info")
 
@@ -876,6 +892,8 @@ class BulkUploadHistory(AuditMixin, Base):
     upload_type = Column(String(50))
     status = Column(String(20))
     record_count = Column(Integer, default=0)
+    #  Contadores y mensaje de las cargas que se procesan en segundo plano
+    resumen = Column(JSONB, nullable=True)
 
     user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     user = relationship("User", foreign_keys=[user_id])
@@ -986,7 +1004,7 @@ class WorkOrder(AuditMixin, Base):
     fecha_apertura = Column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
-    fecha_cierre = Column(DateTime(timezone=True), nullable=True)
+    fecha_cierre = Column(DateTime(timezone=True), nullable=True, index=True)
     porcentaje_iva = Column(Float, default=16.0, server_default="16.0")
     subtotal = Column(Float, default=0.0)
     total = Column(Float, default=0.0)
@@ -1117,10 +1135,16 @@ class IndirectExpenseCategory(AuditMixin, Base):
 
 class PayableInvoice(AuditMixin, Base):
     __tablename__ = "payable_invoices"
+    __table_args__ = (
+        Index("ix_payable_invoices_fecha_vencimiento_id", "fecha_vencimiento", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     supplier_id = Column(
-        Integer, ForeignKey("suppliers.id", ondelete="RESTRICT"), nullable=True
+        Integer,
+        ForeignKey("suppliers.id", ondelete="RESTRICT"),
+        nullable=True,
+        index=True,
     )
     viaje_id = Column(
         Integer, ForeignKey("trips.id", ondelete="SET NULL"), nullable=True
@@ -1330,6 +1354,7 @@ class InvoicePayment(AuditMixin, Base):
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (Index("ix_audit_logs_created_at_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(
@@ -1502,7 +1527,7 @@ class FuelLog(AuditMixin, Base):
     )
 
     fecha_hora = Column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
     )
     estacion = Column(String(200), nullable=False)
     tipo_combustible = Column(String(20), nullable=False)
@@ -1571,7 +1596,10 @@ class ReceivableInvoice(AuditMixin, Base):
     id = Column(Integer, primary_key=True, index=True)
 
     client_id = Column(
-        Integer, ForeignKey("clients.id", ondelete="RESTRICT"), nullable=False
+        Integer,
+        ForeignKey("clients.id", ondelete="RESTRICT"),
+        nullable=False,
+        index=True,
     )
     sub_client_id = Column(
         Integer, ForeignKey("sub_clients.id", ondelete="RESTRICT"), nullable=True
@@ -1624,6 +1652,8 @@ class ReceivableInvoice(AuditMixin, Base):
 
     pdf_url = Column(String(500))
     xml_url = Column(String(500))
+    # Render asíncrono del PDF: PENDIENTE -> GENERADO | ERROR
+    pdf_status = Column(String(20), nullable=True)
 
     metodo_pago = Column(String(5), nullable=True)  # PUE o PPD
     forma_pago = Column(String(5), nullable=True)  # 01, 03, 99...
@@ -1701,6 +1731,100 @@ class SatRetryQueue(AuditMixin, Base):
     trip = relationship("Trip")
 
 
+class FolioSequence(Base):
+    """Contador de folios por serie (CP, F, COM...). Sustituye a folio_actual_{serie}."""
+
+    __tablename__ = "folio_sequences"
+
+    serie = Column(String(10), primary_key=True)
+    ultimo_folio = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+
+class FolioReservation(Base):
+    """Bitácora de folios reservados; base para auditar huecos en la numeración."""
+
+    __tablename__ = "folio_reservations"
+    __table_args__ = (
+        UniqueConstraint("serie", "folio", name="uq_folio_reservations_serie_folio"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    serie = Column(String(10), nullable=False)
+    folio = Column(Integer, nullable=False)
+    origen = Column(String(120), nullable=True)  # servicio / proceso que reservó
+    status = Column(
+        String(20), nullable=False, default="RESERVADO", server_default="RESERVADO"
+    )  # RESERVADO, ANULADO
+    motivo = Column(Text, nullable=True)
+    reserved_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    resolved_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class DashboardDailyRollup(Base):
+    """KPIs del dashboard pre-agregados por día y dimensión (dashboard/rollups.py)."""
+
+    __tablename__ = "dashboard_daily_rollups"
+    __table_args__ = (
+        Index("ix_dashboard_daily_rollups_dimension_dia", "dimension", "dia"),
+    )
+
+    dia = Column(Date, primary_key=True)
+    # GLOBAL, CLIENTE, OPERADOR, MECANICO
+    dimension = Column(String(20), primary_key=True)
+    # id del cliente / operador / mecánico; 0 en GLOBAL
+    dimension_id = Column(Integer, primary_key=True, default=0)
+
+    trips = Column(Integer, nullable=False, default=0, server_default="0")
+    revenue = Column(Float, nullable=False, default=0.0, server_default="0")
+    on_time = Column(Integer, nullable=False, default=0, server_default="0")
+    late = Column(Integer, nullable=False, default=0, server_default="0")
+    tramos_ruta = Column(Integer, nullable=False, default=0, server_default="0")
+    full_count = Column(Integer, nullable=False, default=0, server_default="0")
+    sencillo_count = Column(Integer, nullable=False, default=0, server_default="0")
+    incidents = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Combustible conciliado: mín/máx por día para recomponer cualquier rango
+    fuel_tickets = Column(Integer, nullable=False, default=0, server_default="0")
+    odometro_min = Column(Integer, nullable=True)
+    odometro_max = Column(Integer, nullable=True)
+    litros = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    ordenes_cerradas = Column(Integer, nullable=False, default=0, server_default="0")
+    gasto_taller = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+
+class ConsolidatedBalance(Base):
+    """Deuda vigente por cliente / proveedor (finance/balances.py)."""
+
+    __tablename__ = "consolidated_balances"
+
+    # "clientes" (CxC) o "proveedores" (CxP)
+    tipo = Column(String(20), primary_key=True)
+    entidad_id = Column(Integer, primary_key=True)
+    deuda_total = Column(Float, nullable=False, default=0.0, server_default="0")
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+
 class ReceivableInvoicePayment(AuditMixin, Base):
     __tablename__ = "receivable_invoice_payments"
 
@@ -1729,6 +1853,8 @@ class ReceivableInvoicePayment(AuditMixin, Base):
     complemento_uuid = Column(String(36), nullable=True)
     comprobante_url = Column(String(500), nullable=True)
     folio_complemento = Column(String(50), nullable=True)
+    # Estado del render del PDF del complemento (PENDIENTE | GENERADO | ERROR)
+    pdf_status = Column(String(20), nullable=True)
 
     # NUEVO: CAMPOS DE ESTATUS Y CANCELACIÓN
     estatus = Column(String(50), default="ACTIVO", server_default="ACTIVO")
@@ -1791,10 +1917,18 @@ class BankAccount(AuditMixin, Base):
     saldo = Column(Float, default=0.0)
     estatus = Column(String(20), default="activo")
     tipo_cuenta = Column(String(50))
+    #  Columnas, formato de fecha y separadores del estado de cuenta del banco
+    layout_estado_cuenta = Column(JSONB, nullable=True)
 
 
 class BankMovement(AuditMixin, Base):
     __tablename__ = "bank_movements"
+    __table_args__ = (
+        Index("ix_bank_movements_cuenta_fecha_id", "bank_account_id", "fecha", "id"),
+        Index(
+            "ux_bank_movements_cuenta_huella", "bank_account_id", "huella", unique=True
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     bank_account_id = Column(
@@ -1811,6 +1945,8 @@ class BankMovement(AuditMixin, Base):
     conciliado = Column(Boolean, default=False, server_default="false")
     fecha_conciliacion = Column(Date, nullable=True)
     origen_modulo = Column(String(50), nullable=True)
+    #  Huella de la línea del estado de cuenta importado (evita duplicados)
+    huella = Column(String(40), nullable=True)
 
     bank_account = relationship("BankAccount", backref="movements")
 
@@ -1823,6 +1959,49 @@ class BankMovement(AuditMixin, Base):
         return self.bank_account.numero_cuenta if self.bank_account else None
 
 
+class BankAccountDailyBalance(Base):
+    """Saldo de cada cuenta bancaria al cierre de cada día con movimientos (finance/ledger.py)."""
+
+    __tablename__ = "bank_account_daily_balances"
+
+    bank_account_id = Column(
+        Integer, ForeignKey("bank_accounts.id", ondelete="CASCADE"), primary_key=True
+    )
+    dia = Column(Date, primary_key=True)
+    ingresos = Column(Float, nullable=False, default=0.0, server_default="0")
+    egresos = Column(Float, nullable=False, default=0.0, server_default="0")
+    movimientos = Column(Integer, nullable=False, default=0, server_default="0")
+    # Acumulado de los movimientos vigentes de la cuenta hasta este día
+    saldo_cierre = Column(Float, nullable=False, default=0.0, server_default="0")
+
+
+class BankReconciliation(AuditMixin, Base):
+    """
+    Liga de un movimiento bancario con el documento que lo explica (cobro o
+    factura de CxC, pago o factura de CxP). Un movimiento puede quedar
+    ligado a varios documentos (muchos a uno).
+    """
+
+    __tablename__ = "bank_reconciliations"
+    __table_args__ = (
+        Index("ix_bank_reconciliations_documento", "tipo_documento", "documento_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    bank_movement_id = Column(
+        Integer,
+        ForeignKey("bank_movements.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    tipo_documento = Column(String(20), nullable=False)
+    documento_id = Column(Integer, nullable=False)
+    monto = Column(Float, nullable=False)
+    score = Column(Float, nullable=True)
+
+    movement = relationship("BankMovement", backref="reconciliations")
+
+
 class UserNotification(AuditMixin, Base):
     """
     Historial centralizado de alertas, incidencias y tracking enviado.
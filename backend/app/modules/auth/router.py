@@ -7,7 +7,9 @@ from fastapi import (
     HTTPException,
     status,
     Body,
+    Query,
     Request,
+    Response,
     UploadFile,
     File,
 )
@@ -19,6 +21,7 @@ from app.core.security import verify_password
 import requests  # <-- NUEVO: Para hacer la petición a Google reCAPTCHA
 
 from app.db.database import get_db
+from app.db.pagination import paginar_keyset, publicar_cursor
 from app.models import models
 from app.core import security
 from app.core.config import settings
@@ -493,17 +496,39 @@ def read_role_permissions(role_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/audit-logs")
-def get_audit_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_audit_logs(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    modulo: Optional[str] = None,
+    tipo_accion: Optional[str] = None,
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Bitácora del más reciente al más antiguo. La siguiente página viaja en el
+    header X-Next-Cursor (mandarlo como `cursor`).
+    """
     from sqlalchemy.orm import joinedload
 
-    logs = (
-        db.query(models.AuditLog)
-        .options(joinedload(models.AuditLog.user))
-        .order_by(models.AuditLog.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    query = db.query(models.AuditLog).options(joinedload(models.AuditLog.user))
+    if modulo:
+        query = query.filter(models.AuditLog.modulo == modulo)
+    if tipo_accion:
+        query = query.filter(models.AuditLog.tipo_accion == tipo_accion)
+    if user_id:
+        query = query.filter(models.AuditLog.user_id == user_id)
+
+    logs, siguiente = paginar_keyset(
+        query,
+        [models.AuditLog.created_at, models.AuditLog.id],
+        cursor,
+        limit,
+        descendente=True,
+        skip=skip,
     )
+    publicar_cursor(response, siguiente)
 
     result = []
     for log in logs:
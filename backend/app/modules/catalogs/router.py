@@ -71,6 +71,7 @@ from . import schemas
 from typing import List
 import json
 from app.modules.auth.router import get_current_active_user
+from app.integrations.sat.fiscal_config import invalidar_fiscal_config
 
 # =========================================================
 # CONSTANTES
@@ -182,6 +183,7 @@ def upsert_system_config(
 
     config.updated_by_id = current_user.id
     db.commit()
+    invalidar_fiscal_config([key])
     db.refresh(config)
     return config
 
@@ -238,6 +240,7 @@ def update_system_config_bulk(
             db.add(new_config)
 
     db.commit()
+    invalidar_fiscal_config([item.key for item in payload])
     return {"message": "Configuraciones actualizadas correctamente"}
 
 
@@ -0,0 +1,201 @@
+"""
+Caché de respuestas del dashboard.
+
+`/dashboard/stats` y `/dashboard/stats/costs-by-ceco` se consultan en la
+pantalla de inicio de cada usuario y todos reciben lo mismo. Cada respuesta
+se guarda por (endpoint, rango de fechas) durante
+`DASHBOARD_CACHE_TTL_SECONDS`:
+
+- Cada endpoint lleva un número de versión. Un commit que toca viajes,
+  tramos, monitoreo, combustible, taller, cuentas por pagar, centros de
+  costo o la llave `meta_diaria_ventas` incrementa la versión de los
+  endpoints afectados y sus entradas dejan de servirse.
+- Un cálculo que empezó antes de una invalidación se guarda con la versión
+  que leyó, así que nunca se sirve después de ella.
+- Las entradas vencidas se borran al leerlas y al guardar otra; si aun así
+  se llega a `DASHBOARD_CACHE_MAX_ENTRIES` (el rango de fechas lo elige el
+  cliente), se descarta la más antigua.
+- La invalidación solo llega al proceso que hizo el commit (y no ve SQL
+  fuera del ORM); con varios workers el TTL limita cuánto vive una
+  respuesta vieja en los demás.
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.models import (
+    CostCenter,
+    FuelLog,
+    PayableInvoice,
+    SystemConfig,
+    Trip,
+    TripLeg,
+    TripTimelineEvent,
+    WorkOrder,
+    WorkOrderPart,
+)
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+DASHBOARD_CACHE_ENABLED = os.getenv("DASHBOARD_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+DASHBOARD_CACHE_TTL_SECONDS = _float_env("DASHBOARD_CACHE_TTL_SECONDS", 30.0)
+DASHBOARD_CACHE_MAX_ENTRIES = max(
+    1, int(_float_env("DASHBOARD_CACHE_MAX_ENTRIES", 256))
+)
+
+ENDPOINT_STATS = "stats"
+ENDPOINT_COSTS_BY_CECO = "costs-by-ceco"
+
+# Qué endpoints invalida un cambio en cada modelo
+_DEPENDENCIAS = {
+    Trip: (ENDPOINT_STATS,),
+    TripLeg: (ENDPOINT_STATS,),
+    TripTimelineEvent: (ENDPOINT_STATS,),
+    FuelLog: (ENDPOINT_STATS,),
+    WorkOrder: (ENDPOINT_STATS,),
+    WorkOrderPart: (ENDPOINT_STATS,),
+    PayableInvoice: (ENDPOINT_COSTS_BY_CECO,),
+    CostCenter: (ENDPOINT_COSTS_BY_CECO,),
+}
+META_DIARIA_KEY = "meta_diaria_ventas"
+_PENDIENTES = "dashboard_cache_pendientes"
+
+_lock = threading.Lock()
+_versiones = {ENDPOINT_STATS: 1, ENDPOINT_COSTS_BY_CECO: 1}
+# (endpoint, clave) -> (versión, guardado_en, respuesta), en orden de guardado
+_entradas: dict = {}
+_contadores = {
+    endpoint: {"hits": 0, "misses": 0, "invalidaciones": 0} for endpoint in _versiones
+}
+
+
+def _vigente(llave: tuple, entrada: tuple, ahora: float) -> bool:
+    return (
+        entrada[0] == _versiones[llave[0]]
+        and ahora - entrada[1] < DASHBOARD_CACHE_TTL_SECONDS
+    )
+
+
+def _guardar(llave: tuple, entrada: tuple):
+    """Guarda la entrada sin pasar del tope. Requiere `_lock`."""
+    _entradas.pop(llave, None)
+    if len(_entradas) >= DASHBOARD_CACHE_MAX_ENTRIES:
+        ahora = time.monotonic()
+        for vieja in [k for k, e in _entradas.items() if not _vigente(k, e, ahora)]:
+            del _entradas[vieja]
+    while len(_entradas) >= DASHBOARD_CACHE_MAX_ENTRIES:
+        # La más antigua primero: los dicts conservan el orden de inserción
+        del _entradas[next(iter(_entradas))]
+    _entradas[llave] = entrada
+
+
+def obtener(endpoint: str, clave: tuple, calcular):
+    """Respuesta en caché para (endpoint, clave) o el resultado de `calcular()`."""
+    if not DASHBOARD_CACHE_ENABLED:
+        return calcular()
+
+    llave = (endpoint, clave)
+    with _lock:
+        version = _versiones[endpoint]
+        entrada = _entradas.get(llave)
+        if entrada is not None:
+            if _vigente(llave, entrada, time.monotonic()):
+                _contadores[endpoint]["hits"] += 1
+                return entrada[2]
+            del _entradas[llave]
+        _contadores[endpoint]["misses"] += 1
+
+    # Fuera del lock: un cálculo lento no bloquea los hits de otras llaves
+    respuesta = calcular()
+
+    with _lock:
+        if _versiones[endpoint] == version:
+            _guardar(llave, (version, time.monotonic(), respuesta))
+    return respuesta
+
+
+def invalidar(endpoints=None):
+    """Descarta las respuestas de los endpoints indicados (todos si es None)."""
+    with _lock:
+        for endpoint in endpoints or list(_versiones):
+            _versiones[endpoint] += 1
+            _contadores[endpoint]["invalidaciones"] += 1
+        vigentes = {
+            llave: entrada
+            for llave, entrada in _entradas.items()
+            if entrada[0] == _versiones[llave[0]]
+        }
+        _entradas.clear()
+        _entradas.update(vigentes)
+
+
+def metricas_cache() -> dict:
+    """Hits, misses e invalidaciones por endpoint, más el tamaño actual."""
+    with _lock:
+        por_endpoint = {}
+        for endpoint, contadores in _contadores.items():
+            consultas = contadores["hits"] + contadores["misses"]
+            por_endpoint[endpoint] = {
+                **contadores,
+                "hit_rate": (
+                    round(contadores["hits"] / consultas, 4) if consultas else None
+                ),
+                "entradas": sum(1 for llave in _entradas if llave[0] == endpoint),
+            }
+        return {
+            "habilitado": DASHBOARD_CACHE_ENABLED,
+            "ttl_segundos": DASHBOARD_CACHE_TTL_SECONDS,
+            "max_entradas": DASHBOARD_CACHE_MAX_ENTRIES,
+            "endpoints": por_endpoint,
+        }
+
+
+# ==========================================================================
+# INVALIDACIÓN POR EVENTOS DE SESIÓN
+# ==========================================================================
+
+
+def _endpoints_afectados(obj) -> tuple:
+    if isinstance(obj, SystemConfig):
+        return (ENDPOINT_STATS,) if obj.key == META_DIARIA_KEY else ()
+    return _DEPENDENCIAS.get(type(obj), ())
+
+
+@event.listens_for(Session, "after_flush")
+def _marcar_endpoints(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        endpoints = _endpoints_afectados(obj)
+        if endpoints:
+            session.info.setdefault(_PENDIENTES, set()).update(endpoints)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session):
+    # Liberar un savepoint también dispara after_commit: se espera al commit real
+    if session.in_nested_transaction():
+        return
+    endpoints = session.info.pop(_PENDIENTES, None)
+    if endpoints:
+        invalidar(endpoints)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_pendientes(session, previous_transaction):
+    # Un savepoint revertido (p. ej. el recálculo de rollups) no descarta lo
+    # que ya cambió la transacción externa
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDIENTES, None)
@@ -0,0 +1,480 @@
+"""
+Rollups diarios de KPIs del dashboard (`dashboard_daily_rollups`).
+
+Una fila por día y dimensión:
+
+- GLOBAL (dimension_id 0): viajes, ingresos, a tiempo / con retraso,
+  tramos de ruta full / sencillo, incidencias y combustible conciliado.
+- CLIENTE: viajes e ingresos.
+- OPERADOR: viajes distintos, ingresos, incidencias y combustible.
+- MECANICO: órdenes cerradas y gasto en refacciones.
+
+El combustible guarda odómetro mínimo y máximo por día: el rendimiento de
+cualquier rango sale de min(mín), max(máx) y sum(litros), igual que si se
+calculara sobre los tickets. Un viaje pertenece a un solo día, así que
+sumar días nunca lo cuenta dos veces.
+
+Mantenimiento incremental: los cambios ORM a Trip, TripLeg,
+TripTimelineEvent, FuelLog, WorkOrder y WorkOrderPart marcan los días
+afectados (valor anterior y nuevo) y, antes del commit, esos días se
+recalculan desde las tablas base en la misma transacción, con un advisory
+lock por día. Lo que no pasa por el ORM (updates masivos, SQL manual) lo
+corrige `reconciliar_kpis_dashboard.py`, pensado para correr cada noche.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import (
+    DateTime,
+    and_,
+    case,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    literal,
+    select,
+)
+from sqlalchemy.orm import Session
+
+from app.models.models import (
+    DashboardDailyRollup,
+    FuelLog,
+    RecordStatus,
+    Trip,
+    TripLeg,
+    TripStatus,
+    TripTimelineEvent,
+    Unit,
+    WorkOrder,
+    WorkOrderPart,
+    WorkOrderStatus,
+)
+
+logger = logging.getLogger("dashboard.rollups")
+
+DIMENSION_GLOBAL = "GLOBAL"
+DIMENSION_CLIENTE = "CLIENTE"
+DIMENSION_OPERADOR = "OPERADOR"
+DIMENSION_MECANICO = "MECANICO"
+
+INCIDENT_EVENT_TYPES = ["warning", "danger", "incidencia", "alerta", "retraso"]
+
+# Primer entero del advisory lock (el segundo es el día)
+_LOCK_ROLLUPS = 7_301_015
+_PENDIENTES = "dashboard_rollups_pendientes"
+
+_METRICAS = (
+    "trips",
+    "revenue",
+    "on_time",
+    "late",
+    "tramos_ruta",
+    "full_count",
+    "sencillo_count",
+    "incidents",
+    "fuel_tickets",
+    "odometro_min",
+    "odometro_max",
+    "litros",
+    "ordenes_cerradas",
+    "gasto_taller",
+)
+
+
+# ==========================================================================
+# CÁLCULO DE UN DÍA DESDE LAS TABLAS BASE
+# ==========================================================================
+
+
+def _en_dia(columna, dia: date):
+    # Rango en lugar de date(col) = dia: así se usan los índices de fecha
+    return and_(columna >= dia, columna < dia + timedelta(days=1))
+
+
+def calcular_dia(db: Session, dia: date) -> dict:
+    """Filas del día como {(dimension, dimension_id): {metrica: valor}}."""
+    filas: dict = {}
+
+    def fila(dimension: str, dimension_id: int) -> dict:
+        return filas.setdefault((dimension, dimension_id or 0), {})
+
+    viaje_vigente = and_(
+        _en_dia(Trip.start_date, dia), Trip.record_status != RecordStatus.ELIMINADO
+    )
+
+    # Viajes: global y por cliente
+    for r in (
+        db.query(
+            Trip.client_id,
+            func.count(Trip.id).label("trips"),
+            func.coalesce(func.sum(Trip.tarifa_base), 0).label("revenue"),
+            func.count(case((Trip.status == TripStatus.ENTREGADO, 1))).label("on_time"),
+            func.count(case((Trip.status == TripStatus.RETRASO, 1))).label("late"),
+        )
+        .filter(viaje_vigente)
+        .group_by(Trip.client_id)
+    ):
+        global_ = fila(DIMENSION_GLOBAL, 0)
+        for campo in ("trips", "revenue", "on_time", "late"):
+            global_[campo] = global_.get(campo, 0) + getattr(r, campo)
+        cliente = fila(DIMENSION_CLIENTE, r.client_id)
+        cliente["trips"] = r.trips
+        cliente["revenue"] = float(r.revenue)
+
+    # Configuración de los tramos de ruta (full vs sencillo)
+    config = (
+        db.query(
+            func.count(TripLeg.id).label("tramos_ruta"),
+            func.count(case((Unit.tipo_1.ilike("%full%"), 1))).label("full_count"),
+            func.count(case((~Unit.tipo_1.ilike("%full%"), 1))).label("sencillo_count"),
+        )
+        .join(Trip, TripLeg.trip_id == Trip.id)
+        .join(Unit, TripLeg.unit_id == Unit.id)
+        .filter(viaje_vigente, TripLeg.leg_type == "ruta_carretera")
+        .one()
+    )
+    if config.tramos_ruta:
+        fila(DIMENSION_GLOBAL, 0).update(config._asdict())
+
+    # Viajes distintos por operador
+    viajes_operador = (
+        db.query(
+            TripLeg.operator_id.label("operator_id"),
+            Trip.id.label("trip_id"),
+            Trip.tarifa_base.label("tarifa_base"),
+        )
+        .join(Trip, TripLeg.trip_id == Trip.id)
+        .filter(TripLeg.operator_id.isnot(None), viaje_vigente)
+        .distinct()
+        .subquery()
+    )
+    for r in db.query(
+        viajes_operador.c.operator_id,
+        func.count().label("trips"),
+        func.coalesce(func.sum(viajes_operador.c.tarifa_base), 0).label("revenue"),
+    ).group_by(viajes_operador.c.operator_id):
+        operador = fila(DIMENSION_OPERADOR, r.operator_id)
+        operador["trips"] = r.trips
+        operador["revenue"] = float(r.revenue)
+
+    # Incidencias (Tabla Monitoreo): el operador es el del tramo
+    for r in (
+        db.query(TripLeg.operator_id, func.count(TripTimelineEvent.id).label("n"))
+        .join(TripLeg, TripTimelineEvent.trip_leg_id == TripLeg.id)
+        .filter(
+            _en_dia(TripTimelineEvent.time, dia),
+            TripTimelineEvent.event_type.in_(INCIDENT_EVENT_TYPES),
+        )
+        .group_by(TripLeg.operator_id)
+    ):
+        global_ = fila(DIMENSION_GLOBAL, 0)
+        global_["incidents"] = global_.get("incidents", 0) + r.n
+        if r.operator_id is not None:
+            fila(DIMENSION_OPERADOR, r.operator_id)["incidents"] = r.n
+
+    # Combustible conciliado
+    for r in (
+        db.query(
+            FuelLog.operator_id,
+            func.count(FuelLog.id).label("fuel_tickets"),
+            func.min(FuelLog.odometro).label("odometro_min"),
+            func.max(FuelLog.odometro).label("odometro_max"),
+            func.sum(FuelLog.litros).label("litros"),
+        )
+        .filter(
+            _en_dia(FuelLog.fecha_hora, dia),
+            FuelLog.record_status != RecordStatus.ELIMINADO,
+            FuelLog.is_conciliated == True,
+            FuelLog.odometro > 0,
+        )
+        .group_by(FuelLog.operator_id)
+    ):
+        valores = {
+            "fuel_tickets": r.fuel_tickets,
+            "odometro_min": r.odometro_min,
+            "odometro_max": r.odometro_max,
+            "litros": float(r.litros or 0.0),
+        }
+        if r.operator_id is not None:
+            fila(DIMENSION_OPERADOR, r.operator_id).update(valores)
+
+        global_ = fila(DIMENSION_GLOBAL, 0)
+        if not global_.get("fuel_tickets"):
+            global_.update(valores)
+        else:
+            global_["fuel_tickets"] += valores["fuel_tickets"]
+            global_["odometro_min"] = min(global_["odometro_min"], r.odometro_min)
+            global_["odometro_max"] = max(global_["odometro_max"], r.odometro_max)
+            global_["litros"] += valores["litros"]
+
+    # Taller: órdenes cerradas en el día por mecánico
+    for r in (
+        db.query(
+            WorkOrder.mechanic_id,
+            func.count(WorkOrder.id.distinct()).label("ordenes_cerradas"),
+            func.sum(
+                WorkOrderPart.cantidad * WorkOrderPart.costo_unitario_snapshot
+            ).label("gasto_taller"),
+        )
+        .outerjoin(WorkOrderPart, WorkOrderPart.work_order_id == WorkOrder.id)
+        .filter(
+            WorkOrder.mechanic_id.isnot(None),
+            WorkOrder.status == WorkOrderStatus.CERRADA,
+            _en_dia(WorkOrder.fecha_cierre, dia),
+        )
+        .group_by(WorkOrder.mechanic_id)
+    ):
+        mecanico = fila(DIMENSION_MECANICO, r.mechanic_id)
+        mecanico["ordenes_cerradas"] = r.ordenes_cerradas
+        mecanico["gasto_taller"] = float(r.gasto_taller or 0.0)
+
+    return filas
+
+
+def _normalizar(valores: dict) -> tuple:
+    return tuple(
+        (
+            round(float(valores[m]), 4)
+            if isinstance(valores.get(m), float)
+            else valores.get(m)
+        )
+        for m in _METRICAS
+    )
+
+
+def recalcular_dia(db: Session, dia: date) -> bool:
+    """
+    Reemplaza las filas del día con el cálculo desde las tablas base.
+    Devuelve True si el rollup guardado era distinto (para reconciliación).
+    """
+    db.execute(select(func.pg_advisory_xact_lock(_LOCK_ROLLUPS, dia.toordinal())))
+
+    nuevas = calcular_dia(db, dia)
+    actuales = {
+        (r.dimension, r.dimension_id): {m: getattr(r, m) for m in _METRICAS}
+        for r in db.execute(
+            select(DashboardDailyRollup.__table__).where(
+                DashboardDailyRollup.dia == dia
+            )
+        )
+    }
+    defaults = {m: 0 for m in _METRICAS}
+    defaults.update(odometro_min=None, odometro_max=None, litros=0.0)
+    completas = {clave: {**defaults, **valores} for clave, valores in nuevas.items()}
+
+    cambio = {k: _normalizar(v) for k, v in actuales.items()} != {
+        k: _normalizar(v) for k, v in completas.items()
+    }
+    if not cambio:
+        return False
+
+    # Core: los rollups no generan auditoría ni pasan por estos listeners
+    db.execute(
+        delete(DashboardDailyRollup.__table__).where(DashboardDailyRollup.dia == dia)
+    )
+    if completas:
+        db.execute(
+            insert(DashboardDailyRollup.__table__),
+            [
+                {"dia": dia, "dimension": dimension, "dimension_id": dimension_id, **v}
+                for (dimension, dimension_id), v in completas.items()
+            ],
+        )
+    return True
+
+
+def recalcular_dias(db: Session, dias) -> int:
+    """Recalcula varios días en orden (orden fijo de locks); devuelve cuántos cambiaron."""
+    return sum(recalcular_dia(db, dia) for dia in sorted(set(dias)))
+
+
+def reconciliar(db: Session, desde: date, hasta: date) -> dict:
+    """Recalcula cada día del rango con commit por día y reporta las diferencias."""
+    dias_con_diferencia = []
+    dia = desde
+    while dia <= hasta:
+        try:
+            if recalcular_dia(db, dia):
+                dias_con_diferencia.append(dia.isoformat())
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        dia += timedelta(days=1)
+
+    return {
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "dias_revisados": (hasta - desde).days + 1,
+        "dias_corregidos": len(dias_con_diferencia),
+        "detalle": dias_con_diferencia,
+    }
+
+
+def rango_con_datos(db: Session) -> tuple[date, date] | None:
+    """Primer y último día con registros en alguna tabla base del dashboard."""
+    fechas = [
+        fecha
+        for columna in (
+            Trip.start_date,
+            FuelLog.fecha_hora,
+            TripTimelineEvent.time,
+            WorkOrder.fecha_cierre,
+        )
+        for fecha in db.query(
+            func.min(func.date(columna)), func.max(func.date(columna))
+        ).one()
+        if fecha is not None
+    ]
+    return (min(fechas), max(fechas)) if fechas else None
+
+
+# ==========================================================================
+# MANTENIMIENTO INCREMENTAL (EVENTOS DE SESIÓN)
+# ==========================================================================
+
+# Columnas que mueven algún KPI; cambios a otras no recalculan nada
+_COLUMNAS = {
+    Trip: ("start_date", "status", "tarifa_base", "client_id", "record_status"),
+    TripLeg: ("trip_id", "operator_id", "unit_id", "leg_type"),
+    TripTimelineEvent: ("time", "event_type", "trip_leg_id"),
+    FuelLog: (
+        "fecha_hora",
+        "operator_id",
+        "odometro",
+        "litros",
+        "is_conciliated",
+        "record_status",
+    ),
+    WorkOrder: ("fecha_cierre", "status", "mechanic_id"),
+    WorkOrderPart: ("work_order_id", "cantidad", "costo_unitario_snapshot"),
+}
+_COLUMNA_FECHA = {
+    Trip: "start_date",
+    TripTimelineEvent: "time",
+    FuelLog: "fecha_hora",
+    WorkOrder: "fecha_cierre",
+}
+
+
+def _valores(estado, columna: str) -> list:
+    # Sin cargar nada: solo lo que la sesión ya tiene (anterior y nuevo)
+    return [v for v in estado.attrs[columna].history.sum() if v is not None]
+
+
+@event.listens_for(Session, "after_flush")
+def _marcar_dias_afectados(session, flush_context):
+    pendientes = None
+
+    for obj, es_edicion in (
+        *((o, False) for o in session.new),
+        *((o, True) for o in session.dirty),
+        *((o, False) for o in session.deleted),
+    ):
+        modelo = type(obj)
+        columnas = _COLUMNAS.get(modelo)
+        if columnas is None:
+            continue
+        estado = inspect(obj)
+        if es_edicion and not any(
+            estado.attrs[c].history.has_changes() for c in columnas
+        ):
+            continue
+
+        if pendientes is None:
+            pendientes = session.info.setdefault(
+                _PENDIENTES, {"fechas": set(), "ids": {}}
+            )
+        if modelo in _COLUMNA_FECHA:
+            pendientes["fechas"].update(
+                v
+                for v in _valores(estado, _COLUMNA_FECHA[modelo])
+                if isinstance(v, datetime)
+            )
+        if obj.id is not None:
+            pendientes["ids"].setdefault(modelo, set()).add(obj.id)
+        if modelo is TripLeg:
+            pendientes["ids"].setdefault(Trip, set()).update(
+                _valores(estado, "trip_id")
+            )
+        if modelo is WorkOrderPart:
+            pendientes["ids"].setdefault(WorkOrder, set()).update(
+                _valores(estado, "work_order_id")
+            )
+
+
+def _dias_pendientes(session: Session, pendientes: dict) -> set:
+    # Los días se calculan en la BD: date() usa la zona de la sesión, igual que
+    # el recálculo
+    consultas = [
+        select(func.date(literal(fecha, DateTime(timezone=True))))
+        for fecha in pendientes["fechas"]
+    ]
+
+    ids = pendientes["ids"]
+    if ids.get(Trip):
+        consultas.append(
+            select(func.date(Trip.start_date)).where(Trip.id.in_(ids[Trip]))
+        )
+    if ids.get(FuelLog):
+        consultas.append(
+            select(func.date(FuelLog.fecha_hora)).where(FuelLog.id.in_(ids[FuelLog]))
+        )
+    if ids.get(TripTimelineEvent):
+        consultas.append(
+            select(func.date(TripTimelineEvent.time)).where(
+                TripTimelineEvent.id.in_(ids[TripTimelineEvent])
+            )
+        )
+    if ids.get(TripLeg):
+        # Cambiar el operador de un tramo mueve sus viajes y sus incidencias
+        consultas.append(
+            select(func.date(Trip.start_date))
+            .join(TripLeg, TripLeg.trip_id == Trip.id)
+            .where(TripLeg.id.in_(ids[TripLeg]))
+        )
+        consultas.append(
+            select(func.date(TripTimelineEvent.time)).where(
+                TripTimelineEvent.trip_leg_id.in_(ids[TripLeg])
+            )
+        )
+    if ids.get(WorkOrder):
+        consultas.append(
+            select(func.date(WorkOrder.fecha_cierre)).where(
+                WorkOrder.id.in_(ids[WorkOrder]), WorkOrder.fecha_cierre.isnot(None)
+            )
+        )
+
+    dias = set()
+    for consulta in consultas:
+        dias.update(d for d in session.execute(consulta).scalars() if d is not None)
+    return dias
+
+
+@event.listens_for(Session, "before_commit")
+def _recalcular_dias_pendientes(session):
+    # Liberar un savepoint también dispara before_commit: se espera al commit real
+    if session.in_nested_transaction():
+        return
+    # SessionLocal no hace autoflush: el flush del commit llega después de
+    # este evento, así que se adelanta para que marque los días afectados
+    session.flush()
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if not pendientes:
+        return
+
+    try:
+        with session.begin_nested():
+            recalcular_dias(session, _dias_pendientes(session, pendientes))
+    except Exception as e:
+        # El rollup nunca tumba la operación de negocio; la reconciliación nocturna lo corrige
+        logger.error(f"No se pudieron actualizar los rollups del dashboard: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_dias_pendientes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDIENTES, None)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, case
+from sqlalchemy.orm import Session, contains_eager, selectinload
+from sqlalchemy import and_, func
 from datetime import date, timedelta
 from typing import Optional
 import traceback
@@ -14,149 +14,151 @@ from app.models.models import (
     Client,
     Operator,
     TripLeg,
-    Unit,
-    FuelLog,
     RecordStatus,
     Mechanic,
-    WorkOrder,
-    WorkOrderPart,
-    WorkOrderStatus,
-    TripTimelineEvent,
     CostCenter,
     PayableInvoice,
+    DashboardDailyRollup,
+)
+from app.modules.dashboard import cache as dashboard_cache
+from app.modules.dashboard.rollups import (
+    DIMENSION_CLIENTE,
+    DIMENSION_GLOBAL,
+    DIMENSION_MECANICO,
+    DIMENSION_OPERADOR,
 )
 from app.modules.dashboard.schemas import DashboardData
 
 router = APIRouter()
 
 
+def _rollups(db: Session, dimension: str, start_date, end_date=None):
+    query = db.query(DashboardDailyRollup).filter(
+        DashboardDailyRollup.dimension == dimension,
+        DashboardDailyRollup.dia >= start_date,
+    )
+    if end_date is not None:
+        query = query.filter(DashboardDailyRollup.dia <= end_date)
+    return query
+
+
+def _operator_stats(db: Session, start_date, end_date) -> list:
+    """
+    Viajes, ingresos, incidencias y rendimiento por operador desde los
+    rollups diarios (dimensión OPERADOR).
+    """
+    R = DashboardDailyRollup
+    op_stats_data = []
+    for op in (
+        db.query(
+            Operator.id,
+            Operator.name,
+            func.sum(R.trips).label("trips"),
+            func.sum(R.revenue).label("revenue"),
+            func.sum(R.incidents).label("incidents"),
+            func.sum(R.fuel_tickets).label("tickets"),
+            func.min(R.odometro_min).label("min_odo"),
+            func.max(R.odometro_max).label("max_odo"),
+            func.sum(R.litros).label("litros"),
+        )
+        .join(R, and_(R.dimension_id == Operator.id, R.dimension == DIMENSION_OPERADOR))
+        .filter(R.dia.between(start_date, end_date), Operator.status != "inactivo")
+        .group_by(Operator.id, Operator.name)
+        .order_by(Operator.id)
+        .all()
+    ):
+        trips_count = op.trips or 0
+        tickets = op.tickets or 0
+
+        rend_real = 0.0
+
+        #   LA REGLA DE ORO: Si hay más de 1 ticket, calculamos. Si no, es 0.0
+        if tickets > 1:
+            distancia = op.max_odo - op.min_odo
+            litros_totales = float(op.litros or 0.0)
+
+            if litros_totales > 0 and distancia > 0:
+                rend_real = round((distancia / litros_totales), 2)
+
+        # Solo agregamos al operador a la gráfica si tiene algún viaje, o un rendimiento registrado
+        if trips_count > 0 or tickets > 0:
+            op_stats_data.append(
+                {
+                    "name": op.name,
+                    "shortName": op.name.split(" ")[0] if op.name else "N/A",
+                    "trips": trips_count,
+                    "incidents": op.incidents or 0,
+                    "onTimeRate": 95.0,
+                    "rendimiento_lectura": rend_real,  # Igualamos hasta tener API ECM
+                    "rendimiento_real": rend_real,
+                    "revenue": float(op.revenue or 0.0),
+                }
+            )
+    return op_stats_data
+
+
 @router.get("/stats", response_model=DashboardData)
 def get_dashboard_stats(
-    start_date: str = None, end_date: str = None, db: Session = Depends(get_db)
+    start_date: date = None, end_date: date = None, db: Session = Depends(get_db)
 ):
+    """
+    KPIs del dashboard leídos de `dashboard_daily_rollups` (días completos,
+    ambos extremos incluidos). Solo "servicios recientes" y la meta diaria
+    se consultan en vivo. La respuesta se cachea por rango (ver cache.py).
+    """
+    # 1. Ajuste de fechas por defecto
+    if not start_date:
+        start_date = date.today() - timedelta(days=120)
+    if not end_date:
+        end_date = date.today()
+
+    return dashboard_cache.obtener(
+        dashboard_cache.ENDPOINT_STATS,
+        (start_date, end_date),
+        lambda: _dashboard_stats(db, start_date, end_date),
+    )
+
+
+def _dashboard_stats(db: Session, start_date: date, end_date: date) -> dict:
     try:
-        # 1. Ajuste de fechas por defecto
-        if not start_date:
-            start_date = date.today() - timedelta(days=120)
-        if not end_date:
-            end_date = date.today()
+        R = DashboardDailyRollup
 
         # Total servicios y ganancias
-        base_query = db.query(Trip).filter(
-            Trip.start_date.between(start_date, end_date),
-            Trip.record_status != RecordStatus.ELIMINADO,
-        )
-        total_services = base_query.count()
-        total_revenue = (
-            db.query(func.sum(Trip.tarifa_base))
-            .filter(
-                Trip.start_date.between(start_date, end_date),
-                Trip.record_status != RecordStatus.ELIMINADO,
+        totales = (
+            _rollups(db, DIMENSION_GLOBAL, start_date, end_date)
+            .with_entities(
+                func.coalesce(func.sum(R.trips), 0).label("trips"),
+                func.coalesce(func.sum(R.revenue), 0.0).label("revenue"),
+                func.coalesce(func.sum(R.on_time), 0).label("on_time"),
+                func.coalesce(func.sum(R.late), 0).label("late"),
             )
-            .scalar()
-            or 0.0
+            .one()
         )
-
-        on_time = base_query.filter(Trip.status == "entregado").count()
-        late = base_query.filter(Trip.status == "retraso").count()
+        total_services = totales.trips
+        total_revenue = float(totales.revenue)
+        on_time = totales.on_time
+        late = totales.late
         on_time_percentage = (
             (on_time / total_services * 100) if total_services > 0 else 0
         )
 
         # Top Clientes
         top_clients = (
-            db.query(
+            _rollups(db, DIMENSION_CLIENTE, start_date, end_date)
+            .join(Client, Client.id == R.dimension_id)
+            .with_entities(
                 Client.razon_social.label("client"),
                 Client.razon_social.label("shortName"),
-                func.count(Trip.id).label("count"),
-                func.sum(Trip.tarifa_base).label("revenue"),
-            )
-            .join(Trip, Trip.client_id == Client.id)
-            .filter(
-                Trip.start_date.between(start_date, end_date),
-                Trip.record_status != RecordStatus.ELIMINADO,
+                func.sum(R.trips).label("count"),
+                func.sum(R.revenue).label("revenue"),
             )
             .group_by(Client.id)
-            .order_by(func.sum(Trip.tarifa_base).desc())
+            .order_by(func.sum(R.revenue).desc())
             .all()
         )
 
-        # --- 2. OPERATOR STATS (CÁLCULO EN PYTHON PURO) ---
-        op_stats_data = []
-        operadores = db.query(Operator).filter(Operator.status != "inactivo").all()
-
-        for op in operadores:
-            # A) Viajes y Revenue
-            trips_del_operador = (
-                db.query(Trip)
-                .join(TripLeg, TripLeg.trip_id == Trip.id)
-                .filter(
-                    TripLeg.operator_id == op.id,
-                    Trip.start_date.between(start_date, end_date),
-                    Trip.record_status != RecordStatus.ELIMINADO,
-                )
-                .distinct()
-                .all()
-            )
-
-            trips_count = len(trips_del_operador)
-            revenue = sum(t.tarifa_base for t in trips_del_operador)
-
-            # B) Incidencias (Tabla Monitoreo)
-            incidents = (
-                db.query(func.count(TripTimelineEvent.id))
-                .join(TripLeg, TripTimelineEvent.trip_leg_id == TripLeg.id)
-                .filter(
-                    TripLeg.operator_id == op.id,
-                    TripTimelineEvent.time.between(start_date, end_date),
-                    TripTimelineEvent.event_type.in_(
-                        ["warning", "danger", "incidencia", "alerta", "retraso"]
-                    ),
-                )
-                .scalar()
-                or 0
-            )
-
-            # C) RENDIMIENTO (SIN FALLAS - Lista extraída a Python)
-            fuel_logs_op = (
-                db.query(FuelLog.odometro, FuelLog.litros)
-                .filter(
-                    FuelLog.operator_id == op.id,
-                    FuelLog.fecha_hora.between(start_date, end_date),
-                    FuelLog.record_status != RecordStatus.ELIMINADO,
-                    FuelLog.is_conciliated == True,
-                    FuelLog.odometro > 0,
-                )
-                .all()
-            )
-
-            rend_real = 0.0
-
-            #   LA REGLA DE ORO: Si hay más de 1 ticket, calculamos. Si no, es 0.0
-            if len(fuel_logs_op) > 1:
-                odometros = [f.odometro for f in fuel_logs_op]
-                litros = [f.litros for f in fuel_logs_op]
-
-                distancia = max(odometros) - min(odometros)
-                litros_totales = sum(litros)
-
-                if litros_totales > 0 and distancia > 0:
-                    rend_real = round((distancia / litros_totales), 2)
-
-            # Solo agregamos al operador a la gráfica si tiene algún viaje, o un rendimiento registrado
-            if trips_count > 0 or len(fuel_logs_op) > 0:
-                op_stats_data.append(
-                    {
-                        "name": op.name,
-                        "shortName": op.name.split(" ")[0] if op.name else "N/A",
-                        "trips": trips_count,
-                        "incidents": incidents,
-                        "onTimeRate": 95.0,
-                        "rendimiento_lectura": rend_real,  # Igualamos hasta tener API ECM
-                        "rendimiento_real": rend_real,
-                        "revenue": float(revenue),
-                    }
-                )
+        # --- 2. OPERATOR STATS (ROLLUPS POR OPERADOR) ---
+        op_stats_data = _operator_stats(db, start_date, end_date)
 
         # Ordenamos a los operadores (Top 8 por ingresos)
         op_stats_data = sorted(op_stats_data, key=lambda x: x["revenue"], reverse=True)[
@@ -167,6 +169,10 @@ def get_dashboard_stats(
         recent = (
             db.query(Trip)
             .join(Client, Trip.client_id == Client.id)
+            .options(
+                contains_eager(Trip.client),
+                selectinload(Trip.legs).joinedload(TripLeg.operator),
+            )
             .filter(Trip.record_status != RecordStatus.ELIMINADO)
             .order_by(Trip.created_at.desc())
             .limit(10)
@@ -188,38 +194,25 @@ def get_dashboard_stats(
             META_DIARIA = 0.0
 
         daily_query = (
-            db.query(
-                func.date(Trip.start_date).label("day"),
-                func.sum(Trip.tarifa_base).label("revenue"),
-            )
-            .filter(
-                Trip.start_date.between(start_date, end_date),
-                Trip.record_status != RecordStatus.ELIMINADO,
-            )
-            .group_by(func.date(Trip.start_date))
-            .order_by(func.date(Trip.start_date).asc())
+            _rollups(db, DIMENSION_GLOBAL, start_date, end_date)
+            .filter(R.trips > 0)
+            .order_by(R.dia.asc())
             .all()
         )
 
         daily_revenue_data = [
-            {"day": str(d.day), "revenue": float(d.revenue or 0.0), "meta": META_DIARIA}
+            {"day": str(d.dia), "revenue": float(d.revenue or 0.0), "meta": META_DIARIA}
             for d in daily_query
         ]
 
         # --- 5. MÉTRICAS DE TALLER ---
         mechanic_query = (
-            db.query(
+            _rollups(db, DIMENSION_MECANICO, start_date, end_date)
+            .join(Mechanic, Mechanic.id == R.dimension_id)
+            .with_entities(
                 Mechanic.nombre.label("mechanic_name"),
-                func.count(WorkOrder.id.distinct()).label("ordenes_cerradas"),
-                func.sum(
-                    WorkOrderPart.cantidad * WorkOrderPart.costo_unitario_snapshot
-                ).label("gasto_total"),
-            )
-            .join(WorkOrder, WorkOrder.mechanic_id == Mechanic.id)
-            .outerjoin(WorkOrderPart, WorkOrderPart.work_order_id == WorkOrder.id)
-            .filter(
-                WorkOrder.status == WorkOrderStatus.CERRADA,
-                WorkOrder.fecha_cierre.between(start_date, end_date),
+                func.sum(R.ordenes_cerradas).label("ordenes_cerradas"),
+                func.sum(R.gasto_taller).label("gasto_total"),
             )
             .group_by(Mechanic.id)
             .all()
@@ -234,79 +227,50 @@ def get_dashboard_stats(
             for m in mechanic_query
         ]
 
-        # --- 3. MÉTRICAS MENSUALES PARA GRÁFICAS ---
-
-        # 1. Tendencia de Ingresos (Últimos 6 meses)
-        revenue_trend_query = (
-            db.query(
-                func.to_char(Trip.start_date, "YYYY-MM").label("month"),
-                func.sum(Trip.tarifa_base).label("revenue"),
-            )
-            .filter(
-                Trip.start_date >= (date.today() - timedelta(days=180)),
-                Trip.record_status != RecordStatus.ELIMINADO,
+        # --- 3. MÉTRICAS MENSUALES PARA GRÁFICAS (Últimos 6 meses) ---
+        mes = func.to_char(R.dia, "YYYY-MM")
+        mensual = (
+            _rollups(db, DIMENSION_GLOBAL, date.today() - timedelta(days=180))
+            .with_entities(
+                mes.label("month"),
+                func.sum(R.trips).label("trips"),
+                func.sum(R.revenue).label("revenue"),
+                func.sum(R.tramos_ruta).label("tramos_ruta"),
+                func.sum(R.full_count).label("fullCount"),
+                func.sum(R.sencillo_count).label("sencilloCount"),
+                func.sum(R.fuel_tickets).label("tickets"),
+                func.min(R.odometro_min).label("min_odo"),
+                func.max(R.odometro_max).label("max_odo"),
+                func.sum(R.litros).label("litros_tot"),
             )
-            .group_by(func.to_char(Trip.start_date, "YYYY-MM"))
+            .group_by(mes)
             .order_by("month")
             .all()
         )
+
+        # 1. Tendencia de Ingresos
         revenueTrend = [
             {"month": r.month, "revenue": float(r.revenue or 0.0)}
-            for r in revenue_trend_query
+            for r in mensual
+            if r.trips
         ]
 
         # 2. Configuración de Viaje (Full vs Sencillo)
-        config_query = (
-            db.query(
-                func.to_char(Trip.start_date, "YYYY-MM").label("month"),
-                func.count(case((Unit.tipo_1.ilike("%full%"), 1), else_=None)).label(
-                    "fullCount"
-                ),
-                func.count(case((~Unit.tipo_1.ilike("%full%"), 1), else_=None)).label(
-                    "sencilloCount"
-                ),
-            )
-            .join(TripLeg, TripLeg.trip_id == Trip.id)
-            .join(Unit, TripLeg.unit_id == Unit.id)
-            .filter(
-                Trip.start_date >= (date.today() - timedelta(days=180)),
-                Trip.record_status != RecordStatus.ELIMINADO,
-                TripLeg.leg_type == "ruta_carretera",
-            )
-            .group_by(func.to_char(Trip.start_date, "YYYY-MM"))
-            .order_by("month")
-            .all()
-        )
         tripConfigTrend = [
             {
                 "month": r.month,
                 "fullCount": r.fullCount,
                 "sencilloCount": r.sencilloCount,
             }
-            for r in config_query
+            for r in mensual
+            if r.tramos_ruta
         ]
 
-        # 3. Tendencia de Combustible (Arreglado para sacar Max/Min por mes en la BD)
-        fuel_query_global = (
-            db.query(
-                func.to_char(FuelLog.fecha_hora, "YYYY-MM").label("month"),
-                func.min(FuelLog.odometro).label("min_odo"),
-                func.max(FuelLog.odometro).label("max_odo"),
-                func.sum(FuelLog.litros).label("litros_tot"),
-            )
-            .filter(
-                FuelLog.fecha_hora >= (date.today() - timedelta(days=180)),
-                FuelLog.record_status != RecordStatus.ELIMINADO,
-                FuelLog.is_conciliated == True,
-                FuelLog.odometro > 0,
-            )
-            .group_by(func.to_char(FuelLog.fecha_hora, "YYYY-MM"))
-            .order_by("month")
-            .all()
-        )
-
+        # 3. Tendencia de Combustible (Max/Min por mes desde el mín/máx diario)
         fuelTrend = []
-        for r in fuel_query_global:
+        for r in mensual:
+            if not r.tickets:
+                continue
             dist = (r.max_odo or 0) - (r.min_odo or 0)
             lts = float(r.litros_tot or 0.0)
             rend = round((dist / lts), 2) if lts > 0 and dist > 0 else 0.0
@@ -388,6 +352,12 @@ def get_costs_by_ceco(db: Session = Depends(get_db)):
      TICKET 4: Devuelve la suma de Cuentas por Pagar agrupadas por Centro de Costos.
     Ideal para inyectar directo en un PieChart de React.
     """
+    return dashboard_cache.obtener(
+        dashboard_cache.ENDPOINT_COSTS_BY_CECO, (), lambda: _costs_by_ceco(db)
+    )
+
+
+def _costs_by_ceco(db: Session) -> list:
     try:
         # Usamos los modelos directamente, sin el prefijo "models."
         results = (
@@ -427,3 +397,8 @@ def get_costs_by_ceco(db: Session = Depends(get_db)):
 
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Error obteniendo stats de CECOs")
+
+
+@router.get("/stats/cache-metrics", summary="Métricas del caché del dashboard")
+def get_dashboard_cache_metrics():
+    return dashboard_cache.metricas_cache()
@@ -0,0 +1,172 @@
+"""
+Saldos consolidados por cliente y proveedor (`consolidated_balances`).
+
+La tabla guarda, por entidad, la suma de `saldo_pendiente` de sus facturas
+vigentes (CxC para clientes, CxP para proveedores). Los abonos, pagos,
+cancelaciones y reversas cambian el saldo de la factura vía ORM; cada commit
+que toca una factura recalcula antes de confirmar la deuda de los clientes
+o proveedores afectados (valor anterior y nuevo del dueño), con un advisory
+lock por entidad para que dos commits concurrentes no se pisen.
+
+`get_consolidated_balances` lee de aquí cuando
+`FINANCE_CONSOLIDATED_BALANCES_MATERIALIZED` está activo; si no, usa una
+sola consulta agrupada sobre las facturas. Con la bandera apagada la tabla
+no se mantiene (ni listeners ni importaciones): al encenderla hay que
+correr `reconstruir_saldos`, que repuebla la tabla completa (la migración
+la llena al crearla).
+"""
+
+import logging
+import os
+
+from sqlalchemy import delete, event, func, insert, inspect, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.models import (
+    ConsolidatedBalance,
+    PayableInvoice,
+    ReceivableInvoice,
+    RecordStatus,
+)
+
+logger = logging.getLogger("billing.audit")
+
+FINANCE_CONSOLIDATED_BALANCES_MATERIALIZED = os.getenv(
+    "FINANCE_CONSOLIDATED_BALANCES_MATERIALIZED", "false"
+).lower() in ("1", "true", "yes")
+
+TIPO_CLIENTES = "clientes"
+TIPO_PROVEEDORES = "proveedores"
+
+# tipo -> (modelo de factura, columna del dueño)
+FUENTES = {
+    TIPO_CLIENTES: (ReceivableInvoice, "client_id"),
+    TIPO_PROVEEDORES: (PayableInvoice, "supplier_id"),
+}
+_TIPO_POR_MODELO = {modelo: tipo for tipo, (modelo, _col) in FUENTES.items()}
+
+# Primer entero del advisory lock por tipo (el segundo es la entidad)
+_LOCKS = {TIPO_CLIENTES: 7_301_017, TIPO_PROVEEDORES: 7_301_018}
+_COLUMNAS = ("saldo_pendiente", "record_status")
+_PENDIENTES = "saldos_consolidados_pendientes"
+
+
+def deuda_por_entidad(tipo: str):
+    """Select (entidad_id, deuda) sobre las facturas vigentes del tipo."""
+    modelo, columna = FUENTES[tipo]
+    dueno = getattr(modelo, columna)
+    return (
+        select(
+            dueno.label("entidad_id"),
+            func.coalesce(func.sum(modelo.saldo_pendiente), 0.0).label("deuda"),
+        )
+        .where(dueno.isnot(None), modelo.record_status != RecordStatus.ELIMINADO)
+        .group_by(dueno)
+    )
+
+
+def recalcular_saldos(db: Session, tipo: str, entidad_ids) -> None:
+    """Recalcula la deuda de las entidades indicadas (upsert, 0 si ya no deben)."""
+    entidad_ids = sorted({i for i in entidad_ids if i is not None})
+    if not entidad_ids:
+        return
+
+    for entidad_id in entidad_ids:
+        db.execute(select(func.pg_advisory_xact_lock(_LOCKS[tipo], entidad_id)))
+
+    modelo, columna = FUENTES[tipo]
+    deudas = dict(
+        db.execute(
+            deuda_por_entidad(tipo).where(getattr(modelo, columna).in_(entidad_ids))
+        ).all()
+    )
+
+    stmt = pg_insert(ConsolidatedBalance.__table__).values(
+        [
+            {
+                "tipo": tipo,
+                "entidad_id": entidad_id,
+                "deuda_total": float(deudas.get(entidad_id) or 0.0),
+            }
+            for entidad_id in entidad_ids
+        ]
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["tipo", "entidad_id"],
+            set_={"deuda_total": stmt.excluded.deuda_total, "updated_at": func.now()},
+        )
+    )
+
+
+def reconstruir_saldos(db: Session) -> None:
+    """Reemplaza toda la tabla con la deuda calculada desde las facturas."""
+    tabla = ConsolidatedBalance.__table__
+    db.execute(delete(tabla))
+    for tipo in FUENTES:
+        deuda = deuda_por_entidad(tipo).subquery()
+        db.execute(
+            insert(tabla).from_select(
+                ["tipo", "entidad_id", "deuda_total"],
+                select(literal(tipo), deuda.c.entidad_id, deuda.c.deuda),
+            )
+        )
+
+
+# ==========================================================================
+# MANTENIMIENTO INCREMENTAL (EVENTOS DE SESIÓN)
+# ==========================================================================
+
+
+@event.listens_for(Session, "after_flush")
+def _marcar_entidades(session, flush_context):
+    if not FINANCE_CONSOLIDATED_BALANCES_MATERIALIZED:
+        return
+    for obj, es_edicion in (
+        *((o, False) for o in session.new),
+        *((o, True) for o in session.dirty),
+        *((o, False) for o in session.deleted),
+    ):
+        tipo = _TIPO_POR_MODELO.get(type(obj))
+        if tipo is None:
+            continue
+        columna = FUENTES[tipo][1]
+        estado = inspect(obj)
+        if es_edicion and not any(
+            estado.attrs[c].history.has_changes() for c in (*_COLUMNAS, columna)
+        ):
+            continue
+        # Dueño anterior y nuevo: mover una factura cambia dos saldos
+        duenos = [v for v in estado.attrs[columna].history.sum() if v is not None]
+        if not duenos and not estado.deleted:
+            duenos = [getattr(obj, columna)]
+        session.info.setdefault(_PENDIENTES, {}).setdefault(tipo, set()).update(duenos)
+
+
+@event.listens_for(Session, "before_commit")
+def _recalcular_entidades_pendientes(session):
+    if not FINANCE_CONSOLIDATED_BALANCES_MATERIALIZED:
+        return
+    # Liberar un savepoint también dispara before_commit: se espera al commit real
+    if session.in_nested_transaction():
+        return
+    # Sin autoflush, el flush del commit llega después de este evento
+    session.flush()
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if not pendientes:
+        return
+
+    try:
+        with session.begin_nested():
+            for tipo, entidad_ids in pendientes.items():
+                recalcular_saldos(session, tipo, entidad_ids)
+    except Exception as e:
+        # El saldo materializado nunca tumba el cobro o pago; se repara con reconstruir_saldos
+        logger.error(f"No se pudieron actualizar los saldos consolidados: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_entidades_pendientes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDIENTES, None)
@@ -0,0 +1,621 @@
+"""
+Importación de estados de cuenta bancarios.
+
+`POST /finance/bank-accounts/{account_id}/statement` recibe el archivo del
+banco y lo convierte en movimientos de la cuenta sin pasar por
+`create_bank_movement` (un bloqueo y un UPDATE del saldo por movimiento):
+
+- `filas_estado_cuenta` lee el archivo en streaming con el layout de la
+  cuenta (`BankAccount.layout_estado_cuenta`, ver `LayoutEstadoCuenta`):
+  CSV, Excel (`read_only`) u OFX/QFX (SGML o XML, una transacción
+  `<STMTTRN>` a la vez).
+- Cada línea lleva una huella: el FITID del banco en OFX; en CSV y Excel
+  fecha, tipo, monto, referencia y concepto más el número de repetición de
+  esa misma línea en el archivo (dos comisiones iguales el mismo día son
+  dos movimientos). La huella es única por cuenta: reimportar el archivo, o
+  uno que se traslapa, no duplica movimientos.
+- Por lote: `INSERT ... ON CONFLICT DO NOTHING RETURNING` y un solo UPDATE
+  del saldo de la cuenta con lo que sí entró, en la misma transacción; los
+  días del lote se recalculan en el libro de saldos (`ledger`).
+
+La huella solo existe en movimientos importados. Lo registrado a mano o por
+cobros y pagos (sin huella) se compara antes de insertar: una línea con el
+mismo tipo y monto, fecha a `_TOLERANCIA_DIAS` o menos y referencia
+compatible se reporta como posible duplicado y no entra ni al saldo ni al
+libro. Cada movimiento existente cubre a lo más una línea.
+"""
+
+import csv
+import hashlib
+import html
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+
+from openpyxl import load_workbook
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.modules.finance import ledger, sat_import, sat_reader
+
+logger = logging.getLogger(__name__)
+
+CARGA_ESTADO_CUENTA = "estado_cuenta"
+ORIGEN_ESTADO_CUENTA = "Estado de cuenta"
+ERROR_LECTURA = sat_reader.ERROR_LECTURA
+
+FORMATO_CSV = "csv"
+FORMATO_EXCEL = "excel"
+FORMATO_OFX = "ofx"
+_FORMATO_POR_EXTENSION = {
+    ".csv": FORMATO_CSV,
+    ".txt": FORMATO_CSV,
+    ".xlsx": FORMATO_EXCEL,
+    ".xlsm": FORMATO_EXCEL,
+    ".ofx": FORMATO_OFX,
+    ".qfx": FORMATO_OFX,
+}
+FORMATOS = tuple(_FORMATO_POR_EXTENSION)
+
+# Cabeceras más comunes de los bancos (ya normalizadas, ver `_normalizar`)
+COLUMNAS_DEFAULT = {
+    "fecha": ["fecha", "fecha operacion", "fecha de operacion", "fecha movimiento"],
+    "concepto": ["concepto", "descripcion", "detalle", "movimiento"],
+    "referencia": ["referencia", "referencia numerica", "no referencia", "folio"],
+    "cargo": ["cargo", "cargos", "retiro", "retiros"],
+    "abono": ["abono", "abonos", "deposito", "depositos"],
+    "monto": ["importe", "monto"],
+}
+FORMATOS_FECHA_DEFAULT = ["%d/%m/%Y", "%Y/%m/%d", "%d/%m/%y", "%Y%m%d"]
+
+_LOTE = 1000
+_MAX_ERRORES = 200
+# Días entre la fecha del banco y la registrada en el sistema
+_TOLERANCIA_DIAS = 3
+_FILAS_BUSQUEDA_CABECERA = 30
+_SEPARADORES = ",;|\t"
+_MESES = {
+    "ENE": 1, "JAN": 1, "FEB": 2, "MAR": 3, "ABR": 4, "APR": 4, "MAY": 5,
+    "JUN": 6, "JUL": 7, "AGO": 8, "AUG": 8, "SEP": 9, "SET": 9, "OCT": 10,
+    "NOV": 11, "DIC": 12, "DEC": 12,
+}  # fmt: skip
+_MES_TEXTO = re.compile(r"(?<=[-/ ])([A-Za-z]{3})[A-Za-z]*\.?(?=[-/ ])")
+_HORA = re.compile(r"[ T]\d{1,2}:\d{2}.*$")
+_NO_ALFANUMERICO = re.compile(r"[^0-9A-Z]+")
+_ETIQUETA_OFX = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+_LARGO_CONCEPTO = models.BankMovement.__table__.c.concepto.type.length
+_LARGO_REFERENCIA = models.BankMovement.__table__.c.referencia.type.length
+
+
+class EstadoCuentaInvalido(ValueError):
+    pass
+
+
+# =========================================================
+#  LAYOUT Y NORMALIZACIÓN DE CELDAS
+# =========================================================
+
+
+def _normalizar(texto) -> str:
+    """Cabecera sin acentos, en minúsculas y sin signos: "Depósitos ($)" -> "depositos"."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", texto).split())
+
+
+def _layout(layout: dict | None, extension: str) -> dict:
+    """Layout de la cuenta completado con los valores por omisión."""
+    layout = dict(layout or {})
+    columnas = {**COLUMNAS_DEFAULT, **(layout.get("columnas") or {})}
+    return {
+        "formato": layout.get("formato") or _FORMATO_POR_EXTENSION.get(extension),
+        "separador": layout.get("separador"),
+        "separador_decimal": layout.get("separador_decimal"),
+        "fila_cabecera": layout.get("fila_cabecera"),
+        "formato_fecha": layout.get("formato_fecha") or FORMATOS_FECHA_DEFAULT,
+        "columnas": {k: [_normalizar(c) for c in v] for k, v in columnas.items()},
+    }
+
+
+def _vacio(valor) -> bool:
+    return valor is None or str(valor).strip() == ""
+
+
+def _separador_decimal(texto: str) -> str:
+    """El último separador es decimal salvo que le sigan 3 dígitos (miles)."""
+    ultimo = max(texto.rfind("."), texto.rfind(","))
+    if ultimo < 0:
+        return "."
+    if len(texto) - ultimo - 1 == 3:
+        return "," if texto[ultimo] == "." else "."
+    return texto[ultimo]
+
+
+def _importe(valor, separador_decimal: str | None):
+    """
+    Importe de una celda: None si está vacía; acepta $, miles y (negativos).
+    Sin `separador_decimal` en el layout se deduce de cada valor.
+    """
+    if _vacio(valor):
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor).strip()
+    negativo = texto.startswith("(") and texto.endswith(")")
+    texto = re.sub(r"[^0-9.,-]", "", texto)
+    if not re.search(r"\d", texto):
+        if re.search(r"[A-Za-z]", str(valor)):
+            raise ValueError(f"Importe no reconocido: {valor}")
+        return None
+    decimal = separador_decimal or _separador_decimal(texto)
+    texto = texto.replace("," if decimal == "." else ".", "").replace(decimal, ".")
+    try:
+        importe = float(texto)
+    except ValueError:
+        raise ValueError(f"Importe no reconocido: {valor}")
+    return -abs(importe) if negativo else importe
+
+
+def _fecha(valor, formatos: list):
+    """Fecha de una celda (fecha de Excel, serial o texto); None si no se lee."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    if isinstance(valor, (int, float)):
+        return (datetime(1899, 12, 30) + timedelta(days=float(valor))).date()
+    texto = _HORA.sub("", str(valor).strip())
+    # "15-ENE-2026" / "15 ene. 2026" -> "15-1-2026"
+    texto = _MES_TEXTO.sub(
+        lambda m: str(_MESES.get(m.group(1).upper(), m.group(1))), f" {texto} "
+    ).strip()
+    for candidato in (texto, re.sub(r"[-. ]+", "/", texto)):
+        for formato in formatos:
+            try:
+                return datetime.strptime(candidato, formato).date()
+            except ValueError:
+                continue
+    return None
+
+
+def _movimiento(celdas: dict, layout: dict):
+    """
+    Movimiento de una fila: None si no es un movimiento (leyendas, saldos,
+    totales); ValueError si parece uno pero no se puede leer.
+    """
+    decimal = layout["separador_decimal"]
+    cargo = _importe(celdas.get("cargo"), decimal)
+    abono = _importe(celdas.get("abono"), decimal)
+    monto = _importe(celdas.get("monto"), decimal)
+    if monto is None and (cargo is not None or abono is not None):
+        monto = abs(abono or 0) - abs(cargo or 0)
+    if not monto:
+        return None
+
+    valor_fecha = celdas.get("fecha")
+    fecha = (
+        None if _vacio(valor_fecha) else _fecha(valor_fecha, layout["formato_fecha"])
+    )
+    if fecha is None:
+        # Sin dígitos en la fecha es una leyenda o un total, no un movimiento
+        if not re.search(r"\d", str(valor_fecha or "")):
+            return None
+        raise ValueError(f"Fecha no reconocida: {valor_fecha}")
+
+    return {
+        "fecha": fecha,
+        "tipo": "ingreso" if monto > 0 else "egreso",
+        "monto": round(abs(monto), 2),
+        "concepto": str(celdas.get("concepto") or "").strip(),
+        "referencia": str(celdas.get("referencia") or "").strip(),
+    }
+
+
+# =========================================================
+#  LECTORES POR FORMATO
+# =========================================================
+
+
+def _indices(valores, columnas: dict) -> dict | None:
+    """Posición de cada columna del layout; None si la fila no es la cabecera."""
+    cabeceras = [_normalizar(v) for v in valores or ()]
+    indices = {}
+    for llave, nombres in columnas.items():
+        indice = next((i for i, c in enumerate(cabeceras) if c and c in nombres), None)
+        if indice is not None:
+            indices[llave] = indice
+    if "fecha" in indices and indices.keys() & {"monto", "cargo", "abono"}:
+        return indices
+    return None
+
+
+def _filas_tabla(filas, layout: dict):
+    """Filas de un CSV o una hoja: cabecera del layout, luego un movimiento por fila."""
+    indices = None
+    for numero, valores in enumerate(filas, start=1):
+        if indices is None:
+            if layout["fila_cabecera"]:
+                if numero == layout["fila_cabecera"]:
+                    indices = _indices(valores, layout["columnas"])
+                    if indices is None:
+                        break
+            elif numero <= _FILAS_BUSQUEDA_CABECERA:
+                indices = _indices(valores, layout["columnas"])
+            else:
+                break
+            continue
+        if not valores or all(_vacio(v) for v in valores):
+            continue
+
+        celdas = {
+            llave: valores[i] if i < len(valores) else None
+            for llave, i in indices.items()
+        }
+        try:
+            movimiento = _movimiento(celdas, layout)
+        except ValueError as e:
+            yield numero, {ERROR_LECTURA: str(e)}
+            continue
+        if movimiento is not None:
+            yield numero, movimiento
+
+    if indices is None:
+        raise EstadoCuentaInvalido(
+            "No se encontraron las columnas del estado de cuenta (fecha y "
+            "monto, o cargo y abono). Revisa el layout de la cuenta."
+        )
+
+
+def _filas_excel(ruta: str, layout: dict):
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        yield from _filas_tabla(hoja.iter_rows(values_only=True), layout)
+    finally:
+        libro.close()
+
+
+def _filas_csv(ruta: str, layout: dict):
+    codificacion, lineas = sat_reader.muestra_texto(ruta)
+    separador = layout["separador"]
+    if not separador:
+        # El que más aparece en la línea de cabeceras (o en la primera)
+        nombres = layout["columnas"]["fecha"]
+        cabecera = next(
+            (
+                linea
+                for linea in lineas[:_FILAS_BUSQUEDA_CABECERA]
+                if any(n in _normalizar(linea) for n in nombres)
+            ),
+            lineas[0] if lineas else "",
+        )
+        separador = max(_SEPARADORES, key=cabecera.count)
+
+    with open(ruta, newline="", encoding=codificacion, errors="replace") as archivo:
+        yield from _filas_tabla(csv.reader(archivo, delimiter=separador), layout)
+
+
+def _movimiento_ofx(transaccion: dict) -> dict:
+    try:
+        fecha = datetime.strptime(transaccion.get("DTPOSTED", "")[:8], "%Y%m%d").date()
+    except ValueError:
+        raise ValueError(f"Fecha no reconocida: {transaccion.get('DTPOSTED')}")
+    monto = _importe(transaccion.get("TRNAMT"), None)
+    if not monto:
+        raise ValueError(f"Importe no reconocido: {transaccion.get('TRNAMT')}")
+
+    textos = (transaccion.get("NAME"), transaccion.get("MEMO"))
+    return {
+        "fecha": fecha,
+        "tipo": "ingreso" if monto > 0 else "egreso",
+        "monto": round(abs(monto), 2),
+        "concepto": " - ".join(dict.fromkeys(t for t in textos if t)),
+        "referencia": transaccion.get("REFNUM") or transaccion.get("CHECKNUM") or "",
+        "fitid": transaccion.get("FITID"),
+    }
+
+
+def _filas_ofx(ruta: str, layout: dict):
+    """Transacciones `<STMTTRN>` de un OFX 1.x (SGML, sin cierres) o 2.x (XML)."""
+    codificacion, _lineas = sat_reader.muestra_texto(ruta)
+    transaccion, numero, encontradas = None, 0, False
+    with open(ruta, encoding=codificacion, errors="replace") as archivo:
+        for linea in archivo:
+            for cierre, etiqueta, valor in _ETIQUETA_OFX.findall(linea):
+                etiqueta = etiqueta.upper()
+                if etiqueta == "STMTTRN":
+                    encontradas = True
+                    if not cierre:
+                        transaccion = {}
+                        continue
+                    numero += 1
+                    try:
+                        yield numero, _movimiento_ofx(transaccion or {})
+                    except ValueError as e:
+                        yield numero, {ERROR_LECTURA: str(e)}
+                    transaccion = None
+                elif transaccion is not None and not cierre:
+                    transaccion[etiqueta] = html.unescape(valor).strip()
+
+    if not encontradas:
+        raise EstadoCuentaInvalido("El archivo OFX no trae transacciones (STMTTRN).")
+
+
+_LECTORES = {
+    FORMATO_CSV: _filas_csv,
+    FORMATO_EXCEL: _filas_excel,
+    FORMATO_OFX: _filas_ofx,
+}
+
+
+def filas_estado_cuenta(ruta: str, layout: dict | None = None):
+    """
+    Recorre el archivo y produce `(número, movimiento)`; las filas que no se
+    pueden leer salen como `{ERROR_LECTURA: motivo}`.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    layout = _layout(layout, extension)
+    lector = _LECTORES.get(layout["formato"])
+    if lector is None:
+        raise EstadoCuentaInvalido(
+            f"Formato {extension or 'sin extensión'} no soportado. "
+            f"Usa {', '.join(FORMATOS)}."
+        )
+    return lector(ruta, layout)
+
+
+# =========================================================
+#  HUELLA E IMPORTACIÓN POR LOTES
+# =========================================================
+
+
+def _compacto(texto) -> str:
+    return _NO_ALFANUMERICO.sub("", str(texto or "").upper())
+
+
+def _huella(movimiento: dict, repeticiones: Counter) -> str:
+    """
+    Huella de una línea del estado de cuenta. `repeticiones` cuenta las
+    líneas idénticas ya vistas en el archivo.
+    """
+    if movimiento.get("fitid"):
+        base = f"fitid|{movimiento['fitid']}"
+    else:
+        base = "|".join(
+            (
+                movimiento["fecha"].isoformat(),
+                movimiento["tipo"],
+                str(round(movimiento["monto"] * 100)),
+                _compacto(movimiento["referencia"]),
+                _compacto(movimiento["concepto"]),
+            )
+        )
+        llave = hashlib.sha1(base.encode()).digest()
+        repeticiones[llave] += 1
+        base = f"{base}#{repeticiones[llave]}"
+    return hashlib.sha1(base.encode()).hexdigest()
+
+
+def _referencias_compatibles(linea: dict, referencia: str | None) -> bool:
+    """Sin referencia en alguno de los dos lados basta con monto y fecha."""
+    propia = _compacto(linea["referencia"])
+    ajena = _compacto(referencia)
+    if not propia or not ajena:
+        return True
+    return ajena in propia or propia in ajena or ajena in _compacto(linea["concepto"])
+
+
+def _ya_registrados(
+    db: Session, cuenta_id: int, movimientos: list, usados: set
+) -> list:
+    """
+    Para cada línea del lote, el id del movimiento sin huella de la cuenta
+    (cobro, pago, captura manual) que ya la registra, o None. `usados`
+    guarda los movimientos ya emparejados en la importación.
+    """
+    fechas = [m["fecha"] for m in movimientos]
+    tolerancia = timedelta(days=_TOLERANCIA_DIAS)
+    mov = models.BankMovement
+    candidatos = {}
+    for movimiento_id, tipo, monto, dia, referencia in db.execute(
+        select(mov.id, mov.tipo, mov.monto, func.date(mov.fecha), mov.referencia)
+        .where(
+            mov.bank_account_id == cuenta_id,
+            mov.huella.is_(None),
+            mov.record_status != models.RecordStatus.ELIMINADO,
+            or_(
+                mov.origen_modulo.is_(None),
+                mov.origen_modulo != ledger.ORIGEN_AJUSTE_SALDO,
+            ),
+            mov.fecha >= min(fechas) - tolerancia,
+            mov.fecha < max(fechas) + tolerancia + timedelta(days=1),
+        )
+        .order_by(mov.fecha, mov.id)
+    ):
+        if movimiento_id not in usados:
+            candidatos.setdefault((tipo, round(monto * 100)), []).append(
+                (movimiento_id, dia, referencia)
+            )
+
+    coincidencias = []
+    for linea in movimientos:
+        dia = linea["fecha"].date()
+        encontrado = min(
+            (
+                (abs((candidato[1] - dia).days), candidato)
+                for candidato in candidatos.get(
+                    (linea["tipo"], round(linea["monto"] * 100)), ()
+                )
+                if candidato[0] not in usados
+                and abs((candidato[1] - dia).days) <= _TOLERANCIA_DIAS
+                and _referencias_compatibles(linea, candidato[2])
+            ),
+            default=None,
+            key=lambda par: (par[0], par[1][0]),
+        )
+        if encontrado is None:
+            coincidencias.append(None)
+            continue
+        usados.add(encontrado[1][0])
+        coincidencias.append(encontrado[1][0])
+    return coincidencias
+
+
+def _insertar_lote(
+    db: Session, cuenta_id: int, movimientos: list, user_id: int
+) -> tuple:
+    """
+    Inserta el lote y aplica su efecto al saldo en un solo UPDATE (y al
+    libro de saldos, por día). Devuelve (insertados, ingresos, egresos) de
+    lo que no era duplicado.
+    """
+    tabla = models.BankMovement.__table__
+    stmt = (
+        pg_insert(tabla)
+        .on_conflict_do_nothing(index_elements=["bank_account_id", "huella"])
+        .returning(tabla.c.tipo, tabla.c.monto, func.date(tabla.c.fecha))
+    )
+    insertados = db.execute(stmt, movimientos).all()
+    ingresos = round(sum(m for tipo, m, _dia in insertados if tipo == "ingreso"), 2)
+    egresos = round(sum(m for tipo, m, _dia in insertados if tipo == "egreso"), 2)
+
+    if insertados:
+        db.query(models.BankAccount).filter(models.BankAccount.id == cuenta_id).update(
+            {
+                models.BankAccount.saldo: func.coalesce(models.BankAccount.saldo, 0)
+                + round(ingresos - egresos, 2),
+                models.BankAccount.updated_by_id: user_id,
+            },
+            synchronize_session=False,
+        )
+        ledger.recalcular_dias(db, cuenta_id, {dia for _t, _m, dia in insertados})
+    return len(insertados), ingresos, egresos
+
+
+def importar_estado_cuenta(
+    db: Session,
+    cuenta: models.BankAccount,
+    carga: models.BulkUploadHistory,
+    user_id: int,
+    lote: int = _LOTE,
+) -> dict:
+    """
+    Importa el archivo de la carga a la cuenta, un commit por lote. Devuelve
+    los contadores, el saldo final y hasta `_MAX_ERRORES` filas con error.
+    """
+    resumen = {
+        "leidas": 0,
+        "insertadas": 0,
+        "duplicadas": 0,
+        "posibles_duplicados": 0,
+        "errores": 0,
+        "ingresos": 0.0,
+        "egresos": 0.0,
+    }
+    errores = []
+    posibles_duplicados = []
+    usados = set()
+    repeticiones = Counter()
+    carga.status = sat_import.CARGA_PROCESANDO
+    db.commit()
+
+    try:
+        filas = filas_estado_cuenta(carga.file_path, cuenta.layout_estado_cuenta)
+        while bloque := list(islice(filas, lote)):
+            movimientos, numeros = [], []
+            for numero, movimiento in bloque:
+                if ERROR_LECTURA in movimiento:
+                    resumen["errores"] += 1
+                    if len(errores) < _MAX_ERRORES:
+                        errores.append(
+                            {"fila": numero, "error": movimiento[ERROR_LECTURA]}
+                        )
+                    continue
+                movimientos.append(
+                    {
+                        "bank_account_id": cuenta.id,
+                        "tipo": movimiento["tipo"],
+                        "monto": movimiento["monto"],
+                        "fecha": datetime.combine(movimiento["fecha"], time()),
+                        "concepto": (
+                            movimiento["concepto"] or "Movimiento de estado de cuenta"
+                        )[:_LARGO_CONCEPTO],
+                        "referencia": movimiento["referencia"][:_LARGO_REFERENCIA]
+                        or None,
+                        "origen_modulo": ORIGEN_ESTADO_CUENTA,
+                        "huella": _huella(movimiento, repeticiones),
+                        "created_by_id": user_id,
+                    }
+                )
+                numeros.append(numero)
+
+            resumen["leidas"] += len(movimientos)
+            if movimientos:
+                registrados = _ya_registrados(db, cuenta.id, movimientos, usados)
+                for numero, linea, movimiento_id in zip(
+                    numeros, movimientos, registrados
+                ):
+                    if movimiento_id is None:
+                        continue
+                    resumen["posibles_duplicados"] += 1
+                    if len(posibles_duplicados) < _MAX_ERRORES:
+                        posibles_duplicados.append(
+                            {
+                                "fila": numero,
+                                "fecha": linea["fecha"].date().isoformat(),
+                                "tipo": linea["tipo"],
+                                "monto": linea["monto"],
+                                "referencia": linea["referencia"],
+                                "movimiento_id": movimiento_id,
+                            }
+                        )
+                movimientos = [
+                    linea
+                    for linea, movimiento_id in zip(movimientos, registrados)
+                    if movimiento_id is None
+                ]
+
+            if movimientos:
+                insertados, ingresos, egresos = _insertar_lote(
+                    db, cuenta.id, movimientos, user_id
+                )
+                resumen["insertadas"] += insertados
+                resumen["duplicadas"] += len(movimientos) - insertados
+                resumen["ingresos"] = round(resumen["ingresos"] + ingresos, 2)
+                resumen["egresos"] = round(resumen["egresos"] + egresos, 2)
+
+            carga.record_count = resumen["leidas"] + resumen["errores"]
+            carga.resumen = dict(resumen)
+            carga.updated_by_id = user_id
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error en el estado de cuenta {carga.id}: {e}")
+        carga.status = sat_import.CARGA_ERROR
+        carga.resumen = {**resumen, "error": str(e)}
+        db.commit()
+        raise
+
+    carga.status = sat_import.CARGA_COMPLETADA
+    carga.resumen = dict(resumen)
+    db.commit()
+    db.refresh(cuenta)
+    logger.info(
+        f"🏦 Estado de cuenta {carga.id} ({cuenta.alias}): "
+        f"{resumen['insertadas']} nuevos, {resumen['duplicadas']} duplicados, "
+        f"{resumen['posibles_duplicados']} posibles duplicados"
+    )
+    return {
+        **resumen,
+        "upload_id": carga.id,
+        "bank_account_id": cuenta.id,
+        "saldo": cuenta.saldo,
+        "detalle_errores": errores,
+        "detalle_posibles_duplicados": posibles_duplicados,
+    }
@@ -1,12 +1,14 @@
 import traceback
 from sqlalchemy.orm import Session, joinedload, selectinload
-from sqlalchemy import func
 from typing import List, Optional
 from fastapi import HTTPException
+from pydantic import ValidationError
 from datetime import datetime, timedelta, date
 
+from app.db.pagination import paginar_keyset
 from app.models import models
 from app.models.models import RecordStatus  # <-- Importante para el filtro
+from app.modules.finance import balances, ledger, sat_import
 from . import schemas
 
 # =====================================================================
@@ -32,6 +34,12 @@ def create_bank_account(db: Session, account: schemas.BankAccountCreate, user_id
         **account.model_dump(), created_by_id=user_id
     )  # <--- AUDITORÍA
     db.add(db_account)
+    if db_account.saldo:
+        # El saldo inicial entra al libro como su primer movimiento
+        db.flush()
+        ledger.registrar_ajuste_saldo(
+            db, db_account, db_account.saldo, "Saldo inicial", user_id
+        )
     db.commit()
     db.refresh(db_account)
     return db_account
@@ -48,12 +56,34 @@ def update_bank_account(db: Session, account_id: int, account_data: dict, user_i
             models.BankAccount.id == account_id,
             models.BankAccount.record_status != RecordStatus.ELIMINADO,
         )
+        .with_for_update()
         .first()
     )
 
     if not account:
         return None
 
+    if account_data.get("saldo") is not None:
+        # El ajuste queda como movimiento para que el libro de saldos lo refleje
+        ledger.registrar_ajuste_saldo(
+            db,
+            account,
+            float(account_data["saldo"]) - (account.saldo or 0.0),
+            "Ajuste manual de saldo",
+            user_id,
+        )
+
+    if account_data.get("layout_estado_cuenta") is not None:
+        try:
+            layout = schemas.LayoutEstadoCuenta.model_validate(
+                account_data["layout_estado_cuenta"]
+            )
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=422, detail=f"Layout de estado de cuenta inválido: {e}"
+            )
+        account_data["layout_estado_cuenta"] = layout.model_dump(exclude_none=True)
+
     for key, value in account_data.items():
         if hasattr(account, key) and value is not None:
             setattr(account, key, value)
@@ -93,9 +123,26 @@ def delete_bank_account(
     return True
 
 
-def get_bank_movements(db: Session):
+MOVIMIENTOS_POR_PAGINA = 5000
+
+
+def get_bank_movements(
+    db: Session,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    bank_account_id: Optional[int] = None,
+    conciliado: Optional[bool] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+):
+    """
+    Movimientos del más reciente al más antiguo: (movimientos, siguiente_cursor).
+    Con `cursor` pagina por (fecha, id) e ignora `skip`. Sin `limit` ni
+    `cursor` devuelve todos, como antes de paginar.
+    """
     try:
-        return (
+        query = (
             db.query(models.BankMovement)
             .options(joinedload(models.BankMovement.bank_account))
             .filter(
@@ -104,8 +151,30 @@ def get_bank_movements(db: Session):
                 >= 0,  # 🚀 FIX: Cambiado a >= 0 para incluir conciliaciones de $0
                 ~models.BankMovement.concepto.ilike("%Reverso de Cobro Anulado%"),
             )
-            .order_by(models.BankMovement.fecha.desc())
-            .all()
+        )
+        if bank_account_id:
+            query = query.filter(models.BankMovement.bank_account_id == bank_account_id)
+        if conciliado is not None:
+            query = query.filter(models.BankMovement.conciliado.is_(conciliado))
+        if fecha_desde:
+            query = query.filter(models.BankMovement.fecha >= fecha_desde)
+        if fecha_hasta:
+            query = query.filter(
+                models.BankMovement.fecha < fecha_hasta + timedelta(days=1)
+            )
+
+        orden = [models.BankMovement.fecha, models.BankMovement.id]
+        if limit is None and not cursor:
+            movimientos = query.order_by(*[c.desc() for c in orden]).offset(skip).all()
+            return movimientos, None
+
+        return paginar_keyset(
+            query,
+            orden,
+            cursor,
+            limit or MOVIMIENTOS_POR_PAGINA,
+            descendente=True,
+            skip=skip,
         )
     except Exception as e:
         print(
@@ -504,586 +573,13 @@ def create_manual_receivable(db: Session, data: dict, user_id: int):
 def process_sat_master_report(
     db: Session, payload_data: list, original_file_name: str, user_id: int
 ):  # <--- AUDITORÍA PARAM
-    from datetime import datetime, timedelta, date
-
-    facturas_creadas = 0
-    facturas_ignoradas = 0
-    cecos_creados = 0
-
-    # =========================================================
-    #  HELPER 1: PRECARGAR CECOS EXISTENTES DE LA BD (Tus IDs 1 al 13)
-    # =========================================================
-    cecos_db = db.query(models.CostCenter).all()
-    # Creamos un diccionario en memoria: {"mtto": 1, "administrativo": 2, ...}
-    mapa_cecos = {c.nombre.strip().lower(): c.id for c in cecos_db}
-
-    # =========================================================
-    #  HELPER 2: DICCIONARIO BASE Y BUSCADOR INTELIGENTE
-    # =========================================================
-    BASE_PROVEEDORES = {
-        "CLO CLO": {"dias": 0, "ceco": "Personal"},
-        "CONCESIONARIA AUTOPISTA PEROTE-XALAPA": {"dias": 0, "ceco": "Operaciones"},
-        "CONSTRUCOMERCIO Y GESTORIA MG": {"dias": 0, "ceco": "Mtto"},
-        "CONSTRUCTORA E INMOBILIARIA MARYLAS": {"dias": 0, "ceco": "Administrativo"},
-        "DOGANIA ISAURA ROSALES LICONA": {"dias": 0, "ceco": "Mtto"},
-        "FISHER'S CONDESA": {"dias": 0, "ceco": "Personal"},
-        "FONDO NACIONAL DE INFRAESTRUCTURA": {"dias": 0, "ceco": "Operaciones"},
-        "LA CASA DEL SOL GASOLINERIA": {"dias": 0, "ceco": "Administrativo"},
-        "LA ESTANCIA DEL PUERTO DE VERACRUZ": {"dias": 0, "ceco": "Personal"},
-        "LA FERRE COMERCIALIZADORA": {"dias": 0, "ceco": "Mtto"},
-        "NUEVA WAL MART DE MEXICO": {"dias": 0, "ceco": "Personal"},
-        "OPERADORA BAJO DE LA TINTORERA": {"dias": 0, "ceco": "Personal"},
-        "OPERADORA DE ESTACIONES GL": {"dias": 0, "ceco": "Administrativo"},
-        "OPTIMA G AUTOSPORT": {"dias": 0, "ceco": "Personal"},
-        "PROMOTORA PLATINIUM": {"dias": 0, "ceco": "Administrativo"},
-        "PROVEEDORA DE ALIMENTOS GOURMET": {"dias": 0, "ceco": "Personal"},
-        "QUALITAS COMPAÑIA DE SEGUROS": {"dias": 0, "ceco": "Seguros"},
-        "ROCIO MOLINA CHAVEZ": {"dias": 0, "ceco": "Operaciones"},
-        "TONY TIENDAS": {"dias": 0, "ceco": "Administrativo"},
-        "ABRAHAM OSORIO TINOCO": {"dias": 0, "ceco": "Administrativo"},
-        "ALEJANDRA FABIOLA FLORES SANDOVAL": {"dias": 15, "ceco": "Administrativo"},
-        "ANGELICA TEMOXTLE GOMEZ": {"dias": 0, "ceco": "Mtto"},
-        "ARTURO ISIDRO PEREZ CUREÑO": {"dias": 0, "ceco": "Mtto"},
-        "ARTURO SABBAGH LANDA": {"dias": 15, "ceco": "Administrativo"},
-        "AUTO SERVICIO GUARDIA": {"dias": 0, "ceco": "Administrativo"},
-        "AUTOMOTRIZ ADRIMAR": {"dias": 8, "ceco": "Mtto"},
-        "BACOLUM": {"dias": 0, "ceco": "Personal"},
-        "BANCO MERCANTIL DEL NORTE": {"dias": 0, "ceco": "Comisiones bancarias"},
-        "BANCO MONEX": {"dias": 0, "ceco": "Personal"},
-        "BANCO NACIONAL DE MEXICO": {"dias": 0, "ceco": "Comisiones bancarias"},
-        "BERENICE GUTIERREZ CAMPOS": {"dias": 0, "ceco": "Mtto"},
-        "BETREIBER LOGISTIK": {"dias": 0, "ceco": "Personal"},
-        "CENTRO GASOLINERO ANIMAS": {"dias": 30, "ceco": "Administrativo"},
-        "CEVER SAN ANTONIO": {"dias": 0, "ceco": "Personal"},
-        "CLARA HERNANDEZ GOMEZ": {"dias": 0, "ceco": "Administrativo"},
-        "COMERCIALIZADORA TR ZONE": {"dias": 25, "ceco": "Mtto"},
-        "CORPORATIVO INTERNACIONAL DE COMERCIO SHIJEHECA": {
-            "dias": 0,
-            "ceco": "Gastos deducibles",
-        },
-        "DAIMLER FINANCIAL SERVICES": {"dias": 15, "ceco": "Adquisiciones"},
-        "DALIA CERON ROLDAN": {"dias": 0, "ceco": "Operaciones"},
-        "DHL EXPRESS MEXICO": {"dias": 0, "ceco": "Administrativo"},
-        "DIESEL MARIMAR": {"dias": 15, "ceco": "Mtto"},
-        "ECONOMIA EN MATERIALES PUBLICITARIOS": {"dias": 0, "ceco": "Administrativo"},
-        "EL PALACIO DE HIERRO": {"dias": 0, "ceco": "Personal"},
-        "EL SABOR AUSTRAL": {"dias": 0, "ceco": "Personal"},
-        "FERNANDO MARTINEZ RUIZ DEL HOYO": {"dias": 0, "ceco": "Mtto"},
-        "FRANCISCO FLORENCIO RODRIGUEZ ROMERO": {"dias": 0, "ceco": "Mtto"},
-        "GASOLINERA JEBLA": {"dias": 0, "ceco": "Administrativo"},
-        "GENOVEVO CHAVEZ GAMBOA": {"dias": 15, "ceco": "Mtto"},
-        "GOMSA CAMIONES": {"dias": 25, "ceco": "Mtto"},
-        "GRUPO FERCHE": {"dias": 30, "ceco": "Administrativo"},
-        "GRUPO RULLAN": {"dias": 0, "ceco": "Mtto"},
-        "HACEMOS FUEGO": {"dias": 0, "ceco": "Personal"},
-        "HAMBURGUESAS RAPIDAS LOMAS": {"dias": 0, "ceco": "Personal"},
-        "HERRAMIENTAS Y ACCESORIOS OLMECA": {"dias": 15, "ceco": "Mtto"},
-        "HOME DEPOT": {"dias": 0, "ceco": "Personal"},
-        "IGNACIO VILLEGAS MONTOYA": {"dias": 0, "ceco": "Operaciones"},
-        "IMPACTO COMERCIAL FERRETERO": {"dias": 0, "ceco": "Mtto"},
-        "INSTITUTO MEXICANO DEL SEGURO SOCIAL": {"dias": 0, "ceco": "Administrativo"},
-        "IVON CAMPOS HERRERA": {"dias": 0, "ceco": "Administrativo"},
-        "JANNA LOGISTIC": {"dias": 0, "ceco": "Administrativo"},
-        "JULIA MAGDALENA GOMEZ TERRONES": {"dias": 0, "ceco": "Administrativo"},
-        "JUST IN TIME": {"dias": 0, "ceco": "Operaciones"},
-        "ROGELIO AGUILAR ROGEL": {"dias": 0, "ceco": "Administrativo"},
-        "LATANST": {"dias": 0, "ceco": "Diesel"},
-        "LUCIO RODRIGUEZ PEREYRA": {"dias": 0, "ceco": "Administrativo"},
-        "LUIS ALBERTO GARCIA BALBUENA": {"dias": 0, "ceco": "Personal"},
-        "MARTHA ELENA MEDINA ROBLEDO": {"dias": 0, "ceco": "Mtto"},
-        "MUELLES Y TRACTOPARTES DEL GOLFO": {"dias": 25, "ceco": "Mtto"},
-        "OFFICE DEPOT": {"dias": 0, "ceco": "Administrativo"},
-        "OPERADORA DE ALIMENTOS DURANGO": {"dias": 0, "ceco": "Personal"},
-        "OPERADORA DE ESTACIONES Y PARADORES": {"dias": 0, "ceco": "Diesel"},
-        "OSCAR LOPEZ MARTINEZ": {"dias": 0, "ceco": "Administrativo"},
-        "PACCAR FINANCIAL": {"dias": 0, "ceco": "Adquisiciones"},
-        "PARADOR TURISTICO SAN PEDRO": {"dias": 0, "ceco": "Diesel"},
-        "PASE, SERVICIOS ELECTRONICOS": {"dias": 0, "ceco": "Casetas"},
-        "PASION SONORENSE": {"dias": 0, "ceco": "Diesel"},
-        "PETROMAX": {"dias": 0, "ceco": "Administrativo"},
-        "PETROVIM": {"dias": 0, "ceco": "Diesel"},
-        "PREVENCION Y REACCION": {"dias": 0, "ceco": "Seguridad"},
-        "PRODUCTOS AHULADOS INDUSTRIALES": {"dias": 25, "ceco": "Llantas"},
-        "PROPIMEX": {"dias": 0, "ceco": "Administrativo"},
-        "PROVEEDOR MAYORISTA AL REFACCIONARIO": {"dias": 20, "ceco": "Mtto"},
-        "RADIOMOVIL DIPSA": {"dias": 30, "ceco": "Administrativo"},
-        "RENOVADORA ZUCA DEL SURESTE": {"dias": 15, "ceco": "Llantas"},
-        "ROBERTO ENRIQUE MUÑOZ CEBALLOS": {"dias": 0, "ceco": "Operaciones"},
-        "SEGURIDAD INDUSTRIAL Y SOLDADURAS": {"dias": 0, "ceco": "Mtto"},
-        "SICONT MEX": {"dias": 0, "ceco": "Administrativo"},
-        "SITRACK": {"dias": 30, "ceco": "Operaciones"},
-        "SUMINISTROS TECNICOS COMAI": {"dias": 0, "ceco": "Mtto"},
-        "TELEFONOS DE MEXICO": {"dias": 0, "ceco": "Administrativo"},
-        "TIENDAS CHEDRAUI": {"dias": 0, "ceco": "Personal"},
-        "TRACTO ACCESORIOS COSTA SUR": {"dias": 15, "ceco": "Mtto"},
-        "TRASLADOS RAPIDOS DE CARGA": {"dias": 0, "ceco": "Operaciones"},
-        "VECTOR, CASA DE BOLSA": {"dias": 0, "ceco": "Administrativo"},
-        "VERIFICENTROS DEL SURESTE": {"dias": 8, "ceco": "Operaciones"},
-        "GRUPO AUTOPISTAS NACIONALES": {"dias": 0, "ceco": "Operaciones"},
-        "REFACCIONARIA GLOBAL TRUCK PARTS": {"dias": 0, "ceco": "Operaciones"},
-        "GOBIERNO DEL ESTADO DE VERACRUZ": {"dias": 0, "ceco": "Operaciones"},
-        "CONCESIONES Y PROMOCIONES MALIBRAN": {"dias": 0, "ceco": "Operaciones"},
-        "CONCESIONARIA LERMA SANTIAGO": {"dias": 0, "ceco": "Operaciones"},
-        "PILOTO AUTOMATICO": {"dias": 0, "ceco": "Mtto"},
-        "GRUPO TRACVER": {"dias": 0, "ceco": "Mtto"},
-        "APE ACEROS DE VERACRUZ": {"dias": 0, "ceco": "Mtto"},
-        "CAR MOTION": {"dias": 0, "ceco": "Administrativo"},
-        "AUTO PARTES Y MAS": {"dias": 0, "ceco": "Administrativo"},
-        "IN LAK ECH HALA KEN": {"dias": 0, "ceco": "Administrativo"},
-        "GRUPO FUCHELA": {"dias": 0, "ceco": "Administrativo"},
-        "SALAS VILLAGOMEZ": {"dias": 0, "ceco": "Administrativo"},
-        "AUTOUNO MOTORS": {"dias": 0, "ceco": "Administrativo"},
-        "HULES LAGO": {"dias": 0, "ceco": "Mtto"},
-        "VENTA Y RENTA DE MAQUINARIA VRM": {"dias": 0, "ceco": "Administrativo"},
-        "OMAR MARCELO GONZALEZ MACIAS": {"dias": 0, "ceco": "Administrativo"},
-        "GRUPO GASOLINERO DEL SUR": {"dias": 0, "ceco": "Administrativo"},
-        "ANA GRACIELA AYUSO HERNANDEZ": {"dias": 0, "ceco": "Administrativo"},
-        "TRANSPORTES Y RADIADORES DAOS": {"dias": 0, "ceco": "Mtto"},
-        "ADMINISTRADORA DE GASOLINERAS SAN AGUSTIN": {
-            "dias": 0,
-            "ceco": "Administrativo",
-        },
-        "NEKLAR": {"dias": 0, "ceco": "Administrativo"},
-        "JF HILLEBRAND MEXICO": {"dias": 0, "ceco": "Operaciones"},
-        "COMERCIALIZADORA DISHI": {"dias": 0, "ceco": "Mtto"},
-        "COMBUSTIBLES MALDONADO OLVERA": {"dias": 0, "ceco": "Diesel"},
-        "GRUPO ZORRO ABARROTERO": {"dias": 0, "ceco": "Administrativo"},
-        "OPERADORA DE RESTAURANTES LOS GIROS": {"dias": 0, "ceco": "Personal"},
-        "SANDRA POZOS PEREDO": {"dias": 0, "ceco": "Mtto"},
-        "OPERADORA CAMA": {"dias": 0, "ceco": "Personal"},
-        "JOSE OMAR BRAVO ALARCON": {"dias": 0, "ceco": "Operaciones"},
-        "HIDROLITRO LAGUNERO": {"dias": 0, "ceco": "Operaciones"},
-        "LOGISTICA INTEGRAL FULEM": {"dias": 0, "ceco": "Operaciones"},
-        "GLOBAL INTERNACIONAL AGENCIAS MARITIMAS": {"dias": 0, "ceco": "Operaciones"},
-        "SANTA FE GAS&OIL": {"dias": 0, "ceco": "Diesel"},
-        "SERVICIO CONDESA DE ZACATECAS": {"dias": 0, "ceco": "Operaciones"},
-        "YESENIA JANETH VAZQUEZ SANCHEZ": {"dias": 15, "ceco": "Mtto"},
-        "SAVINO DEL BENE MEXICO": {"dias": 15, "ceco": "Operaciones"},
-        "COMBUSTIBLES DEL SURESTE DE COATZACOALCOS": {"dias": 0, "ceco": "Diesel"},
-        "CORPORACION GASOLINERA MILLENIUM": {"dias": 0, "ceco": "Diesel"},
-        "FIDEICOMISO F/1596": {"dias": 0, "ceco": "Operaciones"},
-        "ALVAREZ AUTOMOTRIZ": {"dias": 0, "ceco": "Mtto"},
-        "OPERADORA OMX": {"dias": 0, "ceco": "Administrativo"},
-        "COSTCO DE MEXICO": {"dias": 0, "ceco": "Personal"},
-        "CANDEGAS": {"dias": 0, "ceco": "Diesel"},
-        "ACEREXPRESS DEL SURESTE": {"dias": 0, "ceco": "Mtto"},
-        "SERVICIO ESPECIALIZADO EN RODAMIENTOS": {"dias": 0, "ceco": "Mtto"},
-        "GAS Y DERIVADOS DEL CARIBE": {"dias": 0, "ceco": "Diesel"},
-        "INSTITUTO DE CAPACITACION DE LA INDUSTRIA": {
-            "dias": 15,
-            "ceco": "Operaciones",
-        },
-        "TRANSPORTE Y LOGISTICA BUZMYR": {"dias": 15, "ceco": "Operaciones"},
-        "LA CASA DE LAS LOMAS": {"dias": 0, "ceco": "Personal"},
-        "COMERCIALIZADORA DE COMBUSTIBLES TIFA": {"dias": 21, "ceco": "Diesel"},
-        "LLANTAS & RINES RUTA 17": {"dias": 0, "ceco": "Mtto"},
-        "VICTOR MANUEL SANTOS DELGADO": {"dias": 15, "ceco": "Mtto"},
-        "LOGISTICA EXPRESS DE CONTENEDORES": {"dias": 0, "ceco": "Operaciones"},
-        "SUTSA PRINT DE MEXICO": {"dias": 0, "ceco": "Operaciones"},
-        "GRUPO GEO DIESEL": {"dias": 0, "ceco": "Mtto"},
-        "SEGUROS INBURSA": {"dias": 15, "ceco": "Seguros"},
-        "REFRISERVICIO Y AIRE ACONDICIONADO": {"dias": 0, "ceco": "Mtto"},
-        "ASEGURADORA INSURGENTES": {"dias": 15, "ceco": "Administrativo"},
-        "SUPER SERVICIO DEL POTOSI": {"dias": 0, "ceco": "Operaciones"},
-        "TYMEG MEXICO": {"dias": 0, "ceco": "Operaciones"},
-        "TURISMO CAMPECHE": {"dias": 0, "ceco": "Administrativo"},
-        "CHRISTIAN ALBERTO HERNANDEZ ANGELES": {"dias": 0, "ceco": "Operaciones"},
-        "MIRIAM YESENIA PIMENTEL SANTIAGO": {"dias": 0, "ceco": "Operaciones"},
-        "SUMINISTROS ENERGETICOS DE CALIDAD": {"dias": 0, "ceco": "Operaciones"},
-        "CLAUDIA ALARCON RAMIREZ": {"dias": 0, "ceco": "Administrativo"},
-        "REMOLQUES Y EQUIPOS DEL GOLFO": {"dias": 0, "ceco": "Operaciones"},
-        "SERVICIO AUTOVIA": {"dias": 0, "ceco": "Operaciones"},
-        "GRUPO GASOLINERO REYNAR": {"dias": 0, "ceco": "Operaciones"},
-        "RICHEMONT DE MEXICO": {"dias": 0, "ceco": "Personal"},
-        "SURMAN POLANCO": {"dias": 0, "ceco": "Personal"},
-        "GRUPO RESTAURANTERO DEL CENTRO": {"dias": 0, "ceco": "Personal"},
-        "GM FINANCIAL DE MEXICO": {"dias": 0, "ceco": "Administrativo"},
-        "SUSPENSION Y DIRECCION": {"dias": 0, "ceco": "Operaciones"},
-        "AUTOZONE DE MEXICO": {"dias": 0, "ceco": "Operaciones"},
-        "COMERCIALIZADORA SDMHC": {"dias": 0, "ceco": "Administrativo"},
-        "PROMOTORA Y TURISTICA ATHENE": {"dias": 0, "ceco": "Administrativo"},
-        "NACIONAL DE COMBUSTIBLES Y LUBRICANTES": {"dias": 0, "ceco": "Administrativo"},
-        "GRUPO MURO TEX": {"dias": 0, "ceco": "Mtto"},
-        "CORS FLORES LOPEZ Y ASOCIADOS": {"dias": 15, "ceco": "Administrativo"},
-        "TRACTOPARTES DIESEL DON TRUCK": {"dias": 0, "ceco": "Mtto"},
-        "GASOIL TECNOLOGIAS": {"dias": 0, "ceco": "Administrativo"},
-        "RESTAURANTES SUNTORY": {"dias": 0, "ceco": "Personal"},
-        "SERVICIO GASOLINERO LA LOMA": {"dias": 0, "ceco": "Administrativo"},
-        "ADMINISTRACION HOTELERA DEL SUR": {"dias": 0, "ceco": "Personal"},
-        "SERVICIO RAULIAM": {"dias": 0, "ceco": "Administrativo"},
-        "RFV TRUCK PARTS": {"dias": 0, "ceco": "Mtto"},
-        "VINILOS Y GRAFICOS DIGITALES": {"dias": 0, "ceco": "Administrativo"},
-        "ESTACION DE SERVICIO FORA": {"dias": 0, "ceco": "Administrativo"},
-        "OPEDEC DE MEXICO": {"dias": 0, "ceco": "Diesel"},
-        "GRUPO BIO GUHUSA": {"dias": 0, "ceco": "Diesel"},
-        "ZURICH ASEGURADORA MEXICANA": {"dias": 0, "ceco": "Seguros"},
-        "VICTOR MARQUINEZ TRESS": {"dias": 0, "ceco": "Mtto"},
-        "SOLUCIONES P&L": {"dias": 0, "ceco": "Administrativo"},
-        "AMERICAN FILTER": {"dias": 0, "ceco": "Mtto"},
-        "PETRO 107": {"dias": 0, "ceco": "Mtto"},
-        "DISTRIBUIDORA SAGARO DE MEXICO": {"dias": 0, "ceco": "Administrativo"},
-        "SERVICIO PIRAMIDE DEL FUEGO": {"dias": 0, "ceco": "Diesel"},
-        "FLORGER COMBUSTIBLES Y ADITIVOS": {"dias": 0, "ceco": "Diesel"},
-        "GASOLINERIA RAQUEL": {"dias": 0, "ceco": "Administrativo"},
-        "KENWORTH DEL ESTE": {"dias": 30, "ceco": "Mtto"},
-        "AGUSTIN FRANCISCO DIAZ CUAUTLE": {"dias": 0, "ceco": "Administrativo"},
-        "INDUSTRIA MANUFACTURERA DE REMOLQUES": {"dias": 0, "ceco": "Mtto"},
-        "SERVICIOS MODERNOS DE JILOTEPEC": {"dias": 0, "ceco": "Diesel"},
-        "VITANOVA": {"dias": 15, "ceco": "Llantas"},
-        "EVER TIRE": {"dias": 15, "ceco": "Llantas"},
-        "EM WORLDWIDE SERVICES": {"dias": 0, "ceco": "Administrativo"},
-        "ROSALINA ADRIANA OROZCO LEON": {"dias": 15, "ceco": "Mtto"},
-        "PROMOTORA PP": {"dias": 15, "ceco": "Casetas"},
-        "RESTAURANTE TORRE DE CASTILLA": {"dias": 0, "ceco": "Personal"},
-        "GASOLINERIA COACALCO": {"dias": 0, "ceco": "Administrativo"},
-        "RUOLAC BANDERILLA": {"dias": 0, "ceco": "Administrativo"},
-        "PETRO MED": {"dias": 0, "ceco": "Diesel"},
-        "SUPER SERVICIO NUEVO BC": {"dias": 0, "ceco": "Diesel"},
-        "SUMINISTROS DE COMBUSTIBLE DIESEL Y GASOLINA": {"dias": 0, "ceco": "Diesel"},
-        "ALBERTO RAYMUNDO PEREDO CUBRIA": {"dias": 0, "ceco": "Operaciones"},
-        "AUTOEXPRESS GSM": {"dias": 0, "ceco": "Diesel"},
-        "REPRESENTACIONES AZTNOR": {"dias": 0, "ceco": "Mtto"},
-        "CONSORCIO GASOLINERO PLUS": {"dias": 0, "ceco": "Diesel"},
-        "HR SOL SERVICIOS ADMINISTRATIVOS": {"dias": 0, "ceco": "Diesel"},
-        "SERVICIO FAS": {"dias": 0, "ceco": "Diesel"},
-        "ABASTECEDORA GASTRONOMICA INTEGRAL": {"dias": 0, "ceco": "Personal"},
-        "GASOLINERA OPERADORA GONZER": {"dias": 0, "ceco": "Diesel"},
-        "CORPORACION RNB": {"dias": 0, "ceco": "Mtto"},
-        "PROMOTORA DE INVERSION MOCAMBO": {"dias": 0, "ceco": "Personal"},
-        "PAULA ALCARAZ MONTAÑO": {"dias": 0, "ceco": "Mtto"},
-        "TECNO UREA": {"dias": 20, "ceco": "Operaciones"},
-        "ANTONIO DE JESUS GARCIA GALVAN": {"dias": 0, "ceco": "Mtto"},
-        "ALEJANDRO ROMO OBSCURA": {"dias": 0, "ceco": "Mtto"},
-        "MIRIAM FLORES VICENTE": {"dias": 0, "ceco": "Mtto"},
-        "SISTEMAS EMPRESARIALES Y RESGUARDO PATRIMONIAL": {
-            "dias": 5,
-            "ceco": "Administrativo",
-        },
-        "TORA JAPONES": {"dias": 0, "ceco": "Personal"},
-        "DISTRIBUIDORA LIVERPOOL": {"dias": 0, "ceco": "Personal"},
-        "AUTOPISTA ARCO NORTE": {"dias": 0, "ceco": "Casetas"},
-        "CONCESIONARIA MEXIQUENSE": {"dias": 0, "ceco": "Casetas"},
-        "CONCESIONARIA DE VIAS TRONCALES": {"dias": 0, "ceco": "Casetas"},
-        "CFC CONCESIONES": {"dias": 0, "ceco": "Casetas"},
-        "PROMOTORA DE CARRETERAS ECATEPEC PIRAMIDES": {"dias": 0, "ceco": "Casetas"},
-        "PROMOTORA Y ADMINISTRADORA DE CARRETERAS": {"dias": 0, "ceco": "Casetas"},
-        "ANESA HOLDING": {"dias": 0, "ceco": "Casetas"},
-        "AUTOPISTAS DE VANGUARDIA": {"dias": 0, "ceco": "Casetas"},
-        "SEXTOMADERO": {"dias": 0, "ceco": "Personal"},
-        "DESARROLLO GLOBAL DE CONCESIONES": {"dias": 0, "ceco": "Casetas"},
-        "REVOLUCION EN MOVIMIENTO": {"dias": 0, "ceco": "Casetas"},
-        "AUTOVIAS SAN MARTIN TEXMELUCAN": {"dias": 0, "ceco": "Casetas"},
-        "CONCESIONARIA BICENTENARIO": {"dias": 0, "ceco": "Casetas"},
-        "AUTOPISTA MORELIA SALAMANCA": {"dias": 0, "ceco": "Casetas"},
-        "AUTOVIA QUERETARO": {"dias": 0, "ceco": "Casetas"},
-        "AMIGOS ATENDIENDO AMIGOS": {"dias": 0, "ceco": "Personal"},
-        "JEAN PIERRE PAGESY HERRERA": {"dias": 0, "ceco": "Personal"},
-        "SERVICIO SAN JUAN": {"dias": 0, "ceco": "Administrativo"},
-        "GASOLINERIA ALTADENA": {"dias": 0, "ceco": "Administrativo"},
-        "RACING TRADING": {"dias": 15, "ceco": "Mtto"},
-        "LIBRAMIENTO ELEVADO DE PUEBLA": {"dias": 0, "ceco": "Casetas"},
-        "CONCESIONARIA ASM": {"dias": 0, "ceco": "Casetas"},
-        "DANIEL RAMIREZ HERRERA": {"dias": 0, "ceco": "Mtto"},
-        "GRUPO NACIONAL PROVINCIAL": {"dias": 0, "ceco": "Administrativo"},
-        "SEGUROS ATLAS": {"dias": 0, "ceco": "Seguros"},
-        "RED STAR FUEL": {"dias": 0, "ceco": "Diesel"},
-        "MORENO DIESEL": {"dias": 15, "ceco": "Mtto"},
-        "VICTOR ALEJANDRO ZAVALA BRITO": {"dias": 15, "ceco": "Mtto"},
-        "GABRIELA CASAS DEL SAUZ": {"dias": 0, "ceco": "Operaciones"},
-        "RESTAURANTE SUNTORY": {"dias": 0, "ceco": "Personal"},
-        "MARISCOS VILLA RICA MOCAMBO": {"dias": 0, "ceco": "Personal"},
-        "JOSE CARLOS ALARCON RAMIREZ": {"dias": 0, "ceco": "Personal"},
-        "A.N.A. COMPAÑIA DE SEGUROS": {"dias": 0, "ceco": "Seguros"},
-        "COMINCAR": {"dias": 0, "ceco": "Operaciones"},
-        "SERVICIO SANMO": {"dias": 0, "ceco": "Diesel"},
-        "MUNDO DE LIMPIEZA DGO": {"dias": 0, "ceco": "Administrativo"},
-        "MARIA EUGENIA HERMIDA GUZMAN": {"dias": 0, "ceco": "Administrativo"},
-        "RIEGOS Y MAQUINARIA AGRICOLA PESCADOR": {"dias": 0, "ceco": "Administrativo"},
-        "AUTO PARTES BICENTENARIO": {"dias": 0, "ceco": "Operaciones"},
-        "LUIS DE JESUS RAMIREZ CADENA": {"dias": 0, "ceco": "Operaciones"},
-        "LUIS MOISES GIL AGUILAR": {"dias": 0, "ceco": "Operaciones"},
-        "GUSTAVO MARIN RODRIGUEZ": {"dias": 0, "ceco": "Operaciones"},
-        "TPS OPERADOR LOGISTICO": {"dias": 0, "ceco": "Operaciones"},
-        "REFACCIONES INDUSTRIALES OLAT": {"dias": 0, "ceco": "Mtto"},
-        "CIRIA LOPEZ RAMOS": {"dias": 0, "ceco": "Mtto"},
-        "AUTOS CON VALOR": {"dias": 0, "ceco": "Mtto"},
-        "MATERIALES RUMA": {"dias": 0, "ceco": "Administrativo"},
-        "SEPTIMO MADERO": {"dias": 0, "ceco": "Personal"},
-        "SANBORN HERMANOS": {"dias": 0, "ceco": "Personal"},
-        "ROGELIO VARGAS PEREZ": {"dias": 0, "ceco": "Mtto"},
-        "UNION DE SERVICIOS CONHUAS": {"dias": 0, "ceco": "Diesel"},
-        "HOGO GROUP": {"dias": 0, "ceco": "Personal"},
-        "SERVICIO Y CALIDAD DE HUEYATZACOALCO": {"dias": 0, "ceco": "Personal"},
-        "HECTOR MANUEL BOYLAN BALBUENA": {"dias": 0, "ceco": "Mtto"},
-        "REMAR DIESEL": {"dias": 0, "ceco": "Mtto"},
-        "QUATTRO TRADE SOLUTIONS": {"dias": 0, "ceco": "Administrativo"},
-        "CENTRO DE DISTRIBUCION DE AUTOCONSUMOS": {"dias": 15, "ceco": "Diesel"},
-        "PROMOTORA HOTELERA DE VERACRUZ": {"dias": 0, "ceco": "Personal"},
-        "TECNOLLANTAS": {"dias": 0, "ceco": "Administrativo"},
-        "PAPELERA SAN RAFAEL DE LEON": {"dias": 0, "ceco": "Administrativo"},
-        "DATOS EN TECNOLOGIAS DE INFORMACION": {"dias": 0, "ceco": "Operaciones"},
-        "TOTAL PLAY": {"dias": 0, "ceco": "Administrativo"},
-        "TOTAL BOX": {"dias": 0, "ceco": "Administrativo"},
-        "COMERCIOS INTEGRALES ZINGRUP": {"dias": 0, "ceco": "Mtto"},
-        "GC MOTORS": {"dias": 0, "ceco": "Personal"},
-        "B PARTES": {"dias": 0, "ceco": "Mtto"},
-        "RAMOS SERVIPARTES": {"dias": 0, "ceco": "Personal"},
-        "ESTANCIA HARBOR'S": {"dias": 0, "ceco": "Personal"},
-        "INMOBILIARIA HOTELERA DE QUERETARO": {"dias": 0, "ceco": "Personal"},
-        "FOFEL": {"dias": 0, "ceco": "Operaciones"},
-        "A LO GOURMET Y EXCELENCIA": {"dias": 0, "ceco": "Personal"},
-        "HOSPITALIDAD LATINA": {"dias": 0, "ceco": "Personal"},
-        "ALCENTRO ALIMENTOS": {"dias": 0, "ceco": "Personal"},
-        "INMOBILIARIA HNF": {"dias": 0, "ceco": "Personal"},
-        "PROMOTORA VINCENT": {"dias": 0, "ceco": "Personal"},
-        "ESTACION DE SERVICIO MAXIPISTA TAPATIA": {"dias": 0, "ceco": "Personal"},
-        "SERVICIO COMERCIAL GARIS": {"dias": 0, "ceco": "Personal"},
-        "CALUFER": {"dias": 0, "ceco": "Personal"},
-        "JOSE REYMUNDO IBARRA GUTIERREZ": {"dias": 0, "ceco": "Personal"},
-        "SIERRA SILLA MITRAS": {"dias": 0, "ceco": "Personal"},
-        "TURBOCARGANDO A MEXICO": {"dias": 0, "ceco": "Mtto"},
-        "CINTHYA GUERRERO SAGAHON": {"dias": 0, "ceco": "Mtto"},
-        "JESUS MANUEL PEREZ PEREZ": {"dias": 0, "ceco": "Mtto"},
-        "TUBELITE DE MEXICO": {"dias": 0, "ceco": "Mtto"},
-        "JUAN CARLOS PELAEZ SANCHEZ": {"dias": 0, "ceco": "Mtto"},
-        "ERNESTINA ESQUIVEL LOPEZ": {"dias": 0, "ceco": "Administrativo"},
-        "LUZ MIREYA SERRANO GOMEZ": {"dias": 0, "ceco": "Mtto"},
-        "MILANO OPERADORA": {"dias": 0, "ceco": "Personal"},
-        "COMERCIAL CITY FRESKO": {"dias": 0, "ceco": "Personal"},
-        "GRUPO PARISINA": {"dias": 0, "ceco": "Administrativo"},
-        "CEVIZI": {"dias": 0, "ceco": "Personal"},
-        "INFRA": {"dias": 0, "ceco": "Administrativo"},
-        "PODER EJECUTIVO DEL ESTADO DE CAMPECHE": {"dias": 0, "ceco": "Administrativo"},
-        "MISE EN PALACE": {"dias": 0, "ceco": "Personal"},
-        "TELECONTROLES DE VERACRUZ": {"dias": 0, "ceco": "Mtto"},
-        "MEXICANA DE LUBRICANTES": {"dias": 0, "ceco": "Mtto"},
-        "ILDEFONSO SOLIS LUCERO": {"dias": 0, "ceco": "Mtto"},
-        "CAMINOS Y PUENTES FEDERALES": {"dias": 0, "ceco": "Casetas"},
-        "SERVICIO REGIO OCHO": {"dias": 0, "ceco": "Diesel"},
-        "OFIX": {"dias": 0, "ceco": "Administrativo"},
-        "SFERP": {"dias": 0, "ceco": "Administrativo"},
-        "HIDROCARBUROS LA MARQUESILLA": {"dias": 0, "ceco": "Diesel"},
-        "LA BARRA MASARYK": {"dias": 0, "ceco": "Personal"},
-        "CINTYA LIZBETH DE THOMAS RAMOS": {"dias": 0, "ceco": "Personal"},
-        "ACRO MAC": {"dias": 0, "ceco": "Personal"},
-    }
-
-    # =========================================================
-    #  HELPER 2: BUSCADOR INTELIGENTE (Fuzzy Matcher)
-    # =========================================================
-    def buscar_coincidencia_proveedor(nombre_emisor: str):
-        if not nombre_emisor:
-            return {"dias": 0, "ceco": "Revisión Manual"}
-
-        nombre_clean = nombre_emisor.upper().strip()
-
-        # 1. Buscar Coincidencia Exacta
-        if nombre_clean in BASE_PROVEEDORES:
-            return BASE_PROVEEDORES[nombre_clean]
-
-        # 2. Buscar Coincidencia Parcial
-        for llave_base, datos in BASE_PROVEEDORES.items():
-            if llave_base in nombre_clean:
-                return datos
-
-        return {"dias": 0, "ceco": "Revisión Manual"}
-
-    # =========================================================
-    #  HELPER 3: Convertidor a prueba de balas para fechas
-    # =========================================================
-    def parse_flexible_date(raw_val) -> date:
-        if not raw_val or str(raw_val).strip() == "None":
-            return date.today()
-
-        val_str = str(raw_val).strip()
-        try:
-            if val_str.replace(".", "", 1).isdigit():
-                serial = float(val_str)
-                return (datetime(1899, 12, 30) + timedelta(days=serial)).date()
-            else:
-                clean_date = val_str.split("T")[0].split()[0]
-                return datetime.strptime(clean_date, "%Y-%m-%d").date()
-        except Exception as e:
-            return date.today()
-
-    # =========================================================
-    # INICIO DEL PROCESAMIENTO BUCLE
-    # =========================================================
-    for row in payload_data:
-        uuid_fiscal = str(row.get("UUID") or "").strip()
-        if not uuid_fiscal or uuid_fiscal == "None":
-            continue
-
-        #  TICKET 2 (CANDADO): Evitar duplicados
-        existing_invoice = (
-            db.query(models.PayableInvoice)
-            .filter(models.PayableInvoice.uuid == uuid_fiscal)
-            .first()
-        )
-        if existing_invoice:
-            facturas_ignoradas += 1
-            continue
-
-        rfc_emisor = str(row.get("Rfc Emisor") or "").strip()
-        nombre_emisor_original = str(row.get("Nombre Emisor") or "").strip()
-
-        #  Buscamos coincidencias con tu lista
-        datos_sugeridos = buscar_coincidencia_proveedor(nombre_emisor_original)
-
-        # Buscar proveedor en la Base de Datos
-        supplier = (
-            db.query(models.Supplier).filter(models.Supplier.rfc == rfc_emisor).first()
-        )
-
-        # Si el proveedor no existe, lo creamos con los datos del BuscarV
-        if not supplier:
-            supplier = models.Supplier(
-                razon_social=nombre_emisor_original,
-                rfc=rfc_emisor,
-                estatus=models.SupplierStatus.ACTIVO,  # FIX: Enum estricto
-                dias_credito=datos_sugeridos["dias"],
-                created_by_id=user_id,
-            )
-            db.add(supplier)
-            db.flush()
-
-        # =========================================================
-        #  LÓGICA INTELIGENTE DE CENTROS DE COSTO (CECOS)
-        # =========================================================
-
-        # 1. Buscamos primero en el MAPA_CECOS (ID exacto por nombre en minúsculas)
-        ceco_name_excel = str(
-            row.get("Centro de Costos ") or row.get("Centro de Costos") or ""
-        ).strip()
-        ceco_a_buscar = (
-            ceco_name_excel
-            if ceco_name_excel and ceco_name_excel.lower() not in ["none", "nan", ""]
-            else None
-        )
-
-        # 2. Si el Excel no trajo nada y el proveedor no tiene CECO en BD, usamos el sugerido
-        if not ceco_a_buscar and not supplier.cost_center_id:
-            ceco_a_buscar = datos_sugeridos["ceco"]
-
-        cost_center_id = supplier.cost_center_id
-
-        if ceco_a_buscar:
-            ceco_key = ceco_a_buscar.strip().lower()
-            if ceco_key in mapa_cecos:
-                cost_center_id = mapa_cecos[ceco_key]
-            else:
-                # Si no existe, lo creamos y actualizamos el mapa
-                nuevo_ceco_codigo = ceco_a_buscar[:15].upper().replace(" ", "-")
-                nuevo_ceco = models.CostCenter(
-                    codigo=nuevo_ceco_codigo,
-                    nombre=ceco_a_buscar,
-                    activo=True,
-                    created_by_id=user_id,
-                )
-                db.add(nuevo_ceco)
-                db.flush()
-                cecos_creados += 1
-                cost_center_id = nuevo_ceco.id
-                mapa_cecos[ceco_key] = cost_center_id
-
-            # Si el proveedor era nuevo o no tenía CECO, le heredamos este para futuras facturas
-            if not supplier.cost_center_id:
-                supplier.cost_center_id = cost_center_id
-                supplier.updated_by_id = user_id
-                db.add(supplier)
-
-        # =========================================================
-        #  EXTRAER MONTOS, FECHAS Y CLASIFICAR EL TIPO DE COMPROBANTE
-        # =========================================================
-        try:
-            monto_total_raw = float(row.get("Total", 0))
-        except:
-            monto_total_raw = 0.0
-
-        # 1. Detectar el Tipo de Comprobante (I=Ingreso, E=Egreso, P=Pago)
-        tipo_raw = (
-            str(row.get("Tipo") or row.get("Tipo de Comprobante") or "I")
-            .strip()
-            .upper()
-        )
-        tipo_comprobante = tipo_raw[0] if tipo_raw else "I"
-
-        # 2. Lógica Financiera Inteligente según el Tipo
-        if tipo_comprobante == "E" or monto_total_raw < 0:
-            tipo_comprobante = "E"
-            # Asegurarnos de que el monto de la nota de crédito sea estrictamente negativo
-            monto_total = -abs(monto_total_raw) if monto_total_raw != 0 else 0.0
-            saldo_pendiente = monto_total
-            estatus = models.InvoiceStatus.PENDIENTE
-
-        elif tipo_comprobante == "P":
-            # Es un complemento de pago del SAT
-            monto_total = abs(monto_total_raw)
-            saldo_pendiente = 0.0
-            estatus = models.InvoiceStatus.PAGADO
-
-        else:
-            # Factura normal de CxP (Ingreso - 'I')
-            tipo_comprobante = "I"
-            monto_total = abs(monto_total_raw)
-            saldo_pendiente = monto_total
-            estatus = models.InvoiceStatus.PENDIENTE
-
-        # Fechas
-        fecha_cruda = row.get("Fecha") or row.get("Fecha emisión")
-        fecha_emision_limpia = parse_flexible_date(fecha_cruda)
-
-        # Los días de crédito: Prioridad -> Lo que tenga la BD, si no, el buscarV
-        dias_credito = supplier.dias_credito
-        if not dias_credito or dias_credito == 0:
-            dias_credito = datos_sugeridos["dias"]
-            if dias_credito > 0:
-                supplier.dias_credito = dias_credito
-                supplier.updated_by_id = user_id
-                db.add(supplier)
-
-        fecha_vencimiento_limpia = fecha_emision_limpia + timedelta(
-            days=(dias_credito or 0)
-        )
-
-        metodo_pago = str(row.get("Método de Pago") or "").split("-")[0].strip()[:5]
-        forma_pago = str(row.get("Forma de Pago") or "").split("-")[0].strip()[:5]
-
-        # Concepto (se guarda completo)
-        concepto_bruto = str(
-            row.get("Conceptos") or "Factura importada del SAT"
-        ).strip()
-
-        moneda_raw = str(row.get("Moneda") or "MXN").strip()[:3].upper()
-        moneda_limpia = moneda_raw if moneda_raw in ["MXN", "USD", "EUR"] else "MXN"
-
-        # Creación de la factura
-        nueva_factura = models.PayableInvoice(
-            supplier_id=supplier.id,
-            cost_center_id=cost_center_id,
-            uuid=uuid_fiscal,
-            folio=str(row.get("Folio") or ""),
-            concepto=concepto_bruto,
-            monto_total=monto_total,
-            saldo_pendiente=saldo_pendiente,
-            moneda=moneda_limpia,
-            fecha_emision=fecha_emision_limpia,
-            fecha_vencimiento=fecha_vencimiento_limpia,
-            metodo_pago=metodo_pago,
-            forma_pago=forma_pago,
-            tipo_comprobante=tipo_comprobante,  # <- Aquí inyectamos I, E o P
-            estatus=estatus,  # <- Aquí inyectamos el estatus corregido
-            created_by_id=user_id,
-        )
-        db.add(nueva_factura)
-        facturas_creadas += 1
-
-    db.commit()
-
-    return {
-        "status": "success",
-        "message": f"Proceso SAT exitoso. Facturas Creadas: {facturas_creadas}. Ignoradas: {facturas_ignoradas}. Nuevos CECOs detectados: {cecos_creados}.",
-    }
+    """
+    Importa el reporte maestro del SAT (ver `sat_import`): consultas por
+    conjunto e inserción masiva, con reporte por fila.
+    """
+    resultado = sat_import.importar_reporte_sat(db, payload_data, user_id)
+    mensaje = sat_import.mensaje_resultado(resultado)
+    return {"status": "success", "message": mensaje, **resultado}
 
 
 def conciliate_bank_movement(db: Session, movement_id: int, user_id: int):
@@ -1174,10 +670,6 @@ def delete_bank_movement(db: Session, movement_id: int, user_id: int):
                 invoice = (
                     db.query(models.ReceivableInvoice)
                     .filter(models.ReceivableInvoice.id == pago_cxc.invoice_id)
-                    .options(
-                        lazyload(models.ReceivableInvoice.created_by),
-                        lazyload(models.ReceivableInvoice.updated_by),
-                    )
                     .with_for_update(of=models.ReceivableInvoice)
                     .first()
                 )
@@ -1458,7 +950,7 @@ from typing import Optional
 from datetime import date
 from app.models import models
 from app.models.models import AuditLog, User, RecordStatus
-from sqlalchemy.orm import Session, joinedload, lazyload, selectinload
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 
 def get_cfdi_vault_records(
@@ -2207,61 +1699,43 @@ def get_consolidated_balances(db: Session, tipo: str = "clientes"):
     """
     Genera el reporte consolidado de deuda total por empresa (Lo que piden en vez de Excel simple).
     tipo: 'clientes' (Cuentas por Cobrar) o 'proveedores' (Cuentas por Pagar)
-    """
-    consolidado = []
 
-    if tipo == "clientes":
-        clientes = (
-            db.query(models.Client)
-            .filter(models.Client.record_status != RecordStatus.ELIMINADO)
-            .all()
-        )
-        for cli in clientes:
-            deuda = (
-                db.query(func.sum(models.ReceivableInvoice.saldo_pendiente))
-                .filter(
-                    models.ReceivableInvoice.client_id == cli.id,
-                    models.ReceivableInvoice.record_status != RecordStatus.ELIMINADO,
-                )
-                .scalar()
-                or 0.0
+    Una sola consulta: agrupada sobre las facturas o, con
+    FINANCE_CONSOLIDATED_BALANCES_MATERIALIZED, sobre `consolidated_balances`.
+    """
+    tipo = balances.TIPO_CLIENTES if tipo == "clientes" else balances.TIPO_PROVEEDORES
+    entidad = models.Client if tipo == balances.TIPO_CLIENTES else models.Supplier
+
+    if balances.FINANCE_CONSOLIDATED_BALANCES_MATERIALIZED:
+        deuda = (
+            db.query(
+                models.ConsolidatedBalance.entidad_id.label("entidad_id"),
+                models.ConsolidatedBalance.deuda_total.label("deuda"),
             )
-
-            if deuda > 0:
-                consolidado.append(
-                    {
-                        "id": cli.id,
-                        "empresa": cli.razon_social,
-                        "rfc": cli.rfc,
-                        "deuda_total": deuda,
-                    }
-                )
-    else:
-        proveedores = (
-            db.query(models.Supplier)
-            .filter(models.Supplier.record_status != RecordStatus.ELIMINADO)
-            .all()
+            .filter(models.ConsolidatedBalance.tipo == tipo)
+            .subquery()
         )
-        for prov in proveedores:
-            deuda = (
-                db.query(func.sum(models.PayableInvoice.saldo_pendiente))
-                .filter(
-                    models.PayableInvoice.supplier_id == prov.id,
-                    models.PayableInvoice.record_status != RecordStatus.ELIMINADO,
-                )
-                .scalar()
-                or 0.0
-            )
+    else:
+        deuda = balances.deuda_por_entidad(tipo).subquery()
 
-            if deuda > 0:
-                consolidado.append(
-                    {
-                        "id": prov.id,
-                        "empresa": prov.razon_social,
-                        "rfc": prov.rfc,
-                        "deuda_total": deuda,
-                    }
-                )
+    filas = (
+        db.query(entidad.id, entidad.razon_social, entidad.rfc, deuda.c.deuda)
+        .join(deuda, deuda.c.entidad_id == entidad.id)
+        .filter(
+            entidad.record_status != RecordStatus.ELIMINADO,
+            deuda.c.deuda > 0,
+        )
+        # Ordenar de mayor a menor deuda
+        .order_by(deuda.c.deuda.desc(), entidad.id)
+        .all()
+    )
 
-    # Ordenar de mayor a menor deuda
-    return sorted(consolidado, key=lambda x: x["deuda_total"], reverse=True)
+    return [
+        {
+            "id": f.id,
+            "empresa": f.razon_social,
+            "rfc": f.rfc,
+            "deuda_total": f.deuda,
+        }
+        for f in filas
+    ]
@@ -0,0 +1,535 @@
+"""
+Libro de saldos bancarios (`bank_account_daily_balances`).
+
+Una fila por cuenta y día con movimientos: ingresos, egresos, número de
+movimientos y saldo al cierre (acumulado de todos los movimientos vigentes
+de la cuenta hasta ese día). Con la llave (cuenta, día):
+
+- `saldo_al` da el saldo a cualquier fecha con una sola lectura por índice,
+  sin volver a sumar movimientos.
+- `movimientos_con_saldo` lista los movimientos de una cuenta con el saldo
+  después de cada uno: parte del cierre del día anterior y acumula.
+
+Mantenimiento incremental: los cambios ORM a BankMovement (alta, baja lógica
+o física, monto, tipo, fecha o cuenta) marcan los días afectados (valor
+anterior y nuevo) y, antes del commit, esos días se recalculan desde los
+movimientos en la misma transacción, con un advisory lock por cuenta. La
+diferencia de un día se suma al cierre de los días posteriores en un solo
+UPDATE. Las inserciones por Core (estado de cuenta) llaman a
+`recalcular_dias` directamente.
+
+El saldo inicial de una cuenta y los ajustes manuales de `saldo` entran al
+libro como movimientos (`registrar_ajuste_saldo`, origen AJUSTE_SALDO), así
+el libro parte del mismo saldo que la cuenta.
+
+`BankAccount.saldo` se sigue moviendo en el lugar. `reconciliar` (script
+`reconciliar_saldos_bancarios.py`) reconstruye el libro, corrige los días
+que no coinciden y reporta las cuentas cuyo saldo no cuadra con sus
+movimientos.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import (
+    DateTime,
+    case,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    literal,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.db.pagination import paginar_keyset
+from app.models.models import (
+    BankAccount,
+    BankAccountDailyBalance,
+    BankMovement,
+    RecordStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+# Primer entero del advisory lock (el segundo es la cuenta)
+_LOCK_LEDGER = 7_301_025
+_PENDIENTES = "ledger_bancario_pendientes"
+_COLUMNAS = ("bank_account_id", "tipo", "monto", "fecha", "record_status")
+_TOLERANCIA = 0.005
+ORIGEN_AJUSTE_SALDO = "AJUSTE_SALDO"
+
+_tabla = BankAccountDailyBalance.__table__
+
+
+def _neto():
+    return case(
+        (BankMovement.tipo == "ingreso", BankMovement.monto),
+        (BankMovement.tipo == "egreso", -BankMovement.monto),
+        else_=0.0,
+    )
+
+
+def totales_por_dia():
+    """Select (cuenta, dia, ingresos, egresos, movimientos) de los movimientos vigentes."""
+    dia = func.date(BankMovement.fecha)
+    return (
+        select(
+            BankMovement.bank_account_id,
+            dia.label("dia"),
+            func.coalesce(
+                func.sum(
+                    case(
+                        (BankMovement.tipo == "ingreso", BankMovement.monto), else_=0.0
+                    )
+                ),
+                0.0,
+            ).label("ingresos"),
+            func.coalesce(
+                func.sum(
+                    case((BankMovement.tipo == "egreso", BankMovement.monto), else_=0.0)
+                ),
+                0.0,
+            ).label("egresos"),
+            func.count().label("movimientos"),
+        )
+        .where(BankMovement.record_status != RecordStatus.ELIMINADO)
+        .group_by(BankMovement.bank_account_id, dia)
+    )
+
+
+def _totales(ingresos, egresos, movimientos) -> tuple:
+    return round(float(ingresos or 0), 2), round(float(egresos or 0), 2), movimientos
+
+
+# ==========================================================================
+# CONSULTAS
+# ==========================================================================
+
+
+def saldo_al(db: Session, cuenta_id: int, fecha: date) -> float:
+    """Saldo de la cuenta al cierre de `fecha` según sus movimientos."""
+    saldo = db.execute(
+        select(_tabla.c.saldo_cierre)
+        .where(_tabla.c.bank_account_id == cuenta_id, _tabla.c.dia <= fecha)
+        .order_by(_tabla.c.dia.desc())
+        .limit(1)
+    ).scalar()
+    return round(saldo or 0.0, 2)
+
+
+def _saldo_antes_de(db: Session, cuenta_id: int, fila) -> float:
+    """Saldo justo antes de un movimiento: cierre del día anterior + lo previo del día."""
+    previo_del_dia = db.execute(
+        select(func.coalesce(func.sum(_neto()), 0.0)).where(
+            BankMovement.bank_account_id == cuenta_id,
+            BankMovement.record_status != RecordStatus.ELIMINADO,
+            BankMovement.fecha >= fila.dia,
+            tuple_(BankMovement.fecha, BankMovement.id) < tuple_(fila.fecha, fila.id),
+        )
+    ).scalar()
+    return saldo_al(db, cuenta_id, fila.dia - timedelta(days=1)) + previo_del_dia
+
+
+def movimientos_con_saldo(
+    db: Session,
+    cuenta_id: int,
+    fecha_desde: date | None = None,
+    fecha_hasta: date | None = None,
+    cursor: str | None = None,
+    limit: int = 500,
+):
+    """
+    Movimientos vigentes de la cuenta del más antiguo al más reciente, cada
+    uno con el saldo después de aplicarlo: (filas, siguiente_cursor).
+    """
+    query = db.query(
+        BankMovement.id,
+        BankMovement.fecha,
+        func.date(BankMovement.fecha).label("dia"),
+        BankMovement.tipo,
+        BankMovement.monto,
+        BankMovement.concepto,
+        BankMovement.referencia,
+        BankMovement.conciliado,
+        _neto().label("neto"),
+    ).filter(
+        BankMovement.bank_account_id == cuenta_id,
+        BankMovement.record_status != RecordStatus.ELIMINADO,
+    )
+    if fecha_desde:
+        query = query.filter(BankMovement.fecha >= fecha_desde)
+    if fecha_hasta:
+        query = query.filter(BankMovement.fecha < fecha_hasta + timedelta(days=1))
+
+    filas, siguiente = paginar_keyset(
+        query, [BankMovement.fecha, BankMovement.id], cursor, limit
+    )
+    if not filas:
+        return [], siguiente
+
+    saldo = _saldo_antes_de(db, cuenta_id, filas[0])
+    movimientos = []
+    for fila in filas:
+        saldo += fila.neto
+        movimientos.append(
+            {
+                "id": fila.id,
+                "fecha": fila.fecha,
+                "tipo": fila.tipo,
+                "monto": fila.monto,
+                "concepto": fila.concepto,
+                "referencia": fila.referencia,
+                "conciliado": bool(fila.conciliado),
+                "saldo": round(saldo, 2),
+            }
+        )
+    return movimientos, siguiente
+
+
+# ==========================================================================
+# AJUSTES DE SALDO
+# ==========================================================================
+
+
+def registrar_ajuste_saldo(
+    db: Session, cuenta: BankAccount, diferencia: float, concepto: str, user_id=None
+):
+    """
+    Registra como movimiento un cambio de saldo que no viene de una operación
+    (saldo inicial o ajuste manual). Nace conciliado: no hay documento que lo
+    explique. No toca `cuenta.saldo`; lo mueve quien llama.
+    """
+    diferencia = round(diferencia or 0.0, 2)
+    if not diferencia:
+        return None
+
+    movimiento = BankMovement(
+        bank_account_id=cuenta.id,
+        tipo="ingreso" if diferencia > 0 else "egreso",
+        monto=abs(diferencia),
+        concepto=concepto,
+        origen_modulo=ORIGEN_AJUSTE_SALDO,
+        fecha=datetime.now(),
+        conciliado=True,
+        fecha_conciliacion=date.today(),
+        created_by_id=user_id,
+    )
+    db.add(movimiento)
+    return movimiento
+
+
+# ==========================================================================
+# RECÁLCULO
+# ==========================================================================
+
+
+def recalcular_dias(db: Session, cuenta_id: int, dias) -> int:
+    """
+    Recalcula los días indicados de la cuenta desde sus movimientos y mueve
+    el cierre de los días posteriores. Devuelve cuántos días cambiaron.
+    """
+    dias = sorted(set(d for d in dias if d is not None))
+    if not dias:
+        return 0
+    db.execute(select(func.pg_advisory_xact_lock(_LOCK_LEDGER, cuenta_id)))
+
+    nuevos = {
+        fila.dia: _totales(fila.ingresos, fila.egresos, fila.movimientos)
+        for fila in db.execute(
+            totales_por_dia().where(
+                BankMovement.bank_account_id == cuenta_id,
+                BankMovement.fecha >= dias[0],
+                BankMovement.fecha < dias[-1] + timedelta(days=1),
+                func.date(BankMovement.fecha).in_(dias),
+            )
+        )
+    }
+    actuales = {
+        fila.dia: _totales(fila.ingresos, fila.egresos, fila.movimientos)
+        for fila in db.execute(
+            select(_tabla).where(
+                _tabla.c.bank_account_id == cuenta_id, _tabla.c.dia.in_(dias)
+            )
+        )
+    }
+
+    cambios = 0
+    for dia in dias:
+        nuevo = nuevos.get(dia, (0.0, 0.0, 0))
+        actual = actuales.get(dia, (0.0, 0.0, 0))
+        if nuevo == actual:
+            continue
+        cambios += 1
+        ingresos, egresos, movimientos = nuevo
+
+        if movimientos:
+            cierre = saldo_al(db, cuenta_id, dia - timedelta(days=1))
+            stmt = pg_insert(_tabla).values(
+                bank_account_id=cuenta_id,
+                dia=dia,
+                ingresos=ingresos,
+                egresos=egresos,
+                movimientos=movimientos,
+                saldo_cierre=round(cierre + ingresos - egresos, 2),
+            )
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["bank_account_id", "dia"],
+                    set_={
+                        c: stmt.excluded[c]
+                        for c in ("ingresos", "egresos", "movimientos", "saldo_cierre")
+                    },
+                )
+            )
+        else:
+            db.execute(
+                delete(_tabla).where(
+                    _tabla.c.bank_account_id == cuenta_id, _tabla.c.dia == dia
+                )
+            )
+
+        diferencia = round((ingresos - egresos) - (actual[0] - actual[1]), 2)
+        if diferencia:
+            db.execute(
+                update(_tabla)
+                .where(_tabla.c.bank_account_id == cuenta_id, _tabla.c.dia > dia)
+                .values(saldo_cierre=_tabla.c.saldo_cierre + diferencia)
+            )
+    return cambios
+
+
+def reconstruir_cuenta(db: Session, cuenta_id: int) -> int:
+    """
+    Recalcula el libro completo de la cuenta y lo reemplaza si difiere.
+    Devuelve cuántos días no coincidían.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(_LOCK_LEDGER, cuenta_id)))
+
+    totales = (
+        totales_por_dia().where(BankMovement.bank_account_id == cuenta_id).subquery()
+    )
+    serie = select(
+        totales.c.dia,
+        totales.c.ingresos,
+        totales.c.egresos,
+        totales.c.movimientos,
+        func.sum(totales.c.ingresos - totales.c.egresos)
+        .over(order_by=totales.c.dia)
+        .label("saldo_cierre"),
+    )
+    nuevas = {
+        fila.dia: (
+            *_totales(fila.ingresos, fila.egresos, fila.movimientos),
+            round(fila.saldo_cierre, 2),
+        )
+        for fila in db.execute(serie)
+    }
+    actuales = {
+        fila.dia: (
+            *_totales(fila.ingresos, fila.egresos, fila.movimientos),
+            round(fila.saldo_cierre, 2),
+        )
+        for fila in db.execute(
+            select(_tabla).where(_tabla.c.bank_account_id == cuenta_id)
+        )
+    }
+    distintos = {
+        dia
+        for dia in nuevas.keys() | actuales.keys()
+        if nuevas.get(dia) != actuales.get(dia)
+    }
+    if not distintos:
+        return 0
+
+    # Core: el libro no genera auditoría ni pasa por los listeners
+    db.execute(delete(_tabla).where(_tabla.c.bank_account_id == cuenta_id))
+    if nuevas:
+        db.execute(
+            insert(_tabla),
+            [
+                {
+                    "bank_account_id": cuenta_id,
+                    "dia": dia,
+                    "ingresos": ingresos,
+                    "egresos": egresos,
+                    "movimientos": movimientos,
+                    "saldo_cierre": saldo_cierre,
+                }
+                for dia, (
+                    ingresos,
+                    egresos,
+                    movimientos,
+                    saldo_cierre,
+                ) in nuevas.items()
+            ],
+        )
+    return len(distintos)
+
+
+def reconciliar(db: Session, cuenta_ids=None) -> dict:
+    """
+    Reconstruye el libro de cada cuenta (commit por cuenta) y compara el
+    saldo final con `BankAccount.saldo`. La cuenta se bloquea mientras se
+    revisa para que un movimiento en curso no aparezca como descuadre.
+    """
+    query = db.query(BankAccount.id).filter(
+        BankAccount.record_status != RecordStatus.ELIMINADO
+    )
+    if cuenta_ids:
+        query = query.filter(BankAccount.id.in_(cuenta_ids))
+    ids = [cuenta_id for (cuenta_id,) in query.order_by(BankAccount.id)]
+
+    detalle = []
+    dias_corregidos = 0
+    for cuenta_id in ids:
+        try:
+            cuenta = (
+                db.query(BankAccount)
+                .filter(BankAccount.id == cuenta_id)
+                .with_for_update()
+                .one()
+            )
+            corregidos = reconstruir_cuenta(db, cuenta_id)
+            saldo_libro = saldo_al(db, cuenta_id, date.max)
+            saldo_cuenta = round(cuenta.saldo or 0.0, 2)
+            alias = cuenta.alias
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        dias_corregidos += corregidos
+        diferencia = round(saldo_cuenta - saldo_libro, 2)
+        if corregidos or abs(diferencia) > _TOLERANCIA:
+            detalle.append(
+                {
+                    "bank_account_id": cuenta_id,
+                    "alias": alias,
+                    "dias_corregidos": corregidos,
+                    "saldo_cuenta": saldo_cuenta,
+                    "saldo_movimientos": saldo_libro,
+                    "diferencia": diferencia,
+                }
+            )
+
+    return {
+        "cuentas_revisadas": len(ids),
+        "dias_corregidos": dias_corregidos,
+        "cuentas_descuadradas": sum(
+            1 for d in detalle if abs(d["diferencia"]) > _TOLERANCIA
+        ),
+        "detalle": detalle,
+    }
+
+
+# ==========================================================================
+# MANTENIMIENTO INCREMENTAL (EVENTOS DE SESIÓN)
+# ==========================================================================
+
+
+def _valores(estado, columna: str) -> list:
+    # Sin cargar nada: solo lo que la sesión ya tiene (anterior y nuevo)
+    return [v for v in estado.attrs[columna].history.sum() if v is not None]
+
+
+def _conservar_anterior(target, value, oldvalue, initiator):
+    return value
+
+
+# Cambiar la fecha o la cuenta de un movimiento expirado (tras un commit) deja
+# el valor anterior en el historial: sin él no se sabe qué día recalcular
+for _columna in ("bank_account_id", "fecha"):
+    event.listen(
+        getattr(BankMovement, _columna),
+        "set",
+        _conservar_anterior,
+        retval=True,
+        active_history=True,
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _marcar_dias_afectados(session, flush_context):
+    for obj, es_edicion in (
+        *((o, False) for o in session.new),
+        *((o, True) for o in session.dirty),
+        *((o, False) for o in session.deleted),
+    ):
+        if type(obj) is not BankMovement:
+            continue
+        estado = inspect(obj)
+        if es_edicion and not any(
+            estado.attrs[c].history.has_changes() for c in _COLUMNAS
+        ):
+            continue
+
+        pendientes = session.info.setdefault(_PENDIENTES, {"fechas": set(), "ids": {}})
+        # Cuenta y fecha anteriores y nuevas: mover un movimiento cambia dos días
+        cuentas = _valores(estado, "bank_account_id")
+        fechas = [v for v in _valores(estado, "fecha") if isinstance(v, datetime)]
+        pendientes["fechas"].update(
+            (cuenta_id, fecha) for cuenta_id in cuentas for fecha in fechas
+        )
+        if obj.id is not None:
+            pendientes["ids"].setdefault(obj.id, set()).update(cuentas)
+
+
+def _dias_pendientes(session: Session, pendientes: dict) -> dict:
+    # El día se calcula en la BD: date() usa la zona de la sesión, igual que
+    # el recálculo
+    dias = defaultdict(set)
+    for cuenta_id, fecha in pendientes["fechas"]:
+        dias[cuenta_id].add(
+            session.execute(
+                select(func.date(literal(fecha, DateTime(timezone=True))))
+            ).scalar()
+        )
+    ids = pendientes["ids"]
+    if ids:
+        # Día actual del movimiento, también en la cuenta de la que salió
+        for movimiento_id, cuenta_id, dia in session.execute(
+            select(
+                BankMovement.id,
+                BankMovement.bank_account_id,
+                func.date(BankMovement.fecha),
+            ).where(BankMovement.id.in_(ids))
+        ):
+            for cuenta in {cuenta_id, *ids[movimiento_id]}:
+                dias[cuenta].add(dia)
+    return dias
+
+
+@event.listens_for(Session, "before_commit")
+def _recalcular_dias_pendientes(session):
+    # Liberar un savepoint también dispara before_commit: se espera al commit real
+    if session.in_nested_transaction():
+        return
+    # Sin autoflush, el flush del commit llega después de este evento
+    session.flush()
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if not pendientes:
+        return
+
+    try:
+        with session.begin_nested():
+            # Orden fijo de cuentas: dos commits nunca toman los locks al revés
+            for cuenta_id, dias in sorted(
+                _dias_pendientes(session, pendientes).items()
+            ):
+                recalcular_dias(session, cuenta_id, dias)
+    except Exception as e:
+        # El libro nunca tumba el movimiento; reconciliar_saldos_bancarios.py lo corrige
+        logger.error(f"No se pudo actualizar el libro de saldos bancarios: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_dias_pendientes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDIENTES, None)
@@ -0,0 +1,693 @@
+"""
+Conciliación bancaria automática.
+
+`proponer_conciliaciones` toma los movimientos no conciliados de una cuenta
+en una ventana de fechas y los cruza contra lo que el sistema tiene abierto:
+
+- ingresos: cobros de CxC (`ReceivableInvoicePayment`) y facturas de CxC
+  con saldo
+- egresos: pagos de CxP (`InvoicePayment`) y facturas de CxP con saldo
+
+Los documentos se cargan una vez (solo columnas) y se ordenan por monto en
+centavos; cada movimiento busca su rango (monto ± tolerancia) con `bisect`,
+sin importar qué tan amplia sea la tolerancia. El
+puntaje (0-100) suma monto exacto, referencia (UUID, folio o referencia del
+pago dentro de la referencia o el concepto del banco) y cercanía de fechas.
+
+1. Uno a uno: mismo monto (± tolerancia). Se asigna de mayor a menor
+   puntaje sin repetir movimiento ni documento.
+2. Muchos a uno: para los movimientos que quedan, 2 o 3 documentos del
+   mismo cliente o proveedor que suman el monto. Las sumas se precalculan
+   por contraparte.
+
+`aplicar_conciliaciones` guarda las propuestas aceptadas en
+`bank_reconciliations` y marca los movimientos como conciliados en un solo
+commit. No registra cobros ni pagos: liga el movimiento con el documento
+que lo explica, y lo ya ligado deja de proponerse. Antes de escribir vuelve
+a validar cada documento contra la BD (existe, sigue abierto, corresponde
+al tipo de movimiento y el monto cabe en lo que le falta por conciliar)
+con un advisory lock por documento, para que dos lotes simultáneos no
+concilien la misma factura de más.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_, select, true, update
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.models.models import RecordStatus
+
+CXC_PAGO = "cxc_pago"
+CXC_FACTURA = "cxc_factura"
+CXP_PAGO = "cxp_pago"
+CXP_FACTURA = "cxp_factura"
+TIPOS_POR_MOVIMIENTO = {
+    "ingreso": (CXC_PAGO, CXC_FACTURA),
+    "egreso": (CXP_PAGO, CXP_FACTURA),
+}
+
+UNO_A_UNO = "uno_a_uno"
+MUCHOS_A_UNO = "muchos_a_uno"
+
+PUNTOS_MONTO = 50
+PUNTOS_SUMA = 40
+PUNTOS_REFERENCIA = 35
+PUNTOS_FECHA = 15
+
+# Documentos por contraparte que entran a las sumas (los más recientes)
+_MAX_DOCS_PAREJAS = 60
+_MAX_DOCS_TERNAS = 25
+_LARGO_MIN_REFERENCIA = 4
+_NO_ALFANUMERICO = re.compile(r"[^0-9A-Z]+")
+_ESTATUS_ABIERTOS = [models.InvoiceStatus.PENDIENTE, models.InvoiceStatus.PAGO_PARCIAL]
+# Primer entero del advisory lock por documento (el segundo es su id)
+_LOCKS_DOCUMENTO = {
+    CXC_PAGO: 7_302_301,
+    CXC_FACTURA: 7_302_302,
+    CXP_PAGO: 7_302_303,
+    CXP_FACTURA: 7_302_304,
+}
+
+
+@dataclass
+class Documento:
+    tipo: str
+    id: int
+    contraparte: int | None
+    monto: float  # lo que falta por conciliar
+    fecha: date  # fecha del pago o de emisión de la factura
+    vencimiento: date | None  # solo facturas
+    referencias: tuple
+
+    @property
+    def llave(self):
+        return self.tipo, self.id
+
+
+def _compacto(*textos) -> str:
+    return "".join(_NO_ALFANUMERICO.sub("", str(t).upper()) for t in textos if t)
+
+
+def _referencias(*valores) -> tuple:
+    """Referencias comparables de un documento: alfanuméricas y en mayúsculas."""
+    refs = set()
+    for valor in valores:
+        ref = _compacto(valor)
+        if len(ref) >= _LARGO_MIN_REFERENCIA:
+            refs.add(ref)
+            # En el banco suele viajar solo el primer bloque del UUID
+            if len(ref) == 32:
+                refs.add(ref[:8])
+    return tuple(refs)
+
+
+def _centavos(monto: float) -> int:
+    return round(monto * 100)
+
+
+def _rango(ordenados: list, centavos: int, tol_centavos: int) -> tuple:
+    """Posiciones [inicio, fin) de `ordenados` dentro de centavos ± tolerancia."""
+    return (
+        bisect_left(ordenados, centavos - tol_centavos),
+        bisect_right(ordenados, centavos + tol_centavos),
+    )
+
+
+def _por_monto(pares) -> dict:
+    """tipo_movimiento -> (centavos ordenados, valores en el mismo orden)."""
+    por_tipo = defaultdict(list)
+    for mov_tipo, centavos, valor in pares:
+        por_tipo[mov_tipo].append((centavos, valor))
+    indice = {}
+    for mov_tipo, items in por_tipo.items():
+        items.sort(key=lambda item: item[0])
+        indice[mov_tipo] = ([c for c, _v in items], [v for _c, v in items])
+    return indice
+
+
+# =========================================================
+#  CARGA DE MOVIMIENTOS Y DOCUMENTOS
+# =========================================================
+
+
+def _movimientos_pendientes(db: Session, cuenta_id: int, desde: date, hasta: date):
+    mov = models.BankMovement
+    inicio = datetime.combine(desde, datetime.min.time())
+    fin = datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+    return (
+        db.query(mov.id, mov.tipo, mov.monto, mov.fecha, mov.referencia, mov.concepto)
+        .filter(
+            mov.bank_account_id == cuenta_id,
+            mov.record_status != RecordStatus.ELIMINADO,
+            mov.conciliado.is_(False),
+            mov.monto > 0,
+            mov.tipo.in_(list(TIPOS_POR_MOVIMIENTO)),
+            mov.fecha >= inicio,
+            mov.fecha < fin,
+            or_(mov.concepto.is_(None), ~mov.concepto.ilike("Reverso%")),
+        )
+        .order_by(mov.fecha, mov.id)
+        .all()
+    )
+
+
+def _montos_ligados(db: Session, tipos, ids: dict | None = None) -> dict:
+    """(tipo, documento_id) -> monto ya conciliado contra movimientos vigentes."""
+    rec = models.BankReconciliation
+    filas = (
+        db.query(rec.tipo_documento, rec.documento_id, func.sum(rec.monto))
+        .join(models.BankMovement, models.BankMovement.id == rec.bank_movement_id)
+        .filter(
+            rec.tipo_documento.in_(tipos),
+            rec.record_status != RecordStatus.ELIMINADO,
+            models.BankMovement.record_status != RecordStatus.ELIMINADO,
+        )
+        .group_by(rec.tipo_documento, rec.documento_id)
+    )
+    if ids is not None:
+        filas = filas.filter(
+            rec.documento_id.in_({doc_id for t in tipos for doc_id in ids.get(t, ())})
+        )
+    return {(tipo, doc_id): total for tipo, doc_id, total in filas}
+
+
+def _documentos(
+    db: Session,
+    cuenta: models.BankAccount,
+    tipos,
+    desde: date | None,
+    hasta: date | None,
+    tolerancia_dias: int = 0,
+    ids: dict | None = None,
+):
+    """
+    Documentos abiertos de los `tipos` pedidos, con su monto por conciliar.
+    Con `ids` (tipo -> ids) solo esos documentos y sin ventana de fechas.
+    """
+    if ids is None:
+        inicio = desde - timedelta(days=tolerancia_dias)
+        fin = hasta + timedelta(days=tolerancia_dias)
+    else:
+        inicio, fin = date.min, date.max
+    monedas = [c for c in models.Currency if c.value == (cuenta.moneda or "MXN")]
+    ligados = _montos_ligados(db, tipos, ids)
+    documentos = []
+
+    def solo(columna, tipo):
+        return columna.in_(ids.get(tipo, ())) if ids is not None else true()
+
+    def agregar(tipo, doc_id, contraparte, monto, fecha, vencimiento, *refs):
+        restante = round((monto or 0) - ligados.get((tipo, doc_id), 0), 2)
+        if restante > 0 and fecha is not None:
+            documentos.append(
+                Documento(
+                    tipo,
+                    doc_id,
+                    contraparte,
+                    restante,
+                    fecha,
+                    vencimiento,
+                    _referencias(*refs),
+                )
+            )
+
+    if CXC_PAGO in tipos:
+        pago, inv = models.ReceivableInvoicePayment, models.ReceivableInvoice
+        filas = (
+            db.query(
+                pago.id,
+                inv.client_id,
+                pago.monto,
+                pago.fecha_pago,
+                pago.referencia,
+                inv.uuid,
+                inv.folio_interno,
+            )
+            .join(inv, inv.id == pago.invoice_id)
+            .filter(
+                solo(pago.id, CXC_PAGO),
+                pago.record_status != RecordStatus.ELIMINADO,
+                pago.estatus != "CANCELADO",
+                pago.fecha_pago.between(inicio, fin),
+                or_(
+                    pago.bank_account_id == cuenta.id,
+                    and_(
+                        pago.bank_account_id.is_(None),
+                        or_(
+                            pago.cuenta_deposito.is_(None),
+                            pago.cuenta_deposito == str(cuenta.id),
+                        ),
+                    ),
+                ),
+            )
+        )
+        for doc_id, cliente, monto, fecha, *refs in filas:
+            agregar(CXC_PAGO, doc_id, cliente, monto, fecha, None, *refs)
+
+    if CXC_FACTURA in tipos:
+        inv = models.ReceivableInvoice
+        filas = db.query(
+            inv.id,
+            inv.client_id,
+            inv.saldo_pendiente,
+            inv.fecha_emision,
+            inv.fecha_vencimiento,
+            inv.uuid,
+            inv.folio_interno,
+        ).filter(
+            solo(inv.id, CXC_FACTURA),
+            inv.record_status != RecordStatus.ELIMINADO,
+            inv.estatus.in_(_ESTATUS_ABIERTOS),
+            inv.saldo_pendiente > 0,
+            inv.fecha_emision <= fin,
+            inv.moneda.in_(monedas),
+        )
+        for fila in filas:
+            agregar(CXC_FACTURA, *fila)
+
+    if CXP_PAGO in tipos:
+        pago, inv = models.InvoicePayment, models.PayableInvoice
+        filas = (
+            db.query(
+                pago.id,
+                inv.supplier_id,
+                pago.monto,
+                pago.fecha_pago,
+                pago.referencia,
+                inv.uuid,
+                inv.folio,
+            )
+            .join(inv, inv.id == pago.invoice_id)
+            .filter(
+                solo(pago.id, CXP_PAGO),
+                pago.record_status != RecordStatus.ELIMINADO,
+                pago.estatus != "CANCELADO",
+                pago.fecha_pago.between(inicio, fin),
+                or_(pago.bank_account_id == cuenta.id, pago.bank_account_id.is_(None)),
+            )
+        )
+        for doc_id, proveedor, monto, fecha, *refs in filas:
+            agregar(CXP_PAGO, doc_id, proveedor, monto, fecha, None, *refs)
+
+    if CXP_FACTURA in tipos:
+        inv = models.PayableInvoice
+        filas = db.query(
+            inv.id,
+            inv.supplier_id,
+            inv.saldo_pendiente,
+            inv.fecha_emision,
+            inv.fecha_vencimiento,
+            inv.uuid,
+            inv.folio,
+            inv.folio_interno,
+        ).filter(
+            solo(inv.id, CXP_FACTURA),
+            inv.record_status != RecordStatus.ELIMINADO,
+            inv.estatus.in_(_ESTATUS_ABIERTOS),
+            inv.saldo_pendiente > 0,
+            inv.fecha_emision <= fin,
+            inv.moneda.in_(monedas),
+        )
+        for fila in filas:
+            agregar(CXP_FACTURA, *fila)
+
+    return documentos
+
+
+# =========================================================
+#  PUNTAJE
+# =========================================================
+
+
+def _puntos_fecha(doc: Documento, fecha_mov: date, tolerancia_dias: int):
+    """0-1 por cercanía de fechas; None si la fecha descarta el documento."""
+    if doc.vencimiento is None:
+        dias = abs((fecha_mov - doc.fecha).days)
+        return None if dias > tolerancia_dias else 1 - dias / (tolerancia_dias + 1)
+    # Factura: no se paga antes de emitirse; ideal, antes del vencimiento
+    if fecha_mov < doc.fecha - timedelta(days=tolerancia_dias):
+        return None
+    return (
+        1.0 if fecha_mov <= doc.vencimiento + timedelta(days=tolerancia_dias) else 0.3
+    )
+
+
+def _referenciado(doc: Documento, texto_mov: tuple) -> bool:
+    """
+    `texto_mov` = (referencia + concepto, referencia) compactos. Coincide si
+    una referencia del documento viene en el banco, o la del banco es parte
+    de la del documento ("778899" en "SPEI 778899").
+    """
+    texto, referencia = texto_mov
+    return any(
+        ref in texto or (len(referencia) >= _LARGO_MIN_REFERENCIA and referencia in ref)
+        for ref in doc.referencias
+    )
+
+
+def _propuesta(mov, documentos, tipo_match, score, texto_mov) -> dict:
+    return {
+        "movement_id": mov.id,
+        "tipo": mov.tipo,
+        "monto": mov.monto,
+        "fecha": mov.fecha.date(),
+        "referencia": mov.referencia,
+        "concepto": mov.concepto,
+        "tipo_match": tipo_match,
+        "score": round(score, 1),
+        "documentos": [
+            {
+                "tipo": d.tipo,
+                "id": d.id,
+                "monto": d.monto,
+                "fecha": d.fecha,
+                "referencia_coincide": _referenciado(d, texto_mov),
+            }
+            for d in documentos
+        ],
+    }
+
+
+# =========================================================
+#  MOTOR
+# =========================================================
+
+
+def _uno_a_uno(movimientos, por_monto, tol_centavos, tolerancia_dias, textos):
+    """Pares (score, movimiento, documento) con el mismo monto."""
+    pares = []
+    for mov in movimientos:
+        if mov.tipo not in por_monto:
+            continue
+        montos, docs = por_monto[mov.tipo]
+        inicio, fin = _rango(montos, _centavos(mov.monto), tol_centavos)
+        fecha_mov = mov.fecha.date()
+        for doc in docs[inicio:fin]:
+            fecha = _puntos_fecha(doc, fecha_mov, tolerancia_dias)
+            if fecha is None:
+                continue
+            score = PUNTOS_MONTO + PUNTOS_FECHA * fecha
+            if _referenciado(doc, textos[mov.id]):
+                score += PUNTOS_REFERENCIA
+            pares.append((score, mov, doc))
+    # Desempate estable: movimiento más antiguo, luego documento por id
+    pares.sort(key=lambda p: (-p[0], p[1].fecha, p[1].id, p[2].tipo, p[2].id))
+    return pares
+
+
+def _sumas_por_contraparte(documentos, buscados: dict, tol_centavos: int) -> dict:
+    """
+    (tipo_movimiento, centavos) -> grupos de 2 o 3 documentos de la misma
+    contraparte que suman eso. Solo se guardan las sumas que caen a la
+    tolerancia de algún movimiento (`buscados`: tipo_movimiento -> centavos
+    ordenados).
+    """
+
+    def buscada(objetivos, suma):
+        inicio, fin = _rango(objetivos, suma, tol_centavos)
+        return inicio < fin
+
+    por_contraparte = defaultdict(list)
+    for mov_tipo, doc in documentos:
+        if doc.contraparte is not None and buscados.get(mov_tipo):
+            por_contraparte[(mov_tipo, doc.contraparte)].append(doc)
+
+    sumas = defaultdict(list)
+    for (mov_tipo, _contraparte), docs in por_contraparte.items():
+        objetivos = buscados[mov_tipo]
+        tope = objetivos[-1] + tol_centavos
+        docs.sort(key=lambda d: (d.fecha, d.id), reverse=True)
+        items = [(_centavos(d.monto), d) for d in docs[:_MAX_DOCS_PAREJAS]]
+        for i, (c1, d1) in enumerate(items):
+            for j in range(i + 1, len(items)):
+                c2, d2 = items[j]
+                par = c1 + c2
+                if buscada(objetivos, par):
+                    sumas[(mov_tipo, par)].append((d1, d2))
+                if j >= _MAX_DOCS_TERNAS or par >= tope:
+                    continue
+                for c3, d3 in items[j + 1 : _MAX_DOCS_TERNAS]:
+                    if buscada(objetivos, par + c3):
+                        sumas[(mov_tipo, par + c3)].append((d1, d2, d3))
+    return sumas
+
+
+def _muchos_a_uno(movimientos, sumas, usados, tol_centavos, tolerancia_dias, textos):
+    """Mejor grupo libre para cada movimiento, en orden de fecha."""
+    claves = _por_monto((mov_tipo, c, c) for mov_tipo, c in sumas)
+    for mov in movimientos:
+        if mov.tipo not in claves:
+            continue
+        montos, _valores = claves[mov.tipo]
+        inicio, fin = _rango(montos, _centavos(mov.monto), tol_centavos)
+        fecha_mov = mov.fecha.date()
+        mejor = None
+        for c in montos[inicio:fin]:
+            for grupo in sumas[(mov.tipo, c)]:
+                if any(d.llave in usados for d in grupo):
+                    continue
+                fechas = [_puntos_fecha(d, fecha_mov, tolerancia_dias) for d in grupo]
+                if None in fechas:
+                    continue
+                referenciados = sum(_referenciado(d, textos[mov.id]) for d in grupo)
+                score = (
+                    PUNTOS_SUMA
+                    + PUNTOS_REFERENCIA * referenciados / len(grupo)
+                    + PUNTOS_FECHA * sum(fechas) / len(grupo)
+                    - 5 * (len(grupo) - 2)
+                )
+                if mejor is None or score > mejor[0]:
+                    mejor = (score, grupo)
+        if mejor:
+            yield mov, mejor[1], mejor[0]
+
+
+def proponer_conciliaciones(
+    db: Session,
+    bank_account_id: int,
+    fecha_desde: date,
+    fecha_hasta: date,
+    tolerancia_dias: int = 3,
+    tolerancia_monto: float = 0.01,
+    score_minimo: float = 50,
+    muchos_a_uno: bool = True,
+) -> dict:
+    """
+    Propuestas de conciliación para los movimientos pendientes de la cuenta
+    entre `fecha_desde` y `fecha_hasta`. Ningún documento se propone dos
+    veces; un movimiento sin propuesta queda en `sin_propuesta`.
+    """
+    cuenta = (
+        db.query(models.BankAccount)
+        .filter(
+            models.BankAccount.id == bank_account_id,
+            models.BankAccount.record_status != RecordStatus.ELIMINADO,
+        )
+        .first()
+    )
+    if not cuenta:
+        raise HTTPException(status_code=404, detail="Cuenta bancaria no encontrada.")
+    if fecha_hasta < fecha_desde:
+        raise HTTPException(
+            status_code=400, detail="fecha_hasta debe ser posterior a fecha_desde."
+        )
+
+    movimientos = _movimientos_pendientes(db, cuenta.id, fecha_desde, fecha_hasta)
+    tipos = {t for m in movimientos for t in TIPOS_POR_MOVIMIENTO[m.tipo]}
+    documentos = [
+        (mov_tipo, doc)
+        for doc in _documentos(
+            db, cuenta, tipos, fecha_desde, fecha_hasta, tolerancia_dias
+        )
+        for mov_tipo, propios in TIPOS_POR_MOVIMIENTO.items()
+        if doc.tipo in propios
+    ]
+
+    por_monto = _por_monto(
+        (mov_tipo, _centavos(doc.monto), doc) for mov_tipo, doc in documentos
+    )
+    textos = {
+        m.id: (_compacto(m.referencia, m.concepto), _compacto(m.referencia))
+        for m in movimientos
+    }
+    tol_centavos = _centavos(tolerancia_monto)
+
+    # 1. Uno a uno, de mayor a menor puntaje
+    usados, asignados, propuestas = set(), set(), []
+    for score, mov, doc in _uno_a_uno(
+        movimientos, por_monto, tol_centavos, tolerancia_dias, textos
+    ):
+        if score < score_minimo or mov.id in asignados or doc.llave in usados:
+            continue
+        asignados.add(mov.id)
+        usados.add(doc.llave)
+        propuestas.append(_propuesta(mov, [doc], UNO_A_UNO, score, textos[mov.id]))
+
+    # 2. Muchos a uno con lo que quedó libre
+    if muchos_a_uno:
+        restantes = [m for m in movimientos if m.id not in asignados]
+        buscados = defaultdict(list)
+        for m in restantes:
+            buscados[m.tipo].append(_centavos(m.monto))
+        for objetivos in buscados.values():
+            objetivos.sort()
+        libres = [(t, d) for t, d in documentos if d.llave not in usados]
+        sumas = (
+            _sumas_por_contraparte(libres, buscados, tol_centavos) if restantes else {}
+        )
+        for mov, grupo, score in _muchos_a_uno(
+            restantes, sumas, usados, tol_centavos, tolerancia_dias, textos
+        ):
+            if score < score_minimo:
+                continue
+            usados.update(d.llave for d in grupo)
+            asignados.add(mov.id)
+            propuestas.append(
+                _propuesta(mov, grupo, MUCHOS_A_UNO, score, textos[mov.id])
+            )
+
+    propuestas.sort(key=lambda p: (p["fecha"], p["movement_id"]))
+    return {
+        "bank_account_id": cuenta.id,
+        "movimientos_analizados": len(movimientos),
+        "documentos_analizados": len(documentos),
+        "propuestas": propuestas,
+        "sin_propuesta": [m.id for m in movimientos if m.id not in asignados],
+    }
+
+
+# =========================================================
+#  APLICACIÓN EN BLOQUE
+# =========================================================
+
+
+def _validar_lote(db: Session, conciliaciones: list, movimientos: dict, tol: float):
+    """
+    Revisa el lote contra la BD con los documentos bloqueados. Cualquier
+    diferencia rechaza el lote completo: 400 si el lote es incongruente,
+    409 si el documento ya no admite ese monto.
+    """
+    vistos = set()
+    for c in conciliaciones:
+        movimiento = movimientos[c["movement_id"]]
+        permitidos = TIPOS_POR_MOVIMIENTO.get(movimiento.tipo, ())
+        for d in c["documentos"]:
+            if d["tipo"] not in permitidos:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"El movimiento {movimiento.id} es {movimiento.tipo}: "
+                    f"no se concilia con {d['tipo']} {d['id']}.",
+                )
+            if (d["tipo"], d["id"]) in vistos:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"El documento {d['tipo']} {d['id']} viene más de una vez en el lote.",
+                )
+            vistos.add((d["tipo"], d["id"]))
+        total = round(sum(d["monto"] for d in c["documentos"]), 2)
+        if abs(total - movimiento.monto) > tol + 1e-9:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Los documentos del movimiento {movimiento.id} suman "
+                f"{total:,.2f} y el movimiento es de {movimiento.monto:,.2f}.",
+            )
+
+    # Orden fijo: dos lotes simultáneos nunca toman los locks al revés
+    for tipo, doc_id in sorted(vistos):
+        db.execute(select(func.pg_advisory_xact_lock(_LOCKS_DOCUMENTO[tipo], doc_id)))
+
+    # Después del lock: lo que otro lote ya ligó y confirmó se descuenta
+    por_cuenta = defaultdict(lambda: defaultdict(set))
+    for c in conciliaciones:
+        cuenta_id = movimientos[c["movement_id"]].bank_account_id
+        for d in c["documentos"]:
+            por_cuenta[cuenta_id][d["tipo"]].add(d["id"])
+    for cuenta_id, ids in por_cuenta.items():
+        cuenta = db.get(models.BankAccount, cuenta_id)
+        restantes = {
+            doc.llave: doc.monto
+            for doc in _documentos(db, cuenta, set(ids), None, None, ids=ids)
+        }
+        for c in conciliaciones:
+            if movimientos[c["movement_id"]].bank_account_id != cuenta_id:
+                continue
+            for d in c["documentos"]:
+                restante = restantes.get((d["tipo"], d["id"]))
+                if restante is None:
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"El documento {d['tipo']} {d['id']} no existe, ya "
+                        f"está conciliado o no corresponde a la cuenta.",
+                    )
+                if round(d["monto"], 2) > restante:
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"El documento {d['tipo']} {d['id']} solo tiene "
+                        f"{restante:,.2f} por conciliar (se enviaron {d['monto']:,.2f}).",
+                    )
+
+
+def aplicar_conciliaciones(
+    db: Session, conciliaciones: list, user_id: int, tolerancia_monto: float = 0.01
+) -> dict:
+    """
+    Guarda las conciliaciones aceptadas (`movement_id`, `documentos` con
+    `tipo`, `id` y `monto`, `score` opcional) y marca los movimientos como
+    conciliados. Todo o nada: un movimiento ya conciliado o inexistente, o
+    un documento que no cuadra (ver `_validar_lote`), rechaza el lote
+    completo.
+    """
+    ids = [c["movement_id"] for c in conciliaciones]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(
+            status_code=400, detail="Un movimiento viene más de una vez en el lote."
+        )
+
+    mov = models.BankMovement
+    movimientos = {
+        fila.id: fila
+        for fila in db.query(mov.id, mov.bank_account_id, mov.tipo, mov.monto)
+        .filter(
+            mov.id.in_(ids),
+            mov.record_status != RecordStatus.ELIMINADO,
+            mov.conciliado.is_(False),
+        )
+        .order_by(mov.id)
+        .with_for_update()
+    }
+    faltantes = sorted(set(ids) - set(movimientos))
+    if faltantes:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Movimientos inexistentes o ya conciliados: {faltantes}",
+        )
+    _validar_lote(db, conciliaciones, movimientos, tolerancia_monto)
+
+    ligas = [
+        {
+            "bank_movement_id": c["movement_id"],
+            "tipo_documento": d["tipo"],
+            "documento_id": d["id"],
+            "monto": d["monto"],
+            "score": c.get("score"),
+            "created_by_id": user_id,
+        }
+        for c in conciliaciones
+        for d in c["documentos"]
+    ]
+    if ligas:
+        db.execute(models.BankReconciliation.__table__.insert(), ligas)
+    db.execute(
+        update(mov)
+        .where(mov.id.in_(ids))
+        .values(conciliado=True, fecha_conciliacion=date.today(), updated_by_id=user_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return {"movimientos_conciliados": len(ids), "documentos_ligados": len(ligas)}
@@ -4,7 +4,7 @@ import shutil
 import json
 import traceback
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 from io import BytesIO
 
 import pandas as pd
@@ -13,18 +13,27 @@ from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Response,
     UploadFile,
     File,
     Body,
     status,
     Form,
     Query,
+    BackgroundTasks,
 )
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session, joinedload
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload, selectinload
 from lxml import etree
 
 from app.db.database import get_db
+from app.db.pagination import (
+    HEADER_SIGUIENTE,
+    paginar_keyset_en_lotes,
+    publicar_cursor,
+)
 from app.models import models
 from app.modules.auth.router import get_current_active_user
 from app.modules.auth.router import RequirePermission
@@ -32,7 +41,15 @@ from app.modules.auth.router import RequirePermission
 from openpyxl.drawing.image import Image as OpenpyxlImage
 
 # IMPORTACIONES LOCALES (FSD)
-from . import schemas, crud
+from . import (
+    bank_statement,
+    schemas,
+    crud,
+    ledger,
+    reconciliation,
+    sat_import,
+    sat_reader,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -189,10 +206,203 @@ def delete_bank_account(
         )
 
 
+def _cuenta_bancaria(db: Session, account_id: int) -> models.BankAccount:
+    cuenta = (
+        db.query(models.BankAccount)
+        .filter(
+            models.BankAccount.id == account_id,
+            models.BankAccount.record_status != models.RecordStatus.ELIMINADO,
+        )
+        .first()
+    )
+    if not cuenta:
+        raise HTTPException(status_code=404, detail="Cuenta bancaria no encontrada.")
+    return cuenta
+
+
+@router.post("/bank-accounts/{account_id}/statement")
+def import_bank_statement(
+    account_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Importa el estado de cuenta del banco (CSV, Excel u OFX) con el layout
+    de la cuenta. Las líneas ya importadas se omiten y las que ya registró un
+    cobro, pago o captura manual se reportan como posibles duplicados; ver
+    `bank_statement`.
+    """
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if extension not in bank_statement.FORMATOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato no soportado. Usa {', '.join(bank_statement.FORMATOS)}.",
+        )
+    cuenta = _cuenta_bancaria(db, account_id)
+
+    try:
+        upload_dir = "app/storage/bulk_uploads"
+        os.makedirs(upload_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        stored_filename = f"{timestamp}_{file.filename}"
+        file_path = os.path.join(upload_dir, stored_filename)
+
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+
+        carga = models.BulkUploadHistory(
+            filename=file.filename,
+            stored_filename=stored_filename,
+            file_path=file_path,
+            upload_type=bank_statement.CARGA_ESTADO_CUENTA,
+            status=sat_import.CARGA_PENDIENTE,
+            record_count=0,
+            user_id=current_user.id,
+            created_by_id=current_user.id,
+        )
+        db.add(carga)
+        db.commit()
+        return bank_statement.importar_estado_cuenta(db, cuenta, carga, current_user.id)
+    except bank_statement.EstadoCuentaInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        error_details = traceback.format_exc()
+        print(
+            "\n"
+            + "=" * 50
+            + "\n  ERROR CRÍTICO EN import_bank_statement  \n"
+            + error_details
+            + "\n"
+            + "=" * 50
+            + "\n"
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Cazador de bugs activado. Error real: {str(e)}"
+        )
+
+
+@router.get(
+    "/bank-accounts/{account_id}/balance", response_model=schemas.SaldoCuentaAlCorte
+)
+def read_bank_account_balance(
+    account_id: int,
+    fecha: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Saldo de la cuenta al cierre de `fecha` (hoy si no viene), desde el libro."""
+    try:
+        cuenta = _cuenta_bancaria(db, account_id)
+        fecha = fecha or date.today()
+        return {
+            "bank_account_id": cuenta.id,
+            "fecha": fecha,
+            "saldo": ledger.saldo_al(db, cuenta.id, fecha),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        error_details = traceback.format_exc()
+        print(
+            "\n"
+            + "=" * 50
+            + "\n  ERROR CRÍTICO EN read_bank_account_balance  \n"
+            + error_details
+            + "\n"
+            + "=" * 50
+            + "\n"
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Cazador de bugs activado. Error real: {str(e)}"
+        )
+
+
+@router.get(
+    "/bank-accounts/{account_id}/ledger",
+    response_model=List[schemas.MovimientoLibroBancario],
+)
+def read_bank_account_ledger(
+    account_id: int,
+    response: Response,
+    limit: int = Query(500, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Movimientos de la cuenta del más antiguo al más reciente con el saldo
+    después de cada uno. La siguiente página viaja en el header X-Next-Cursor.
+    """
+    try:
+        cuenta = _cuenta_bancaria(db, account_id)
+        movimientos, siguiente = ledger.movimientos_con_saldo(
+            db,
+            cuenta.id,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            cursor=cursor,
+            limit=limit,
+        )
+        publicar_cursor(response, siguiente)
+        return movimientos
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        error_details = traceback.format_exc()
+        print(
+            "\n"
+            + "=" * 50
+            + "\n  ERROR CRÍTICO EN read_bank_account_ledger  \n"
+            + error_details
+            + "\n"
+            + "=" * 50
+            + "\n"
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Cazador de bugs activado. Error real: {str(e)}"
+        )
+
+
 @router.get("/movements", response_model=List[schemas.BankMovementResponse])
-def read_movements(db: Session = Depends(get_db)):
+def read_movements(
+    response: Response,
+    skip: int = 0,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    bank_account_id: Optional[int] = None,
+    conciliado: Optional[bool] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Movimientos bancarios, del más reciente al más antiguo. Sin `limit` ni
+    `cursor` responde todos (comportamiento anterior); con `limit` la
+    siguiente página viaja en el header X-Next-Cursor (mandarlo como `cursor`).
+    """
     try:
-        return crud.get_bank_movements(db)
+        movements, siguiente = crud.get_bank_movements(
+            db,
+            skip,
+            limit,
+            cursor=cursor,
+            bank_account_id=bank_account_id,
+            conciliado=conciliado,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+        )
+        publicar_cursor(response, siguiente)
+        return movements
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         error_details = traceback.format_exc()
@@ -247,6 +457,89 @@ def conciliate_movement(
         )
 
 
+@router.get(
+    "/reconciliation/proposals",
+    response_model=schemas.ConciliacionPropuestasResponse,
+)
+def read_reconciliation_proposals(
+    bank_account_id: int,
+    fecha_desde: date,
+    fecha_hasta: date,
+    tolerancia_dias: int = Query(3, ge=0, le=60),
+    tolerancia_monto: float = Query(0.01, ge=0, le=5),
+    score_minimo: float = Query(50, ge=0, le=100),
+    muchos_a_uno: bool = True,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Propone conciliaciones (uno a uno y muchos a uno, con puntaje) para los
+    movimientos pendientes de la cuenta en la ventana de fechas. No escribe.
+    """
+    try:
+        return reconciliation.proponer_conciliaciones(
+            db,
+            bank_account_id,
+            fecha_desde,
+            fecha_hasta,
+            tolerancia_dias=tolerancia_dias,
+            tolerancia_monto=tolerancia_monto,
+            score_minimo=score_minimo,
+            muchos_a_uno=muchos_a_uno,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        error_details = traceback.format_exc()
+        print(
+            "\n"
+            + "=" * 50
+            + "\n  ERROR CRÍTICO EN read_reconciliation_proposals  \n"
+            + error_details
+            + "\n"
+            + "=" * 50
+            + "\n"
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Cazador de bugs activado. Error real: {str(e)}"
+        )
+
+
+@router.post("/reconciliation/apply")
+def apply_reconciliations(
+    payload: schemas.ConciliacionAplicarPayload,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Aplica en bloque las conciliaciones aceptadas (todo o nada)."""
+    try:
+        return reconciliation.aplicar_conciliaciones(
+            db,
+            [c.model_dump() for c in payload.conciliaciones],
+            user_id=current_user.id,
+            tolerancia_monto=payload.tolerancia_monto,
+        )
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        error_details = traceback.format_exc()
+        print(
+            "\n"
+            + "=" * 50
+            + "\n  ERROR CRÍTICO EN apply_reconciliations  \n"
+            + error_details
+            + "\n"
+            + "=" * 50
+            + "\n"
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Cazador de bugs activado. Error real: {str(e)}"
+        )
+
+
 @router.delete("/movements/{movement_id}")
 def delete_bank_movement(
     movement_id: int,
@@ -310,20 +603,61 @@ def create_manual_movement(
 
 @router.post("/invoices/bulk-upload")
 async def bulk_upload_invoices(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    json_data: str = Form(...),
+    json_data: Optional[str] = Form(None),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
+    """
+    Con `json_data` (filas ya convertidas en el navegador) importa en la
+    misma petición. Sin él, el servidor lee el archivo guardado en streaming
+    (ver `sat_reader`) en segundo plano: responde con `upload_id` y el
+    avance se consulta en `GET /invoices/bulk-upload/{upload_id}`.
+    """
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if json_data is None and extension not in sat_reader.FORMATOS:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                "Formato no soportado para lectura en el servidor. "
+                f"Usa {', '.join(sat_reader.FORMATOS)} o envía json_data."
+            ),
+        )
+
     try:
         upload_dir = "app/storage/bulk_uploads"
         os.makedirs(upload_dir, exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_path = os.path.join(upload_dir, f"{timestamp}_{file.filename}")
+        stored_filename = f"{timestamp}_{file.filename}"
+        file_path = os.path.join(upload_dir, stored_filename)
 
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
+        if json_data is None:
+            carga = models.BulkUploadHistory(
+                filename=file.filename,
+                stored_filename=stored_filename,
+                file_path=file_path,
+                upload_type=sat_import.CARGA_FACTURAS_SAT,
+                status=sat_import.CARGA_PENDIENTE,
+                record_count=0,
+                user_id=current_user.id,
+                created_by_id=current_user.id,
+            )
+            db.add(carga)
+            db.commit()
+            background_tasks.add_task(
+                sat_import.procesar_carga_sat, carga.id, current_user.id
+            )
+            return {
+                "status": "processing",
+                "message": "Archivo recibido. La importación sigue en segundo plano.",
+                "upload_id": carga.id,
+                "file_stored": file_path,
+            }
+
         data = json.loads(json_data)
         # <--- AUDITORÍA PARAM (Pasamos current_user.id para la masiva de facturas)
         resultado = crud.process_sat_master_report(
@@ -350,129 +684,219 @@ async def bulk_upload_invoices(
         )
 
 
+def _carga_sat(db: Session, upload_id: int) -> models.BulkUploadHistory:
+    carga = db.get(models.BulkUploadHistory, upload_id)
+    if not carga or carga.upload_type != sat_import.CARGA_FACTURAS_SAT:
+        raise HTTPException(status_code=404, detail="Carga no encontrada")
+    return carga
+
+
+@router.get("/invoices/bulk-upload/{upload_id}")
+def get_bulk_upload_status(
+    upload_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Avance de una carga en segundo plano: filas leídas y contadores."""
+    carga = _carga_sat(db, upload_id)
+    return {
+        "upload_id": carga.id,
+        "filename": carga.filename,
+        "status": carga.status,
+        "filas_procesadas": carga.record_count or 0,
+        "resumen": carga.resumen or {},
+        "created_at": carga.created_at,
+        "updated_at": carga.updated_at,
+    }
+
+
+@router.get("/invoices/bulk-upload/{upload_id}/reporte")
+def download_bulk_upload_report(
+    upload_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Reporte por fila (CSV) de una carga en segundo plano."""
+    ruta = sat_import.ruta_reporte(_carga_sat(db, upload_id))
+    if not os.path.exists(ruta):
+        raise HTTPException(status_code=404, detail="Reporte no disponible")
+    return FileResponse(
+        ruta, filename=os.path.basename(ruta), media_type="text/csv; charset=utf-8"
+    )
+
+
 # =====================================================================
 # RECEIVABLES (Cuentas por Cobrar & Puente a Tesorería)
 # =====================================================================
 
 
+def _receivable_a_dict(inv) -> dict:
+    """Fila del listado de CxC (mismo formato que consume la pantalla)."""
+    pagos_list = [
+        {
+            "id": p.id,
+            "fecha_pago": p.fecha_pago.isoformat() if p.fecha_pago else None,
+            "monto": p.monto,
+            "metodo_pago": p.metodo_pago,
+            "referencia": p.referencia or "S/R",
+            "cuenta_deposito": p.cuenta_deposito,
+            "complemento_uuid": p.complemento_uuid,
+            "estatus": getattr(p, "estatus", "ACTIVO"),
+        }
+        for p in sorted(inv.payments, key=lambda p: p.id)
+    ]
+
+    folio_display = inv.folio_interno or (
+        f"CXC-TRP-{inv.viaje_id}"
+        if inv.viaje_id
+        else (f"SAT-{str(inv.uuid)[:8]}" if inv.uuid else f"PROVISIONAL-{inv.id}")
+    )
+
+    trip_data = None
+    if inv.trip:
+        conts = []
+        if inv.trip.contenedor_1 and inv.trip.contenedor_1 not in ["N/A", ""]:
+            conts.append(inv.trip.contenedor_1)
+        if inv.trip.contenedor_2 and inv.trip.contenedor_2 not in ["N/A", ""]:
+            conts.append(inv.trip.contenedor_2)
+        contenedores_str = " / ".join(conts) if conts else "Sin contenedor"
+
+        trip_data = {
+            "origen": inv.trip.origin,
+            "destino": inv.trip.destination,
+            "peso_toneladas": inv.trip.peso_toneladas,
+            "contenedores": contenedores_str,
+            "producto_sat": f"[{inv.trip.sat_clave_producto or '01010101'}] {inv.trip.descripcion_mercancia or 'Carga General'}",
+        }
+
+    # Prevenir error 500 al serializar los Enums a JSON puro:
+    estatus_val = (
+        inv.estatus.value if hasattr(inv.estatus, "value") else str(inv.estatus)
+    )
+    moneda_val = (
+        inv.moneda.value if hasattr(inv.moneda, "value") else str(inv.moneda or "MXN")
+    )
+
+    return {
+        "id": inv.id,
+        "uuid": inv.uuid,
+        "uuid_relacionado": inv.uuid_relacionado,
+        "folio_interno": folio_display,
+        "concepto": inv.concepto or "Servicio de Flete",
+        "subtotal": inv.subtotal,
+        "iva": inv.iva,
+        "retenciones": inv.retenciones,
+        "monto_total": inv.monto_total,
+        "saldo_pendiente": inv.saldo_pendiente,
+        "fecha_emision": inv.fecha_emision.isoformat() if inv.fecha_emision else None,
+        "fecha_vencimiento": (
+            inv.fecha_vencimiento.isoformat() if inv.fecha_vencimiento else None
+        ),
+        "estatus": estatus_val,
+        "moneda": moneda_val,
+        "referencia": getattr(inv.trip, "referencia", "") if inv.trip else "",
+        "trip_info": trip_data,
+        "pdf_url": inv.pdf_url,
+        "pdf_status": inv.pdf_status,
+        "xml_url": inv.xml_url,
+        "payments": pagos_list,
+        "client": (
+            {
+                "id": inv.client.id,
+                "razon_social": inv.client.razon_social,
+                "rfc": inv.client.rfc,
+            }
+            if inv.client
+            else None
+        ),
+    }
+
+
+# Columnas por las que se puede ordenar el listado (desempate por id)
+_ORDEN_RECEIVABLES = {
+    "id": models.ReceivableInvoice.id,
+    "fecha_emision": models.ReceivableInvoice.fecha_emision,
+    "fecha_vencimiento": models.ReceivableInvoice.fecha_vencimiento,
+    "monto_total": models.ReceivableInvoice.monto_total,
+    "saldo_pendiente": models.ReceivableInvoice.saldo_pendiente,
+}
+_LOTE_RECEIVABLES = 500
+
+
 @router.get("/receivables")
 def get_receivable_invoices(
-    skip: int = 0, limit: int = 5000, db: Session = Depends(get_db)
+    skip: int = 0,
+    limit: int = Query(5000, ge=1),
+    cursor: Optional[str] = None,
+    client_id: Optional[int] = None,
+    estatus: Optional[models.InvoiceStatus] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    con_saldo: bool = False,
+    q: Optional[str] = None,
+    sort: Literal[
+        "id", "fecha_emision", "fecha_vencimiento", "monto_total", "saldo_pendiente"
+    ] = "id",
+    order: Literal["asc", "desc"] = "desc",
+    db: Session = Depends(get_db),
 ):
+    """
+    Facturas de CxC (más recientes primero por defecto), filtradas y
+    ordenadas en el servidor:
+
+    - `client_id`, `estatus`, `fecha_desde` / `fecha_hasta` (emisión,
+      inclusivas), `con_saldo` (saldo pendiente > 0) y `q` (folio interno o
+      UUID).
+    - `sort` / `order`; la página siguiente viaja en el header
+      X-Next-Cursor (mandarlo como `cursor`) en lugar de `skip`.
+
+    El JSON sale en streaming y las facturas se leen por lotes, así que la
+    memoria no crece con el tamaño de la página.
+    """
     try:
-        invoices = (
-            db.query(models.ReceivableInvoice)
+        Factura = models.ReceivableInvoice
+        query = (
+            db.query(Factura)
             .options(
-                joinedload(models.ReceivableInvoice.client),
-                joinedload(models.ReceivableInvoice.payments),
-                joinedload(models.ReceivableInvoice.trip),
+                joinedload(Factura.client),
+                selectinload(Factura.payments),
+                joinedload(Factura.trip),
             )
             .filter(
-                models.ReceivableInvoice.record_status != models.RecordStatus.ELIMINADO,
-                models.ReceivableInvoice.is_nominal == False,
+                Factura.record_status != models.RecordStatus.ELIMINADO,
+                Factura.is_nominal == False,
             )
-            .order_by(models.ReceivableInvoice.id.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
         )
-
-        response = []
-        for inv in invoices:
-            if getattr(inv, "is_nominal", False) == True:
-                continue
-
-            pagos_list = [
-                {
-                    "id": p.id,
-                    "fecha_pago": p.fecha_pago.isoformat() if p.fecha_pago else None,
-                    "monto": p.monto,
-                    "metodo_pago": p.metodo_pago,
-                    "referencia": p.referencia or "S/R",
-                    "cuenta_deposito": p.cuenta_deposito,
-                    "complemento_uuid": p.complemento_uuid,
-                    "estatus": getattr(p, "estatus", "ACTIVO"),
-                }
-                for p in inv.payments
-            ]
-
-            folio_display = inv.folio_interno or (
-                f"CXC-TRP-{inv.viaje_id}"
-                if inv.viaje_id
-                else (
-                    f"SAT-{str(inv.uuid)[:8]}" if inv.uuid else f"PROVISIONAL-{inv.id}"
-                )
-            )
-
-            trip_data = None
-            if inv.trip:
-                conts = []
-                if inv.trip.contenedor_1 and inv.trip.contenedor_1 not in ["N/A", ""]:
-                    conts.append(inv.trip.contenedor_1)
-                if inv.trip.contenedor_2 and inv.trip.contenedor_2 not in ["N/A", ""]:
-                    conts.append(inv.trip.contenedor_2)
-                contenedores_str = " / ".join(conts) if conts else "Sin contenedor"
-
-                trip_data = {
-                    "origen": inv.trip.origin,
-                    "destino": inv.trip.destination,
-                    "peso_toneladas": inv.trip.peso_toneladas,
-                    "contenedores": contenedores_str,
-                    "producto_sat": f"[{inv.trip.sat_clave_producto or '01010101'}] {inv.trip.descripcion_mercancia or 'Carga General'}",
-                }
-
-            # Prevenir error 500 al serializar los Enums a JSON puro:
-            estatus_val = (
-                inv.estatus.value if hasattr(inv.estatus, "value") else str(inv.estatus)
-            )
-            moneda_val = (
-                inv.moneda.value
-                if hasattr(inv.moneda, "value")
-                else str(inv.moneda or "MXN")
-            )
-
-            response.append(
-                {
-                    "id": inv.id,
-                    "uuid": inv.uuid,
-                    "uuid_relacionado": inv.uuid_relacionado,
-                    "folio_interno": folio_display,
-                    "concepto": inv.concepto or "Servicio de Flete",
-                    "subtotal": inv.subtotal,
-                    "iva": inv.iva,
-                    "retenciones": inv.retenciones,
-                    "monto_total": inv.monto_total,
-                    "saldo_pendiente": inv.saldo_pendiente,
-                    "fecha_emision": (
-                        inv.fecha_emision.isoformat() if inv.fecha_emision else None
-                    ),
-                    "fecha_vencimiento": (
-                        inv.fecha_vencimiento.isoformat()
-                        if inv.fecha_vencimiento
-                        else None
-                    ),
-                    "estatus": estatus_val,
-                    "moneda": moneda_val,
-                    "referencia": (
-                        getattr(inv.trip, "referencia", "") if inv.trip else ""
-                    ),
-                    "trip_info": trip_data,
-                    "pdf_url": inv.pdf_url,
-                    "xml_url": inv.xml_url,
-                    "payments": pagos_list,
-                    "client": (
-                        {
-                            "id": inv.client.id,
-                            "razon_social": inv.client.razon_social,
-                            "rfc": inv.client.rfc,
-                        }
-                        if inv.client
-                        else None
-                    ),
-                }
+        if client_id is not None:
+            query = query.filter(Factura.client_id == client_id)
+        if estatus is not None:
+            query = query.filter(Factura.estatus == estatus)
+        if fecha_desde is not None:
+            query = query.filter(Factura.fecha_emision >= fecha_desde)
+        if fecha_hasta is not None:
+            query = query.filter(Factura.fecha_emision <= fecha_hasta)
+        if con_saldo:
+            query = query.filter(Factura.saldo_pendiente > 0)
+        if q and q.strip():
+            patron = f"%{q.strip()}%"
+            query = query.filter(
+                or_(Factura.folio_interno.ilike(patron), Factura.uuid.ilike(patron))
             )
 
-        return response
+        orden = [_ORDEN_RECEIVABLES[sort]]
+        if sort != "id":
+            orden.append(Factura.id)
+        invoices, siguiente = paginar_keyset_en_lotes(
+            query,
+            orden,
+            cursor,
+            limit,
+            descendente=order == "desc",
+            skip=skip,
+            lote=_LOTE_RECEIVABLES,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         error_details = traceback.format_exc()
@@ -489,6 +913,27 @@ def get_receivable_invoices(
             status_code=500, detail=f"Cazador de bugs activado. Error real: {str(e)}"
         )
 
+    def cuerpo():
+        # Mismo JSON que JSONResponse, pero factura por factura
+        try:
+            yield "["
+            for i, inv in enumerate(invoices):
+                fila = json.dumps(
+                    jsonable_encoder(_receivable_a_dict(inv)),
+                    ensure_ascii=False,
+                    allow_nan=False,
+                    separators=(",", ":"),
+                )
+                yield fila if i == 0 else "," + fila
+            yield "]"
+        except Exception:
+            # Los headers ya salieron: solo queda registrar y cortar la respuesta
+            logger.error(f"Error enviando el listado de CxC:\n{traceback.format_exc()}")
+            raise
+
+    headers = {HEADER_SIGUIENTE: siguiente} if siguiente else None
+    return StreamingResponse(cuerpo(), media_type="application/json", headers=headers)
+
 
 @router.delete("/receivables/{invoice_id}")
 def delete_receivable_invoice(
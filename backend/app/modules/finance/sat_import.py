@@ -0,0 +1,814 @@
+"""
+Importación masiva del reporte maestro del SAT a Cuentas por Pagar.
+
+`POST /finance/invoices/bulk-upload` recibe el reporte ya convertido a filas
+(una por CFDI recibido). En lugar de consultar UUID y proveedor fila por
+fila, el importador:
+
+1. Descarta filas sin UUID y UUID repetidos dentro del mismo archivo.
+2. Trae en consultas por conjunto los UUID que ya existen y los proveedores
+   de todos los RFC del archivo.
+3. Resuelve proveedor, días de crédito y centro de costo en memoria, con el
+   catálogo `BASE_PROVEEDORES` indexado (coincidencia exacta y parcial).
+4. Crea de una vez los proveedores nuevos e inserta las facturas con
+   `INSERT ... ON CONFLICT (uuid) DO NOTHING` por lotes.
+
+Devuelve un reporte por fila (`creada`, `duplicada`, `omitida` o `error`).
+Las facturas entran por Core, sin eventos del ORM: el saldo consolidado de
+los proveedores y la caché de costos por CECO se actualizan aquí mismo.
+
+Sin `json_data`, el endpoint guarda el archivo, registra la carga en
+`BulkUploadHistory` y `importar_archivo_sat` lo lee en segundo plano con
+`sat_reader`, por lotes, dejando el avance en la carga y el reporte por fila
+en un CSV junto al archivo.
+"""
+
+import csv
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models import models
+from app.modules.dashboard import cache as dashboard_cache
+from app.modules.finance import balances, sat_reader
+
+logger = logging.getLogger(__name__)
+
+CREADA = "creada"
+DUPLICADA = "duplicada"
+OMITIDA = "omitida"
+ERROR = "error"
+
+_LOTE_CONSULTA = 5000
+_LOTE_INSERT = 1000
+_LARGO_RFC = models.Supplier.__table__.c.rfc.type.length
+_LARGO_UUID = models.PayableInvoice.__table__.c.uuid.type.length
+
+# =========================================================
+#  CATÁLOGO BASE DE PROVEEDORES (días de crédito y CECO sugeridos)
+# =========================================================
+BASE_PROVEEDORES = {
+    "CLO CLO": {"dias": 0, "ceco": "Personal"},
+    "CONCESIONARIA AUTOPISTA PEROTE-XALAPA": {"dias": 0, "ceco": "Operaciones"},
+    "CONSTRUCOMERCIO Y GESTORIA MG": {"dias": 0, "ceco": "Mtto"},
+    "CONSTRUCTORA E INMOBILIARIA MARYLAS": {"dias": 0, "ceco": "Administrativo"},
+    "DOGANIA ISAURA ROSALES LICONA": {"dias": 0, "ceco": "Mtto"},
+    "FISHER'S CONDESA": {"dias": 0, "ceco": "Personal"},
+    "FONDO NACIONAL DE INFRAESTRUCTURA": {"dias": 0, "ceco": "Operaciones"},
+    "LA CASA DEL SOL GASOLINERIA": {"dias": 0, "ceco": "Administrativo"},
+    "LA ESTANCIA DEL PUERTO DE VERACRUZ": {"dias": 0, "ceco": "Personal"},
+    "LA FERRE COMERCIALIZADORA": {"dias": 0, "ceco": "Mtto"},
+    "NUEVA WAL MART DE MEXICO": {"dias": 0, "ceco": "Personal"},
+    "OPERADORA BAJO DE LA TINTORERA": {"dias": 0, "ceco": "Personal"},
+    "OPERADORA DE ESTACIONES GL": {"dias": 0, "ceco": "Administrativo"},
+    "OPTIMA G AUTOSPORT": {"dias": 0, "ceco": "Personal"},
+    "PROMOTORA PLATINIUM": {"dias": 0, "ceco": "Administrativo"},
+    "PROVEEDORA DE ALIMENTOS GOURMET": {"dias": 0, "ceco": "Personal"},
+    "QUALITAS COMPAÑIA DE SEGUROS": {"dias": 0, "ceco": "Seguros"},
+    "ROCIO MOLINA CHAVEZ": {"dias": 0, "ceco": "Operaciones"},
+    "TONY TIENDAS": {"dias": 0, "ceco": "Administrativo"},
+    "ABRAHAM OSORIO TINOCO": {"dias": 0, "ceco": "Administrativo"},
+    "ALEJANDRA FABIOLA FLORES SANDOVAL": {"dias": 15, "ceco": "Administrativo"},
+    "ANGELICA TEMOXTLE GOMEZ": {"dias": 0, "ceco": "Mtto"},
+    "ARTURO ISIDRO PEREZ CUREÑO": {"dias": 0, "ceco": "Mtto"},
+    "ARTURO SABBAGH LANDA": {"dias": 15, "ceco": "Administrativo"},
+    "AUTO SERVICIO GUARDIA": {"dias": 0, "ceco": "Administrativo"},
+    "AUTOMOTRIZ ADRIMAR": {"dias": 8, "ceco": "Mtto"},
+    "BACOLUM": {"dias": 0, "ceco": "Personal"},
+    "BANCO MERCANTIL DEL NORTE": {"dias": 0, "ceco": "Comisiones bancarias"},
+    "BANCO MONEX": {"dias": 0, "ceco": "Personal"},
+    "BANCO NACIONAL DE MEXICO": {"dias": 0, "ceco": "Comisiones bancarias"},
+    "BERENICE GUTIERREZ CAMPOS": {"dias": 0, "ceco": "Mtto"},
+    "BETREIBER LOGISTIK": {"dias": 0, "ceco": "Personal"},
+    "CENTRO GASOLINERO ANIMAS": {"dias": 30, "ceco": "Administrativo"},
+    "CEVER SAN ANTONIO": {"dias": 0, "ceco": "Personal"},
+    "CLARA HERNANDEZ GOMEZ": {"dias": 0, "ceco": "Administrativo"},
+    "COMERCIALIZADORA TR ZONE": {"dias": 25, "ceco": "Mtto"},
+    "CORPORATIVO INTERNACIONAL DE COMERCIO SHIJEHECA": {
+        "dias": 0,
+        "ceco": "Gastos deducibles",
+    },
+    "DAIMLER FINANCIAL SERVICES": {"dias": 15, "ceco": "Adquisiciones"},
+    "DALIA CERON ROLDAN": {"dias": 0, "ceco": "Operaciones"},
+    "DHL EXPRESS MEXICO": {"dias": 0, "ceco": "Administrativo"},
+    "DIESEL MARIMAR": {"dias": 15, "ceco": "Mtto"},
+    "ECONOMIA EN MATERIALES PUBLICITARIOS": {"dias": 0, "ceco": "Administrativo"},
+    "EL PALACIO DE HIERRO": {"dias": 0, "ceco": "Personal"},
+    "EL SABOR AUSTRAL": {"dias": 0, "ceco": "Personal"},
+    "FERNANDO MARTINEZ RUIZ DEL HOYO": {"dias": 0, "ceco": "Mtto"},
+    "FRANCISCO FLORENCIO RODRIGUEZ ROMERO": {"dias": 0, "ceco": "Mtto"},
+    "GASOLINERA JEBLA": {"dias": 0, "ceco": "Administrativo"},
+    "GENOVEVO CHAVEZ GAMBOA": {"dias": 15, "ceco": "Mtto"},
+    "GOMSA CAMIONES": {"dias": 25, "ceco": "Mtto"},
+    "GRUPO FERCHE": {"dias": 30, "ceco": "Administrativo"},
+    "GRUPO RULLAN": {"dias": 0, "ceco": "Mtto"},
+    "HACEMOS FUEGO": {"dias": 0, "ceco": "Personal"},
+    "HAMBURGUESAS RAPIDAS LOMAS": {"dias": 0, "ceco": "Personal"},
+    "HERRAMIENTAS Y ACCESORIOS OLMECA": {"dias": 15, "ceco": "Mtto"},
+    "HOME DEPOT": {"dias": 0, "ceco": "Personal"},
+    "IGNACIO VILLEGAS MONTOYA": {"dias": 0, "ceco": "Operaciones"},
+    "IMPACTO COMERCIAL FERRETERO": {"dias": 0, "ceco": "Mtto"},
+    "INSTITUTO MEXICANO DEL SEGURO SOCIAL": {"dias": 0, "ceco": "Administrativo"},
+    "IVON CAMPOS HERRERA": {"dias": 0, "ceco": "Administrativo"},
+    "JANNA LOGISTIC": {"dias": 0, "ceco": "Administrativo"},
+    "JULIA MAGDALENA GOMEZ TERRONES": {"dias": 0, "ceco": "Administrativo"},
+    "JUST IN TIME": {"dias": 0, "ceco": "Operaciones"},
+    "ROGELIO AGUILAR ROGEL": {"dias": 0, "ceco": "Administrativo"},
+    "LATANST": {"dias": 0, "ceco": "Diesel"},
+    "LUCIO RODRIGUEZ PEREYRA": {"dias": 0, "ceco": "Administrativo"},
+    "LUIS ALBERTO GARCIA BALBUENA": {"dias": 0, "ceco": "Personal"},
+    "MARTHA ELENA MEDINA ROBLEDO": {"dias": 0, "ceco": "Mtto"},
+    "MUELLES Y TRACTOPARTES DEL GOLFO": {"dias": 25, "ceco": "Mtto"},
+    "OFFICE DEPOT": {"dias": 0, "ceco": "Administrativo"},
+    "OPERADORA DE ALIMENTOS DURANGO": {"dias": 0, "ceco": "Personal"},
+    "OPERADORA DE ESTACIONES Y PARADORES": {"dias": 0, "ceco": "Diesel"},
+    "OSCAR LOPEZ MARTINEZ": {"dias": 0, "ceco": "Administrativo"},
+    "PACCAR FINANCIAL": {"dias": 0, "ceco": "Adquisiciones"},
+    "PARADOR TURISTICO SAN PEDRO": {"dias": 0, "ceco": "Diesel"},
+    "PASE, SERVICIOS ELECTRONICOS": {"dias": 0, "ceco": "Casetas"},
+    "PASION SONORENSE": {"dias": 0, "ceco": "Diesel"},
+    "PETROMAX": {"dias": 0, "ceco": "Administrativo"},
+    "PETROVIM": {"dias": 0, "ceco": "Diesel"},
+    "PREVENCION Y REACCION": {"dias": 0, "ceco": "Seguridad"},
+    "PRODUCTOS AHULADOS INDUSTRIALES": {"dias": 25, "ceco": "Llantas"},
+    "PROPIMEX": {"dias": 0, "ceco": "Administrativo"},
+    "PROVEEDOR MAYORISTA AL REFACCIONARIO": {"dias": 20, "ceco": "Mtto"},
+    "RADIOMOVIL DIPSA": {"dias": 30, "ceco": "Administrativo"},
+    "RENOVADORA ZUCA DEL SURESTE": {"dias": 15, "ceco": "Llantas"},
+    "ROBERTO ENRIQUE MUÑOZ CEBALLOS": {"dias": 0, "ceco": "Operaciones"},
+    "SEGURIDAD INDUSTRIAL Y SOLDADURAS": {"dias": 0, "ceco": "Mtto"},
+    "SICONT MEX": {"dias": 0, "ceco": "Administrativo"},
+    "SITRACK": {"dias": 30, "ceco": "Operaciones"},
+    "SUMINISTROS TECNICOS COMAI": {"dias": 0, "ceco": "Mtto"},
+    "TELEFONOS DE MEXICO": {"dias": 0, "ceco": "Administrativo"},
+    "TIENDAS CHEDRAUI": {"dias": 0, "ceco": "Personal"},
+    "TRACTO ACCESORIOS COSTA SUR": {"dias": 15, "ceco": "Mtto"},
+    "TRASLADOS RAPIDOS DE CARGA": {"dias": 0, "ceco": "Operaciones"},
+    "VECTOR, CASA DE BOLSA": {"dias": 0, "ceco": "Administrativo"},
+    "VERIFICENTROS DEL SURESTE": {"dias": 8, "ceco": "Operaciones"},
+    "GRUPO AUTOPISTAS NACIONALES": {"dias": 0, "ceco": "Operaciones"},
+    "REFACCIONARIA GLOBAL TRUCK PARTS": {"dias": 0, "ceco": "Operaciones"},
+    "GOBIERNO DEL ESTADO DE VERACRUZ": {"dias": 0, "ceco": "Operaciones"},
+    "CONCESIONES Y PROMOCIONES MALIBRAN": {"dias": 0, "ceco": "Operaciones"},
+    "CONCESIONARIA LERMA SANTIAGO": {"dias": 0, "ceco": "Operaciones"},
+    "PILOTO AUTOMATICO": {"dias": 0, "ceco": "Mtto"},
+    "GRUPO TRACVER": {"dias": 0, "ceco": "Mtto"},
+    "APE ACEROS DE VERACRUZ": {"dias": 0, "ceco": "Mtto"},
+    "CAR MOTION": {"dias": 0, "ceco": "Administrativo"},
+    "AUTO PARTES Y MAS": {"dias": 0, "ceco": "Administrativo"},
+    "IN LAK ECH HALA KEN": {"dias": 0, "ceco": "Administrativo"},
+    "GRUPO FUCHELA": {"dias": 0, "ceco": "Administrativo"},
+    "SALAS VILLAGOMEZ": {"dias": 0, "ceco": "Administrativo"},
+    "AUTOUNO MOTORS": {"dias": 0, "ceco": "Administrativo"},
+    "HULES LAGO": {"dias": 0, "ceco": "Mtto"},
+    "VENTA Y RENTA DE MAQUINARIA VRM": {"dias": 0, "ceco": "Administrativo"},
+    "OMAR MARCELO GONZALEZ MACIAS": {"dias": 0, "ceco": "Administrativo"},
+    "GRUPO GASOLINERO DEL SUR": {"dias": 0, "ceco": "Administrativo"},
+    "ANA GRACIELA AYUSO HERNANDEZ": {"dias": 0, "ceco": "Administrativo"},
+    "TRANSPORTES Y RADIADORES DAOS": {"dias": 0, "ceco": "Mtto"},
+    "ADMINISTRADORA DE GASOLINERAS SAN AGUSTIN": {
+        "dias": 0,
+        "ceco": "Administrativo",
+    },
+    "NEKLAR": {"dias": 0, "ceco": "Administrativo"},
+    "JF HILLEBRAND MEXICO": {"dias": 0, "ceco": "Operaciones"},
+    "COMERCIALIZADORA DISHI": {"dias": 0, "ceco": "Mtto"},
+    "COMBUSTIBLES MALDONADO OLVERA": {"dias": 0, "ceco": "Diesel"},
+    "GRUPO ZORRO ABARROTERO": {"dias": 0, "ceco": "Administrativo"},
+    "OPERADORA DE RESTAURANTES LOS GIROS": {"dias": 0, "ceco": "Personal"},
+    "SANDRA POZOS PEREDO": {"dias": 0, "ceco": "Mtto"},
+    "OPERADORA CAMA": {"dias": 0, "ceco": "Personal"},
+    "JOSE OMAR BRAVO ALARCON": {"dias": 0, "ceco": "Operaciones"},
+    "HIDROLITRO LAGUNERO": {"dias": 0, "ceco": "Operaciones"},
+    "LOGISTICA INTEGRAL FULEM": {"dias": 0, "ceco": "Operaciones"},
+    "GLOBAL INTERNACIONAL AGENCIAS MARITIMAS": {"dias": 0, "ceco": "Operaciones"},
+    "SANTA FE GAS&OIL": {"dias": 0, "ceco": "Diesel"},
+    "SERVICIO CONDESA DE ZACATECAS": {"dias": 0, "ceco": "Operaciones"},
+    "YESENIA JANETH VAZQUEZ SANCHEZ": {"dias": 15, "ceco": "Mtto"},
+    "SAVINO DEL BENE MEXICO": {"dias": 15, "ceco": "Operaciones"},
+    "COMBUSTIBLES DEL SURESTE DE COATZACOALCOS": {"dias": 0, "ceco": "Diesel"},
+    "CORPORACION GASOLINERA MILLENIUM": {"dias": 0, "ceco": "Diesel"},
+    "FIDEICOMISO F/1596": {"dias": 0, "ceco": "Operaciones"},
+    "ALVAREZ AUTOMOTRIZ": {"dias": 0, "ceco": "Mtto"},
+    "OPERADORA OMX": {"dias": 0, "ceco": "Administrativo"},
+    "COSTCO DE MEXICO": {"dias": 0, "ceco": "Personal"},
+    "CANDEGAS": {"dias": 0, "ceco": "Diesel"},
+    "ACEREXPRESS DEL SURESTE": {"dias": 0, "ceco": "Mtto"},
+    "SERVICIO ESPECIALIZADO EN RODAMIENTOS": {"dias": 0, "ceco": "Mtto"},
+    "GAS Y DERIVADOS DEL CARIBE": {"dias": 0, "ceco": "Diesel"},
+    "INSTITUTO DE CAPACITACION DE LA INDUSTRIA": {
+        "dias": 15,
+        "ceco": "Operaciones",
+    },
+    "TRANSPORTE Y LOGISTICA BUZMYR": {"dias": 15, "ceco": "Operaciones"},
+    "LA CASA DE LAS LOMAS": {"dias": 0, "ceco": "Personal"},
+    "COMERCIALIZADORA DE COMBUSTIBLES TIFA": {"dias": 21, "ceco": "Diesel"},
+    "LLANTAS & RINES RUTA 17": {"dias": 0, "ceco": "Mtto"},
+    "VICTOR MANUEL SANTOS DELGADO": {"dias": 15, "ceco": "Mtto"},
+    "LOGISTICA EXPRESS DE CONTENEDORES": {"dias": 0, "ceco": "Operaciones"},
+    "SUTSA PRINT DE MEXICO": {"dias": 0, "ceco": "Operaciones"},
+    "GRUPO GEO DIESEL": {"dias": 0, "ceco": "Mtto"},
+    "SEGUROS INBURSA": {"dias": 15, "ceco": "Seguros"},
+    "REFRISERVICIO Y AIRE ACONDICIONADO": {"dias": 0, "ceco": "Mtto"},
+    "ASEGURADORA INSURGENTES": {"dias": 15, "ceco": "Administrativo"},
+    "SUPER SERVICIO DEL POTOSI": {"dias": 0, "ceco": "Operaciones"},
+    "TYMEG MEXICO": {"dias": 0, "ceco": "Operaciones"},
+    "TURISMO CAMPECHE": {"dias": 0, "ceco": "Administrativo"},
+    "CHRISTIAN ALBERTO HERNANDEZ ANGELES": {"dias": 0, "ceco": "Operaciones"},
+    "MIRIAM YESENIA PIMENTEL SANTIAGO": {"dias": 0, "ceco": "Operaciones"},
+    "SUMINISTROS ENERGETICOS DE CALIDAD": {"dias": 0, "ceco": "Operaciones"},
+    "CLAUDIA ALARCON RAMIREZ": {"dias": 0, "ceco": "Administrativo"},
+    "REMOLQUES Y EQUIPOS DEL GOLFO": {"dias": 0, "ceco": "Operaciones"},
+    "SERVICIO AUTOVIA": {"dias": 0, "ceco": "Operaciones"},
+    "GRUPO GASOLINERO REYNAR": {"dias": 0, "ceco": "Operaciones"},
+    "RICHEMONT DE MEXICO": {"dias": 0, "ceco": "Personal"},
+    "SURMAN POLANCO": {"dias": 0, "ceco": "Personal"},
+    "GRUPO RESTAURANTERO DEL CENTRO": {"dias": 0, "ceco": "Personal"},
+    "GM FINANCIAL DE MEXICO": {"dias": 0, "ceco": "Administrativo"},
+    "SUSPENSION Y DIRECCION": {"dias": 0, "ceco": "Operaciones"},
+    "AUTOZONE DE MEXICO": {"dias": 0, "ceco": "Operaciones"},
+    "COMERCIALIZADORA SDMHC": {"dias": 0, "ceco": "Administrativo"},
+    "PROMOTORA Y TURISTICA ATHENE": {"dias": 0, "ceco": "Administrativo"},
+    "NACIONAL DE COMBUSTIBLES Y LUBRICANTES": {"dias": 0, "ceco": "Administrativo"},
+    "GRUPO MURO TEX": {"dias": 0, "ceco": "Mtto"},
+    "CORS FLORES LOPEZ Y ASOCIADOS": {"dias": 15, "ceco": "Administrativo"},
+    "TRACTOPARTES DIESEL DON TRUCK": {"dias": 0, "ceco": "Mtto"},
+    "GASOIL TECNOLOGIAS": {"dias": 0, "ceco": "Administrativo"},
+    "RESTAURANTES SUNTORY": {"dias": 0, "ceco": "Personal"},
+    "SERVICIO GASOLINERO LA LOMA": {"dias": 0, "ceco": "Administrativo"},
+    "ADMINISTRACION HOTELERA DEL SUR": {"dias": 0, "ceco": "Personal"},
+    "SERVICIO RAULIAM": {"dias": 0, "ceco": "Administrativo"},
+    "RFV TRUCK PARTS": {"dias": 0, "ceco": "Mtto"},
+    "VINILOS Y GRAFICOS DIGITALES": {"dias": 0, "ceco": "Administrativo"},
+    "ESTACION DE SERVICIO FORA": {"dias": 0, "ceco": "Administrativo"},
+    "OPEDEC DE MEXICO": {"dias": 0, "ceco": "Diesel"},
+    "GRUPO BIO GUHUSA": {"dias": 0, "ceco": "Diesel"},
+    "ZURICH ASEGURADORA MEXICANA": {"dias": 0, "ceco": "Seguros"},
+    "VICTOR MARQUINEZ TRESS": {"dias": 0, "ceco": "Mtto"},
+    "SOLUCIONES P&L": {"dias": 0, "ceco": "Administrativo"},
+    "AMERICAN FILTER": {"dias": 0, "ceco": "Mtto"},
+    "PETRO 107": {"dias": 0, "ceco": "Mtto"},
+    "DISTRIBUIDORA SAGARO DE MEXICO": {"dias": 0, "ceco": "Administrativo"},
+    "SERVICIO PIRAMIDE DEL FUEGO": {"dias": 0, "ceco": "Diesel"},
+    "FLORGER COMBUSTIBLES Y ADITIVOS": {"dias": 0, "ceco": "Diesel"},
+    "GASOLINERIA RAQUEL": {"dias": 0, "ceco": "Administrativo"},
+    "KENWORTH DEL ESTE": {"dias": 30, "ceco": "Mtto"},
+    "AGUSTIN FRANCISCO DIAZ CUAUTLE": {"dias": 0, "ceco": "Administrativo"},
+    "INDUSTRIA MANUFACTURERA DE REMOLQUES": {"dias": 0, "ceco": "Mtto"},
+    "SERVICIOS MODERNOS DE JILOTEPEC": {"dias": 0, "ceco": "Diesel"},
+    "VITANOVA": {"dias": 15, "ceco": "Llantas"},
+    "EVER TIRE": {"dias": 15, "ceco": "Llantas"},
+    "EM WORLDWIDE SERVICES": {"dias": 0, "ceco": "Administrativo"},
+    "ROSALINA ADRIANA OROZCO LEON": {"dias": 15, "ceco": "Mtto"},
+    "PROMOTORA PP": {"dias": 15, "ceco": "Casetas"},
+    "RESTAURANTE TORRE DE CASTILLA": {"dias": 0, "ceco": "Personal"},
+    "GASOLINERIA COACALCO": {"dias": 0, "ceco": "Administrativo"},
+    "RUOLAC BANDERILLA": {"dias": 0, "ceco": "Administrativo"},
+    "PETRO MED": {"dias": 0, "ceco": "Diesel"},
+    "SUPER SERVICIO NUEVO BC": {"dias": 0, "ceco": "Diesel"},
+    "SUMINISTROS DE COMBUSTIBLE DIESEL Y GASOLINA": {"dias": 0, "ceco": "Diesel"},
+    "ALBERTO RAYMUNDO PEREDO CUBRIA": {"dias": 0, "ceco": "Operaciones"},
+    "AUTOEXPRESS GSM": {"dias": 0, "ceco": "Diesel"},
+    "REPRESENTACIONES AZTNOR": {"dias": 0, "ceco": "Mtto"},
+    "CONSORCIO GASOLINERO PLUS": {"dias": 0, "ceco": "Diesel"},
+    "HR SOL SERVICIOS ADMINISTRATIVOS": {"dias": 0, "ceco": "Diesel"},
+    "SERVICIO FAS": {"dias": 0, "ceco": "Diesel"},
+    "ABASTECEDORA GASTRONOMICA INTEGRAL": {"dias": 0, "ceco": "Personal"},
+    "GASOLINERA OPERADORA GONZER": {"dias": 0, "ceco": "Diesel"},
+    "CORPORACION RNB": {"dias": 0, "ceco": "Mtto"},
+    "PROMOTORA DE INVERSION MOCAMBO": {"dias": 0, "ceco": "Personal"},
+    "PAULA ALCARAZ MONTAÑO": {"dias": 0, "ceco": "Mtto"},
+    "TECNO UREA": {"dias": 20, "ceco": "Operaciones"},
+    "ANTONIO DE JESUS GARCIA GALVAN": {"dias": 0, "ceco": "Mtto"},
+    "ALEJANDRO ROMO OBSCURA": {"dias": 0, "ceco": "Mtto"},
+    "MIRIAM FLORES VICENTE": {"dias": 0, "ceco": "Mtto"},
+    "SISTEMAS EMPRESARIALES Y RESGUARDO PATRIMONIAL": {
+        "dias": 5,
+        "ceco": "Administrativo",
+    },
+    "TORA JAPONES": {"dias": 0, "ceco": "Personal"},
+    "DISTRIBUIDORA LIVERPOOL": {"dias": 0, "ceco": "Personal"},
+    "AUTOPISTA ARCO NORTE": {"dias": 0, "ceco": "Casetas"},
+    "CONCESIONARIA MEXIQUENSE": {"dias": 0, "ceco": "Casetas"},
+    "CONCESIONARIA DE VIAS TRONCALES": {"dias": 0, "ceco": "Casetas"},
+    "CFC CONCESIONES": {"dias": 0, "ceco": "Casetas"},
+    "PROMOTORA DE CARRETERAS ECATEPEC PIRAMIDES": {"dias": 0, "ceco": "Casetas"},
+    "PROMOTORA Y ADMINISTRADORA DE CARRETERAS": {"dias": 0, "ceco": "Casetas"},
+    "ANESA HOLDING": {"dias": 0, "ceco": "Casetas"},
+    "AUTOPISTAS DE VANGUARDIA": {"dias": 0, "ceco": "Casetas"},
+    "SEXTOMADERO": {"dias": 0, "ceco": "Personal"},
+    "DESARROLLO GLOBAL DE CONCESIONES": {"dias": 0, "ceco": "Casetas"},
+    "REVOLUCION EN MOVIMIENTO": {"dias": 0, "ceco": "Casetas"},
+    "AUTOVIAS SAN MARTIN TEXMELUCAN": {"dias": 0, "ceco": "Casetas"},
+    "CONCESIONARIA BICENTENARIO": {"dias": 0, "ceco": "Casetas"},
+    "AUTOPISTA MORELIA SALAMANCA": {"dias": 0, "ceco": "Casetas"},
+    "AUTOVIA QUERETARO": {"dias": 0, "ceco": "Casetas"},
+    "AMIGOS ATENDIENDO AMIGOS": {"dias": 0, "ceco": "Personal"},
+    "JEAN PIERRE PAGESY HERRERA": {"dias": 0, "ceco": "Personal"},
+    "SERVICIO SAN JUAN": {"dias": 0, "ceco": "Administrativo"},
+    "GASOLINERIA ALTADENA": {"dias": 0, "ceco": "Administrativo"},
+    "RACING TRADING": {"dias": 15, "ceco": "Mtto"},
+    "LIBRAMIENTO ELEVADO DE PUEBLA": {"dias": 0, "ceco": "Casetas"},
+    "CONCESIONARIA ASM": {"dias": 0, "ceco": "Casetas"},
+    "DANIEL RAMIREZ HERRERA": {"dias": 0, "ceco": "Mtto"},
+    "GRUPO NACIONAL PROVINCIAL": {"dias": 0, "ceco": "Administrativo"},
+    "SEGUROS ATLAS": {"dias": 0, "ceco": "Seguros"},
+    "RED STAR FUEL": {"dias": 0, "ceco": "Diesel"},
+    "MORENO DIESEL": {"dias": 15, "ceco": "Mtto"},
+    "VICTOR ALEJANDRO ZAVALA BRITO": {"dias": 15, "ceco": "Mtto"},
+    "GABRIELA CASAS DEL SAUZ": {"dias": 0, "ceco": "Operaciones"},
+    "RESTAURANTE SUNTORY": {"dias": 0, "ceco": "Personal"},
+    "MARISCOS VILLA RICA MOCAMBO": {"dias": 0, "ceco": "Personal"},
+    "JOSE CARLOS ALARCON RAMIREZ": {"dias": 0, "ceco": "Personal"},
+    "A.N.A. COMPAÑIA DE SEGUROS": {"dias": 0, "ceco": "Seguros"},
+    "COMINCAR": {"dias": 0, "ceco": "Operaciones"},
+    "SERVICIO SANMO": {"dias": 0, "ceco": "Diesel"},
+    "MUNDO DE LIMPIEZA DGO": {"dias": 0, "ceco": "Administrativo"},
+    "MARIA EUGENIA HERMIDA GUZMAN": {"dias": 0, "ceco": "Administrativo"},
+    "RIEGOS Y MAQUINARIA AGRICOLA PESCADOR": {"dias": 0, "ceco": "Administrativo"},
+    "AUTO PARTES BICENTENARIO": {"dias": 0, "ceco": "Operaciones"},
+    "LUIS DE JESUS RAMIREZ CADENA": {"dias": 0, "ceco": "Operaciones"},
+    "LUIS MOISES GIL AGUILAR": {"dias": 0, "ceco": "Operaciones"},
+    "GUSTAVO MARIN RODRIGUEZ": {"dias": 0, "ceco": "Operaciones"},
+    "TPS OPERADOR LOGISTICO": {"dias": 0, "ceco": "Operaciones"},
+    "REFACCIONES INDUSTRIALES OLAT": {"dias": 0, "ceco": "Mtto"},
+    "CIRIA LOPEZ RAMOS": {"dias": 0, "ceco": "Mtto"},
+    "AUTOS CON VALOR": {"dias": 0, "ceco": "Mtto"},
+    "MATERIALES RUMA": {"dias": 0, "ceco": "Administrativo"},
+    "SEPTIMO MADERO": {"dias": 0, "ceco": "Personal"},
+    "SANBORN HERMANOS": {"dias": 0, "ceco": "Personal"},
+    "ROGELIO VARGAS PEREZ": {"dias": 0, "ceco": "Mtto"},
+    "UNION DE SERVICIOS CONHUAS": {"dias": 0, "ceco": "Diesel"},
+    "HOGO GROUP": {"dias": 0, "ceco": "Personal"},
+    "SERVICIO Y CALIDAD DE HUEYATZACOALCO": {"dias": 0, "ceco": "Personal"},
+    "HECTOR MANUEL BOYLAN BALBUENA": {"dias": 0, "ceco": "Mtto"},
+    "REMAR DIESEL": {"dias": 0, "ceco": "Mtto"},
+    "QUATTRO TRADE SOLUTIONS": {"dias": 0, "ceco": "Administrativo"},
+    "CENTRO DE DISTRIBUCION DE AUTOCONSUMOS": {"dias": 15, "ceco": "Diesel"},
+    "PROMOTORA HOTELERA DE VERACRUZ": {"dias": 0, "ceco": "Personal"},
+    "TECNOLLANTAS": {"dias": 0, "ceco": "Administrativo"},
+    "PAPELERA SAN RAFAEL DE LEON": {"dias": 0, "ceco": "Administrativo"},
+    "DATOS EN TECNOLOGIAS DE INFORMACION": {"dias": 0, "ceco": "Operaciones"},
+    "TOTAL PLAY": {"dias": 0, "ceco": "Administrativo"},
+    "TOTAL BOX": {"dias": 0, "ceco": "Administrativo"},
+    "COMERCIOS INTEGRALES ZINGRUP": {"dias": 0, "ceco": "Mtto"},
+    "GC MOTORS": {"dias": 0, "ceco": "Personal"},
+    "B PARTES": {"dias": 0, "ceco": "Mtto"},
+    "RAMOS SERVIPARTES": {"dias": 0, "ceco": "Personal"},
+    "ESTANCIA HARBOR'S": {"dias": 0, "ceco": "Personal"},
+    "INMOBILIARIA HOTELERA DE QUERETARO": {"dias": 0, "ceco": "Personal"},
+    "FOFEL": {"dias": 0, "ceco": "Operaciones"},
+    "A LO GOURMET Y EXCELENCIA": {"dias": 0, "ceco": "Personal"},
+    "HOSPITALIDAD LATINA": {"dias": 0, "ceco": "Personal"},
+    "ALCENTRO ALIMENTOS": {"dias": 0, "ceco": "Personal"},
+    "INMOBILIARIA HNF": {"dias": 0, "ceco": "Personal"},
+    "PROMOTORA VINCENT": {"dias": 0, "ceco": "Personal"},
+    "ESTACION DE SERVICIO MAXIPISTA TAPATIA": {"dias": 0, "ceco": "Personal"},
+    "SERVICIO COMERCIAL GARIS": {"dias": 0, "ceco": "Personal"},
+    "CALUFER": {"dias": 0, "ceco": "Personal"},
+    "JOSE REYMUNDO IBARRA GUTIERREZ": {"dias": 0, "ceco": "Personal"},
+    "SIERRA SILLA MITRAS": {"dias": 0, "ceco": "Personal"},
+    "TURBOCARGANDO A MEXICO": {"dias": 0, "ceco": "Mtto"},
+    "CINTHYA GUERRERO SAGAHON": {"dias": 0, "ceco": "Mtto"},
+    "JESUS MANUEL PEREZ PEREZ": {"dias": 0, "ceco": "Mtto"},
+    "TUBELITE DE MEXICO": {"dias": 0, "ceco": "Mtto"},
+    "JUAN CARLOS PELAEZ SANCHEZ": {"dias": 0, "ceco": "Mtto"},
+    "ERNESTINA ESQUIVEL LOPEZ": {"dias": 0, "ceco": "Administrativo"},
+    "LUZ MIREYA SERRANO GOMEZ": {"dias": 0, "ceco": "Mtto"},
+    "MILANO OPERADORA": {"dias": 0, "ceco": "Personal"},
+    "COMERCIAL CITY FRESKO": {"dias": 0, "ceco": "Personal"},
+    "GRUPO PARISINA": {"dias": 0, "ceco": "Administrativo"},
+    "CEVIZI": {"dias": 0, "ceco": "Personal"},
+    "INFRA": {"dias": 0, "ceco": "Administrativo"},
+    "PODER EJECUTIVO DEL ESTADO DE CAMPECHE": {"dias": 0, "ceco": "Administrativo"},
+    "MISE EN PALACE": {"dias": 0, "ceco": "Personal"},
+    "TELECONTROLES DE VERACRUZ": {"dias": 0, "ceco": "Mtto"},
+    "MEXICANA DE LUBRICANTES": {"dias": 0, "ceco": "Mtto"},
+    "ILDEFONSO SOLIS LUCERO": {"dias": 0, "ceco": "Mtto"},
+    "CAMINOS Y PUENTES FEDERALES": {"dias": 0, "ceco": "Casetas"},
+    "SERVICIO REGIO OCHO": {"dias": 0, "ceco": "Diesel"},
+    "OFIX": {"dias": 0, "ceco": "Administrativo"},
+    "SFERP": {"dias": 0, "ceco": "Administrativo"},
+    "HIDROCARBUROS LA MARQUESILLA": {"dias": 0, "ceco": "Diesel"},
+    "LA BARRA MASARYK": {"dias": 0, "ceco": "Personal"},
+    "CINTYA LIZBETH DE THOMAS RAMOS": {"dias": 0, "ceco": "Personal"},
+    "ACRO MAC": {"dias": 0, "ceco": "Personal"},
+}
+
+SIN_SUGERENCIA = {"dias": 0, "ceco": "Revisión Manual"}
+
+# Índice para la coincidencia parcial: cada llave se registra bajo sus
+# primeros caracteres, así que solo se prueban las llaves cuyo prefijo
+# aparece en el nombre. `orden` conserva la prioridad del catálogo.
+_LARGO_PREFIJO = 4
+_POR_PREFIJO = defaultdict(list)
+_LLAVES_CORTAS = []
+for _orden, _llave in enumerate(BASE_PROVEEDORES):
+    if len(_llave) < _LARGO_PREFIJO:
+        _LLAVES_CORTAS.append((_orden, _llave))
+    else:
+        _POR_PREFIJO[_llave[:_LARGO_PREFIJO]].append((_orden, _llave))
+
+
+@lru_cache(maxsize=4096)
+def sugerencia_proveedor(nombre_emisor: str) -> dict:
+    """
+    Días y CECO sugeridos para un emisor: coincidencia exacta con el
+    catálogo o, si no, la primera llave (en orden del catálogo) contenida en
+    el nombre.
+    """
+    nombre = (nombre_emisor or "").upper().strip()
+    if not nombre:
+        return SIN_SUGERENCIA
+    if nombre in BASE_PROVEEDORES:
+        return BASE_PROVEEDORES[nombre]
+
+    candidatas = list(_LLAVES_CORTAS)
+    for i in range(len(nombre) - _LARGO_PREFIJO + 1):
+        candidatas.extend(_POR_PREFIJO.get(nombre[i : i + _LARGO_PREFIJO], ()))
+    for _orden, llave in sorted(candidatas):
+        if llave in nombre:
+            return BASE_PROVEEDORES[llave]
+    return SIN_SUGERENCIA
+
+
+# =========================================================
+#  NORMALIZACIÓN DE CAMPOS DEL REPORTE
+# =========================================================
+
+
+def fecha_flexible(raw_val) -> date:
+    """Fecha ISO o serial de Excel; hoy si no se puede leer."""
+    if not raw_val or str(raw_val).strip() == "None":
+        return date.today()
+
+    val_str = str(raw_val).strip()
+    try:
+        if val_str.replace(".", "", 1).isdigit():
+            serial = float(val_str)
+            return (datetime(1899, 12, 30) + timedelta(days=serial)).date()
+        clean_date = val_str.split("T")[0].split()[0]
+        return datetime.strptime(clean_date, "%Y-%m-%d").date()
+    except Exception:
+        return date.today()
+
+
+def _montos(row) -> dict:
+    """Tipo de comprobante, montos y estatus según el signo y el tipo."""
+    try:
+        monto_total_raw = float(row.get("Total", 0))
+    except (TypeError, ValueError):
+        monto_total_raw = 0.0
+
+    # 1. Detectar el Tipo de Comprobante (I=Ingreso, E=Egreso, P=Pago)
+    tipo_raw = (
+        str(row.get("Tipo") or row.get("Tipo de Comprobante") or "I").strip().upper()
+    )
+    tipo_comprobante = tipo_raw[0] if tipo_raw else "I"
+
+    # 2. Nota de crédito: monto estrictamente negativo
+    if tipo_comprobante == "E" or monto_total_raw < 0:
+        monto_total = -abs(monto_total_raw) if monto_total_raw != 0 else 0.0
+        return {
+            "tipo_comprobante": "E",
+            "monto_total": monto_total,
+            "saldo_pendiente": monto_total,
+            "estatus": models.InvoiceStatus.PENDIENTE,
+        }
+    # Complemento de pago del SAT
+    if tipo_comprobante == "P":
+        return {
+            "tipo_comprobante": "P",
+            "monto_total": abs(monto_total_raw),
+            "saldo_pendiente": 0.0,
+            "estatus": models.InvoiceStatus.PAGADO,
+        }
+    # Factura normal de CxP (Ingreso - 'I')
+    return {
+        "tipo_comprobante": "I",
+        "monto_total": abs(monto_total_raw),
+        "saldo_pendiente": abs(monto_total_raw),
+        "estatus": models.InvoiceStatus.PENDIENTE,
+    }
+
+
+def _ceco_del_archivo(row):
+    ceco = str(row.get("Centro de Costos ") or row.get("Centro de Costos") or "")
+    ceco = ceco.strip()
+    return ceco if ceco and ceco.lower() not in ["none", "nan", ""] else None
+
+
+def _en_lotes(valores, tamano):
+    valores = list(valores)
+    for i in range(0, len(valores), tamano):
+        yield valores[i : i + tamano]
+
+
+# =========================================================
+#  IMPORTADOR
+# =========================================================
+
+
+def importar_reporte_sat(
+    db: Session, filas: list, user_id: int, numeros: list | None = None
+) -> dict:
+    """
+    Importa las filas del reporte maestro y hace commit. Devuelve los
+    contadores y `reporte`: una entrada por fila con `fila` (1 = primera fila
+    de datos, o el número que traiga `numeros`), `uuid`, `resultado` y
+    `detalle`.
+    """
+    reporte = [
+        {"fila": numero, "uuid": None, "resultado": None, "detalle": None}
+        for numero in (numeros or range(1, len(filas) + 1))
+    ]
+
+    # 1. UUID: vacíos y repetidos dentro del archivo
+    candidatas = {}  # uuid -> índice de la primera fila
+    for i, row in enumerate(filas):
+        uuid_fiscal = str(row.get("UUID") or "").strip()
+        if not uuid_fiscal or uuid_fiscal == "None":
+            reporte[i].update(resultado=OMITIDA, detalle="Fila sin UUID")
+            continue
+        reporte[i]["uuid"] = uuid_fiscal
+        if len(uuid_fiscal) > _LARGO_UUID:
+            reporte[i].update(resultado=ERROR, detalle="UUID inválido")
+        elif uuid_fiscal in candidatas:
+            reporte[i].update(
+                resultado=DUPLICADA, detalle="UUID repetido en el archivo"
+            )
+        else:
+            candidatas[uuid_fiscal] = i
+
+    # 2. Consultas por conjunto: UUID ya registrados y proveedores por RFC
+    existentes = set()
+    for lote in _en_lotes(candidatas, _LOTE_CONSULTA):
+        existentes.update(
+            u
+            for (u,) in db.query(models.PayableInvoice.uuid).filter(
+                models.PayableInvoice.uuid.in_(lote)
+            )
+        )
+    for uuid_fiscal in existentes:
+        reporte[candidatas.pop(uuid_fiscal)].update(
+            resultado=DUPLICADA, detalle="La factura ya existe"
+        )
+
+    pendientes = []  # (índice, row, rfc)
+    for i in sorted(candidatas.values()):
+        rfc = str(filas[i].get("Rfc Emisor") or "").strip()
+        if len(rfc) > _LARGO_RFC:
+            reporte[i].update(
+                resultado=ERROR, detalle=f"RFC del emisor inválido: {rfc}"
+            )
+            continue
+        pendientes.append((i, filas[i], rfc))
+
+    proveedores = {}
+    for lote in _en_lotes({rfc for _i, _row, rfc in pendientes}, _LOTE_CONSULTA):
+        for supplier in db.query(models.Supplier).filter(models.Supplier.rfc.in_(lote)):
+            proveedores[supplier.rfc] = supplier
+
+    # 3. Proveedores nuevos, con el nombre y los días de su primera fila
+    nuevos = []
+    for _i, row, rfc in pendientes:
+        if rfc in proveedores:
+            continue
+        nombre = str(row.get("Nombre Emisor") or "").strip()
+        proveedores[rfc] = models.Supplier(
+            razon_social=nombre,
+            rfc=rfc,
+            estatus=models.SupplierStatus.ACTIVO,
+            dias_credito=sugerencia_proveedor(nombre)["dias"],
+            created_by_id=user_id,
+        )
+        nuevos.append(proveedores[rfc])
+    if nuevos:
+        db.add_all(nuevos)
+        db.flush()
+
+    # 4. CECO y días de crédito fila por fila (en memoria), en el orden del
+    #    archivo: la primera factura de un proveedor le hereda su CECO
+    mapa_cecos = {
+        c.nombre.strip().lower(): c.id for c in db.query(models.CostCenter).all()
+    }
+    cecos_creados = 0
+    facturas = []
+    for i, row, rfc in pendientes:
+        supplier = proveedores[rfc]
+        datos_sugeridos = sugerencia_proveedor(
+            str(row.get("Nombre Emisor") or "").strip()
+        )
+
+        # Prioridad: CECO del archivo, luego el del proveedor, luego el sugerido
+        ceco_a_buscar = _ceco_del_archivo(row)
+        if not ceco_a_buscar and not supplier.cost_center_id:
+            ceco_a_buscar = datos_sugeridos["ceco"]
+
+        cost_center_id = supplier.cost_center_id
+        if ceco_a_buscar:
+            ceco_key = ceco_a_buscar.strip().lower()
+            if ceco_key not in mapa_cecos:
+                nuevo_ceco = models.CostCenter(
+                    codigo=ceco_a_buscar[:15].upper().replace(" ", "-"),
+                    nombre=ceco_a_buscar,
+                    activo=True,
+                    created_by_id=user_id,
+                )
+                db.add(nuevo_ceco)
+                db.flush()
+                cecos_creados += 1
+                mapa_cecos[ceco_key] = nuevo_ceco.id
+            cost_center_id = mapa_cecos[ceco_key]
+
+            if not supplier.cost_center_id:
+                supplier.cost_center_id = cost_center_id
+                supplier.updated_by_id = user_id
+
+        # Días de crédito: los del proveedor; si no tiene, los sugeridos
+        dias_credito = supplier.dias_credito
+        if not dias_credito:
+            dias_credito = datos_sugeridos["dias"]
+            if dias_credito > 0:
+                supplier.dias_credito = dias_credito
+                supplier.updated_by_id = user_id
+
+        fecha_emision = fecha_flexible(row.get("Fecha") or row.get("Fecha emisión"))
+        metodo_pago = str(row.get("Método de Pago") or "").split("-")[0].strip()
+        forma_pago = str(row.get("Forma de Pago") or "").split("-")[0].strip()
+        concepto = str(row.get("Conceptos") or "Factura importada del SAT").strip()
+        moneda = str(row.get("Moneda") or "MXN").strip()[:3].upper()
+        facturas.append(
+            {
+                "supplier_id": supplier.id,
+                "cost_center_id": cost_center_id,
+                "uuid": reporte[i]["uuid"],
+                "folio": str(row.get("Folio") or ""),
+                "concepto": concepto,
+                **_montos(row),
+                "moneda": moneda if moneda in ["MXN", "USD", "EUR"] else "MXN",
+                "fecha_emision": fecha_emision,
+                "fecha_vencimiento": fecha_emision + timedelta(days=dias_credito or 0),
+                "metodo_pago": metodo_pago[:5],
+                "forma_pago": forma_pago[:5],
+                "created_by_id": user_id,
+            }
+        )
+
+    # 5. Inserción por lotes; lo que otra carga insertó en paralelo se omite
+    db.flush()
+    tabla = models.PayableInvoice.__table__
+    stmt = (
+        pg_insert(tabla)
+        .on_conflict_do_nothing(index_elements=["uuid"])
+        .returning(tabla.c.uuid, tabla.c.supplier_id)
+    )
+    insertadas = {}
+    for lote in _en_lotes(facturas, _LOTE_INSERT):
+        insertadas.update(db.execute(stmt, lote).all())
+
+    for i, _row, _rfc in pendientes:
+        if reporte[i]["uuid"] in insertadas:
+            reporte[i]["resultado"] = CREADA
+        else:
+            reporte[i].update(resultado=DUPLICADA, detalle="La factura ya existe")
+
+    if balances.FINANCE_CONSOLIDATED_BALANCES_MATERIALIZED:
+        balances.recalcular_saldos(db, balances.TIPO_PROVEEDORES, insertadas.values())
+    db.commit()
+    if insertadas:
+        dashboard_cache.invalidar([dashboard_cache.ENDPOINT_COSTS_BY_CECO])
+
+    contadores = defaultdict(int)
+    for entrada in reporte:
+        contadores[entrada["resultado"]] += 1
+    return {
+        "creadas": contadores[CREADA],
+        "duplicadas": contadores[DUPLICADA],
+        "omitidas": contadores[OMITIDA],
+        "errores": contadores[ERROR],
+        "proveedores_creados": len(nuevos),
+        "cecos_creados": cecos_creados,
+        "reporte": reporte,
+    }
+
+
+def mensaje_resultado(resultado: dict) -> str:
+    mensaje = (
+        f"Proceso SAT exitoso. Facturas Creadas: {resultado['creadas']}. "
+        f"Ignoradas: {resultado['duplicadas']}. "
+        f"Nuevos CECOs detectados: {resultado['cecos_creados']}."
+    )
+    if resultado["errores"]:
+        mensaje += f" Filas con error: {resultado['errores']}."
+    return mensaje
+
+
+# =========================================================
+#  IMPORTACIÓN DESDE EL ARCHIVO GUARDADO (streaming)
+# =========================================================
+
+CARGA_FACTURAS_SAT = "facturas_sat"
+CARGA_PENDIENTE = "pendiente"
+CARGA_PROCESANDO = "procesando"
+CARGA_COMPLETADA = "completado"
+CARGA_ERROR = "error"
+
+_LOTE_ARCHIVO = 2000
+_COLUMNAS_REPORTE = ["fila", "uuid", "resultado", "detalle"]
+_CONTADORES = (
+    "creadas",
+    "duplicadas",
+    "omitidas",
+    "errores",
+    "proveedores_creados",
+    "cecos_creados",
+)
+
+
+def ruta_reporte(carga: models.BulkUploadHistory) -> str:
+    return f"{carga.file_path}.reporte.csv"
+
+
+def _importar_bloque(db: Session, bloque: list, user_id: int, resumen: dict):
+    """Importa un lote `(fila, row)` del lector y suma sus contadores."""
+    entradas = [
+        {
+            "fila": numero,
+            "uuid": None,
+            "resultado": ERROR,
+            "detalle": row[sat_reader.ERROR_LECTURA],
+        }
+        for numero, row in bloque
+        if sat_reader.ERROR_LECTURA in row
+    ]
+    resumen["errores"] += len(entradas)
+
+    validas = [(n, row) for n, row in bloque if sat_reader.ERROR_LECTURA not in row]
+    if validas:
+        resultado = importar_reporte_sat(
+            db, [row for _n, row in validas], user_id, [n for n, _row in validas]
+        )
+        for llave in _CONTADORES:
+            resumen[llave] += resultado[llave]
+        entradas += resultado["reporte"]
+    return sorted(entradas, key=lambda e: e["fila"])
+
+
+def importar_archivo_sat(
+    db: Session, carga_id: int, user_id: int, lote: int = _LOTE_ARCHIVO
+) -> dict:
+    """
+    Importa el archivo de una carga leyéndolo en streaming: cada `lote`
+    filas pasan por `importar_reporte_sat` y se confirman, y la carga guarda
+    el avance (`record_count` = filas leídas, `resumen` = contadores). La
+    memoria no crece con el tamaño del archivo.
+
+    Un UUID repetido en lotes distintos queda como "La factura ya existe".
+    """
+    carga = db.get(models.BulkUploadHistory, carga_id)
+    resumen = dict.fromkeys(_CONTADORES, 0)
+    carga.status = CARGA_PROCESANDO
+    carga.record_count = 0
+    carga.resumen = dict(resumen)
+    db.commit()
+
+    with open(ruta_reporte(carga), "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.DictWriter(archivo, fieldnames=_COLUMNAS_REPORTE)
+        escritor.writeheader()
+        filas = sat_reader.filas_archivo(carga.file_path)
+        while bloque := list(islice(filas, lote)):
+            escritor.writerows(_importar_bloque(db, bloque, user_id, resumen))
+            carga.record_count += len(bloque)
+            carga.resumen = dict(resumen)
+            carga.updated_by_id = user_id
+            db.commit()
+
+    resumen["mensaje"] = mensaje_resultado(resumen)
+    carga.status = CARGA_COMPLETADA
+    carga.resumen = resumen
+    db.commit()
+    return resumen
+
+
+def procesar_carga_sat(carga_id: int, user_id: int) -> None:
+    """Tarea en segundo plano del bulk-upload sin `json_data`."""
+    db = SessionLocal()
+    try:
+        resumen = importar_archivo_sat(db, carga_id, user_id)
+        logger.info(f"📥 Carga SAT {carga_id} terminada: {resumen['mensaje']}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error en la carga SAT {carga_id}: {e}")
+        carga = db.get(models.BulkUploadHistory, carga_id)
+        carga.status = CARGA_ERROR
+        carga.resumen = {**(carga.resumen or {}), "error": str(e)}
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,235 @@
+"""
+Lectura en streaming de los archivos del SAT para la importación de CxP.
+
+`filas_archivo(ruta)` recorre el archivo ya guardado en disco y produce una
+fila a la vez, `(número de fila, dict)`, con las mismas llaves y la misma
+limpieza que el navegador aplicaba antes de mandar `json_data`:
+
+- `.xlsx` / `.xlsm`: openpyxl en modo `read_only` (la hoja no se carga
+  completa); las cabeceras se buscan en las primeras 15 filas.
+- `.csv` / `.txt`: `csv.reader` con el separador de la línea de cabeceras
+  (`,`, `;`, `|`, `~` o tabulador), en UTF-8 o Latin-1.
+- `.xml` / `.zip` de XML: un CFDI por fila, leído con `iterparse`. Las
+  columnas se arman con los atributos del comprobante, el emisor, los
+  conceptos y el timbre.
+
+Se descartan complementos de pago y filas sin UUID, y las notas de crédito
+salen en negativo. Un XML que no se puede leer sale como fila con
+`ERROR_LECTURA` para que quede en el reporte sin detener la carga.
+"""
+
+import csv
+import os
+import re
+import zipfile
+
+from lxml import etree
+from openpyxl import load_workbook
+
+ERROR_LECTURA = "_error_lectura"
+
+FORMATOS_HOJA = (".xlsx", ".xlsm")
+FORMATOS_TEXTO = (".csv", ".txt")
+FORMATOS_XML = (".xml", ".zip")
+FORMATOS = FORMATOS_HOJA + FORMATOS_TEXTO + FORMATOS_XML
+
+_FILAS_BUSQUEDA_CABECERA = 15
+_MUESTRA_TEXTO = 64 * 1024
+_SEPARADORES = ",;|~\t"
+_NUMERO = re.compile(r"-?(\d+\.?\d*|\.\d+)")
+
+
+class FormatoNoSoportado(ValueError):
+    pass
+
+
+# =========================================================
+#  LIMPIEZA DE FILAS (misma regla que el modal de importación)
+# =========================================================
+
+
+def _es_cabecera(valores) -> bool:
+    texto = " ".join("" if v is None else str(v) for v in valores).lower()
+    return "rfc emisor" in texto or "uuid" in texto
+
+
+def _primera_llave(row: dict, condicion):
+    return next((k for k in row if condicion(k.lower())), None)
+
+
+def _normalizar(row: dict):
+    """
+    Complementos de pago fuera, notas de crédito en negativo, total sin
+    formato de moneda. Devuelve None si la fila no se importa.
+    """
+    tipo_key = _primera_llave(row, lambda k: "tipo" in k)
+    tipo = row[tipo_key].lower() if tipo_key else ""
+    if tipo == "p" or "pago" in tipo:
+        return None
+    es_nota_credito = tipo in ("e", "egreso") or "nota de" in tipo
+
+    total_key = _primera_llave(row, lambda k: k == "total" or "monto" in k)
+    if total_key and row[total_key]:
+        numero = _NUMERO.match(re.sub(r"[^0-9.-]+", "", row[total_key]))
+        if numero:
+            total = float(numero.group())
+            row[total_key] = str(-total if es_nota_credito and total > 0 else total)
+
+    uuid_fiscal = row.get("UUID") or row.get("uuid") or row.get("Uuid")
+    if not uuid_fiscal or len(uuid_fiscal) <= 10:
+        return None
+    return row
+
+
+def _filas_tabla(filas):
+    """Filas de una hoja o CSV: cabeceras, luego un dict por fila de datos."""
+    cabeceras = None
+    for numero, valores in enumerate(filas, start=1):
+        if cabeceras is None:
+            if numero > _FILAS_BUSQUEDA_CABECERA:
+                break
+            if valores and _es_cabecera(valores):
+                cabeceras = [str(h or "").strip() for h in valores]
+            continue
+        if not valores or all(v is None or v == "" for v in valores):
+            continue
+
+        row = {}
+        for indice, cabecera in enumerate(cabeceras):
+            valor = valores[indice] if indice < len(valores) else None
+            row[cabecera] = "" if valor is None else str(valor).strip()
+        row = _normalizar(row)
+        if row is not None:
+            yield numero, row
+
+    if cabeceras is None:
+        raise FormatoNoSoportado(
+            "No se encontraron las columnas del SAT (Rfc Emisor, UUID). "
+            "Verifica el formato de tu archivo."
+        )
+
+
+# =========================================================
+#  LECTORES POR FORMATO
+# =========================================================
+
+
+def _filas_xlsx(ruta: str):
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        yield from _filas_tabla(hoja.iter_rows(values_only=True))
+    finally:
+        libro.close()
+
+
+def muestra_texto(ruta: str):
+    """
+    Codificación del archivo (UTF-8 con o sin BOM, o Latin-1) y las líneas
+    de sus primeros 64 KB, para buscar cabeceras y separador.
+    """
+    with open(ruta, "rb") as archivo:
+        muestra = archivo.read(_MUESTRA_TEXTO)
+    try:
+        muestra.decode("utf-8")
+        codificacion = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # Un corte a media secuencia al final de la muestra no cuenta
+        codificacion = "utf-8-sig" if e.start >= len(muestra) - 3 else "latin-1"
+    return codificacion, muestra.decode(codificacion, errors="replace").splitlines()
+
+
+def _filas_csv(ruta: str):
+    codificacion, lineas = muestra_texto(ruta)
+
+    # Separador: el que más aparece en la línea de cabeceras
+    cabecera = next(
+        (linea for linea in lineas[:_FILAS_BUSQUEDA_CABECERA] if _es_cabecera([linea])),
+        "",
+    )
+    separador = max(_SEPARADORES, key=cabecera.count)
+
+    with open(ruta, newline="", encoding=codificacion, errors="replace") as archivo:
+        yield from _filas_tabla(csv.reader(archivo, delimiter=separador))
+
+
+def _localname(tag) -> str:
+    return tag.rpartition("}")[2] if isinstance(tag, str) else ""
+
+
+def _cfdi_a_fila(stream) -> dict:
+    """Columnas del reporte a partir de un CFDI (3.3 o 4.0)."""
+    row = {}
+    conceptos = []
+    for evento, elem in etree.iterparse(
+        stream,
+        events=("start", "end"),
+        load_dtd=False,
+        no_network=True,
+        resolve_entities=False,
+    ):
+        if evento == "end":
+            elem.clear()
+            continue
+        nombre = _localname(elem.tag)
+        if nombre == "Comprobante":
+            row.update(
+                {
+                    "Total": elem.get("Total", ""),
+                    "Tipo": elem.get("TipoDeComprobante", ""),
+                    "Fecha": elem.get("Fecha", ""),
+                    "Método de Pago": elem.get("MetodoPago", ""),
+                    "Forma de Pago": elem.get("FormaPago", ""),
+                    "Moneda": elem.get("Moneda", ""),
+                    "Folio": elem.get("Folio", ""),
+                }
+            )
+        elif nombre == "Emisor":
+            row["Rfc Emisor"] = elem.get("Rfc", "")
+            row["Nombre Emisor"] = elem.get("Nombre", "")
+        elif nombre == "Concepto" and elem.get("Descripcion"):
+            conceptos.append(elem.get("Descripcion"))
+        elif nombre == "TimbreFiscalDigital":
+            row["UUID"] = elem.get("UUID", "")
+    row["Conceptos"] = " | ".join(conceptos)
+    return {k: v.strip() for k, v in row.items()}
+
+
+def _filas_xml(nombre: str, abrir, numero: int):
+    try:
+        with abrir() as stream:
+            row = _cfdi_a_fila(stream)
+    except (etree.XMLSyntaxError, ValueError) as e:
+        yield numero, {ERROR_LECTURA: f"XML inválido ({nombre}): {e}"}
+        return
+    row = _normalizar(row)
+    if row is not None:
+        yield numero, row
+
+
+def _filas_zip(ruta: str):
+    with zipfile.ZipFile(ruta) as paquete:
+        nombres = [
+            n.filename
+            for n in paquete.infolist()
+            if not n.is_dir() and n.filename.lower().endswith(".xml")
+        ]
+        for numero, nombre in enumerate(nombres, start=1):
+            yield from _filas_xml(nombre, lambda: paquete.open(nombre), numero)
+
+
+def filas_archivo(ruta: str):
+    """Recorre el archivo guardado; ver formatos en el docstring del módulo."""
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in FORMATOS_HOJA:
+        return _filas_xlsx(ruta)
+    if extension in FORMATOS_TEXTO:
+        return _filas_csv(ruta)
+    if extension == ".zip":
+        return _filas_zip(ruta)
+    if extension == ".xml":
+        return _filas_xml(os.path.basename(ruta), lambda: open(ruta, "rb"), 1)
+    raise FormatoNoSoportado(
+        f"Formato {extension or 'sin extensión'} no soportado para lectura en "
+        f"el servidor. Usa {', '.join(FORMATOS)} o envía json_data."
+    )
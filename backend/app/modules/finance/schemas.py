@@ -7,7 +7,7 @@ from pydantic import (
     field_validator,
     ValidationInfo,
 )
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime, date
 from app.models.models import RecordStatus
 
@@ -46,6 +46,38 @@ class ProviderResponse(ProviderBase):
 # ==========================================
 # BANK ACCOUNT SCHEMAS
 # ==========================================
+ColumnaEstadoCuenta = Literal[
+    "fecha", "concepto", "referencia", "cargo", "abono", "monto"
+]
+
+
+class LayoutEstadoCuenta(BaseModel):
+    """
+    Cómo leer el estado de cuenta del banco. Cada columna acepta uno o varios
+    nombres de cabecera; lo que no venga usa los nombres más comunes.
+    `monto` es una sola columna con signo; `cargo` y `abono`, dos columnas.
+    """
+
+    formato: Optional[Literal["csv", "excel", "ofx"]] = None
+    separador: Optional[str] = Field(None, min_length=1, max_length=1)
+    separador_decimal: Optional[Literal[".", ","]] = None
+    fila_cabecera: Optional[int] = Field(None, ge=1)
+    formato_fecha: List[str] = []
+    columnas: Dict[ColumnaEstadoCuenta, List[str]] = {}
+
+    @field_validator("formato_fecha", mode="before")
+    @classmethod
+    def _formato_fecha_lista(cls, v):
+        return [v] if isinstance(v, str) else v
+
+    @field_validator("columnas", mode="before")
+    @classmethod
+    def _columnas_lista(cls, v):
+        if isinstance(v, dict):
+            return {k: [c] if isinstance(c, str) else c for k, c in v.items()}
+        return v
+
+
 class BankAccountBase(BaseModel):
     banco: str
     banco_logo: Optional[str] = "🏦"
@@ -54,6 +86,7 @@ class BankAccountBase(BaseModel):
     moneda: str = "MXN"
     alias: str
     tipo_cuenta: Optional[str] = "operativa"
+    layout_estado_cuenta: Optional[LayoutEstadoCuenta] = None
 
 
 class BankAccountCreate(BankAccountBase):
@@ -100,6 +133,74 @@ class BankMovementCreate(BaseModel):
     referencia: Optional[str] = None
 
 
+class MovimientoLibroBancario(BaseModel):
+    id: int
+    fecha: datetime
+    tipo: str
+    monto: float
+    concepto: Optional[str] = None
+    referencia: Optional[str] = None
+    conciliado: bool = False
+    saldo: float  # Saldo de la cuenta después de este movimiento
+
+
+class SaldoCuentaAlCorte(BaseModel):
+    bank_account_id: int
+    fecha: date
+    saldo: float
+
+
+# ==========================================
+# CONCILIACIÓN BANCARIA
+# ==========================================
+TipoDocumentoConciliacion = Literal[
+    "cxc_pago", "cxc_factura", "cxp_pago", "cxp_factura"
+]
+
+
+class ConciliacionDocumento(BaseModel):
+    tipo: TipoDocumentoConciliacion
+    id: int
+    monto: float = Field(..., gt=0)
+
+
+class ConciliacionDocumentoPropuesto(ConciliacionDocumento):
+    fecha: date
+    referencia_coincide: bool = False
+
+
+class ConciliacionPropuesta(BaseModel):
+    movement_id: int
+    tipo: str
+    monto: float
+    fecha: date
+    referencia: Optional[str] = None
+    concepto: Optional[str] = None
+    tipo_match: Literal["uno_a_uno", "muchos_a_uno"]
+    score: float
+    documentos: List[ConciliacionDocumentoPropuesto]
+
+
+class ConciliacionPropuestasResponse(BaseModel):
+    bank_account_id: int
+    movimientos_analizados: int
+    documentos_analizados: int
+    propuestas: List[ConciliacionPropuesta]
+    sin_propuesta: List[int]
+
+
+class ConciliacionAceptada(BaseModel):
+    movement_id: int
+    documentos: List[ConciliacionDocumento] = Field(..., min_length=1)
+    score: Optional[float] = None
+
+
+class ConciliacionAplicarPayload(BaseModel):
+    conciliaciones: List[ConciliacionAceptada] = Field(..., min_length=1)
+    # Diferencia aceptada entre la suma de los documentos y el movimiento
+    tolerancia_monto: float = Field(0.01, ge=0, le=5)
+
+
 # ==========================================
 # NUEVO: COST CENTER (CECOS)
 # ==========================================
@@ -416,6 +517,7 @@ class CFDIHistoryRecord(BaseModel):
     versiones_archivos: List[DocumentHistoryResponse] = Field(default_factory=list)
     viaje_id: Optional[int] = None
     pdf_url: Optional[str] = None
+    pdf_status: Optional[str] = None
     xml_url: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
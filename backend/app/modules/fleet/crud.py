@@ -515,6 +515,7 @@ def delete_tire(db: Session, tire_id: int, user_id: int):  # <--- AUDITORÍA PAR
 
 from datetime import date
 from sqlalchemy.orm import Session, joinedload
+from app.db.pagination import paginar_keyset
 from app.models import models
 from app.models.models import RecordStatus
 from . import schemas
@@ -635,16 +636,14 @@ def _update_unit_status(db: Session, unit: models.Unit) -> None:
             unit.razon_bloqueo = None
 
 
-def get_units(db: Session, skip: int = 0, limit: int = 100):
-    units = (
+def get_units(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    """Unidades por id: (unidades, siguiente_cursor). Con `cursor` ignora `skip`."""
+    query = (
         db.query(models.Unit)
         .options(joinedload(models.Unit.tires))
         .filter(models.Unit.record_status != RecordStatus.ELIMINADO)
-        .order_by(models.Unit.id.asc())
-        .offset(skip)
-        .limit(limit)
-        .all()
     )
+    units, siguiente = paginar_keyset(query, [models.Unit.id], cursor, limit, skip=skip)
 
     changed_any = False
     for unit in units:
@@ -668,7 +667,7 @@ def get_units(db: Session, skip: int = 0, limit: int = 100):
     if changed_any:
         db.commit()
 
-    return units
+    return units, siguiente
 
 
 def get_unit(db: Session, unit_id: int):
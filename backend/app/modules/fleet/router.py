@@ -14,6 +14,7 @@ from fastapi import (
     File,
     Form,
     Query,
+    Response,
     status,
 )
 from fastapi.responses import FileResponse
@@ -22,6 +23,7 @@ from sqlalchemy import select, func
 from sqlalchemy.exc import IntegrityError
 
 from app.db.database import get_db
+from app.db.pagination import publicar_cursor
 from app.models import models
 from app.models.models import User, Unit, BulkUploadHistory, UnitDocumentHistory
 
@@ -68,8 +70,16 @@ def clean_eco_prefix(eco_str: str) -> str:
 
 
 @router.get("/units", response_model=List[schemas.UnitResponse], tags=["Fleet - Units"])
-def read_units(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_units(db, skip=skip, limit=limit)
+def read_units(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    units, siguiente = crud.get_units(db, skip=skip, limit=limit, cursor=cursor)
+    publicar_cursor(response, siguiente)
+    return units
 
 
 @router.post("/units", response_model=schemas.UnitResponse, tags=["Fleet - Units"])
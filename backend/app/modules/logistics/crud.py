@@ -12,10 +12,11 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status, Body
 from fastapi.responses import Response
 from sqlalchemy.orm import Session, contains_eager, joinedload, selectinload
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func, or_  # <-- NUEVO: Agregado or_ para la consulta masiva
+from sqlalchemy import func, or_, true  # <-- NUEVO: Agregado or_ para la consulta masiva
 from jinja2 import Environment, FileSystemLoader
 
 from app.db.database import get_db
+from app.db.pagination import paginar_keyset
 from app.models import models
 from app.models.models import SystemConfig, RecordStatus
 
@@ -77,8 +78,19 @@ def get_osrm_distance(origen: str, destino: str) -> float:
 # CRUD TRIPS (GET, CREATE, UPDATE, DELETE)
 # =====================================================================
 
-def get_trips(db: Session, skip: int = 0, limit: int = 100):
-    return (
+def get_trips(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    client_id: Optional[int] = None,
+):
+    """
+    Viajes del más reciente al más antiguo: (viajes, siguiente_cursor).
+    Con `cursor` pagina por id (keyset) e ignora `skip`.
+    """
+    query = (
         db.query(models.Trip)
         .options(
             joinedload(models.Trip.client),
@@ -99,10 +111,91 @@ def get_trips(db: Session, skip: int = 0, limit: int = 100):
             selectinload(models.Trip.receivable_invoices).joinedload(models.ReceivableInvoice.factura_padre),
         )
         .filter(models.Trip.record_status != RecordStatus.ELIMINADO)
-        .order_by(models.Trip.id.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    )
+    if status:
+        query = query.filter(models.Trip.status == status)
+    if client_id:
+        query = query.filter(models.Trip.client_id == client_id)
+
+    return paginar_keyset(
+        query, [models.Trip.id], cursor, limit, descendente=True, skip=skip
+    )
+
+
+def get_trips_summary(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    client_id: Optional[int] = None,
+):
+    """
+    Versión ligera de `get_trips` para el tablero: una sola consulta por
+    columnas (sin cargar relaciones ni instanciar modelos), con el cliente,
+    el número de tramos y la unidad / operador del primer tramo.
+    Mismo orden, filtros y cursor que `get_trips`.
+    """
+    Trip, TripLeg = models.Trip, models.TripLeg
+    primer_tramo = (
+        db.query(TripLeg.unit_id, TripLeg.operator_id)
+        .filter(TripLeg.trip_id == Trip.id)
+        .order_by(TripLeg.id)
+        .limit(1)
+        .subquery()
+        .lateral()
+    )
+    legs_count = (
+        db.query(func.count(TripLeg.id))
+        .filter(TripLeg.trip_id == Trip.id)
+        .correlate(Trip)
+        .scalar_subquery()
+    )
+
+    query = (
+        db.query(
+            Trip.id,
+            Trip.public_id,
+            Trip.status,
+            Trip.client_id,
+            models.Client.razon_social.label("client_razon_social"),
+            Trip.sub_client_id,
+            Trip.origin,
+            Trip.destination,
+            Trip.route_name,
+            Trip.referencia,
+            Trip.contenedor_1,
+            Trip.contenedor_2,
+            Trip.tipo_operacion,
+            Trip.remolque_1_id,
+            Trip.dolly_id,
+            Trip.remolque_2_id,
+            Trip.tarifa_base,
+            Trip.costo_casetas,
+            Trip.fecha_programada,
+            Trip.start_date,
+            Trip.closed_at,
+            Trip.created_at,
+            legs_count.label("legs_count"),
+            models.Unit.numero_economico.label("unit_numero_economico"),
+            models.Unit.placas.label("unit_placas"),
+            models.Operator.name.label("operator_name"),
+        )
+        .outerjoin(models.Client, models.Client.id == Trip.client_id)
+        .outerjoin(primer_tramo, true())
+        .outerjoin(models.Unit, models.Unit.id == primer_tramo.c.unit_id)
+        .outerjoin(
+            models.Operator, models.Operator.id == primer_tramo.c.operator_id
+        )
+        .filter(Trip.record_status != RecordStatus.ELIMINADO)
+    )
+    if status:
+        query = query.filter(Trip.status == status)
+    if client_id:
+        query = query.filter(Trip.client_id == client_id)
+
+    return paginar_keyset(
+        query, [Trip.id], cursor, limit, descendente=True, skip=skip
     )
 
 
@@ -4,18 +4,19 @@ import uuid
 import datetime
 from datetime import date, timedelta, datetime as dt_utcnow
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Literal, Optional
 import requests  # <-- NUEVO: Para la API de mapas OSRM
 import traceback  # <-- PARA IMPRIMIR EL ERROR EXACTO EN CONSOLA
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Body
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session, contains_eager, joinedload, selectinload
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func, or_  # <-- NUEVO: Agregado or_ para la consulta masiva
 from jinja2 import Environment, FileSystemLoader
 
 from app.db.database import get_db
+from app.db.pagination import publicar_cursor
 from app.models import models
 from app.models.models import SystemConfig, RecordStatus
 
@@ -525,8 +526,61 @@ def delete_template(
 
 
 @router.get("/trips", response_model=List[schemas.TripResponse])
-def read_trips(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_trips(db, skip, limit)
+def read_trips(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    status: Optional[models.TripStatus] = None,
+    client_id: Optional[int] = None,
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Listado de viajes. La siguiente página viaja en el header X-Next-Cursor
+    (mandarlo como `cursor`); `skip` se mantiene para los clientes anteriores.
+
+    `view=summary` devuelve filas `TripSummaryResponse` (columnas planas, sin
+    tramos ni facturas) para el tablero; `fields=id,status,origin,...` las
+    recorta a esas columnas e implica `view=summary`.
+    """
+    if view == "summary" or fields:
+        return _read_trips_summary(db, skip, limit, cursor, status, client_id, fields)
+
+    trips, siguiente = crud.get_trips(
+        db, skip, limit, cursor=cursor, status=status, client_id=client_id
+    )
+    publicar_cursor(response, siguiente)
+    return trips
+
+
+def _read_trips_summary(db, skip, limit, cursor, status, client_id, fields):
+    campos = None
+    if fields:
+        campos = {c.strip() for c in fields.split(",") if c.strip()}
+        desconocidos = campos - schemas.TripSummaryResponse.model_fields.keys()
+        if desconocidos:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Campos no disponibles en view=summary: {', '.join(sorted(desconocidos))}",
+            )
+        campos.add("id")
+
+    filas, siguiente = crud.get_trips_summary(
+        db, skip, limit, cursor=cursor, status=status, client_id=client_id
+    )
+    # Respuesta directa: el response_model del endpoint es el de la vista completa
+    response = JSONResponse(
+        [
+            schemas.TripSummaryResponse.model_validate(fila).model_dump(
+                mode="json", include=campos
+            )
+            for fila in filas
+        ]
+    )
+    publicar_cursor(response, siguiente)
+    return response
 
 
 @router.get("/trips/{trip_id}", response_model=schemas.TripResponse)
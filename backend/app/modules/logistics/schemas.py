@@ -497,6 +497,39 @@ class TripResponse(TripBase):
     updated_at: Optional[datetime] = None
 
 
+class TripSummaryResponse(ORMBase):
+    """Fila del tablero de viajes (`/trips?view=summary`): solo columnas planas."""
+
+    id: int
+    public_id: Optional[str] = None
+    status: TripStatus
+    client_id: int
+    client_razon_social: Optional[str] = None
+    sub_client_id: int
+    origin: str
+    destination: str
+    route_name: Optional[str] = None
+    referencia: Optional[str] = None
+    contenedor_1: Optional[str] = None
+    contenedor_2: Optional[str] = None
+    tipo_operacion: Optional[str] = None
+    remolque_1_id: Optional[int] = None
+    dolly_id: Optional[int] = None
+    remolque_2_id: Optional[int] = None
+    tarifa_base: float = 0.0
+    costo_casetas: Optional[float] = 0.0
+    fecha_programada: Optional[date] = None
+    start_date: Optional[datetime] = None
+    closed_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+
+    # Primer tramo (lo que el tablero muestra como unidad / operador)
+    legs_count: int = 0
+    unit_numero_economico: Optional[str] = None
+    unit_placas: Optional[str] = None
+    operator_name: Optional[str] = None
+
+
 class TripTimelineEventUpdate(ORMBase):
     time: Optional[datetime] = None
     event: Optional[str] = Field(default=None, max_length=500)
@@ -311,8 +311,7 @@ def list_work_orders(
             selectinload(
                 models.WorkOrder.parts.and_(models.WorkOrderPart.record_status != models.RecordStatus.ELIMINADO)
             ).joinedload(models.WorkOrderPart.item),
-            joinedload(models.WorkOrder.created_by),  # <-- AUDITORÍA: Cargar creador
-            joinedload(models.WorkOrder.updated_by),  # <-- AUDITORÍA: Cargar editor
+            *models.WorkOrder.opciones_auditoria(),  # <-- AUDITORÍA: creador y editor
         )
         .filter(models.WorkOrder.record_status != models.RecordStatus.ELIMINADO)
     )
@@ -364,8 +363,7 @@ def get_work_order(db: Session, order_id: int):
             selectinload(
                 models.WorkOrder.parts.and_(models.WorkOrderPart.record_status != models.RecordStatus.ELIMINADO)
             ).joinedload(models.WorkOrderPart.item),
-            joinedload(models.WorkOrder.created_by),  # <-- AUDITORÍA: Cargar creador
-            joinedload(models.WorkOrder.updated_by),  # <-- AUDITORÍA: Cargar editor
+            *models.WorkOrder.opciones_auditoria(),  # <-- AUDITORÍA: creador y editor
         )
         .filter(
             models.WorkOrder.id == order_id,
@@ -2,10 +2,12 @@
 
 import traceback
 from datetime import datetime, timedelta, date
+from typing import Optional
 from fastapi import HTTPException
 from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.exc import IntegrityError
 
+from app.db.pagination import paginar_keyset
 from app.models import models
 from app.models.models import RecordStatus
 from . import schemas
@@ -141,8 +143,19 @@ def delete_supplier(
 # =========================================================
 
 
-def get_invoices(db: Session, skip: int = 0, limit: int = 5000):
-    invoices = (
+def get_invoices(
+    db: Session,
+    skip: int = 0,
+    limit: int = 5000,
+    cursor: Optional[str] = None,
+    supplier_id: Optional[int] = None,
+    estatus: Optional[str] = None,
+):
+    """
+    Facturas por vencimiento (la más próxima primero): (facturas, siguiente_cursor).
+    Con `cursor` pagina por (fecha_vencimiento, id) e ignora `skip`.
+    """
+    query = (
         db.query(models.PayableInvoice)
         .options(
             joinedload(models.PayableInvoice.supplier),
@@ -150,15 +163,24 @@ def get_invoices(db: Session, skip: int = 0, limit: int = 5000):
             selectinload(models.PayableInvoice.payments),
         )
         .filter(models.PayableInvoice.record_status != RecordStatus.ELIMINADO)
-        .order_by(models.PayableInvoice.fecha_vencimiento.asc())
-        .offset(skip)
-        .all()
+    )
+    if supplier_id:
+        query = query.filter(models.PayableInvoice.supplier_id == supplier_id)
+    if estatus:
+        query = query.filter(models.PayableInvoice.estatus == estatus)
+
+    invoices, siguiente = paginar_keyset(
+        query,
+        [models.PayableInvoice.fecha_vencimiento, models.PayableInvoice.id],
+        cursor,
+        limit,
+        skip=skip,
     )
 
     for inv in invoices:
         inv.supplier_razon_social = inv.supplier.razon_social if inv.supplier else None
 
-    return invoices
+    return invoices, siguiente
 
 
 def get_invoice(db: Session, invoice_id: int):
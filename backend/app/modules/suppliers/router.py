@@ -3,10 +3,11 @@ import logging
 import traceback
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Body, status
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response, status
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
+from app.db.pagination import publicar_cursor
 from app.models import models
 from app.modules.auth.router import get_current_active_user
 from . import schemas, crud
@@ -21,11 +22,24 @@ router = APIRouter(tags=["Suppliers"])
 
 
 @router.get("/invoices", response_model=List[schemas.PayableInvoiceResponse])
-def read_invoices(skip: int = 0, limit: int = 5000, db: Session = Depends(get_db)):
+def read_invoices(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(5000, ge=1),
+    cursor: Optional[str] = None,
+    supplier_id: Optional[int] = None,
+    estatus: Optional[models.InvoiceStatus] = None,
+    db: Session = Depends(get_db),
+):
     """
     Obtiene el listado de Cuentas por Pagar (Facturas de Proveedores).
+    La siguiente página viaja en el header X-Next-Cursor (mandarlo como `cursor`).
     """
-    return crud.get_invoices(db, skip, limit)
+    invoices, siguiente = crud.get_invoices(
+        db, skip, limit, cursor=cursor, supplier_id=supplier_id, estatus=estatus
+    )
+    publicar_cursor(response, siguiente)
+    return invoices
 
 
 @router.post("/invoices", response_model=schemas.PayableInvoiceResponse)
@@ -0,0 +1,152 @@
+"""
+Benchmark de la importación del reporte maestro del SAT (CxP).
+
+Genera un reporte sintético (20 000 filas por defecto) con la forma de la
+descarga del SAT: emisores del catálogo `BASE_PROVEEDORES` y emisores
+nuevos, UUID ya registrados, filas sin UUID, notas de crédito y complementos
+de pago. Lo pasa por `crud.process_sat_master_report` y reporta:
+
+- tiempo total y filas por segundo
+- sentencias SQL emitidas
+- resultado por fila (creadas, duplicadas, omitidas, errores)
+- buscador de proveedores: indexado contra el recorrido lineal anterior
+
+Todo corre dentro de una transacción que se revierte al final: usa la base
+configurada en el `.env` y no deja nada escrito.
+
+Uso:
+    python benchmark_importacion_sat.py [filas]
+"""
+
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.database import engine
+from app.models import models
+from app.modules.finance import crud, sat_import
+
+
+def reporte_sintetico(filas: int, uuids_existentes: list) -> list:
+    random.seed(20)
+    catalogo = list(sat_import.BASE_PROVEEDORES)
+    emisores = [
+        (f"BEN{i:09d}"[:13], random.choice([nombre, f"{nombre} SA DE CV"]))
+        for i, nombre in enumerate(catalogo)
+    ]
+    emisores += [(f"BNN{i:09d}"[:13], f"PROVEEDOR NUEVO {i}") for i in range(200)]
+
+    reporte = []
+    for i in range(filas):
+        rfc, nombre = random.choice(emisores)
+        uuid_fiscal = f"BENCH-{i:012d}"
+        if uuids_existentes and random.random() < 0.05:
+            uuid_fiscal = random.choice(uuids_existentes)
+        elif random.random() < 0.02:
+            uuid_fiscal = None
+        reporte.append(
+            {
+                "UUID": uuid_fiscal,
+                "Rfc Emisor": rfc,
+                "Nombre Emisor": nombre,
+                "Centro de Costos": random.choice([None] * 8 + ["Mtto", "Diesel"]),
+                "Total": round(random.uniform(-500, 25000), 2),
+                "Tipo": random.choice(["I"] * 8 + ["E", "P"]),
+                "Fecha": f"2026-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+                "Método de Pago": random.choice(["PPD - Pago en parcialidades", "PUE"]),
+                "Forma de Pago": random.choice(["03 - Transferencia", "99"]),
+                "Conceptos": "Refacciones y servicios",
+                "Moneda": "MXN",
+                "Folio": str(i),
+            }
+        )
+    return reporte
+
+
+def medir_importacion(filas: int) -> None:
+    sentencias = []
+
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    with engine.connect() as conn:
+        transaccion = conn.begin()
+        # Los commit del importador cierran savepoints; la transacción
+        # externa se revierte al final
+        db = Session(bind=conn, join_transaction_mode="create_savepoint")
+        try:
+            existentes = [
+                u
+                for (u,) in db.query(models.PayableInvoice.uuid)
+                .filter(models.PayableInvoice.uuid.isnot(None))
+                .limit(2000)
+            ]
+            reporte = reporte_sintetico(filas, existentes)
+
+            event.listen(engine, "before_cursor_execute", _contar)
+            inicio = time.perf_counter()
+            resultado = crud.process_sat_master_report(
+                db, reporte, "benchmark.xlsx", None
+            )
+            segundos = time.perf_counter() - inicio
+        finally:
+            event.remove(engine, "before_cursor_execute", _contar)
+            db.close()
+            transaccion.rollback()
+
+    print(f"Importación de {filas} filas")
+    print(
+        f"  tiempo={segundos:8.2f} s  filas/s={filas / segundos:10.0f}  "
+        f"sentencias={len(sentencias)}"
+    )
+    por_resultado = Counter(f["resultado"] for f in resultado["reporte"])
+    print(
+        "  "
+        + "  ".join(f"{nombre}={total}" for nombre, total in por_resultado.items())
+        + f"  proveedores_creados={resultado['proveedores_creados']}"
+        + f"  cecos_creados={resultado['cecos_creados']}"
+    )
+
+
+def buscar_lineal(nombre_emisor: str) -> dict:
+    """Buscador anterior: coincidencia exacta y luego recorrido del catálogo."""
+    nombre = nombre_emisor.upper().strip()
+    if nombre in sat_import.BASE_PROVEEDORES:
+        return sat_import.BASE_PROVEEDORES[nombre]
+    for llave, datos in sat_import.BASE_PROVEEDORES.items():
+        if llave in nombre:
+            return datos
+    return sat_import.SIN_SUGERENCIA
+
+
+def medir_buscador(filas: int) -> None:
+    nombres = [f["Nombre Emisor"] for f in reporte_sintetico(filas, [])]
+
+    inicio = time.perf_counter()
+    lineal = [buscar_lineal(n) for n in nombres]
+    t_lineal = time.perf_counter() - inicio
+
+    sat_import.sugerencia_proveedor.cache_clear()
+    inicio = time.perf_counter()
+    indexado = [sat_import.sugerencia_proveedor(n) for n in nombres]
+    t_indexado = time.perf_counter() - inicio
+
+    assert lineal == indexado
+    print(f"Buscador de proveedores ({filas} nombres)")
+    print(
+        f"  lineal={t_lineal * 1000:8.1f} ms  indexado={t_indexado * 1000:8.1f} ms  "
+        f"mejora={t_lineal / t_indexado:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    medir_buscador(filas)
+    medir_importacion(filas)
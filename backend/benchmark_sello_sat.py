@@ -0,0 +1,142 @@
+"""
+Micro-benchmark del sellado CFDI (cadena original XSLT + firma RSA).
+
+Compara la latencia por sello del camino anterior (parsear y compilar el XSLT
+del SAT y descifrar la llave CSD en cada timbre) contra el registro compartido
+de transforms y el caché de firmantes CSD.
+
+No requiere base de datos ni certificados reales: genera una llave RSA
+temporal y un comprobante de ejemplo.
+
+Uso:
+    python benchmark_sello_sat.py [iteraciones]
+"""
+
+import base64
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from lxml import etree
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.serialization import load_der_private_key
+
+from app.integrations.sat.csd_signer import get_csd_signer
+from app.integrations.sat.xslt_registry import (
+    CADENA_ORIGINAL_CFDI_40,
+    generar_cadena_original,
+)
+
+KEY_PASSWORD = b"12345678a"
+
+XML_EJEMPLO = """<?xml version="1.0" encoding="UTF-8"?>
+<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" Version="4.0" Fecha="2026-01-31T12:00:00" Serie="CP" Folio="1001" FormaPago="99" NoCertificado="00001000000500000000" SubTotal="15000.00" Moneda="MXN" TipoCambio="1" Total="16800.00" TipoDeComprobante="I" Exportacion="01" MetodoPago="PPD" LugarExpedicion="91808">
+    <cfdi:Emisor Rfc="EKU9003173C9" Nombre="RAPIDOS 3T" RegimenFiscal="624" />
+    <cfdi:Receptor Rfc="XAXX010101000" Nombre="PUBLICO EN GENERAL" DomicilioFiscalReceptor="91808" RegimenFiscalReceptor="616" UsoCFDI="S01" />
+    <cfdi:Conceptos>
+        <cfdi:Concepto ClaveProdServ="78101802" Cantidad="1.00" ClaveUnidad="E48" Unidad="SRV" Descripcion="FLETE DE CARGA GENERAL" ValorUnitario="15000.00" Importe="15000.00" ObjetoImp="02" />
+    </cfdi:Conceptos>
+</cfdi:Comprobante>""".encode("utf-8")
+
+
+def _llave_der_cifrada() -> bytes:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.BestAvailableEncryption(KEY_PASSWORD),
+    )
+
+
+def _firmar(key_der: bytes, cadena_original: str) -> str:
+    private_key = load_der_private_key(key_der, password=KEY_PASSWORD)
+    signature = private_key.sign(
+        cadena_original.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256()
+    )
+    return base64.b64encode(signature).decode("utf-8")
+
+
+def cadena_sin_cache(_key_der: bytes = b"") -> str:
+    """Réplica del camino anterior: parse + compilación del XSLT por sello."""
+    parser = etree.XMLParser(load_dtd=False, no_network=True, resolve_entities=False)
+    xslt_doc = etree.parse(str(CADENA_ORIGINAL_CFDI_40), parser=parser)
+    transform = etree.XSLT(xslt_doc)
+    xml_doc = etree.fromstring(XML_EJEMPLO, parser=parser)
+    return (
+        str(transform(xml_doc))
+        .replace('<?xml version="1.0" encoding="UTF-8"?>', "")
+        .replace("\n", "")
+        .strip()
+    )
+
+
+def cadena_con_registro(_key_der: bytes = b"") -> str:
+    return generar_cadena_original(XML_EJEMPLO)
+
+
+def sello_sin_cache(key_der: bytes) -> str:
+    return _firmar(key_der, cadena_sin_cache())
+
+
+def sello_con_registro(key_der: bytes) -> str:
+    return _firmar(key_der, cadena_con_registro())
+
+
+def sello_con_cache_de_llave(key_path: str) -> str:
+    signer = get_csd_signer(key_path, KEY_PASSWORD.decode(), "QA")
+    return signer.sign(cadena_con_registro())
+
+
+def medir(nombre: str, fn, key_der: bytes, iteraciones: int) -> float:
+    fn(key_der)  # calentamiento
+    tiempos = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        fn(key_der)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    mediana = statistics.median(tiempos)
+    print(
+        f"{nombre:<28} mediana={mediana:8.3f} ms  "
+        f"p95={sorted(tiempos)[int(len(tiempos) * 0.95) - 1]:8.3f} ms"
+    )
+    return mediana
+
+
+if __name__ == "__main__":
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    key_der = _llave_der_cifrada()
+
+    assert cadena_sin_cache() == cadena_con_registro()
+
+    print(f"Sellos por escenario: {iteraciones}")
+    print("-- Solo cadena original (XSLT)")
+    antes = medir("XSLT por sello (anterior)", cadena_sin_cache, key_der, iteraciones)
+    despues = medir(
+        "Registro XSLT compartido", cadena_con_registro, key_der, iteraciones
+    )
+    print(f"Mejora: {antes / despues:.1f}x ({antes - despues:.3f} ms menos por sello)")
+
+    print("-- Sello completo (XSLT + llave + firma)")
+    antes = medir("XSLT por sello (anterior)", sello_sin_cache, key_der, iteraciones)
+    despues = medir(
+        "Registro XSLT compartido", sello_con_registro, key_der, iteraciones
+    )
+    print(f"Mejora: {antes / despues:.1f}x ({antes - despues:.3f} ms menos por sello)")
+
+    with tempfile.NamedTemporaryFile(suffix=".key", delete=False) as tmp:
+        tmp.write(key_der)
+    try:
+        con_cache = medir(
+            "Registro XSLT + caché CSD", sello_con_cache_de_llave, tmp.name, iteraciones
+        )
+        print(
+            f"Mejora total: {antes / con_cache:.1f}x "
+            f"({antes - con_cache:.3f} ms menos por sello)"
+        )
+    finally:
+        os.unlink(tmp.name)
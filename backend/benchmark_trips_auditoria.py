@@ -0,0 +1,112 @@
+"""
+Benchmark de `GET /logistics/trips` con y sin los JOIN a users de AuditMixin.
+
+Antes `created_by` / `updated_by` eran `lazy="joined"`: cada entidad del
+grafo de viajes (viaje, cliente, tarifa, remolques, tramos, unidades,
+operadores, facturas...) agregaba dos LEFT JOIN a `users`. Este script
+ejecuta la consulta real de `crud.get_trips` y la serialización de
+`TripResponse` en ambos modos y compara:
+
+- sentencias SQL emitidas, tamaño total del SQL y JOINs a users
+- latencia (mediana y p95)
+
+El modo "anterior" se reproduce cambiando temporalmente la estrategia de
+carga de esas relaciones a joined; usa la base configurada en el `.env` y
+no escribe nada.
+
+Uso:
+    python benchmark_trips_auditoria.py [iteraciones] [limit]
+"""
+
+import os
+import re
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.database import Base, engine
+from app.models.models import AuditMixin
+from app.modules.logistics import crud, schemas
+
+JOIN_USERS = re.compile(r"JOIN users\b", re.IGNORECASE)
+
+# Sin caché de sentencias compiladas: la estrategia de carga no forma parte
+# de la llave del caché y ambos modos compilarían el mismo SQL
+engine_sin_cache = engine.execution_options(compiled_cache=None)
+respuesta = TypeAdapter(list[schemas.TripResponse])
+
+
+@contextmanager
+def usuarios_auditoria_joined():
+    """Restaura temporalmente `lazy="joined"` en created_by / updated_by."""
+    props = [
+        mapper.attrs[nombre]
+        for mapper in Base.registry.mappers
+        if issubclass(mapper.class_, AuditMixin)
+        for nombre in ("created_by", "updated_by")
+    ]
+    originales = [prop.strategy for prop in props]
+    for prop in props:
+        prop.strategy = prop._get_strategy((("lazy", "joined"),))
+    try:
+        yield
+    finally:
+        for prop, original in zip(props, originales):
+            prop.strategy = original
+
+
+def ejecutar(limit: int) -> list[str]:
+    sentencias = []
+
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _capturar)
+    try:
+        with Session(bind=engine_sin_cache) as db:
+            trips, _ = crud.get_trips(db, 0, limit)
+            respuesta.dump_python(
+                respuesta.validate_python(trips, from_attributes=True)
+            )
+    finally:
+        event.remove(engine, "before_cursor_execute", _capturar)
+    return sentencias
+
+
+def medir(nombre: str, limit: int, iteraciones: int) -> float:
+    sentencias = ejecutar(limit)  # calentamiento + conteo de SQL
+    tiempos = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        ejecutar(limit)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    mediana = statistics.median(tiempos)
+    print(
+        f"{nombre:<22} sentencias={len(sentencias):3d}  "
+        f"sql={sum(len(s) for s in sentencias) / 1024:8.1f} KB  "
+        f"joins_users={sum(len(JOIN_USERS.findall(s)) for s in sentencias):4d}  "
+        f"mediana={mediana:8.2f} ms  "
+        f"p95={sorted(tiempos)[max(int(len(tiempos) * 0.95) - 1, 0)]:8.2f} ms"
+    )
+    return mediana
+
+
+if __name__ == "__main__":
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    print(f"GET /logistics/trips?limit={limit}, {iteraciones} iteraciones")
+    with usuarios_auditoria_joined():
+        antes = medir("JOIN users (anterior)", limit, iteraciones)
+    despues = medir("Perezoso (actual)", limit, iteraciones)
+    print(
+        f"Mejora: {antes / despues:.2f}x ({antes - despues:.2f} ms menos por petición)"
+    )
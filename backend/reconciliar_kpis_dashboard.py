@@ -0,0 +1,84 @@
+"""
+Reconciliación de los rollups diarios del dashboard.
+
+Recalcula `dashboard_daily_rollups` desde las tablas base y corrige los días
+que no coinciden (cambios hechos fuera del ORM: updates masivos, SQL manual,
+restauraciones). Pensado para correr cada noche; después de aplicar la
+migración f6b8d0e2a4c7 se corre una vez con `--todo` para poblar el histórico.
+
+Uso:
+    python reconciliar_kpis_dashboard.py                 # últimos 35 días
+    python reconciliar_kpis_dashboard.py --dias 90
+    python reconciliar_kpis_dashboard.py --desde 2026-01-01 --hasta 2026-03-31
+    python reconciliar_kpis_dashboard.py --todo
+"""
+
+import argparse
+import logging
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.database import SessionLocal
+from app.modules.dashboard.rollups import rango_con_datos, reconciliar
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger("reconciliar_kpis_dashboard")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recalcula los rollups diarios del dashboard y corrige diferencias."
+    )
+    parser.add_argument(
+        "--dias",
+        type=int,
+        default=int(os.getenv("DASHBOARD_ROLLUP_RECONCILE_DAYS", 35)),
+        help="Días hacia atrás desde hoy (por defecto 35).",
+    )
+    parser.add_argument(
+        "--desde", type=date.fromisoformat, help="Fecha inicial (YYYY-MM-DD)."
+    )
+    parser.add_argument(
+        "--hasta", type=date.fromisoformat, help="Fecha final (YYYY-MM-DD)."
+    )
+    parser.add_argument(
+        "--todo",
+        action="store_true",
+        help="Del primer al último día con datos (carga inicial).",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.todo:
+            rango = rango_con_datos(db)
+            if rango is None:
+                logger.info("Sin datos que reconciliar.")
+                return
+            desde, hasta = rango
+        else:
+            # Un día de margen: la BD puede ir un día adelante (UTC vs hora local)
+            hasta = args.hasta or (date.today() + timedelta(days=1))
+            desde = args.desde or (hasta - timedelta(days=args.dias))
+
+        logger.info(f"🔄 Reconciliando rollups del {desde} al {hasta}...")
+        resultado = reconciliar(db, desde, hasta)
+        logger.info(
+            f"✅ {resultado['dias_revisados']} días revisados, "
+            f"{resultado['dias_corregidos']} corregidos"
+        )
+        for dia in resultado["detalle"]:
+            logger.warning(f"-> Rollup corregido: {dia}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
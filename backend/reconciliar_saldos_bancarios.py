@@ -0,0 +1,69 @@
+"""
+Verificación de saldos bancarios.
+
+Reconstruye el libro de saldos (`bank_account_daily_balances`) de cada
+cuenta desde sus movimientos, corrige los días que no coinciden (cambios
+hechos fuera del ORM) y reporta las cuentas cuyo `saldo` no cuadra con la
+suma de sus movimientos. El saldo de la cuenta no se toca: la diferencia se
+revisa a mano. Pensado para correr cada noche; sale con código 1 si hay
+cuentas descuadradas.
+
+Uso:
+    python reconciliar_saldos_bancarios.py                 # todas las cuentas
+    python reconciliar_saldos_bancarios.py --cuenta 3 --cuenta 7
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.database import SessionLocal
+from app.modules.finance.ledger import reconciliar
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger("reconciliar_saldos_bancarios")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Recalcula el libro de saldos bancarios y reporta descuadres."
+    )
+    parser.add_argument(
+        "--cuenta",
+        type=int,
+        action="append",
+        help="Id de la cuenta a revisar (se puede repetir). Por defecto, todas.",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        logger.info("🔄 Reconciliando saldos bancarios...")
+        resultado = reconciliar(db, args.cuenta)
+        logger.info(
+            f"✅ {resultado['cuentas_revisadas']} cuentas revisadas, "
+            f"{resultado['dias_corregidos']} días corregidos en el libro, "
+            f"{resultado['cuentas_descuadradas']} cuentas descuadradas"
+        )
+        for cuenta in resultado["detalle"]:
+            logger.warning(
+                f"-> Cuenta {cuenta['bank_account_id']} ({cuenta['alias']}): "
+                f"saldo {cuenta['saldo_cuenta']:,.2f}, movimientos "
+                f"{cuenta['saldo_movimientos']:,.2f}, diferencia "
+                f"{cuenta['diferencia']:,.2f}, días corregidos "
+                f"{cuenta['dias_corregidos']}"
+            )
+        return 1 if resultado["cuentas_descuadradas"] else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
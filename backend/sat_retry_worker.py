@@ -0,0 +1,90 @@
+import argparse
+import logging
+import os
+import signal
+import sys
+
+# 1. Aseguramos que el script pueda encontrar los módulos de 'app'
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.integrations.sat.retry_queue import SAT_RETRY_LEASE_SECONDS
+from app.integrations.sat.retry_worker import SatRetryWorker
+
+# 2. Configuración del logger (systemd / supervisor capturan stdout)
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger("sat_retry_worker")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Worker de la cola de reintentos SAT (sat_retry_queue)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("SAT_RETRY_WORKERS", 4)),
+        help="Items procesados en paralelo.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=int(os.getenv("SAT_RETRY_BATCH_SIZE", 20)),
+        help="Máximo de items reclamados por consulta.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=float(os.getenv("SAT_RETRY_POLL_SECONDS", 10)),
+        help="Segundos de espera cuando la cola está vacía.",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=SAT_RETRY_LEASE_SECONDS,
+        help="Antigüedad de locked_at a partir de la cual un reclamo se libera.",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=float(os.getenv("SAT_RETRY_METRICS_SECONDS", 60)),
+        help="Cada cuántos segundos se registran las métricas de la cola.",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Procesa un solo lote y termina (modo cron).",
+    )
+    args = parser.parse_args()
+
+    worker = SatRetryWorker(
+        workers=args.workers,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        lease_seconds=args.lease_seconds,
+        metrics_interval=args.metrics_interval,
+    )
+
+    if args.once:
+        resultados = worker.run_once()
+        logger.info(f"Lote procesado: {len(resultados)} items")
+        for r in resultados:
+            logger.info(f"-> {r}")
+        return
+
+    # 3. Apagado ordenado: termina los items en curso antes de salir
+    def _detener(signum, _frame):
+        logger.info(f"Señal {signum} recibida, deteniendo worker...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, _detener)
+    signal.signal(signal.SIGINT, _detener)
+
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
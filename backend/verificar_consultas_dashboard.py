@@ -0,0 +1,224 @@
+"""
+Verificación de regresión: las estadísticas por operador del dashboard
+emiten un número acotado de consultas sin importar cuántos operadores haya.
+
+Antes el endpoint hacía tres consultas por operador activo (viajes,
+incidencias, combustible); ahora cada métrica sale de una consulta agrupada
+sobre viajes, tramos, eventos y tickets de combustible (`calcular_dia`) y
+`GET /dashboard/stats` lee el resultado de los rollups diarios. Este script
+siembra N operadores con viajes, incidencias y tickets reales dentro de una
+transacción que se revierte al final y, contando las sentencias con
+`before_cursor_execute`:
+
+1. agrega los días desde las tablas base (`recalcular_dias`);
+2. ejecuta el cálculo del dashboard (sin pasar por el caché) y compara los
+   viajes, incidencias y rendimiento de cada operador con lo sembrado.
+
+Usa la base configurada en el `.env` y no deja nada escrito. Sale con
+código 1 si el número de consultas cambia con N o si las cifras no cuadran.
+
+Uso:
+    python verificar_consultas_dashboard.py [n1 n2 ...]   # por defecto 1 50 500
+"""
+
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.database import engine
+from app.models.models import (
+    Client,
+    FuelLog,
+    Operator,
+    SubClient,
+    Trip,
+    TripLeg,
+    TripLegType,
+    TripStatus,
+    TripTimelineEvent,
+    Unit,
+)
+from app.modules.dashboard.rollups import recalcular_dias
+from app.modules.dashboard.router import _dashboard_stats
+
+DIAS = 7
+TARIFA = 1000.0
+LITROS_TICKET = 100.0
+# Dos tickets por día: odómetro 1000 * (día + 1) y 500 km más (0 no cuenta)
+KMS_DIA = 500
+
+
+def _esperado(dias: int) -> dict:
+    """Viajes, incidencias y rendimiento que debe tener cada operador sembrado."""
+    distancia = 1000 * (dias - 1) + KMS_DIA
+    return {
+        "trips": dias,
+        "incidents": dias // 2,
+        "rendimiento_real": round(distancia / (2 * dias * LITROS_TICKET), 2),
+        "revenue": dias * TARIFA,
+    }
+
+
+def sembrar(db: Session, operadores: int, inicio: date):
+    """N operadores activos, cada uno con un viaje y dos tickets por día del rango."""
+    cliente = Client(razon_social="CLIENTE VERIFICACION DASH", rfc="XAXX010101000")
+    db.add(cliente)
+    db.flush()
+    sub_cliente = SubClient(
+        client_id=cliente.id,
+        nombre="DESTINO VERIFICACION",
+        direccion="S/N",
+        ciudad="VERACRUZ",
+        estado="VERACRUZ",
+    )
+    unidad = Unit(
+        public_id="VERIF-DASH-UNIDAD",
+        numero_economico="VERIF-DASH",
+        placas="VERIF-DASH",
+        marca="VERIF",
+        modelo="VERIF",
+        tipo_1="FULL",
+    )
+    nuevos = [
+        Operator(
+            name=f"OPERADOR VERIFICACION {i}",
+            license_number=f"VERIF-DASH-{i}",
+            license_expiry=inicio + timedelta(days=365),
+            medical_check_expiry=inicio + timedelta(days=365),
+        )
+        for i in range(operadores)
+    ]
+    db.add_all([sub_cliente, unidad, *nuevos])
+    db.flush()
+
+    viajes = {}
+    for op in nuevos:
+        for d in range(DIAS):
+            viajes[(op.id, d)] = Trip(
+                client_id=cliente.id,
+                sub_client_id=sub_cliente.id,
+                origin="VERACRUZ",
+                destination="MEXICO",
+                status=TripStatus.ENTREGADO,
+                tarifa_base=TARIFA,
+                start_date=datetime.combine(inicio + timedelta(days=d), time(8)),
+            )
+    db.add_all(viajes.values())
+    db.flush()
+
+    tramos = {
+        llave: TripLeg(
+            trip_id=viaje.id,
+            leg_type=TripLegType.RUTA,
+            unit_id=unidad.id,
+            operator_id=llave[0],
+        )
+        for llave, viaje in viajes.items()
+    }
+    db.add_all(tramos.values())
+    db.flush()
+
+    db.add_all(
+        TripTimelineEvent(
+            trip_leg_id=tramo.id,
+            time=datetime.combine(inicio + timedelta(days=d), time(12)),
+            event="Incidencia de verificación",
+            event_type="incidencia",
+        )
+        for (_operador, d), tramo in tramos.items()
+        if d % 2
+    )
+    db.add_all(
+        FuelLog(
+            unit_id=unidad.id,
+            operator_id=op.id,
+            fecha_hora=datetime.combine(inicio + timedelta(days=d), time(6 + k)),
+            estacion="ESTACION VERIFICACION",
+            tipo_combustible="diesel",
+            litros=LITROS_TICKET,
+            odometro=1000 * (d + 1) + KMS_DIA * k,
+            is_conciliated=True,
+        )
+        for op in nuevos
+        for d in range(DIAS)
+        for k in range(2)
+    )
+    db.flush()
+    return {op.name for op in nuevos}
+
+
+def verificar(operadores: int) -> tuple[int, int, list]:
+    """(consultas de la agregación, consultas del dashboard, errores)."""
+    fin = date.today()
+    inicio = fin - timedelta(days=DIAS - 1)
+    sentencias = []
+
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    def contar(funcion, *args):
+        sentencias.clear()
+        event.listen(engine, "before_cursor_execute", _capturar)
+        try:
+            resultado = funcion(*args)
+        finally:
+            event.remove(engine, "before_cursor_execute", _capturar)
+        return resultado, len(sentencias)
+
+    with engine.connect() as conn:
+        transaccion = conn.begin()
+        try:
+            db = Session(bind=conn, join_transaction_mode="create_savepoint")
+            sembrados = sembrar(db, operadores, inicio)
+
+            dias = [inicio + timedelta(days=d) for d in range(DIAS)]
+            _cambios, consultas_agregacion = contar(recalcular_dias, db, dias)
+            stats, consultas_dashboard = contar(_dashboard_stats, db, inicio, fin)
+            db.close()
+        finally:
+            transaccion.rollback()
+
+    esperado = _esperado(DIAS)
+    errores = []
+    propios = [o for o in stats["operatorStats"] if o["name"] in sembrados]
+    if len(propios) != min(operadores, 8):
+        errores.append(
+            f"{len(propios)} operadores en la gráfica, se esperaban {min(operadores, 8)}"
+        )
+    for operador in propios:
+        for campo, valor in esperado.items():
+            if operador[campo] != valor:
+                errores.append(
+                    f"{operador['name']}: {campo}={operador[campo]}, se esperaba {valor}"
+                )
+    return consultas_agregacion, consultas_dashboard, errores
+
+
+if __name__ == "__main__":
+    cantidades = [int(n) for n in sys.argv[1:]] or [1, 50, 500]
+
+    conteos = {}
+    fallas = []
+    for operadores in cantidades:
+        agregacion, dashboard, errores = verificar(operadores)
+        conteos[operadores] = (agregacion, dashboard)
+        fallas.extend(errores)
+        print(
+            f"operadores={operadores:5d}  consultas agregación={agregacion:3d}  "
+            f"dashboard={dashboard:3d}  errores={len(errores)}"
+        )
+
+    for error in fallas[:20]:
+        print(f"   {error}")
+    if len(set(conteos.values())) > 1:
+        print("❌ El número de consultas del dashboard crece con los operadores")
+        sys.exit(1)
+    if fallas:
+        print("❌ Las estadísticas por operador no cuadran con lo sembrado")
+        sys.exit(1)
+    print("✅ Número de consultas constante y estadísticas por operador correctas")
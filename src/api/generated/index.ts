@@ -115,6 +115,7 @@ export type { RateSegmentUpdate } from './models/RateSegmentUpdate';
 export type { RateTemplateCreate } from './models/RateTemplateCreate';
 export type { RateTemplateResponse } from './models/RateTemplateResponse';
 export type { RateTemplateUpdate } from './models/RateTemplateUpdate';
+export type { RebuildPdfsPayload } from './models/RebuildPdfsPayload';
 export type { ReceivableInvoiceCreate } from './models/ReceivableInvoiceCreate';
 export type { ReceivableInvoiceLite } from './models/ReceivableInvoiceLite';
 export type { ReceivableInvoiceRef } from './models/ReceivableInvoiceRef';
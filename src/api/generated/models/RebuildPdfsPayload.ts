@@ -0,0 +1,12 @@
+/* generated using openapi-typescript-codegen -- do not edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+export type RebuildPdfsPayload = {
+    fecha_desde?: (string | null);
+    fecha_hasta?: (string | null);
+    serie?: (string | null);
+    client_id?: (number | null);
+    reanudar?: boolean;
+};
+
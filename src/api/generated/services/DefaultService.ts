@@ -18,6 +18,7 @@ import type { InsurerCreate } from '../models/InsurerCreate';
 import type { LicenseTypeBase } from '../models/LicenseTypeBase';
 import type { LicenseTypeCreate } from '../models/LicenseTypeCreate';
 import type { ModuleSchema } from '../models/ModuleSchema';
+import type { RebuildPdfsPayload } from '../models/RebuildPdfsPayload';
 import type { ReceivableInvoiceCreate } from '../models/ReceivableInvoiceCreate';
 import type { RegistroPagoPayload } from '../models/RegistroPagoPayload';
 import type { RouteCreate } from '../models/RouteCreate';
@@ -1074,13 +1075,34 @@ export class DefaultService {
     }
     /**
      * Rebuild All Pdfs
+     * Reconstruye PDFs en segundo plano por bloques, con checkpoint por id.
+     * Con `reanudar` continúa la última reconstrucción interrumpida.
+     * @param requestBody
      * @returns any Successful Response
      * @throws ApiError
      */
-    public static rebuildAllPdfsApiSatRebuildAllPdfsGet(): CancelablePromise<any> {
+    public static rebuildAllPdfsApiSatRebuildAllPdfsPost(
+        requestBody: RebuildPdfsPayload,
+    ): CancelablePromise<any> {
         return __request(OpenAPI, {
-            method: 'GET',
+            method: 'POST',
             url: '/api/sat/rebuild-all-pdfs',
+            body: requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+    /**
+     * Rebuild All Pdfs Status
+     * @returns any Successful Response
+     * @throws ApiError
+     */
+    public static rebuildAllPdfsStatusApiSatRebuildAllPdfsStatusGet(): CancelablePromise<any> {
+        return __request(OpenAPI, {
+            method: 'GET',
+            url: '/api/sat/rebuild-all-pdfs/status',
         });
     }
     /**